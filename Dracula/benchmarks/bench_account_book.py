@@ -0,0 +1,181 @@
+"""
+账户簿基准
+1. 查找一个持仓：旧实现（query_stock_positions 后线性查找）与账户簿（按证券代码索引）的耗时
+2. 一致性：通过 buy_stock / sell_stock 随机买卖，等回报推送完成后，账户簿的持仓、可用数量和资金
+   与重新查询的结果逐项相同；这期间除第一次建立快照外不再调用 query_stock_positions / query_stock_asset
+3. 冻结：未结卖出委托冻结可用数量，撤单后解冻；市价买入（委托价为 0）按计算数量所用的价格冻结资金；
+   连接断开后快照过期，下次使用时重新查询
+
+    python benchmarks/bench_account_book.py --latency 0.005 --positions 300 --orders 40
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+ACCOUNT = "fake"
+
+
+def _wait(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def bench_lookup(trader, codes, repeats):
+    from xtquant.xttype import StockAccount
+    from xtquantai.tools.account_detail import get_account_book
+
+    acc = StockAccount(ACCOUNT, "STOCK")
+    target = codes[-1]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        position = None
+        for pos in trader.query_stock_positions(acc):
+            if pos.stock_code == target:
+                position = pos
+                break
+    old = (time.perf_counter() - start) / repeats
+    with contextlib.redirect_stdout(io.StringIO()):
+        book = get_account_book(ACCOUNT)
+    start = time.perf_counter()
+    for _ in range(repeats * 100):
+        position = book.position(target)
+    new = (time.perf_counter() - start) / (repeats * 100)
+    print(f"查找一个持仓（共 {len(codes)} 个）: 查询后线性查找 {old * 1e3:.2f}ms，账户簿 {new * 1e6:.2f}us")
+    return 0 if position is not None else 1
+
+
+def _differences(book, trader, acc):
+    positions = {p.stock_code: (p.volume, p.can_use_volume) for p in trader.query_stock_positions(acc)}
+    expected = {code: (p.volume, p.can_use_volume) for code, p in book.positions.items()}
+    asset = trader.query_stock_asset(acc)
+    diffs = [f"{code}: 账户簿 {expected.get(code)}，查询 {positions.get(code)}"
+             for code in sorted(set(positions) | set(expected)) if positions.get(code) != expected.get(code)]
+    for name in ("cash", "available"):
+        if abs(getattr(book, name) - getattr(asset, name)) > 1e-6:
+            diffs.append(f"{name}: 账户簿 {getattr(book, name)}，查询 {getattr(asset, name)}")
+    return diffs
+
+
+async def check_consistency(trader, codes, orders):
+    from xtquant.xttype import StockAccount
+    from xtquantai.tools.account_detail import buy_stock, get_account_book, sell_stock
+
+    failed = 0
+    rng = random.Random(3)
+    acc = StockAccount(ACCOUNT, "STOCK")
+    with contextlib.redirect_stdout(io.StringIO()):
+        book = get_account_book(ACCOUNT)
+    events = book.events
+    fake_xtquant.CALL_COUNTS.clear()
+    placed = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(orders):
+            code = rng.choice(codes[:10])
+            if i % 3 == 0:
+                result = await buy_stock(ACCOUNT, code, rng.choice([5000, 20000]))
+            else:
+                result = await sell_stock(ACCOUNT, code, rng.choice([100, 300, 1000, 5000]))
+            placed += bool(result.get("success"))
+        elapsed = time.perf_counter() - start
+        # 每笔委托推送 已报、成交、已成 三个回报
+        settled = _wait(lambda: book.events - events >= 3 * placed)
+    queries = fake_xtquant.CALL_COUNTS.get("query_stock_positions", 0) + fake_xtquant.CALL_COUNTS.get("query_stock_asset", 0)
+    diffs = _differences(book, trader, acc)
+    if not settled or diffs or queries:
+        failed += 1
+        print(f"  回报完成 {settled}，买卖期间的查询 {queries} 次，差异: {diffs[:5]}")
+    print(f"一致性: {orders} 次买卖（委托成功 {placed} 笔）{elapsed:.3f}s，"
+          f"买卖期间查询 {queries} 次，{'通过' if not failed else '未通过'}")
+    return failed
+
+
+async def check_freeze_and_resync(trader, codes):
+    from xtquant import xtconstant
+    from xtquantai.tools.account_detail import (get_account_book, get_account_book_snapshot, get_callback_instance,
+                                                get_trader_session)
+
+    failed = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        book = get_account_book(ACCOUNT)
+    code = next(code for code in codes if book.position(code) and book.position(code).can_use_volume >= 500)
+    before = book.position(code).can_use_volume
+    order = fake_xtquant._Obj(account_id=ACCOUNT, stock_code=code, order_id=999001, order_type=xtconstant.STOCK_SELL,
+                              order_volume=500, price=10.0, traded_volume=0, order_status=xtconstant.ORDER_REPORTED,
+                              order_remark="")
+    book.apply_order(order)
+    frozen = book.position(code).can_use_volume
+    order.order_status = xtconstant.ORDER_CANCELED
+    book.apply_order(order)
+    released = book.position(code).can_use_volume
+    if frozen != before - 500 or released != before:
+        failed += 1
+        print(f"  冻结: {before} -> 已报 {frozen} -> 撤单 {released}")
+
+    cash = book.available
+    book.expect_buy(code, 12.5)
+    buy = fake_xtquant._Obj(account_id=ACCOUNT, stock_code=code, order_id=999002, order_type=xtconstant.STOCK_BUY,
+                            order_volume=400, price=0.0, traded_volume=0, order_status=xtconstant.ORDER_REPORTED,
+                            order_remark="")
+    book.apply_order(buy)
+    buy_frozen = cash - book.available
+    buy.order_status = xtconstant.ORDER_CANCELED
+    book.apply_order(buy)
+    if abs(buy_frozen - 5000.0) > 1e-6 or abs(book.available - cash) > 1e-6:
+        failed += 1
+        print(f"  市价买入冻结 {buy_frozen:.2f}（应为 5000.00），撤单后可用 {book.available:.2f} / {cash:.2f}")
+
+    syncs = book.syncs
+    with contextlib.redirect_stdout(io.StringIO()):
+        get_callback_instance().on_disconnected()
+        stale = book.needs_sync()
+        # 等后台重连完成后再使用
+        _wait(lambda: get_trader_session().connected)
+        get_account_book(ACCOUNT)
+        snapshot = await get_account_book_snapshot(ACCOUNT, resync=True)
+    if not stale or book.syncs != syncs + 2 or not snapshot.get("success") or snapshot["stale_reason"]:
+        failed += 1
+        print(f"  断开后 stale_reason={stale!r}，查询次数 {syncs} -> {book.syncs}")
+    print(f"冻结与重新同步: 已报卖出冻结 500 股、市价买入冻结 {buy_frozen:.0f} 元，撤单解冻，断开后快照过期（{stale}）并重新查询，"
+          f"{'通过' if not failed else '未通过'}")
+    return failed
+
+
+async def main(args):
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    os.environ.setdefault("XTQUANTAI_TRADER_RECONNECT_BASE", "0.01")
+    fake_xtquant.install(args.latency)
+    from xtquantai.tools.account_detail import get_trader_instance
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        trader = get_trader_instance()
+    codes = fake_xtquant._SECTORS["沪深300"][:args.positions]
+    trader.positions = {code: {"volume": 3000, "can_use_volume": 2000} for code in codes}
+
+    failed = bench_lookup(trader, codes, 20)
+    failed += await check_consistency(trader, codes, args.orders)
+    failed += await check_freeze_and_resync(trader, codes)
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.005, help="每次交易接口调用的模拟延迟（秒）")
+    parser.add_argument("--positions", type=int, default=300, help="持仓个数")
+    parser.add_argument("--orders", type=int, default=40, help="买卖次数")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(main(args)) else 0)
@@ -0,0 +1,331 @@
+"""
+本地回测引擎：一致性检查与速度基准
+1. 一致性：
+   - 把向量化的本地引擎与逐根K线串行执行 VBA 模板的参考实现逐点比较（模拟K线，多种信号，含同根K线 bk/bp 同时成立、
+     首根K线开仓、持仓到最后一根等边界情况）
+   - benchmarks/fixtures/backtest/*.json 中录制的 get_vba_func_result 结果（存在时）：用录制的K线运行本地引擎，
+     汇总指标必须一致（仅允许 1e-9 的相对浮点误差），逐K线各列在 1e-6 内一致
+   - 区间内没有K线时本地引擎返回“区间内没有K线”的错误
+2. 速度：本地引擎与 get_vba_func_result 往返（模拟延迟）逐只股票回测的耗时对比。
+
+录制夹具需要在装有 QMT 的机器上运行（会调用真实的 xtquant）：
+    python benchmarks/bench_backtest.py --record --stock 600050.SH --start 20220101 --end 20241231
+
+只做检查和基准（使用模拟行情）：
+    python benchmarks/bench_backtest.py --stocks 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "backtest")
+
+FEE = 0.003
+
+SIGNALS = {
+    "ma_cross": """
+input:N1(5,1,100,1);
+input:N2(34,1,120,1);
+ma1:=ma(c,N1);
+ma2:=ma(c,N2);
+bk:= cross(ma1,ma2);//////////开仓条件
+bp:= cross(ma2,ma1);////平仓条件
+""",
+    "ma_state": "Bk:= MA(CLOSE,5)>MA(CLOSE,10); bp:= MA(CLOSE,5)<MA(CLOSE,10);",
+    "overlap": "bk:=C>REF(C,1); bp:=C<REF(C,2) OR C>REF(C,1)*1.015;",
+    "first_bar": "bk:=C>0; bp:=MOD(BARPOS,7)=0;",
+    "hold_to_end": "bk:=BARPOS=20; bp:=0;",
+}
+
+
+# ---------- 逐根K线串行执行模板的参考实现 ----------
+
+def _div(a, b):
+    if math.isnan(a) or math.isnan(b):
+        return math.nan
+    return 0.0 if b == 0 else a / b
+
+
+def _true(x):
+    return not math.isnan(x) and x != 0
+
+
+def reference_template(close, hs, bk, bp, fee=FEE):
+    """逐根K线按模板语句顺序执行，VARIABLE 变量在 IF 之前保持上一根K线的值"""
+    n = len(close)
+    holding = []
+    cjt = []
+    index_hist = []
+    zhishu = hszhishu = tmp = hstmp = buypoint = hs300bp = 0.0
+    dcs = 0
+    strategy = math.nan
+    peak = max_dd = math.nan
+    wins = 0
+    rows = {name: [] for name in ("持仓周期", "持仓收益", "策略收益", "交易次数", "最近回撤", "最大回撤",
+                                  "平均收益", "收益回撤比", "胜率", "指数", "对应指数", "对冲")}
+    for i in range(n):
+        test_holding = holding[i - 1] if i else 0
+        # t:=BARSLAST(TestHolding=0)，历史为各根K线结束时的值，当前为尚未更新的值
+        if test_holding == 0:
+            t = 0.0
+        else:
+            j = next((j for j in range(i - 1, -1, -1) if holding[j] == 0), None)
+            t = math.nan if j is None else float(i - j)
+        base = close[i - int(t)] if not math.isnan(t) and i - int(t) >= 0 else math.nan
+        cjt.append(_div(close[i] - base, base))
+        if test_holding > 0:
+            prev = cjt[i - 1] if i else math.nan
+            cjt1 = (cjt[i] - prev) * 100 if not (math.isnan(cjt[i]) or math.isnan(prev)) else math.nan
+        else:
+            cjt1 = 0.0
+        if not math.isnan(cjt1):
+            strategy = cjt1 if math.isnan(strategy) else strategy + cjt1
+
+        if _true(bk[i]) and not _true(bp[i]) and test_holding == 0:
+            test_holding = 1
+            hs300bp = hs[i]
+            buypoint = close[i]
+            tmp = zhishu
+            hstmp = hszhishu
+        if _true(bp[i]) and test_holding > 0:
+            test_holding = 0
+            thisprofit = _div(close[i] - buypoint, buypoint)
+            hszhishu = hstmp + _div(hs[i] - hs300bp, hs300bp)
+            zhishu = tmp + thisprofit - fee
+            buypoint = hs300bp = 0.0
+            dcs += 1
+        holding.append(test_holding)
+
+        if i and zhishu > index_hist[-1]:
+            wins += 1
+        index_hist.append(zhishu)
+        if not math.isnan(strategy):
+            peak = strategy if math.isnan(peak) else max(peak, strategy)
+        recent = peak - strategy
+        if not math.isnan(recent):
+            max_dd = recent if math.isnan(max_dd) else max(max_dd, recent)
+
+        rows["持仓周期"].append(t)
+        rows["持仓收益"].append(cjt[i] * 100)
+        rows["策略收益"].append(strategy)
+        rows["交易次数"].append(float(dcs))
+        rows["最近回撤"].append(recent)
+        rows["最大回撤"].append(max_dd)
+        rows["平均收益"].append(_div(strategy, dcs))
+        rows["收益回撤比"].append(_div(strategy, max_dd))
+        rows["胜率"].append(_div(wins, dcs))
+        rows["指数"].append(zhishu)
+        rows["对应指数"].append(hszhishu)
+        rows["对冲"].append(zhishu - hszhishu)
+    return rows
+
+
+# ---------- 比较 ----------
+
+def mismatches(actual, expected, tol=1e-6):
+    actual, expected = np.asarray(actual, dtype=np.float64), np.asarray(expected, dtype=np.float64)
+    if actual.shape != expected.shape:
+        return [f"长度不同 {actual.shape} != {expected.shape}"]
+    close = np.isclose(actual, expected, rtol=tol, atol=tol) | (np.isnan(actual) & np.isnan(expected))
+    return [f"[{i}] {actual[i]!r} != {expected[i]!r}" for i in np.flatnonzero(~close)[:3]]
+
+
+def synthetic_bars(n, seed):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    return {
+        "time": 1704067200000 + np.arange(n, dtype=np.int64) * 86400000,
+        "open": open_,
+        "high": np.maximum(open_, close) * 1.005,
+        "low": np.minimum(open_, close) * 0.995,
+        "close": close,
+        "volume": rng.integers(1000, 100000, n).astype(np.float64),
+    }
+
+
+def check_reference(n, seeds):
+    from xtquantai.backtest import run_template_backtest
+    from xtquantai.formula import evaluate_signal
+
+    failed = total = 0
+    for seed in range(seeds):
+        bars = synthetic_bars(n, seed)
+        benchmark = {"time": bars["time"], "close": synthetic_bars(n, 1000 + seed)["close"]}
+        for name, signal in SIGNALS.items():
+            total += 1
+            df = run_template_backtest(signal, bars, benchmark=benchmark)
+            sig = evaluate_signal(signal, bars, names=["BK", "BP"])
+            expected = reference_template(bars["close"], benchmark["close"], sig["BK"], sig["BP"])
+            errors = {col: err for col in expected if (err := mismatches(df[col].to_numpy(), expected[col]))}
+            if errors:
+                failed += 1
+                print(f"  参考实现 不一致 seed={seed} {name}: {errors}")
+    print(f"参考实现一致性: {total - failed}/{total} 个回测通过（每个 {n} 根K线）")
+    return failed
+
+
+def check_fixtures():
+    from xtquantai.backtest import run_template_backtest
+    from xtquantai.tools.single_stock_backtest import summarize_backtest_result
+
+    paths = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json")))
+    if not paths:
+        print(f"未找到录制的 get_vba_func_result 回测夹具（{FIXTURE_DIR}），可在 QMT 环境下用 --record 录制")
+        return 0
+    import pandas as pd
+
+    failed = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+        bars = {field: np.asarray(values, dtype=np.float64) for field, values in fixture["bars"].items()}
+        benchmark = {field: np.asarray(values, dtype=np.float64) for field, values in fixture["benchmark"].items()}
+        expected = pd.DataFrame({name: [np.nan if v is None else v for v in values]
+                                 for name, values in fixture["result"].items()})
+        actual = run_template_backtest(fixture["signal"], bars, fixture["period"], benchmark=benchmark)
+        errors = []
+        summary = summarize_backtest_result(actual)["summary"]
+        expected_summary = summarize_backtest_result(expected)["summary"]
+        # 汇总指标只允许浮点累加顺序带来的误差
+        if any(not math.isclose(summary[k], v, rel_tol=1e-9, abs_tol=1e-12) for k, v in expected_summary.items()):
+            errors.append(f"汇总指标 {summary} != {expected_summary}")
+        for col in expected.columns:
+            if col in actual.columns and col != "time":
+                err = mismatches(actual[col].to_numpy(), expected[col].to_numpy())
+                if err:
+                    errors.append(f"{col}: {err}")
+        if errors:
+            failed += 1
+            print(f"  录制结果 不一致 {os.path.basename(path)}: {errors}")
+    print(f"录制结果一致性: {len(paths) - failed}/{len(paths)} 个夹具通过")
+    return failed
+
+
+def check_empty_range():
+    """区间内没有K线时本地引擎返回明确的错误，而不是在汇总时出错"""
+    from xtquantai.tools.single_stock_backtest import run_single_stock_backtest
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = asyncio.run(run_single_stock_backtest("600000.SH", SIGNALS["ma_cross"], start_time="20350101",
+                                                       end_time="20351231", engine="local"))
+    ok = "区间内没有K线" in result.get("error", "")
+    print(f"空区间: {result.get('error')!r}，{'通过' if ok else '未通过'}")
+    return 0 if ok else 1
+
+
+def record(stock, signal_name, period, start, end, dividend_type):
+    """调用真实的 xtdata 录制夹具"""
+    import xtquant.xtdata as xtdata
+    from xtquantai.backtest import BENCHMARK_CODE
+    from xtquantai.tools.single_stock_backtest import build_vba_template
+
+    signal = SIGNALS[signal_name]
+    fields = ["time", "open", "high", "low", "close", "volume", "amount"]
+    data = {}
+    for code in (stock, BENCHMARK_CODE):
+        xtdata.download_history_data(code, period, start, end)
+        data[code] = xtdata.get_market_data_ex_ori(fields, [code], period, start, end, -1, dividend_type, True)[code]
+    df = xtdata.get_vba_func_result([build_vba_template(signal)], stock, period, start, end, -1, dividend_type)
+    result = {}
+    for name in df.columns:
+        try:
+            values = df[name].astype(float).tolist()
+        except (TypeError, ValueError):
+            continue
+        result[str(name)] = [None if math.isnan(v) else v for v in values]
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = os.path.join(FIXTURE_DIR, f"{stock}_{signal_name}_{period}_{dividend_type}_{start}_{end}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"stock_code": stock, "signal": signal, "period": period, "dividend_type": dividend_type,
+                   "start_time": start, "end_time": end,
+                   "bars": {k: np.asarray(v, dtype=np.float64).tolist() for k, v in data[stock].items()},
+                   "benchmark": {k: np.asarray(v, dtype=np.float64).tolist() for k, v in data[BENCHMARK_CODE].items()},
+                   "result": result}, f, ensure_ascii=False)
+    print(f"已录制: {path}")
+
+
+async def bench_tool(stocks, latency):
+    import fake_xtquant
+    from xtquantai.server import handle_call_tool
+
+    fake_xtquant.LATENCY = latency
+    codes = [f"{600000 + i:06d}.SH" for i in range(stocks)]
+    # local 第二轮K线已在本地缓存中
+    for engine in ("vba", "local", "local"):
+        start = time.perf_counter()
+        summaries = []
+        for code in codes:
+            with contextlib.redirect_stdout(io.StringIO()):
+                blocks = await handle_call_tool(None, "run_single_stock_backtest", {
+                    "stock_code": code, "signal": SIGNALS["ma_cross"], "start_time": "20100101",
+                    "end_time": "20191231", "engine": engine})
+            result = json.loads(blocks[0].text)
+            summaries.append(result.get("summary"))
+        elapsed = time.perf_counter() - start
+        print(f"run_single_stock_backtest engine={engine}: {stocks} 只股票 {elapsed:.2f}s，"
+              f"每只 {elapsed / stocks * 1000:.1f}ms")
+
+
+def bench_engine(n):
+    from xtquantai.backtest import run_template_backtest, template_backtest
+    from xtquantai.formula import evaluate_signal
+
+    bars = synthetic_bars(n, 0)
+    benchmark = {"time": bars["time"], "close": synthetic_bars(n, 1)["close"]}
+    signals = evaluate_signal(SIGNALS["ma_cross"], bars, names=["BK", "BP"])
+    start = time.perf_counter()
+    columns = template_backtest(bars["close"], signals["BK"], signals["BP"], benchmark["close"])
+    core = time.perf_counter() - start
+    start = time.perf_counter()
+    run_template_backtest(SIGNALS["ma_cross"], bars, benchmark=benchmark)
+    total = time.perf_counter() - start
+    print(f"本地引擎: {n} 根K线，模板计算 {core * 1000:.1f}ms（{n / core / 1e6:.2f} 百万根/秒），"
+          f"含信号求值和结果 DataFrame {total * 1000:.1f}ms，交易 {int(columns['交易次数'][-1])} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true", help="调用真实 xtdata 录制夹具")
+    parser.add_argument("--stock", default="600050.SH")
+    parser.add_argument("--signal", default="ma_cross", choices=list(SIGNALS))
+    parser.add_argument("--period", default="1d")
+    parser.add_argument("--start", default="20220101")
+    parser.add_argument("--end", default="20241231")
+    parser.add_argument("--dividend-type", default="front_ratio")
+    parser.add_argument("--check-bars", type=int, default=400, help="参考实现比较的K线数")
+    parser.add_argument("--seeds", type=int, default=5, help="参考实现比较的随机行情个数")
+    parser.add_argument("--bars", type=int, default=1_000_000, help="本地引擎基准的K线数")
+    parser.add_argument("--stocks", type=int, default=20, help="工具基准的股票数")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟 get_vba_func_result 的延迟（秒）")
+    args = parser.parse_args()
+
+    if args.record:
+        # 录制时使用真实的 xtquant
+        record(args.stock, args.signal, args.period, args.start, args.end, args.dividend_type)
+        return
+
+    os.environ["XTQUANTAI_CACHE_DIR"] = tempfile.mkdtemp(prefix="xtquantai-bench-")
+    import fake_xtquant
+    fake_xtquant.install(0)
+    failed = check_reference(args.check_bars, args.seeds) + check_fixtures() + check_empty_range()
+    bench_engine(args.bars)
+    asyncio.run(bench_tool(args.stocks, args.latency))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
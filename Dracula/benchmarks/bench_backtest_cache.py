@@ -0,0 +1,171 @@
+"""
+回测结果缓存：一致性检查与基准
+1. 一致性：
+   - 命中缓存的结果与不使用缓存重新计算的结果相同（本地引擎和 get_vba_func_result）
+   - 只有空白不同的信号命中同一个结果；K线内容变化时数据版本变化，不会命中旧结果
+   - get_vba_func_result 回测的数据版本取股票和基准（沪深300）在K线缓存中的序列版本，不读取K线，序列重写后随之变化
+   - 磁盘层：新建的缓存实例（相当于进程重启）从磁盘读回的结果与原结果相同
+2. 基准：先 run_backtest(output_type='data') 再用相同参数生成交互式图表（display_backtest_chart、
+   save_interactive_backtest_chart 同样调用 run_backtest），与原来两次都重新回测的耗时和 get_vba_func_result 调用次数
+
+    python benchmarks/bench_backtest_cache.py --bars 200000 --latency 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+SIGNAL = ("input:N1(5,1,100,1);\ninput:N2(34,1,120,1);\nMA1:=MA(C,N1);\nMA2:=MA(C,N2);\n"
+          "bk:CROSS(MA1,MA2);\nbp:CROSS(MA2,MA1);")
+
+# 含本地不支持的函数，engine='auto' 时也会改用 get_vba_func_result
+VBA_SIGNAL = "bk:CROSS(MA(C,5),MA(C,20)) AND FINANCE(7)>0;\nbp:CROSS(MA(C,20),MA(C,5));"
+
+# 只有空白不同的信号
+SIGNAL_SPACED = "\n  " + SIGNAL.replace(";\n", " ;\n\n").replace(":=", " :=  ") + "\n"
+
+
+async def quiet(coro):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await coro
+
+
+async def check(bars):
+    from xtquantai.backtest_cache import BacktestCache, backtest_cache, data_version
+    from xtquantai.tools.single_stock_backtest import run_single_stock_backtest
+
+    failed = 0
+    args = {"stock_code": "600000.SH", "period": "1m", "start_time": "", "end_time": "", "count": bars}
+    for engine in ("local", "vba"):
+        backtest_cache.clear()
+        fresh = await quiet(run_single_stock_backtest(signal=SIGNAL, engine=engine, use_cache=False, **args))
+        first = await quiet(run_single_stock_backtest(signal=SIGNAL, engine=engine, **args))
+        second = await quiet(run_single_stock_backtest(signal=SIGNAL_SPACED, engine=engine, **args))
+        if first["cached"] or not second["cached"]:
+            failed += 1
+            print(f"  {engine}: 命中情况不对，第一次 {first['cached']}，第二次 {second['cached']}")
+        for name, result in (("第一次", first), ("命中", second)):
+            if result["summary"] != fresh["summary"] or any(
+                    not np.array_equal(result["daily_data"][field], fresh["daily_data"][field])
+                    for field in fresh["daily_data"]):
+                failed += 1
+                print(f"  {engine}: {name}的结果与重新计算的不同")
+
+    # 磁盘层：新实例相当于进程重启
+    key = next(iter(backtest_cache._entries))
+    original = backtest_cache.get(key)
+    restored = BacktestCache(os.environ["XTQUANTAI_CACHE_DIR"]).get(key)
+    if restored is None or not restored.equals(original) or not restored.index.equals(original.index):
+        failed += 1
+        print("  磁盘层读回的结果与原结果不同")
+
+    # 数据版本随K线内容变化
+    close = np.linspace(10, 12, 100)
+    times = np.arange(100, dtype=np.int64)
+    changed = close.copy()
+    changed[-1] *= 1.0001
+    if data_version({"time": times, "close": close}) == data_version({"time": times, "close": changed}):
+        failed += 1
+        print("  K线变化后数据版本没有变化")
+    failed += check_vba_version(bars)
+    print(f"一致性: {'通过' if not failed else f'{failed} 处不一致'}")
+    return failed
+
+
+def check_vba_version(bars):
+    """vba_data_version 不读取K线（不调用 load_kline），股票或基准的K线缓存序列变化后版本随之变化"""
+    from xtquantai.backtest import BENCHMARK_CODE
+    from xtquantai.kline_cache import kline_cache
+    from xtquantai.tools import single_stock_backtest as module
+
+    failed = 0
+    loaded = []
+    load_kline = module.load_kline
+
+    def recording(code, *args):
+        loaded.append(code)
+        return load_kline(code, *args)
+
+    def version():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return module.vba_data_version("600000.SH", "1m", "", "", bars, "front_ratio")
+
+    module.load_kline = recording
+    try:
+        first, second = version(), version()
+        kline_cache.invalidate("600000.SH")
+        stock_changed = version()
+        kline_cache.invalidate(BENCHMARK_CODE)
+        benchmark_changed = version()
+    finally:
+        module.load_kline = load_kline
+    if loaded:
+        failed += 1
+        print(f"  get_vba_func_result 数据版本读取了K线: {loaded}")
+    if first is None or first != second or stock_changed == second or benchmark_changed == stock_changed:
+        failed += 1
+        print("  get_vba_func_result 数据版本应在K线缓存不变时相同、股票或基准序列重写后变化")
+    return failed
+
+
+async def bench(bars, engine, save_dir):
+    """模拟先“运行回测”再“显示图表”：run_backtest 先返回数据，再用相同参数生成交互式图表"""
+    from xtquantai.backtest_cache import backtest_cache
+    from xtquantai.tools.single_stock_backtest import run_backtest
+
+    args = {"stock_code": "600000.SH", "signal": SIGNAL if engine == "local" else VBA_SIGNAL, "period": "1m",
+            "start_time": "", "end_time": "", "count": bars, "save_path": save_dir, "auto_open": False,
+            "engine": engine}
+    limits = (backtest_cache.memory_bytes, backtest_cache.disk_bytes)
+    for label, enabled in (("不使用缓存", False), ("使用缓存", True)):
+        backtest_cache.clear()
+        # 上限为 0 时结果不会被保存，相当于原来每次都重新回测
+        backtest_cache.memory_bytes, backtest_cache.disk_bytes = limits if enabled else (0, 0)
+        calls = fake_xtquant.CALL_COUNTS.get("get_vba_func_result", 0)
+        try:
+            start = time.perf_counter()
+            await quiet(run_backtest(**args, output_type="data"))
+            run_elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            await quiet(run_backtest(**args, output_type="interactive", max_points=5000))
+            chart_elapsed = time.perf_counter() - start
+        finally:
+            backtest_cache.memory_bytes, backtest_cache.disk_bytes = limits
+        vba_calls = fake_xtquant.CALL_COUNTS.get("get_vba_func_result", 0) - calls
+        print(f"{engine:5s} {label}: 运行回测 {run_elapsed:6.2f}s，显示图表 {chart_elapsed:6.2f}s，"
+              f"get_vba_func_result 调用 {vba_calls} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=200_000, help="分钟K线数")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟 xtdata 调用延迟（秒），get_vba_func_result 为 10 倍")
+    args = parser.parse_args()
+
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    fake_xtquant.install(0.0)
+    failed = asyncio.run(check(min(args.bars, 20000)))
+
+    fake_xtquant.set_latency(args.latency)
+    from xtquantai.backtest_cache import backtest_cache
+    with tempfile.TemporaryDirectory() as save_dir:
+        for engine in ("local", "vba"):
+            asyncio.run(bench(args.bars, engine, save_dir))
+    stats = backtest_cache.stats()
+    print(f"缓存统计: 查询 {stats['requests']} 次，内存命中 {stats['memory_hits']}，磁盘命中 {stats['disk_hits']}，"
+          f"命中率 {stats['hit_ratio']:.0%}，磁盘 {stats['disk_entries']} 个结果 {stats['disk_bytes'] / 1e6:.1f} MB")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+回测结果处理：一致性检查与速度基准
+在模拟的分钟K线上运行本地回测引擎得到逐K线结果（含模板前几根K线的 NaN），比较：
+- 原来的逐行实现（df.iterrows + row.get / pd.isna，复制在本文件中）
+- process_backtest_result(daily_format='rows')：与原实现逐条相同
+- process_backtest_result(daily_format='columns')，以及按 max_points 降采样
+并计算编码为 JSON 的耗时。
+
+    python benchmarks/bench_backtest_result.py --rows 500000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+SIGNAL = "MA1:=MA(C,30);\nMA2:=MA(C,240);\nbk:CROSS(MA1,MA2);\nbp:CROSS(MA2,MA1);"
+
+
+def legacy_daily_data(df):
+    """原 process_backtest_result 中逐行生成 daily_data 的实现"""
+    daily_data = []
+    for idx, row in df.iterrows():
+        daily_record = {
+            "date": idx,
+            "timestamp": int(row.get("time", 0)),
+            "strategy_value": float(row.get("策略收益", 0.0)) if not pd.isna(row.get("策略收益")) else 0.0,
+            "holding_period": int(row.get("持仓周期", 0)) if not pd.isna(row.get("持仓周期")) else 0,
+            "holding_return": float(row.get("持仓收益", 0.0)) if not pd.isna(row.get("持仓收益")) else 0.0,
+            "drawdown": float(row.get("最近回撤", 0.0)) if not pd.isna(row.get("最近回撤")) else 0.0
+        }
+        daily_data.append(daily_record)
+    return daily_data
+
+
+def minute_frame(rows, seed=5):
+    from xtquantai.backtest import run_template_backtest
+
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.001, rows)))
+    close[rng.integers(0, rows, rows // 1000)] = np.nan
+    times = 1704072600000 + np.arange(rows, dtype=np.int64) * 60000
+    return run_template_backtest(SIGNAL, {"time": times, "close": close}, period="1m")
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--max-points", type=int, default=5000, help="降采样后的最大点数")
+    args = parser.parse_args()
+
+    fake_xtquant.install(0.0)
+    from xtquantai.encoding import dumps
+    from xtquantai.tools.single_stock_backtest import process_backtest_result
+
+    df = minute_frame(args.rows)
+    nan_rows = int(df[["策略收益", "持仓周期", "持仓收益", "最近回撤"]].isna().any(axis=1).sum())
+    print(f"回测结果: {len(df)} 行，{nan_rows} 行含 NaN")
+
+    legacy, legacy_elapsed = timed(legacy_daily_data, df)
+    rows, rows_elapsed = timed(process_backtest_result, df, "rows")
+    columns, columns_elapsed = timed(process_backtest_result, df, "columns")
+    sampled, sampled_elapsed = timed(process_backtest_result, df, "columns", args.max_points)
+
+    failed = 0
+    if rows["daily_data"] != legacy:
+        failed += 1
+        mismatch = next(i for i, (a, b) in enumerate(zip(rows["daily_data"], legacy)) if a != b)
+        print(f"  rows 格式与原实现不一致，第 {mismatch} 行: {rows['daily_data'][mismatch]} != {legacy[mismatch]}")
+    daily = columns["daily_data"]
+    for field in legacy[0]:
+        if [day[field] for day in legacy] != daily[field].tolist():
+            failed += 1
+            print(f"  columns 格式的 {field} 列与原实现不一致")
+    sampled_daily = sampled["daily_data"]
+    if (len(sampled_daily["date"]) > args.max_points or sampled_daily["date"][-1] != daily["date"][-1]
+            or sampled_daily["drawdown"].max() != daily["drawdown"].max()):
+        failed += 1
+        print("  降采样结果没有保留最后一根K线或最大回撤")
+    print(f"一致性: {'通过' if not failed else f'{failed} 处不一致'}")
+
+    _, legacy_json = timed(dumps, {"daily_data": legacy})
+    _, columns_json = timed(dumps, columns)
+    _, sampled_json = timed(dumps, sampled)
+    print(f"原实现 iterrows:        {legacy_elapsed:7.2f}s  JSON {legacy_json:.2f}s")
+    print(f"rows 格式:              {rows_elapsed:7.2f}s  ({legacy_elapsed / rows_elapsed:.0f}x)")
+    print(f"columns 格式:           {columns_elapsed:7.3f}s  ({legacy_elapsed / columns_elapsed:.0f}x)"
+          f"  JSON {columns_json:.2f}s")
+    print(f"columns + 降采样 {len(sampled_daily['date'])} 点: {sampled_elapsed:7.3f}s  JSON {sampled_json:.3f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+篮子委托基准
+1. 100 只股票按权重买入：旧实现的调用顺序（每只股票 connect + subscribe + 两次资金查询、两次 get_full_tick、
+   再 connect + subscribe + order_stock_async）、逐只调用 buy_stock，与 place_basket_order 一次提交的耗时和接口调用次数
+2. 正确性：股数与逐只按 calculate_buy_volume 的算法计算相同；get_full_tick 只调用一次；每笔委托都提交并按 seq
+   对应到回报中的委托编号，seq 按篮子中的顺序递增（在交易线程中依次提交）；卖出不超过可用数量，卖出全部时保留零股
+
+    python benchmarks/bench_basket_order.py --latency 0.005 --names 100
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+ACCOUNT = "fake"
+CALLS = ("connect", "subscribe", "query_stock_asset", "get_full_tick", "order_stock_async")
+
+
+def _calls():
+    return {name: fake_xtquant.CALL_COUNTS.get(name, 0) for name in CALLS}
+
+
+def _format(calls):
+    return "，".join(f"{name} {count}" for name, count in calls.items() if count)
+
+
+def run_old(codes, amount):
+    """旧实现 buy_stock 的调用顺序（复制自改动前的 get_trade_detail_data / calculate_buy_volume / place_order）"""
+    import xtquant.xtdata as xtdata
+    from xtquant import xtconstant
+    from xtquant.xttrader import XtQuantTrader
+    from xtquant.xttype import StockAccount
+
+    trader = XtQuantTrader("userdata", int(time.time()))
+    acc = StockAccount(ACCOUNT, "STOCK")
+    for code in codes:
+        trader.connect()
+        trader.subscribe(acc)
+        trader.query_stock_asset(acc)
+        trader.query_stock_asset(acc)
+        xtdata.get_full_tick([code])
+        price = xtdata.get_full_tick([code])[code]["lastPrice"]
+        volume = int(amount / price / 100) * 100
+        trader.connect()
+        trader.subscribe(acc)
+        trader.order_stock_async(acc, code, xtconstant.STOCK_BUY, volume, xtconstant.LATEST_PRICE, -1, "", code)
+
+
+async def run_loop(codes, amount):
+    from xtquantai.tools.account_detail import buy_stock
+
+    for code in codes:
+        await buy_stock(ACCOUNT, code, amount)
+
+
+async def run_basket(codes, amount):
+    from xtquantai.tools.basket_order import place_basket_order
+
+    return await place_basket_order(ACCOUNT, [{"stock_code": code, "weight": 0.01} for code in codes],
+                                    total_amount=amount * 100)
+
+
+async def compare(codes, amount):
+    import xtquant.xtdata as xtdata
+    from xtquantai.tools.account_detail import get_account_book
+
+    failed = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        get_account_book(ACCOUNT)
+    result = None
+    for label, run in (("旧实现", lambda: asyncio.to_thread(run_old, codes, amount)),
+                       ("逐只 buy_stock", lambda: run_loop(codes, amount)),
+                       ("place_basket_order", lambda: run_basket(codes, amount))):
+        fake_xtquant.CALL_COUNTS.clear()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = await run()
+        elapsed = time.perf_counter() - start
+        calls = _calls()
+        print(f"{label}: {len(codes)} 只 {elapsed:.3f}s，{_format(calls)}")
+
+    ticks = xtdata.get_full_tick(codes)
+    expected = {code: int(amount / ticks[code]["lastPrice"] / 100) * 100 for code in codes}
+    got = {row["stock_code"]: row["volume"] for row in result["orders"]}
+    # 不足一手的股票跳过
+    rows = [row for row in result["orders"] if row["status"] == "submitted"]
+    order_ids = [row["order_id"] for row in rows]
+    if got != expected:
+        failed += 1
+        print(f"  股数不同: {[(c, got[c], expected[c]) for c in codes if got[c] != expected[c]][:5]}")
+    lots = sum(volume > 0 for volume in expected.values())
+    if calls["get_full_tick"] != 1 or result["submitted"] != lots or result["pending"]:
+        failed += 1
+        print(f"  get_full_tick {calls['get_full_tick']} 次，提交 {result['submitted']}，未收到回报 {result['pending']}")
+    # 替身的委托编号与 seq 同步递增，对应正确时差值处处相同
+    if None in order_ids or len(set(order_ids)) != lots or len({row["order_id"] - row["seq"] for row in rows}) != 1:
+        failed += 1
+        print(f"  委托编号与 seq 对应不对: {[(row['seq'], row['order_id']) for row in rows[:5]]}")
+    seqs = [row["seq"] for row in rows]
+    if seqs != sorted(seqs) or len(set(seqs)) != len(seqs):
+        failed += 1
+        print(f"  seq 没有按篮子顺序递增: {seqs[:10]}")
+    print(f"买入篮子: 提交 {result['submitted']} 笔（{len(codes) - lots} 只不足一手），委托编号 {len(set(order_ids) - {None})} 个，"
+          f"{'通过' if not failed else '未通过'}")
+    return failed
+
+
+async def check_sell(trader, codes):
+    from xtquantai.tools.account_detail import get_account_book
+    from xtquantai.tools.basket_order import place_basket_order
+
+    failed = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        get_account_book(ACCOUNT, resync=True)
+        result = await place_basket_order(ACCOUNT, [
+            {"stock_code": codes[0], "volume": 10_000},   # 超过可用数量：卖出全部可用（含零股）
+            {"stock_code": codes[1], "volume": 250},      # 不足可用数量：按手取整
+            {"stock_code": codes[2], "volume": 50},       # 不足一手
+            {"stock_code": "000000.SZ", "volume": 100},   # 没有持仓
+        ], direction="SELL")
+    got = [row["volume"] for row in result["orders"]]
+    if got != [1234, 200, 0, 0] or result["submitted"] != 2 or result["skipped"] != 2:
+        failed += 1
+        print(f"  卖出股数 {got}（应为 [1234, 200, 0, 0]），{[row.get('reason') for row in result['orders']]}")
+    print(f"卖出篮子: 股数 {got}，{'通过' if not failed else '未通过'}")
+    return failed
+
+
+async def main(args):
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    fake_xtquant.install(args.latency)
+    from xtquantai.tools.account_detail import get_trader_instance
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        trader = get_trader_instance()
+    trader.cash = 1e9
+    codes = fake_xtquant._SECTORS["沪深300"][:args.names]
+    trader.positions = {code: {"volume": 2000, "can_use_volume": 1234} for code in codes[:3]}
+    failed = await check_sell(trader, codes)
+    failed += await compare(codes, args.amount)
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.005, help="每次接口调用的模拟延迟（秒）")
+    parser.add_argument("--names", type=int, default=100, help="篮子中的股票数")
+    parser.add_argument("--amount", type=float, default=20000, help="每只股票的买入金额")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(main(args)) else 0)
@@ -0,0 +1,109 @@
+"""
+批量下载基准测试
+对比逐个代码调用 download_history_data 与 bulk_download_history 并行下载整个板块的耗时，
+并校验：失败重试、中断后按检查点续传、跳过本地已有数据、MCP 进度通知。
+
+    python benchmarks/bench_bulk_download.py --latency 0.01 --sector 沪深300
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+
+class _Session:
+    """记录进度通知的会话替身"""
+
+    def __init__(self):
+        self.notifications = []
+
+    async def send_progress_notification(self, token, progress, total=None, message=None):
+        self.notifications.append((progress, total, message))
+
+
+async def _call(server, name, arguments):
+    from xtquantai.server import handle_call_tool
+    with contextlib.redirect_stdout(io.StringIO()):
+        blocks = await handle_call_tool(server, name, arguments)
+    return json.loads(blocks[0].text)
+
+
+async def main(args):
+    fake_xtquant.install(latency=args.latency)
+    os.environ["XTQUANTAI_CACHE_DIR"] = tempfile.mkdtemp(prefix="xtquantai-cache-")
+    os.environ["XTQUANTAI_DOWNLOAD_BACKOFF"] = "0.01"
+    codes = fake_xtquant._SECTORS[args.sector]
+
+    session = _Session()
+    server = SimpleNamespace(request_context=SimpleNamespace(
+        meta=SimpleNamespace(progressToken="bench"), session=session))
+    bulk = {"sector": args.sector, "workers": args.workers, "retries": 2}
+
+    print(f"xtdata延迟 {args.latency * 1000:.0f}ms（下载按 4 倍计），板块 {args.sector} 共 {len(codes)} 个代码")
+    start = time.perf_counter()
+    for code in codes:
+        await _call(None, "download_history_data", {"stock_code": code, "period": "1d"})
+    sequential = time.perf_counter() - start
+    print(f"  逐个 download_history_data  {sequential:8.2f}s")
+
+    fake_xtquant.LOCAL_DATA.clear()
+    start = time.perf_counter()
+    state = await _call(server, "bulk_download_history", bulk)
+    parallel = time.perf_counter() - start
+    assert state["downloaded"] == len(codes) and not state["failed"]
+    print(f"  bulk_download_history x{args.workers}  {parallel:8.2f}s  (加速 {sequential / parallel:.1f}x)，"
+          f"进度通知 {len(session.notifications)} 次")
+    assert session.notifications[-1][:2] == (len(codes), len(codes))
+
+    print("\n校验")
+    state = await _call(server, "bulk_download_history", bulk)
+    assert state["total"] == 0 and state["skipped_checkpoint"] == len(codes)
+    print(f"  重复执行: 检查点跳过 {state['skipped_checkpoint']}，需要下载 {state['total']}")
+
+    # 模拟中断：清空检查点和本地数据，一部分代码持续失败（超过重试次数），一部分失败一次后成功
+    import shutil
+    from xtquantai.downloader import download_jobs
+    shutil.rmtree(download_jobs.root)
+    fake_xtquant.LOCAL_DATA.clear()
+    broken, flaky = codes[:10], codes[10:20]
+    fake_xtquant.DOWNLOAD_FAILURES.update({code: 100 for code in broken})
+    fake_xtquant.DOWNLOAD_FAILURES.update({code: 1 for code in flaky})
+    state = await _call(server, "bulk_download_history", bulk)
+    assert state["status"] == "failed" and sorted(f["code"] for f in state["failed"]) == sorted(broken)
+    assert state["retried"] >= len(flaky) + 2 * len(broken)
+    print(f"  失败重试: 下载成功 {state['downloaded']}，重试 {state['retried']} 次，失败 {len(state['failed'])}")
+
+    fake_xtquant.DOWNLOAD_FAILURES.clear()
+    for code in codes[20:]:
+        fake_xtquant.LOCAL_DATA.pop((code, "1d"))
+    state = await _call(server, "bulk_download_history", bulk)
+    assert state["downloaded"] == len(broken) and state["skipped_checkpoint"] == len(codes) - len(broken)
+    print(f"  断点续传: 检查点跳过 {state['skipped_checkpoint']}，只下载失败的 {state['downloaded']} 个")
+
+    # 清空检查点，本地已有全部数据
+    shutil.rmtree(download_jobs.root)
+    fake_xtquant.LOCAL_DATA.update({(code, "1d"): fake_xtquant.BAR_COUNT for code in codes})
+    state = await _call(server, "bulk_download_history", bulk)
+    assert state["total"] == 0 and state["skipped_local"] == len(codes)
+    print(f"  本地数据去重: 跳过 {state['skipped_local']}，需要下载 {state['total']}")
+
+    status = await _call(None, "get_bulk_download_status", {"job_id": state["job_id"]})
+    assert status["status"] == "finished"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--sector", default="沪深300")
+    parser.add_argument("--workers", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+列式二进制编码基准测试
+先校验 npy / arrow 编码经 handle_call_tool 返回后的往返一致性（base64 资源与内存映射文件两种方式），
+再对比 get_kline 在 JSON 与二进制编码下的编码+解码吞吐。
+
+    python benchmarks/bench_columnar.py --rows 1000000
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+FIELDS = ["open", "high", "low", "close", "volume"]
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+async def _call(handle_call_tool, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await handle_call_tool(None, "get_kline", {"field_list": FIELDS, "stock_code": "600000.SH",
+                                                          "period": "1m", **kwargs})
+
+
+def _decode_blocks(blocks, encoding):
+    from xtquantai.columnar import decode_npy, decode_arrow
+    meta = json.loads(blocks[0].text)
+    if encoding == "npy":
+        return {uri.rsplit("/", 1)[-1][:-4]: decode_npy(base64.b64decode(block.resource.blob))
+                for uri, block in zip(meta["resources"], blocks[1:])}
+    return decode_arrow(base64.b64decode(blocks[1].resource.blob))
+
+
+def _load_files(meta):
+    if meta["encoding"] == "npy":
+        return {field: np.load(path, mmap_mode="r") for field, path in meta["files"].items()}
+    import pyarrow as pa
+    table = pa.ipc.open_file(pa.memory_map(meta["file"])).read_all()
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def _check(expected, decoded, label):
+    for field, values in expected.items():
+        assert np.array_equal(np.asarray(values), decoded[field]), f"{label}: {field} 不一致"
+    print(f"  往返校验通过: {label}")
+
+
+async def main(args):
+    fake_xtquant.install(latency=0)
+    from xtquantai.server import handle_call_tool
+    from xtquantai.encoding import dumps
+
+    encodings = ["npy"] + (["arrow"] if _has_pyarrow() else [])
+    expected = fake_xtquant._bars("600000.SH", "1m", args.rows)
+    expected = {field: expected[field] for field in ["time"] + FIELDS}
+
+    print("往返校验")
+    with tempfile.TemporaryDirectory() as tmp:
+        for encoding in encodings:
+            blocks = await _call(handle_call_tool, count=args.rows, encoding=encoding)
+            _check(expected, _decode_blocks(blocks, encoding), f"{encoding} base64")
+            blocks = await _call(handle_call_tool, count=args.rows, encoding=encoding, output_dir=tmp)
+            _check(expected, _load_files(json.loads(blocks[0].text)), f"{encoding} 内存映射文件")
+
+    from xtquantai.tools.market_data import get_kline
+    from xtquantai.encoding import encode_result
+    with contextlib.redirect_stdout(io.StringIO()):
+        raw = await get_kline(FIELDS, "600000.SH", period="1m", count=args.rows)
+
+    print(f"\n{args.rows} 行 1m K线，{len(FIELDS) + 1} 个字段，编码+解码耗时")
+    start = time.perf_counter()
+    decoded = json.loads(dumps(raw))
+    {field: np.asarray(values) for field, values in decoded["600000.SH"].items()}
+    json_time = time.perf_counter() - start
+    print(f"  json  {json_time * 1000:8.1f}ms")
+
+    from xtquantai.columnar import encode_columns
+    for encoding in encodings:
+        start = time.perf_counter()
+        blocks = encode_result(encode_columns(raw["600000.SH"], encoding, "600000.SH_1m"))
+        _decode_blocks(blocks, encoding)
+        elapsed = time.perf_counter() - start
+        print(f"  {encoding:<5} {elapsed * 1000:8.1f}ms  (加速 {json_time / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    asyncio.run(main(parser.parse_args()))
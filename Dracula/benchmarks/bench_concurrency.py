@@ -0,0 +1,81 @@
+"""
+并发调用基准测试
+对比工具函数在事件循环中直接执行（旧行为）与经 handle_call_tool 按执行类别派发后的耗时。
+
+    python benchmarks/bench_concurrency.py --latency 0.05 --calls 32
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+
+async def _inline(tool_registry, name, kwargs):
+    """旧行为：直接在事件循环中 await 工具函数"""
+    return await tool_registry.tools[name]["function"](**kwargs)
+
+
+async def _measure(call, calls):
+    start = time.perf_counter()
+    await asyncio.gather(*[call(name, kwargs) for name, kwargs in calls])
+    return time.perf_counter() - start
+
+
+async def _slow_blocks_fast(call, fast_count):
+    """一个慢下载请求期间，其他快请求的平均等待时间"""
+    latencies = []
+    start = time.perf_counter()
+
+    async def timed(name, kwargs):
+        await call(name, kwargs)
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(call("download_history_contracts", {}),
+                         *[timed("get_full_tick", {"stock_codes": ["600000.SH"]})
+                           for _ in range(fast_count)])
+    return sum(latencies) / len(latencies)
+
+
+async def main(args):
+    fake_xtquant.install(latency=args.latency)
+    from xtquantai.registry import tool_registry
+    from xtquantai.server import handle_call_tool
+    from xtquantai.executor import shutdown_executors
+
+    calls = [("get_kline", {"field_list": ["close"], "stock_code": f"{600000 + i}.SH",
+                             "count": 100})
+             for i in range(args.calls)]
+
+    async def old(name, kwargs):
+        return await _inline(tool_registry, name, kwargs)
+
+    async def new(name, kwargs):
+        return await handle_call_tool(None, name, kwargs)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        old_total = await _measure(old, calls)
+        new_total = await _measure(new, calls)
+        old_wait = await _slow_blocks_fast(old, 8)
+        new_wait = await _slow_blocks_fast(new, 8)
+    shutdown_executors()
+
+    print(f"xtdata延迟 {args.latency * 1000:.0f}ms, 并发调用 {args.calls} 次 get_kline")
+    print(f"  事件循环内直接执行: {old_total:.3f}s")
+    print(f"  按执行类别派发:     {new_total:.3f}s  (加速 {old_total / new_total:.1f}x)")
+    print("慢请求 download_history_contracts 执行期间 get_full_tick 的平均延迟")
+    print(f"  事件循环内直接执行: {old_wait * 1000:.0f}ms")
+    print(f"  按执行类别派发:     {new_wait * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--calls", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
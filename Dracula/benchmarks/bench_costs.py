@@ -0,0 +1,207 @@
+"""
+交易成本模型：一致性检查与基准
+1. 一致性：在带涨停、跌停、停牌的模拟分钟K线上，把 cost_backtest 的逐K线结果与逐根循环的参考实现（复制在本文件中）比较：
+   逐根维护持仓和排队的开平仓委托，按整手、滑点、佣金（含最低佣金）、印花税、过户费、T+1 和涨跌停/停牌计算；
+   另有一个构造的场景：开仓后一直涨停买不进，平仓信号之后才能买入，这笔交易不应成交
+2. 不计成本（none 预设）且没有停牌时，空仓K线上的毛收益与模板的指数（fee=0）相同
+3. 基准：run_template_backtest 不使用和使用成本模型的耗时
+
+    python benchmarks/bench_costs.py --bars 500000
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+SIGNAL = "MA1:=MA(C,30);\nMA2:=MA(C,240);\nbk:CROSS(MA1,MA2);\nbp:CROSS(MA2,MA1);"
+
+BARS_PER_DAY = 240
+
+
+def minute_bars(days, seed=11):
+    """模拟分钟K线：每天 240 根，偶尔整天停牌、尾盘封涨停或跌停"""
+    rng = np.random.default_rng(seed)
+    n = days * BARS_PER_DAY
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    day = np.arange(n) // BARS_PER_DAY
+    day_close = close[BARS_PER_DAY - 1::BARS_PER_DAY]
+    pre_day = np.concatenate([[close[0]], day_close[:-1]])
+    pre_close = pre_day[day]
+    # 每天最后 60 根中有一段封在涨停或跌停
+    for d in rng.choice(days, days // 8, replace=False):
+        start = d * BARS_PER_DAY + rng.integers(120, 200)
+        stop = (d + 1) * BARS_PER_DAY
+        limit = np.round(pre_day[d] * (1.1 if rng.random() < 0.5 else 0.9), 2)
+        close[start:stop] = limit
+    suspend = np.zeros(n, dtype=np.int64)
+    for d in rng.choice(days, days // 30, replace=False):
+        suspend[d * BARS_PER_DAY:(d + 1) * BARS_PER_DAY] = 1
+    volume = np.where(suspend == 1, 0, 1000)
+    # 涨跌停改变了收盘价，重新计算昨收
+    day_close = close[BARS_PER_DAY - 1::BARS_PER_DAY]
+    pre_close = np.concatenate([[close[0]], day_close[:-1]])[day]
+    times = 1704072600000 + day * 86400000 + (np.arange(n) % BARS_PER_DAY) * 60000
+    return {"time": times, "close": close, "preClose": pre_close, "suspendFlag": suspend, "volume": volume}
+
+
+def reference_costs(bars, bk, bp, model, amount, ratio):
+    """逐根循环的参考实现，返回 COST_COLUMNS 各列"""
+    close = bars["close"]
+    n = len(close)
+    day = (bars["time"] + 8 * 3600 * 1000) // 86400000
+    holding = False
+    queue = []
+    position = None  # (买入位置, 股数, 收盘买入价, 成交价)
+    totals = {name: 0.0 for name in ("realized", "佣金", "印花税", "过户费", "滑点", "顺延次数")}
+    out = {name: np.zeros(n) for name in ("毛收益", "净收益", "佣金", "印花税", "过户费", "滑点", "顺延次数")}
+    day_pre = {}
+    for i in range(n):
+        day_pre.setdefault(day[i], bars["preClose"][i])
+        suspended = bars["suspendFlag"][i] == 1 or not bars["volume"][i] > 0
+        pre = day_pre[day[i]]
+        can_buy = not suspended and not close[i] >= pre * (1 + ratio) - 0.005 - 1e-9
+        can_sell = not suspended and not close[i] <= pre * (1 - ratio) + 0.005 + 1e-9
+
+        # 模板的持仓锁存器，开平仓委托按顺序排队
+        if not holding and bk[i] and not bp[i]:
+            holding = True
+            queue.append(("buy", i))
+        elif holding and bp[i]:
+            holding = False
+            queue.append(("sell", i))
+
+        # 按顺序撮合队首的委托：卖出要求 T+1 之后可卖出，同一根K线上可以先卖后买
+        while queue:
+            side, signal_at = queue[0]
+            if side == "sell":
+                if not (day[i] > day[position[0]] and can_sell):
+                    break
+                _, shares, buy_close, _ = position
+                price = max(close[i] * (1 - model.slippage_rate) - model.slippage, 0.0)
+                value = shares * price
+                base = shares * buy_close
+                totals["realized"] += (close[i] / buy_close - 1) * 100
+                totals["佣金"] += max(value * model.commission_rate, model.min_commission) / base * 100
+                totals["印花税"] += value * model.stamp_duty / base * 100
+                totals["过户费"] += value * model.transfer_fee / base * 100
+                totals["滑点"] += shares * (close[i] - price) / base * 100
+                position = None
+            else:
+                if not can_buy:
+                    break
+                price = close[i] * (1 + model.slippage_rate) + model.slippage
+                shares = math.floor(amount / price / model.lot_size) * model.lot_size
+                assert shares > 0, "模拟K线的价格应使每笔交易至少买入一手"
+                value = shares * price
+                base = shares * close[i]
+                totals["佣金"] += max(value * model.commission_rate, model.min_commission) / base * 100
+                totals["过户费"] += value * model.transfer_fee / base * 100
+                totals["滑点"] += shares * (price - close[i]) / base * 100
+                position = (i, shares, close[i], price)
+            totals["顺延次数"] += i > signal_at
+            queue.pop(0)
+        # 平仓信号出现时仍未买入（包括排在上一笔的卖出之后）：错过开仓，撤销这一对开平仓委托
+        j = 1 if queue and queue[0][0] == "sell" else 0
+        if len(queue) >= j + 2:
+            del queue[j:j + 2]
+
+        floating = (close[i] / position[2] - 1) * 100 if position is not None else 0.0
+        gross = totals["realized"] + floating
+        cost = totals["佣金"] + totals["印花税"] + totals["过户费"] + totals["滑点"]
+        out["毛收益"][i] = gross
+        out["净收益"][i] = gross - cost
+        for name in ("佣金", "印花税", "过户费", "滑点", "顺延次数"):
+            out[name][i] = totals[name]
+    return out
+
+
+def check(days):
+    from xtquantai.backtest import TEMPLATE_BUY_AMOUNT, template_backtest
+    from xtquantai.costs import COST_COLUMNS, CostModel, cost_backtest
+    from xtquantai.fills import holding_state
+    from xtquantai.formula import compile_signal
+
+    failed = 0
+    bars = minute_bars(days)
+    values = compile_signal(SIGNAL).evaluate(bars, None, ["BK", "BP"])
+    bk, bp = values["BK"], values["BP"]
+    for spec in ("a_share", {"preset": "a_share", "slippage": 0.02, "slippage_rate": 0.0005, "lot_size": 200}):
+        model = CostModel.from_spec(spec)
+        result = cost_backtest(bars, bk, bp, model, TEMPLATE_BUY_AMOUNT, "600000.SH")["columns"]
+        expected = reference_costs(bars, bk, bp, model, TEMPLATE_BUY_AMOUNT, 0.1)
+        for name in COST_COLUMNS:
+            if not np.allclose(result[name], expected[name], rtol=1e-9, atol=1e-9):
+                failed += 1
+                bad = int(np.flatnonzero(~np.isclose(result[name], expected[name], rtol=1e-9, atol=1e-9))[0])
+                print(f"  {spec}: {name} 与参考实现不同，第 {bad} 根 {result[name][bad]} != {expected[name][bad]}")
+        print(f"  {spec if isinstance(spec, str) else '自定义'}: 毛收益 {result['毛收益'][-1]:.2f}%，"
+              f"净收益 {result['净收益'][-1]:.2f}%，顺延 {int(result['顺延次数'][-1])} 次")
+
+    # 开仓后一直涨停，直到平仓信号之后才能买入：错过开仓，不应在平仓信号之后买入再卖出
+    model = CostModel.from_spec("a_share")
+    days = 3
+    flat_bars = minute_bars(days)
+    flat_bars = {**flat_bars, "close": np.full(days * BARS_PER_DAY, 20.0), "preClose": np.full(days * BARS_PER_DAY, 20.0)}
+    flat_bars["close"][10:BARS_PER_DAY] = 22.0
+    flat_bars["suspendFlag"] = np.zeros(days * BARS_PER_DAY, dtype=np.int64)
+    flat_bars["volume"] = np.full(days * BARS_PER_DAY, 1000)
+    entry, exit_ = np.zeros(days * BARS_PER_DAY, dtype=bool), np.zeros(days * BARS_PER_DAY, dtype=bool)
+    entry[20], exit_[60] = True, True
+    missed = cost_backtest(flat_bars, entry, exit_, model, TEMPLATE_BUY_AMOUNT, "600000.SH")
+    expected = reference_costs(flat_bars, entry, exit_, model, TEMPLATE_BUY_AMOUNT, 0.1)
+    if len(missed["trades"]["shares"]) or not np.allclose(missed["columns"]["净收益"], expected["净收益"]):
+        failed += 1
+        print(f"  错过开仓：平仓信号之后仍成交了 {len(missed['trades']['shares'])} 笔交易")
+
+    # 不计成本、没有停牌时与模板的指数一致（空仓时）
+    none = CostModel.from_spec("none")
+    unsuspended = {"time": bars["time"], "close": bars["close"]}
+    gross = cost_backtest(unsuspended, bk, bp, none, TEMPLATE_BUY_AMOUNT)["columns"]["毛收益"]
+    index = template_backtest(bars["close"], bk, bp, fee=0.0)["指数"] * 100
+    flat = ~holding_state(bk, bp)
+    if not np.allclose(gross[flat], index[flat], atol=1e-9):
+        failed += 1
+        print("  none 预设的毛收益与模板指数不同")
+    print(f"一致性: {'通过' if not failed else f'{failed} 处不一致'}")
+    return failed
+
+
+def bench(rows):
+    from xtquantai.backtest import run_template_backtest
+
+    bars = minute_bars(rows // BARS_PER_DAY, seed=3)
+    timings = {}
+    for label, spec in (("不使用成本模型", None), ("a_share 成本模型", "a_share")):
+        run_template_backtest(SIGNAL, bars, "1m", cost_model=spec, stock_code="600000.SH")
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            df = run_template_backtest(SIGNAL, bars, "1m", cost_model=spec, stock_code="600000.SH")
+            best = min(best, time.perf_counter() - start)
+        timings[label] = best
+        print(f"{label}: {len(df)} 根K线 {best:.3f}s")
+    base, with_costs = timings.values()
+    print(f"成本模型增加 {(with_costs / base - 1) * 100:.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=120, help="一致性检查的交易日数")
+    parser.add_argument("--bars", type=int, default=500_000, help="基准的分钟K线数")
+    args = parser.parse_args()
+
+    fake_xtquant.install(0.0)
+    failed = check(args.days)
+    bench(args.bars)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
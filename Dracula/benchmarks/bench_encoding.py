@@ -0,0 +1,67 @@
+"""
+结果编码基准测试
+对比旧的 json.dumps(indent=2) 单文本块与新的紧凑/分页编码，
+在 100 万行 1m K线结果上的首块耗时和内存峰值。
+
+    python benchmarks/bench_encoding.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+
+def _old_encode(result):
+    import mcp.types as types
+    return [types.TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
+
+
+def _kline_result(rows):
+    bars = fake_xtquant._bars("600000.SH", "1m", rows)
+    return {"600000.SH": {field: bars[field].tolist()
+                          for field in ("time", "open", "high", "low", "close", "volume")}}
+
+
+def _run(encode, result):
+    start = time.perf_counter()
+    blocks = encode(result)
+    first_block = time.perf_counter() - start
+    size = sum(len(block.text) for block in blocks)
+
+    tracemalloc.start()
+    encode(result)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_block, size, peak
+
+
+def main(args):
+    fake_xtquant.install(latency=0)
+    from xtquantai.encoding import encode_result, result_store, dumps
+
+    result = _kline_result(args.rows)
+    print(f"{args.rows} 行 1m K线，6 个字段")
+    for label, encode in (("json.dumps(indent=2)", _old_encode),
+                          ("紧凑JSON（完整）", lambda r: _compact_full(r, dumps)),
+                          ("紧凑JSON + 分页", encode_result)):
+        first_block, size, peak = _run(encode, result)
+        print(f"  {label:<22} 首块耗时 {first_block * 1000:8.1f}ms  "
+              f"返回文本 {size / 1e6:8.2f}MB  内存峰值 {peak / 1e6:8.1f}MB")
+    result_store.results.clear()
+
+
+def _compact_full(result, dumps):
+    import mcp.types as types
+    return [types.TextContent(type="text", text=dumps(result))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    main(parser.parse_args())
@@ -0,0 +1,410 @@
+"""
+信号公式本地求值：一致性检查与吞吐量基准
+1. 一致性：每个用例是一条 'OUT:表达式;' 公式，把本地求值结果与
+   - 逐周期循环实现的参考结果（与向量实现相互独立，随机K线上比较）
+   - benchmarks/fixtures/formula/*.json 中录制的 xtdata.get_vba_func_result 输出（存在时）
+   逐点比较，NaN 与 NaN 视为相等。
+2. 吞吐量：均线交叉信号和多函数组合信号在百万根K线上的求值速度。
+
+录制夹具需要在装有 QMT 的机器上运行（会调用真实的 xtquant）：
+    python benchmarks/bench_formula.py --record --stock 600000.SH --start 20230101 --end 20241231
+
+只做检查和基准（使用模拟行情）：
+    python benchmarks/bench_formula.py --bars 1000000
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "formula")
+
+FIELDS = ["time", "open", "high", "low", "close", "volume", "amount"]
+
+# (用例名, 公式)
+CASES = [
+    ("ma", "OUT:MA(C,5);"),
+    ("ema", "OUT:EMA(C,12);"),
+    ("sma", "OUT:SMA(C,6,1);"),
+    ("wma", "OUT:WMA(C,4);"),
+    ("dma", "OUT:DMA(C,0.2);"),
+    ("ref", "OUT:REF(C,3);"),
+    ("ref_series", "OUT:REF(C,BARSLAST(C>O)+1);"),
+    ("hhv", "OUT:HHV(H,10);"),
+    ("llv", "OUT:LLV(L,10);"),
+    ("hhv_all", "OUT:HHV(H,0);"),
+    ("llv_all", "OUT:LLV(L,0);"),
+    ("hhvbars", "OUT:HHVBARS(H,8);"),
+    ("llvbars", "OUT:LLVBARS(L,8);"),
+    ("sum", "OUT:SUM(V,5);"),
+    ("sum_all", "OUT:SUM(V,0);"),
+    ("count", "OUT:COUNT(C>O,10);"),
+    ("count_all", "OUT:COUNT(C>O,0);"),
+    ("every", "OUT:EVERY(C>O,3);"),
+    ("exist", "OUT:EXIST(C>REF(C,1),4);"),
+    ("std", "OUT:STD(C,10);"),
+    ("stdp", "OUT:STDP(C,10);"),
+    ("avedev", "OUT:AVEDEV(C,10);"),
+    ("cross", "MA1:=MA(C,5);MA2:=MA(C,10);OUT:CROSS(MA1,MA2);"),
+    ("barslast", "OUT:BARSLAST(C>REF(C,1)*1.01);"),
+    ("barssince", "OUT:BARSSINCE(C<O);"),
+    ("valuewhen", "OUT:VALUEWHEN(CROSS(C,MA(C,5)),C);"),
+    ("filter", "OUT:FILTER(C>O,3);"),
+    ("if", "OUT:IF(C>O,H-L,-(H-L));"),
+    ("logic", "OUT:C>O AND V>REF(V,1) OR NOT(H>REF(H,1));"),
+    ("arith", "OUT:(C-REF(C,1))/REF(C,1)*100;"),
+    ("divide_zero", "OUT:C/(H-H);"),
+    ("functions", "OUT:ABS(C-O)+MAX(C,O)-MIN(C,O)+SQRT(V)+LN(C)+ROUND(C/3)+MOD(BARPOS,7);"),
+    ("input", "input:N(7,1,100,1);OUT:MA(C,N)-EMA(C,N);"),
+]
+
+
+# ---------- 逐周期参考实现 ----------
+
+def _window(x, i, n):
+    return x[max(0, i - n + 1):i + 1]
+
+
+def _full(x, i, n):
+    return i + 1 >= n and not np.isnan(_window(x, i, n)).any()
+
+
+def ref_ma(x, n):
+    return [np.mean(_window(x, i, n)) if _full(x, i, n) else np.nan for i in range(len(x))]
+
+
+def ref_recursive(x, alpha):
+    out, prev = [], np.nan
+    for v in x:
+        prev = v if math.isnan(prev) else alpha * v + (1 - alpha) * prev
+        out.append(prev)
+    return out
+
+
+def ref_wma(x, n):
+    w = np.arange(1, n + 1)
+    return [np.dot(_window(x, i, n), w) / w.sum() if _full(x, i, n) else np.nan for i in range(len(x))]
+
+
+def ref_ref(x, k):
+    return [x[i - k] if i - k >= 0 else np.nan for i in range(len(x))]
+
+
+def ref_extreme(x, n, func):
+    return [func(x[:i + 1] if n == 0 else _window(x, i, n)) for i in range(len(x))]
+
+
+def ref_bars_extreme(x, n, high):
+    out = []
+    for i in range(len(x)):
+        w = x[:i + 1] if n == 0 else _window(x, i, n)
+        target = w.max() if high else w.min()
+        out.append(len(w) - 1 - max(j for j in range(len(w)) if w[j] == target))
+    return out
+
+
+def ref_sum(x, n):
+    if n == 0:
+        return list(np.cumsum(x))
+    return [np.sum(_window(x, i, n)) if _full(x, i, n) else np.nan for i in range(len(x))]
+
+
+def ref_count(cond, n):
+    return [float(np.sum(cond[:i + 1] if n == 0 else _window(cond, i, n))) for i in range(len(cond))]
+
+
+def ref_std(x, n, ddof):
+    return [np.std(_window(x, i, n), ddof=ddof) if _full(x, i, n) else np.nan for i in range(len(x))]
+
+
+def ref_avedev(x, n):
+    out = []
+    for i in range(len(x)):
+        w = _window(x, i, n)
+        out.append(np.mean(np.abs(w - w.mean())) if _full(x, i, n) else np.nan)
+    return out
+
+
+def ref_cross(a, b):
+    return [float(i > 0 and a[i] > b[i] and a[i - 1] <= b[i - 1]) for i in range(len(a))]
+
+
+def ref_barslast(cond):
+    out, last = [], None
+    for i, v in enumerate(cond):
+        if v:
+            last = i
+        out.append(np.nan if last is None else i - last)
+    return out
+
+
+def ref_valuewhen(cond, x):
+    out, value = [], np.nan
+    for i, v in enumerate(cond):
+        if v:
+            value = x[i]
+        out.append(value)
+    return out
+
+
+def ref_filter(cond, n):
+    out, until = [], -1
+    for i, v in enumerate(cond):
+        hit = bool(v) and i > until
+        if hit:
+            until = i + n
+        out.append(float(hit))
+    return out
+
+
+def reference(case, bars):
+    o, h, l, c, v = (bars[f] for f in ("open", "high", "low", "close", "volume"))
+    nbar = len(c)
+    gt = lambda a, b: np.array([float(x > y) for x, y in zip(a, b)])
+    if case == "ma":
+        return ref_ma(c, 5)
+    if case == "ema":
+        return ref_recursive(c, 2 / 13)
+    if case == "sma":
+        return ref_recursive(c, 1 / 6)
+    if case == "wma":
+        return ref_wma(c, 4)
+    if case == "dma":
+        return ref_recursive(c, 0.2)
+    if case == "ref":
+        return ref_ref(c, 3)
+    if case == "ref_series":
+        k = np.array(ref_barslast(gt(c, o))) + 1
+        return [c[i - int(k[i])] if not np.isnan(k[i]) and i - k[i] >= 0 else np.nan for i in range(nbar)]
+    if case == "hhv":
+        return ref_extreme(h, 10, np.max)
+    if case == "llv":
+        return ref_extreme(l, 10, np.min)
+    if case == "hhv_all":
+        return ref_extreme(h, 0, np.max)
+    if case == "llv_all":
+        return ref_extreme(l, 0, np.min)
+    if case == "hhvbars":
+        return ref_bars_extreme(h, 8, True)
+    if case == "llvbars":
+        return ref_bars_extreme(l, 8, False)
+    if case == "sum":
+        return ref_sum(v, 5)
+    if case == "sum_all":
+        return ref_sum(v, 0)
+    if case == "count":
+        return ref_count(gt(c, o), 10)
+    if case == "count_all":
+        return ref_count(gt(c, o), 0)
+    if case == "every":
+        cond = gt(c, o)
+        return [float(i >= 2 and all(cond[i - 2:i + 1])) for i in range(nbar)]
+    if case == "exist":
+        cond = gt(c, ref_ref(c, 1))
+        return [float(any(_window(cond, i, 4))) for i in range(nbar)]
+    if case == "std":
+        return ref_std(c, 10, 1)
+    if case == "stdp":
+        return ref_std(c, 10, 0)
+    if case == "avedev":
+        return ref_avedev(c, 10)
+    if case == "cross":
+        return ref_cross(ref_ma(c, 5), ref_ma(c, 10))
+    if case == "barslast":
+        return ref_barslast(gt(c, np.array(ref_ref(c, 1)) * 1.01))
+    if case == "barssince":
+        cond = gt(o, c)
+        first = next((i for i in range(nbar) if cond[i]), None)
+        return [np.nan if first is None or i < first else i - first for i in range(nbar)]
+    if case == "valuewhen":
+        return ref_valuewhen(ref_cross(c, ref_ma(c, 5)), c)
+    if case == "filter":
+        return ref_filter(gt(c, o), 3)
+    if case == "if":
+        return [h[i] - l[i] if c[i] > o[i] else -(h[i] - l[i]) for i in range(nbar)]
+    if case == "logic":
+        rv, rh = ref_ref(v, 1), ref_ref(h, 1)
+        return [float((c[i] > o[i] and v[i] > rv[i]) or not (h[i] > rh[i])) for i in range(nbar)]
+    if case == "arith":
+        rc = ref_ref(c, 1)
+        return [(c[i] - rc[i]) / rc[i] * 100 for i in range(nbar)]
+    if case == "divide_zero":
+        return [0.0] * nbar
+    if case == "functions":
+        return [abs(c[i] - o[i]) + max(c[i], o[i]) - min(c[i], o[i]) + math.sqrt(v[i]) + math.log(c[i])
+                + np.round(c[i] / 3) + (i + 1) % 7 for i in range(nbar)]
+    if case == "input":
+        return np.array(ref_ma(c, 7)) - np.array(ref_recursive(c, 2 / 8))
+    raise KeyError(case)
+
+
+# ---------- 比较 ----------
+
+def mismatches(actual, expected, tol=1e-6):
+    actual, expected = np.asarray(actual, dtype=np.float64), np.asarray(expected, dtype=np.float64)
+    if actual.shape != expected.shape:
+        return [f"长度不同 {actual.shape} != {expected.shape}"]
+    both_nan = np.isnan(actual) & np.isnan(expected)
+    close = np.isclose(actual, expected, rtol=tol, atol=tol) | both_nan
+    bad = np.flatnonzero(~close)
+    return [f"[{i}] {actual[i]!r} != {expected[i]!r}" for i in bad[:3]]
+
+
+def synthetic_bars(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, n))
+    volume = rng.integers(1000, 100000, n).astype(np.float64)
+    return {
+        "time": 1704067200000 + np.arange(n, dtype=np.float64) * 86400000,
+        "open": open_, "high": high, "low": low, "close": close,
+        "volume": volume, "amount": volume * close,
+    }
+
+
+def check_reference(n):
+    from xtquantai.formula import evaluate_signal
+
+    bars = synthetic_bars(n)
+    failed = 0
+    for case, formula in CASES:
+        actual = evaluate_signal(formula, bars, names=["OUT"])["OUT"]
+        errors = mismatches(actual, reference(case, bars))
+        if errors:
+            failed += 1
+            print(f"  参考实现 不一致 {case}: {formula} {errors}")
+    print(f"参考实现一致性: {len(CASES) - failed}/{len(CASES)} 个用例通过（{n} 根K线）")
+    return failed
+
+
+def check_panel(n, width=6):
+    """(时间, 股票) 面板上的求值结果应与逐只股票求值一致"""
+    from xtquantai.formula import evaluate_signal
+
+    series = [synthetic_bars(n, seed=seed) for seed in range(width)]
+    # 模拟上市较晚和中途停牌的股票
+    for field in FIELDS[1:]:
+        series[1][field][:n // 3] = np.nan
+        series[2][field][n // 2:n // 2 + 20] = np.nan
+    panel = {"time": series[0]["time"]}
+    for field in FIELDS[1:]:
+        panel[field] = np.column_stack([bars[field] for bars in series])
+    failed = 0
+    for case, formula in CASES:
+        actual = evaluate_signal(formula, panel, names=["OUT"])["OUT"]
+        errors = []
+        for j, bars in enumerate(series):
+            expected = evaluate_signal(formula, {**bars, "time": panel["time"]}, names=["OUT"])["OUT"]
+            errors += [f"列{j} {e}" for e in mismatches(actual[:, j], expected, tol=1e-9)]
+        if errors:
+            failed += 1
+            print(f"  面板求值 不一致 {case}: {formula} {errors[:3]}")
+    print(f"面板求值一致性: {len(CASES) - failed}/{len(CASES)} 个用例通过（{n} 根K线 x {width} 只股票）")
+    return failed
+
+
+def check_fixtures():
+    from xtquantai.formula import evaluate_signal
+
+    paths = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json")))
+    if not paths:
+        print(f"未找到录制的 get_vba_func_result 夹具（{FIXTURE_DIR}），可在 QMT 环境下用 --record 录制")
+        return 0
+    failed = total = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+        bars = {field: np.asarray(values, dtype=np.float64) for field, values in fixture["bars"].items()}
+        for case in fixture["cases"]:
+            total += 1
+            actual = evaluate_signal(case["formula"], bars, names=list(case["outputs"]))
+            errors = [f"{name}: {mismatches(actual[name.upper()], [np.nan if v is None else v for v in expected])}"
+                      for name, expected in case["outputs"].items()
+                      if mismatches(actual[name.upper()], [np.nan if v is None else v for v in expected])]
+            if errors:
+                failed += 1
+                print(f"  录制结果 不一致 {os.path.basename(path)} {case['name']}: {errors}")
+    print(f"录制结果一致性: {total - failed}/{total} 个用例通过（{len(paths)} 个夹具）")
+    return failed
+
+
+def record(stock, period, start, end, dividend_type):
+    """调用真实的 xtdata 录制夹具"""
+    import xtquant.xtdata as xtdata
+
+    xtdata.download_history_data(stock, period, start, end)
+    data = xtdata.get_market_data_ex_ori(FIELDS, [stock], period, start, end, -1, dividend_type, True)[stock]
+    cases = []
+    for case, formula in CASES:
+        df = xtdata.get_vba_func_result([formula], stock, period, start, end, -1, dividend_type)
+        outputs = {name: [None if v is None or (isinstance(v, float) and math.isnan(v)) else float(v)
+                          for v in df[name].tolist()]
+                   for name in df.columns if name != "time"}
+        cases.append({"name": case, "formula": formula, "outputs": outputs})
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = os.path.join(FIXTURE_DIR, f"{stock}_{period}_{dividend_type}_{start}_{end}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"stock_code": stock, "period": period, "dividend_type": dividend_type,
+                   "start_time": start, "end_time": end,
+                   "bars": {field: np.asarray(values, dtype=np.float64).tolist() for field, values in data.items()},
+                   "cases": cases}, f, ensure_ascii=False)
+    print(f"已录制 {len(cases)} 个用例: {path}")
+
+
+def bench(n):
+    from xtquantai.formula import compile_signal
+
+    bars = synthetic_bars(n)
+    signals = {
+        "均线交叉": "input:N1(5,1,100,1);input:N2(34,1,120,1);ma1:=ma(c,N1);ma2:=ma(c,N2);"
+                "bk:=cross(ma1,ma2);bp:=cross(ma2,ma1);",
+        "多函数组合": "DIF:=EMA(C,12)-EMA(C,26);DEA:=EMA(DIF,9);UP:=HHV(H,20);DN:=LLV(L,20);"
+                 "bk:=CROSS(DIF,DEA) AND C>MA(C,60) AND COUNT(C>O,5)>=3 AND BARSLAST(C>=REF(UP,1))<10;"
+                 "bp:=CROSS(DEA,DIF) OR C<DN OR STD(C,20)>REF(STD(C,20),5)*1.5;",
+    }
+    for name, source in signals.items():
+        signal = compile_signal(source)
+        signal.evaluate(bars, names=["bk", "bp"])
+        start = time.perf_counter()
+        out = signal.evaluate(bars, names=["bk", "bp"])
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {n} 根K线 {elapsed * 1000:.1f}ms，{n / elapsed / 1e6:.2f} 百万根/秒，"
+              f"bk={int(out['BK'].sum())} bp={int(out['BP'].sum())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true", help="调用真实 xtdata 录制夹具")
+    parser.add_argument("--stock", default="600000.SH")
+    parser.add_argument("--period", default="1d")
+    parser.add_argument("--start", default="20230101")
+    parser.add_argument("--end", default="20241231")
+    parser.add_argument("--dividend-type", default="none")
+    parser.add_argument("--check-bars", type=int, default=600, help="参考实现比较的K线数")
+    parser.add_argument("--bars", type=int, default=1_000_000, help="吞吐量基准的K线数")
+    args = parser.parse_args()
+
+    if args.record:
+        # 录制时使用真实的 xtquant
+        record(args.stock, args.period, args.start, args.end, args.dividend_type)
+        return
+
+    # xtquantai 包导入时依赖 xtquant，检查和基准不调用行情接口，使用模拟模块即可
+    import fake_xtquant
+    fake_xtquant.install(0)
+    failed = check_reference(args.check_bars) + check_panel(args.check_bars) + check_fixtures()
+    bench(args.bars)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
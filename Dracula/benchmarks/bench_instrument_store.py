@@ -0,0 +1,91 @@
+"""
+合约信息仓库基准测试
+模拟一次会话中多个工具反复用到合约信息的场景（板块成分股、持仓查询、单个合约详情、名称查找），
+统计实际打到 xtdata 的合约信息调用次数和耗时，与旧实现（每个合约每次调用一次 get_instrument_detail）对比。
+
+    python benchmarks/bench_instrument_store.py --latency 0.01 --rounds 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+
+async def _call(handle_call_tool, name, arguments):
+    with contextlib.redirect_stdout(io.StringIO()):
+        blocks = await handle_call_tool(None, name, arguments)
+    return json.loads(blocks[0].text)
+
+
+def _detail_calls():
+    return (fake_xtquant.CALL_COUNTS.get("get_instrument_detail", 0)
+            + fake_xtquant.CALL_COUNTS.get("get_instrument_detail_list", 0))
+
+
+async def main(args):
+    fake_xtquant.install(latency=args.latency)
+    os.environ["XTQUANTAI_CACHE_DIR"] = tempfile.mkdtemp(prefix="xtquantai-cache-")
+    import xtquant.xtdata as xtdata
+    from xtquantai.server import handle_call_tool
+    from xtquantai.tools.account_detail import get_trader_instance
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        trader = get_trader_instance()
+    held = fake_xtquant._SECTORS["沪深300"][:args.positions]
+    trader.positions = {code: {"volume": 100, "can_use_volume": 100} for code in held}
+
+    session = [
+        ("get_sector_constituents", {"sector": "沪深300"}),
+        ("get_sector_constituents", {"sector": "上证50"}),
+        ("get_account_positions", {"account": "fake"}),
+        ("get_instrument_detail", {"instrument_code": "600000.SH"}),
+        ("get_instrument_details", {"instrument_codes": held}),
+    ]
+    old_calls = 300 + 50 + args.positions + 1 + args.positions
+
+    # 旧实现：每个合约每次调用一次 get_instrument_detail
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for code in (fake_xtquant._SECTORS["沪深300"] + fake_xtquant._SECTORS["上证50"]
+                     + held + ["600000.SH"] + held):
+            xtdata.get_instrument_detail(code)
+    old_time = time.perf_counter() - start
+
+    before = _detail_calls()
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for name, arguments in session:
+            await _call(handle_call_tool, name, arguments)
+    new_time = time.perf_counter() - start
+    new_calls = _detail_calls() - before
+
+    print(f"xtdata延迟 {args.latency * 1000:.0f}ms（合约详情按 0.01 倍计），会话 {args.rounds} 轮 x {len(session)} 个工具调用")
+    print(f"  旧实现  合约信息调用 {old_calls * args.rounds:6d} 次  耗时 {old_time:.3f}s")
+    print(f"  仓库    合约信息调用 {new_calls:6d} 次  耗时 {new_time:.3f}s（含工具调度和编码）")
+
+    stats = await _call(handle_call_tool, "get_instrument_store_stats", {})
+    print("\n仓库统计")
+    for key in ("records", "requests", "hits", "hit_ratio", "xtdata_calls", "saved_calls"):
+        print(f"  {key}: {stats[key]}")
+    assert stats["saved_calls"] == stats["requests"] - new_calls
+
+    positions = await _call(handle_call_tool, "get_account_positions", {"account": "fake"})
+    names = {p["stock_code"]: p["stock_name"] for p in positions["positions"]}
+    assert names["600000.SH"] == "浦发银行"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--positions", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
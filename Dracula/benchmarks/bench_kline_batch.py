@@ -0,0 +1,98 @@
+"""
+批量K线基准测试
+对比逐个股票调用 get_kline（每只股票一次 MCP 往返和一次 JSON 编码）
+与一次 get_kline_batch 调用（分块并行获取 + 对齐面板）的耗时，并校验两者数据一致。
+
+    python benchmarks/bench_kline_batch.py --latency 0.01 --symbols 300,5000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+FIELDS = ["open", "high", "low", "close", "volume"]
+
+
+async def _call(handle_call_tool, name, arguments):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await handle_call_tool(None, name, arguments)
+
+
+async def _per_symbol(handle_call_tool, codes, count):
+    """旧方式：逐个股票顺序调用 get_kline"""
+    result = {}
+    for code in codes:
+        blocks = await _call(handle_call_tool, "get_kline", {
+            "field_list": FIELDS, "stock_code": code, "count": count, "use_cache": False})
+        result.update(json.loads(blocks[0].text))
+    return result
+
+
+async def _batch(handle_call_tool, codes, count, encoding):
+    return await _call(handle_call_tool, "get_kline_batch", {
+        "field_list": FIELDS, "stock_codes": codes, "count": count, "encoding": encoding})
+
+
+def _check(per_symbol, blocks, codes):
+    panel = json.loads(blocks[0].text)
+    assert panel["stock_codes"] == codes
+    for row, code in enumerate(codes):
+        assert panel["time"] == per_symbol[code]["time"], f"{code}: time 不一致"
+        for field in FIELDS:
+            assert np.allclose(panel["fields"][field][row], per_symbol[code][field]), f"{code}: {field} 不一致"
+
+
+async def main(args):
+    fake_xtquant.install(latency=args.latency)
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    from xtquantai.server import handle_call_tool
+    from xtquantai.panel import downsample_panel
+
+    universe = fake_xtquant._SECTORS["沪深A股"] + fake_xtquant._UNIVERSE["BJ"]
+    print(f"xtdata延迟 {args.latency * 1000:.0f}ms（每次调用按股票数加成），每只股票 {args.count} 根日K线")
+    for n in [int(x) for x in args.symbols.split(",")]:
+        codes = universe[:n]
+
+        start = time.perf_counter()
+        per_symbol = await _per_symbol(handle_call_tool, codes, args.count)
+        loop_time = time.perf_counter() - start
+
+        timings = {}
+        for encoding in ("json", "npy"):
+            start = time.perf_counter()
+            blocks = await _batch(handle_call_tool, codes, args.count, encoding)
+            timings[encoding] = time.perf_counter() - start
+            if encoding == "json":
+                _check(per_symbol, blocks, codes)
+
+        print(f"\n{n} 只股票（一致性校验通过）")
+        print(f"  逐个 get_kline      {loop_time:8.2f}s")
+        for encoding, elapsed in timings.items():
+            print(f"  get_kline_batch {encoding:<4} {elapsed:8.2f}s  (加速 {loop_time / elapsed:.1f}x)")
+
+    # 降采样：桶内 high 取最大、volume 求和，与逐桶计算一致
+    times = np.arange(1000, dtype=np.int64)
+    values = np.random.default_rng(0).random((3, 1000))
+    axis, sampled = downsample_panel(times, {"high": values, "volume": values}, 100)
+    assert len(axis) == 100 and np.allclose(sampled["high"][:, 0], values[:, :10].max(axis=1))
+    assert np.allclose(sampled["volume"][:, -1], values[:, -10:].sum(axis=1))
+    print("\n降采样校验通过")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--symbols", default="300,5000")
+    parser.add_argument("--count", type=int, default=250)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""
+K线缓存基准测试
+模拟 AI 在一次会话中反复请求同一只股票的K线，对比使用/不使用本地缓存的耗时，
+并校验缓存结果与直接读取 xtdata 的结果一致，包括新K线追加和除权失效两种情况。
+
+    python benchmarks/bench_kline_cache.py --latency 0.05 --repeat 20
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+WINDOWS = [
+    {"start_time": "20120101", "end_time": "20121231"},
+    {"start_time": "20150101", "end_time": ""},
+    {"count": 250},
+    {},
+]
+
+# 先取历史区间、再在刷新间隔内取到最新的请求
+BOUNDED_THEN_OPEN = [
+    {"start_time": "20120101", "end_time": "20121231"},
+    {"start_time": "20150101", "end_time": ""},
+    {"count": 50},
+]
+
+
+async def _kline(get_kline, use_cache, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await get_kline(["open", "close", "volume"], "600000.SH", period="1d",
+                               dividend_type="front_ratio", use_cache=use_cache, **kwargs)
+
+
+async def _check(get_kline, label, windows=WINDOWS):
+    for window in windows:
+        cached = await _kline(get_kline, True, **window)
+        direct = await _kline(get_kline, False, **window)
+        for field, values in direct["600000.SH"].items():
+            assert cached["600000.SH"][field] == values, f"{label} {window}: {field} 不一致"
+    print(f"  一致性校验通过: {label}")
+
+
+def _check_rewrite(market_data, cache):
+    """追加新K线重写分区时，之前返回的内存映射数组不变，序列目录中只保留元数据引用的分区"""
+    held = market_data.load_kline("600000.SH", ["close"], "1d", "", "", 250, "front_ratio")["close"]
+    before = np.array(held)
+    fake_xtquant.BAR_COUNT += 5
+    market_data.load_kline("600000.SH", ["close"], "1d", "", "", 250, "front_ratio")
+    series_dir = cache._series_dir("600000.SH", "1d", "front_ratio")
+    meta = cache._load_index()[series_dir]
+    referenced = {meta["dirs"].get(key, key) for key in meta["partitions"]}
+    entries = {entry for entry in os.listdir(series_dir) if os.path.isdir(os.path.join(series_dir, entry))}
+    assert np.array_equal(held, before), "重写分区改变了已返回的数组"
+    assert entries == referenced, f"残留未引用的分区目录: {sorted(entries - referenced)}"
+    print("  一致性校验通过: 重写分区不覆盖已返回的数据")
+
+
+async def main(args):
+    fake_xtquant.install(latency=args.latency)
+    tmp = tempfile.mkdtemp(prefix="xtquantai-cache-")
+    os.environ["XTQUANTAI_CACHE_DIR"] = tmp
+    from xtquantai.tools import market_data
+    from xtquantai.kline_cache import KlineCache
+    market_data.kline_cache = cache = KlineCache(root=tmp, tail_ttl=0)
+    get_kline = market_data.get_kline
+
+    print("一致性校验")
+    await _check(get_kline, "首次加载")
+    fake_xtquant.BAR_COUNT += 30
+    await _check(get_kline, "新K线追加")
+    fake_xtquant.ADJUST_FACTOR = 0.9
+    await _check(get_kline, "除权失效")
+    # 刷新间隔内，之前只取过历史区间的序列也要取到最新
+    market_data.kline_cache = KlineCache(root=os.path.join(tmp, "bounded"), tail_ttl=60)
+    await _check(get_kline, "历史区间后不限结束时间", BOUNDED_THEN_OPEN)
+    market_data.kline_cache = cache
+    _check_rewrite(market_data, cache)
+
+    cache.tail_ttl = 60
+    print(f"\nxtdata延迟 {args.latency * 1000:.0f}ms，重复请求 {args.repeat} 轮 x {len(WINDOWS)} 个窗口")
+    for use_cache in (False, True):
+        before = dict(fake_xtquant.CALL_COUNTS)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for window in WINDOWS:
+                await _kline(get_kline, use_cache, **window)
+        elapsed = time.perf_counter() - start
+        calls = fake_xtquant.CALL_COUNTS.get("get_market_data_ex_ori", 0) - before.get("get_market_data_ex_ori", 0)
+        print(f"  {'使用缓存' if use_cache else '不使用缓存'}: {elapsed:.3f}s，xtdata调用 {calls} 次")
+
+    stats = cache.stats()
+    print("\n缓存统计")
+    for key in ("requests", "hits", "partial_hits", "misses", "bypassed", "hit_ratio",
+                "rows_served", "rows_fetched", "dividend_invalidations", "series", "bytes"):
+        print(f"  {key}: {stats[key]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,83 @@
+"""
+合约名称索引基准测试
+对比旧的按市场逐个调用 get_instrument_detail 建立名称缓存（每次查找还要线性扫描判断市场是否已缓存），
+与批量构建的全市场名称索引的构建、新进程加载和查询耗时，并展示前缀/拼音首字母/模糊匹配的候选。
+
+    python benchmarks/bench_name_index.py --latency 0.01
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+QUERIES = ["浦发银行", "万科A", "浦发", "PFYH", "GZMT", "浦发银航", "贵州茅苔", "平安"]
+
+
+def _old_lookup(xtdata, cache, name, markets):
+    """旧实现：逐个市场按需建立缓存并查找"""
+    for market in markets:
+        if not any(k.startswith(f"{market}:") for k in cache):
+            for stock in xtdata.get_stock_list_in_sector(market):
+                detail = xtdata.get_instrument_detail(stock)
+                if detail and "InstrumentName" in detail:
+                    cache[f"{market}:{detail['InstrumentName']}"] = stock
+        if f"{market}:{name}" in cache:
+            return cache[f"{market}:{name}"]
+    raise ValueError(f"未找到名称为'{name}'的合约")
+
+
+def main(args):
+    fake_xtquant.install(latency=args.latency)
+    path = os.path.join(tempfile.mkdtemp(prefix="xtquantai-cache-"), "name_index.json")
+    import xtquant.xtdata as xtdata
+    from xtquantai.name_index import NameIndex
+
+    markets = list(xtdata.get_markets())
+    total = sum(len(xtdata.get_stock_list_in_sector(m)) for m in markets)
+    print(f"xtdata延迟 {args.latency * 1000:.0f}ms（合约详情按 0.01 倍计），{len(markets)} 个市场 {total} 个合约")
+
+    cache = {}
+    start = time.perf_counter()
+    _old_lookup(xtdata, cache, fake_xtquant._REAL_NAMES["000001.SZ"], markets)
+    print(f"  旧缓存首次查找（逐个获取详情）  {time.perf_counter() - start:8.3f}s")
+    start = time.perf_counter()
+    for _ in range(100):
+        _old_lookup(xtdata, cache, "平安银行", markets)
+    print(f"  旧缓存后续查找                  {(time.perf_counter() - start) * 10:8.3f}ms/次")
+
+    start = time.perf_counter()
+    NameIndex(path=path).build()
+    print(f"  索引构建（批量获取详情）        {time.perf_counter() - start:8.3f}s")
+
+    index = NameIndex(path=path)
+    start = time.perf_counter()
+    index.ensure_loaded()
+    print(f"  新进程从磁盘加载                {time.perf_counter() - start:8.3f}s")
+
+    start = time.perf_counter()
+    for _ in range(100):
+        index.search("平安银行")
+    print(f"  精确查找                        {(time.perf_counter() - start) * 10:8.3f}ms/次")
+    assert index.search("平安银行")[0] == {"code": "000001.SZ", "name": "平安银行", "market": "SZ",
+                                            "score": 1.0, "match": "exact"}
+    assert index.search("浦发银航")[0]["code"] == "600000.SH"
+    assert index.search("万科A")[0]["code"] == "000002.SZ"
+
+    print("\n查询示例")
+    for query in QUERIES:
+        start = time.perf_counter()
+        candidates = index.search(query, limit=3)
+        elapsed = (time.perf_counter() - start) * 1000
+        shown = ", ".join(f"{c['name']}({c['code']}) {c['match']} {c['score']}" for c in candidates)
+        print(f"  {query:<8} {elapsed:6.2f}ms  {shown}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.01)
+    main(parser.parse_args())
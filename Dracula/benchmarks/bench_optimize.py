@@ -0,0 +1,197 @@
+"""
+信号参数寻优：一致性检查与基准
+1. 一致性：
+   - 网格寻优中每组参数的汇总指标与逐组调用 run_template_backtest 的结果相同，约束条件过滤正确
+   - 热力图每个格子等于该格子上所有组合的最好指标
+   - prune_keep=1 时与不剪枝的排名相同
+   - 回测出错（非公式错误）的组合记为失败并带上错误信息，不影响同一批的其他组合
+2. 抽样：在 MA 交叉信号的完整网格（N1 1..100 x N2 1..120）上，比较 random/bayes 用相同评估次数找到的最好组合
+   在全部组合中的排名
+3. 基准：逐组参数调用 run_single_stock_backtest(engine=local) 与一次 optimize_signal_params 的耗时
+
+    python benchmarks/bench_optimize.py --bars 2500 --workers 8
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+SIGNAL = ("input:N1(5,1,100,1);\ninput:N2(34,1,120,1);\nMA1:=MA(C,N1);\nMA2:=MA(C,N2);\n"
+          "bk:CROSS(MA1,MA2);\nbp:CROSS(MA2,MA1);")
+
+
+def synthetic_bars(n, seed=21):
+    rng = np.random.default_rng(seed)
+    # 带趋势切换的随机游走，使不同参数的结果有明显差异
+    drift = np.repeat(rng.normal(0, 0.004, n // 100 + 1), 100)[:n]
+    close = 10 * np.exp(np.cumsum(drift + rng.normal(0, 0.015, n)))
+    return {"time": 1262275200000 + np.arange(n, dtype=np.int64) * 86400000, "close": close}
+
+
+def check_grid(bars):
+    from xtquantai.backtest import run_template_backtest, template_summary
+    from xtquantai.optimize import optimize_signal
+
+    ranges = {"N1": [2, 20, 3], "N2": [10, 60, 10]}
+    result = optimize_signal(SIGNAL, bars, ranges, constraint="N1<N2", top=1000)
+    failed = 0
+    expected_rows = []
+    for n1 in np.arange(2, 21, 3):
+        for n2 in np.arange(10, 61, 10):
+            if n1 >= n2:
+                continue
+            df = run_template_backtest(SIGNAL, bars, params={"N1": n1, "N2": n2})
+            expected_rows.append(({"N1": float(n1), "N2": float(n2)}, template_summary(df)))
+    rows = {(row["N1"], row["N2"]): row for row in result["top"]}
+    if result["candidates"] != len(expected_rows) or len(rows) != len(expected_rows):
+        failed += 1
+        print(f"  约束过滤 不一致: {result['candidates']} / {len(rows)} != {len(expected_rows)}")
+    for params, summary in expected_rows:
+        row = rows.get((params["N1"], params["N2"]))
+        if row is None or any(not np.isclose(row[k], v, rtol=1e-12, atol=1e-12) for k, v in summary.items()):
+            failed += 1
+            print(f"  网格 不一致 {params}: {row} != {summary}")
+
+    heatmap = result["heatmap"]
+    for i, n2 in enumerate(heatmap["y_values"]):
+        for j, n1 in enumerate(heatmap["x_values"]):
+            values = [row["收益回撤比"] for row in result["top"] if row["N1"] == n1 and row["N2"] == n2]
+            expected = max(values) if values else None
+            if heatmap["z"][i][j] != expected:
+                failed += 1
+                print(f"  热力图 不一致 N1={n1} N2={n2}: {heatmap['z'][i][j]} != {expected}")
+
+    pruned = optimize_signal(SIGNAL, bars, ranges, constraint="N1<N2", prune_keep=1.0, top=1000)
+    if [(r["N1"], r["N2"]) for r in pruned["top"]] != [(r["N1"], r["N2"]) for r in result["top"]]:
+        failed += 1
+        print("  剪枝 prune_keep=1 的排名与不剪枝不同")
+    failed += check_batch_errors(bars)
+    print(f"网格一致性: {len(expected_rows)} 组参数，{'通过' if not failed else f'{failed} 处不一致'}")
+    return failed
+
+
+def check_batch_errors(bars):
+    """在当前进程里直接调用 evaluate_batch，让其中一组参数的回测抛出异常"""
+    from xtquantai import optimize
+    from xtquantai.shared_arrays import SharedArrays
+
+    original = optimize.template_backtest
+
+    def flaky(close, bk, bp, *args, **kwargs):
+        if flaky.calls == 1:
+            flaky.calls += 1
+            raise ValueError("模拟的回测错误")
+        flaky.calls += 1
+        return original(close, bk, bp, *args, **kwargs)
+
+    flaky.calls = 0
+    combos = [{"N1": 5.0, "N2": 20.0}, {"N1": 6.0, "N2": 20.0}, {"N1": 7.0, "N2": 20.0}]
+    arrays = {"time": np.asarray(bars["time"]), "close": np.asarray(bars["close"], dtype=np.float64)}
+    optimize.template_backtest = flaky
+    try:
+        with SharedArrays(arrays) as shared:
+            results = optimize.evaluate_batch(shared.handle, SIGNAL, combos)
+    finally:
+        optimize.template_backtest = original
+    if [result is None for result, _ in results] != [False, True, False] or results[1][1] != "模拟的回测错误":
+        print(f"  批内出错 不一致: {[(result is None, error) for result, error in results]}")
+        return 1
+    return 0
+
+
+def compare_sampling(bars, samples):
+    from xtquantai.optimize import optimize_signal
+
+    start = time.perf_counter()
+    grid = optimize_signal(SIGNAL, bars, top=100000)
+    grid_elapsed = time.perf_counter() - start
+    scores = np.sort([row["收益回撤比"] for row in grid["top"]])[::-1]
+    print(f"完整网格: {grid['evaluated']} 组 {grid_elapsed:.1f}s（{grid['evaluated'] / grid_elapsed:.0f} 组/秒），"
+          f"最优 {grid['best']['N1']:.0f}/{grid['best']['N2']:.0f} 收益回撤比 {scores[0]:.3f}")
+
+    def rank(value):
+        return int(np.searchsorted(-scores, -value, side="left")) + 1
+
+    for method in ("random", "bayes"):
+        ranks = []
+        start = time.perf_counter()
+        for seed in range(5):
+            found = optimize_signal(SIGNAL, bars, method=method, samples=samples, seed=seed)
+            ranks.append(rank(found["best"]["收益回撤比"]))
+        elapsed = (time.perf_counter() - start) / 5
+        print(f"{method:6s}: 评估 {samples} 组（{elapsed:.1f}s），找到的最优组合在 {grid['evaluated']} 组中排名 "
+              f"{sorted(ranks)}（5 个随机种子）")
+
+    start = time.perf_counter()
+    pruned = optimize_signal(SIGNAL, bars, prune_keep=0.2)
+    elapsed = time.perf_counter() - start
+    print(f"剪枝 prune_keep=0.2: {elapsed:.1f}s，前半段剪掉 {pruned['pruned']} 组，完整评估 {pruned['evaluated']} 组，"
+          f"最优排名 {rank(pruned['best']['收益回撤比'])}")
+
+
+async def _call(handle_call_tool, name, arguments):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await handle_call_tool(None, name, arguments)
+
+
+async def bench_tool(n, latency, per_call):
+    fake_xtquant.set_latency(latency)
+    from xtquantai.server import handle_call_tool
+
+    ranges = {"N1": [2, 30, 2], "N2": [20, 120, 5]}
+    combos = [(n1, n2) for n1 in range(2, 31, 2) for n2 in range(20, 121, 5)]
+    start = time.perf_counter()
+    for n1, n2 in combos[:per_call]:
+        signal = SIGNAL.replace("N1(5,", f"N1({n1},").replace("N2(34,", f"N2({n2},")
+        await _call(handle_call_tool, "run_single_stock_backtest", {
+            "stock_code": "600000.SH", "signal": signal, "start_time": "", "end_time": "", "count": n,
+            "engine": "local"})
+    per_combo = (time.perf_counter() - start) / per_call
+
+    start = time.perf_counter()
+    blocks = await _call(handle_call_tool, "optimize_signal_params", {
+        "stock_code": "600000.SH", "signal": SIGNAL, "start_time": "", "end_time": "", "count": n,
+        "ranges": ranges})
+    elapsed = time.perf_counter() - start
+    result = json.loads(blocks[0].text)
+    print(f"工具: {len(combos)} 组参数，逐组调用 run_single_stock_backtest 约 {per_combo * len(combos):.1f}s"
+          f"（按 {per_call} 组实测外推），optimize_signal_params {elapsed:.2f}s"
+          f"（{per_combo * len(combos) / elapsed:.0f}x），最优 N1={result['best']['N1']:.0f} N2={result['best']['N2']:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=2500)
+    parser.add_argument("--samples", type=int, default=300, help="random/bayes 的评估次数")
+    parser.add_argument("--workers", type=int, default=0, help="cpu 进程池大小，0 为 CPU 核数")
+    parser.add_argument("--latency", type=float, default=0.01, help="模拟 xtdata 调用延迟（秒）")
+    parser.add_argument("--per-call", type=int, default=20, help="逐组调用基准实测的组数")
+    args = parser.parse_args()
+
+    if args.workers:
+        os.environ["XTQUANTAI_CPU_WORKERS"] = str(args.workers)
+    fake_xtquant.install(args.latency)
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    from xtquantai.executor import CPU_WORKERS
+    print(f"cpu 进程池: {CPU_WORKERS} 个进程（本机 {os.cpu_count()} 核）")
+
+    bars = synthetic_bars(args.bars)
+    failed = check_grid(bars)
+    compare_sampling(bars, args.samples)
+    asyncio.run(bench_tool(args.bars, args.latency, args.per_call))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
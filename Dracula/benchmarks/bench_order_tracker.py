@@ -0,0 +1,200 @@
+"""
+委托跟踪基准
+1. 生命周期：全部成交、部分成交后撤单、挂单后撤单、废单四种委托按 seq 跟踪到正确的结束状态和成交数量；
+   下单后按 seq 注册的委托、成交、错误回调都被调用；until='update' 在部分成交时返回；timeout=0 只返回当前状态
+   没有记录的 seq / 委托编号立即返回 unknown、不能注册回调；超出保留条数时（包括下单回报建立对应关系时）
+   丢弃最早的记录，还有 future 在等待的委托保留
+2. 一批委托提交后等到全部结束：客户端按委托编号每隔 --poll 秒轮询 query_stock_order，
+   与 wait_orders 由回报推送完成 future 的耗时和查询次数对比
+
+    python benchmarks/bench_order_tracker.py --latency 0.005 --orders 200 --poll 0.1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+ACCOUNT = "fake"
+
+
+async def check_lifecycle(trader, codes):
+    from xtquantai.tools.account_detail import get_callback_instance, get_trader_session, place_order
+    from xtquantai.tools.order_status import wait_orders
+
+    failed, lines = 0, []
+    plans = dict(zip(codes, ("fill", "partial", "open", "reject")))
+    trader.plans.update(plans)
+    callbacks = get_callback_instance()
+    fired = {"order": 0, "trade": 0, "error": 0}
+
+    def counter(kind):
+        def callback(obj):
+            fired[kind] += 1
+        return callback
+
+    seqs = []
+    for code in plans:
+        seq = place_order(ACCOUNT, code, "BUY", 1000)
+        callbacks.register_order_callback(None, counter("order"), seq=seq)
+        callbacks.register_trade_callback(None, counter("trade"), seq=seq)
+        callbacks.register_error_callback(None, counter("error"), seq=seq)
+        seqs.append(seq)
+
+    # 部分成交的委托逐次等待状态变化（已报、部分成交），之后全部委托只返回当前状态
+    updates = []
+    while not updates or updates[-1]["status"] == "reported":
+        updates.append((await wait_orders(seqs=seqs[1:2], until="update", timeout=5))["orders"][0])
+    partial = updates[-1]
+    await asyncio.sleep(0.1)
+    poll = await wait_orders(seqs=seqs, timeout=0)
+    if [u["status"] for u in updates] != ["reported", "partial"] or partial["traded_volume"] != 500:
+        failed += 1
+        lines.append(f"  状态变化: {[(u['status'], u['traded_volume']) for u in updates]}")
+    if [o["status"] for o in poll["orders"]] != ["filled", "partial", "reported", "rejected"]:
+        failed += 1
+        lines.append(f"  当前状态: {[o['status'] for o in poll['orders']]}")
+
+    trader_instance, acc = get_trader_session().ensure(ACCOUNT, "STOCK")
+    for order in poll["orders"][1:3]:
+        trader_instance.cancel_order_stock_async(acc, order["order_id"])
+    result = await wait_orders(seqs=seqs, timeout=5)
+    got = [(o["status"], o["traded_volume"]) for o in result["orders"]]
+    expected = [("filled", 1000), ("cancelled", 500), ("cancelled", 0), ("rejected", 0)]
+    if got != expected or result["pending"] or result["orders"][3]["error_msg"] != "资金不足":
+        failed += 1
+        lines.append(f"  结束状态 {got}，应为 {expected}，废单原因 {result['orders'][3]['error_msg']!r}")
+    # 委托回报：成交 2 次、部分成交后撤单 3 次、挂单撤单 2 次、废单 1 次；成交 2 笔；错误 1 次
+    if fired != {"order": 8, "trade": 2, "error": 1}:
+        failed += 1
+        lines.append(f"  回调次数 {fired}")
+    for code in plans:
+        trader.plans.pop(code)
+    lines.append(f"生命周期: {', '.join(f'{s}({v})' for s, v in got)}，回调 {fired}，{'通过' if not failed else '未通过'}")
+    return failed, lines
+
+
+async def check_retention():
+    from types import SimpleNamespace
+    from xtquant import xtconstant
+    from xtquantai.order_tracker import OrderTracker
+    from xtquantai.tools.order_status import wait_orders
+
+    failed, lines = 0, []
+    start = time.perf_counter()
+    result = await wait_orders(seqs=[10 ** 9], order_ids=[10 ** 9], timeout=5)
+    elapsed = time.perf_counter() - start
+    if [o["status"] for o in result["orders"]] != ["unknown", "unknown"] or result["pending"] != 2 or elapsed > 0.1:
+        failed += 1
+        lines.append(f"  未知委托: {result['orders']}，等待 {elapsed:.3f}s")
+    tracker = OrderTracker(limit=4)
+    try:
+        tracker.add_callback("order", print, seq=10 ** 9)
+        failed += 1
+        lines.append("  未知委托可以注册回调")
+    except ValueError:
+        pass
+
+    tracker.expect(0, "600000.SH", 100)
+    watched = tracker.watch(seq=0)
+    for seq in range(1, 10):
+        tracker.expect(seq, "600000.SH", 100)
+        tracker.on_response(SimpleNamespace(seq=seq, order_id=1000 + seq, error_msg=""))
+    sizes = (len(tracker._by_seq), len(tracker._by_order), len(tracker._responses))
+    kept = 0 in tracker._by_seq
+    tracker.on_response(SimpleNamespace(seq=0, order_id=1000, error_msg=""))
+    tracker.on_order(SimpleNamespace(order_id=1000, order_status=xtconstant.ORDER_SUCCEEDED,
+                                     stock_code="600000.SH", order_volume=100, traded_volume=100, traded_price=10.0))
+    await asyncio.sleep(0.01)
+    status = watched.result()["status"] if watched.done() else None
+    if sizes != (4, 4, 4) or not kept or status != "filled":
+        failed += 1
+        lines.append(f"  保留条数 {sizes}，等待中的 seq 保留 {kept}，等待结果 {status}")
+    lines.append(f"未知委托与保留条数: 未知委托 {elapsed * 1000:.1f}ms 返回 unknown，上限 4 条时保留 {sizes[0]} 个 seq"
+                 f"（含等待中的最早一条），{'通过' if not failed else '未通过'}")
+    return failed, lines
+
+
+def submit(codes, volume):
+    from xtquantai.tools.account_detail import place_order
+
+    return [place_order(ACCOUNT, code, "BUY", volume) for code in codes]
+
+
+async def poll_orders(trader, acc, seqs, interval):
+    """旧做法：客户端按委托编号轮询，直到全部委托结束"""
+    from xtquant import xtconstant
+    from xtquantai.order_tracker import order_tracker
+
+    final = {xtconstant.ORDER_SUCCEEDED, xtconstant.ORDER_CANCELED, xtconstant.ORDER_PART_CANCEL,
+             xtconstant.ORDER_JUNK}
+    responses = order_tracker.wait_responses(seqs)
+    waiting = [responses[seq]["order_id"] for seq in seqs]
+    while waiting:
+        await asyncio.sleep(interval)
+        orders = [trader.query_stock_order(acc, order_id) for order_id in waiting]
+        waiting = [order_id for order_id, order in zip(waiting, orders)
+                   if order is None or order.order_status not in final]
+
+
+async def compare(trader, codes, interval):
+    from xtquantai.tools.account_detail import get_trader_session
+    from xtquantai.tools.order_status import wait_orders
+
+    failed, lines = 0, []
+    _, acc = get_trader_session().ensure(ACCOUNT, "STOCK")
+    seqs = submit(codes, 100)
+    fake_xtquant.CALL_COUNTS.clear()
+    start = time.perf_counter()
+    await poll_orders(trader, acc, seqs, interval)
+    poll_elapsed = time.perf_counter() - start
+    queries = fake_xtquant.CALL_COUNTS.get("query_stock_order", 0)
+    lines.append(f"轮询 query_stock_order（间隔 {interval:g}s）: {len(seqs)} 笔 {poll_elapsed:.3f}s，查询 {queries} 次")
+
+    seqs = submit(codes, 100)
+    fake_xtquant.CALL_COUNTS.clear()
+    start = time.perf_counter()
+    result = await wait_orders(seqs=seqs, timeout=10)
+    elapsed = time.perf_counter() - start
+    queries = fake_xtquant.CALL_COUNTS.get("query_stock_order", 0)
+    if result["pending"] or result["counts"] != {"filled": len(seqs)} or queries:
+        failed += 1
+        lines.append(f"  未结束 {result['pending']}，状态 {result['counts']}，查询 {queries} 次")
+    lines.append(f"wait_orders: {len(seqs)} 笔 {elapsed:.3f}s，查询 {queries} 次，{'通过' if not failed else '未通过'}")
+    return failed, lines
+
+
+async def main(args):
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    fake_xtquant.install(args.latency)
+    from xtquantai.tools.account_detail import get_trader_instance
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        trader = get_trader_instance()
+    trader.cash = 1e12
+    codes = fake_xtquant._SECTORS["沪深300"][:args.orders]
+    failed = 0
+    # 回报推送线程中的回调会打印，检查结果在恢复输出后统一打印
+    for check in (lambda: check_lifecycle(trader, codes[:4]), check_retention,
+                  lambda: compare(trader, codes, args.poll)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            check_failed, lines = await check()
+        failed += check_failed
+        print("\n".join(lines))
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.005, help="每次接口调用的模拟延迟（秒）")
+    parser.add_argument("--orders", type=int, default=200, help="委托笔数")
+    parser.add_argument("--poll", type=float, default=0.1, help="轮询间隔（秒）")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(main(args)) else 0)
@@ -0,0 +1,206 @@
+"""
+板块组合回测：一致性检查与基准
+1. 一致性：
+   - 与逐根K线、逐只股票循环的参考实现比较权益曲线和各股票的交易统计（随机K线，含上市较晚和停牌的股票）
+   - 仓位不受限时，各股票的交易次数应与单股票本地回测模板的交易次数一致
+2. 基准：
+   - 引擎：300 只股票 x 2500 根日线（约 10 年）的信号求值和组合模拟耗时
+   - 工具：一次 run_sector_backtest 与逐只股票调用 run_single_stock_backtest(engine=local) 的耗时
+
+    python benchmarks/bench_portfolio.py --symbols 300 --bars 2500 --latency 0.01
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+SIGNAL = "INPUT:N1(5,1,60,1),N2(20,1,250,1);\nMA1:=MA(C,N1);\nMA2:=MA(C,N2);\nbk:CROSS(MA1,MA2);\nbp:CROSS(MA2,MA1);"
+SCORE_SIGNAL = SIGNAL + "\nSCORE:=C/REF(C,20);"
+
+# (配置名, simulate_portfolio 参数, 是否使用 SCORE)
+CONFIGS = [
+    ("equal", {"max_positions": 5}, False),
+    ("equal_score", {"max_positions": 5}, True),
+    ("equal_cap", {"max_positions": 4, "max_weight": 0.1}, False),
+    ("cash", {"allocation": "cash", "max_positions": 8}, False),
+    ("cash_score", {"allocation": "cash", "max_positions": 3}, True),
+    ("single", {"max_positions": 1}, True),
+    ("unlimited", {"max_positions": 1000}, False),
+]
+
+
+def synthetic_panel(n, width, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (n, width)), axis=0))
+    # 上市较晚和中途停牌的股票
+    close[:n // 3, 1] = np.nan
+    close[n // 2:n // 2 + 15, 2] = np.nan
+    close[n // 4:, 3] = np.nan
+    return {"time": 1262275200000 + np.arange(n, dtype=np.int64) * 86400000, "close": close}
+
+
+def reference_portfolio(close, bk, bp, score=None, initial_capital=1000000.0, max_positions=10,
+                        max_weight=0.0, allocation="equal", fee=0.0015):
+    """逐根K线、逐只股票的串行实现"""
+    n, width = close.shape
+    last = [np.nan] * width
+    value = [0.0] * width
+    cost = [0.0] * width
+    held = [False] * width
+    trades, wins, pnl = [0] * width, [0] * width, [0.0] * width
+    cash = initial_capital
+    equity = []
+    for t in range(n):
+        for j in range(width):
+            price = close[t, j]
+            if not np.isnan(price):
+                if held[j] and not np.isnan(last[j]):
+                    value[j] *= price / last[j]
+                last[j] = price
+        for j in range(width):
+            if held[j] and bp[t, j] and not np.isnan(close[t, j]):
+                proceeds = value[j] * (1 - fee)
+                cash += proceeds
+                trades[j] += 1
+                wins[j] += proceeds - cost[j] > 0
+                pnl[j] += proceeds - cost[j]
+                value[j] = cost[j] = 0.0
+                held[j] = False
+        candidates = [j for j in range(width)
+                      if bk[t, j] and not bp[t, j] and not held[j] and not np.isnan(close[t, j])]
+        slots = max_positions - sum(held)
+        if score is not None and len(candidates) > slots > 0:
+            key = [(-np.inf if np.isnan(score[t, j]) else score[t, j]) for j in candidates]
+            candidates = [j for _, j in sorted(zip([-k for k in key], candidates), key=lambda p: p[0])]
+        chosen = candidates[:max(slots, 0)]
+        if chosen:
+            total = cash + sum(value)
+            amount = total / max_positions if allocation == "equal" else cash / len(chosen)
+            if max_weight > 0:
+                amount = min(amount, total * max_weight)
+            for j in chosen:
+                if amount < 1.0 or cash < amount * (1 - 1e-9):
+                    break
+                value[j] = amount * (1 - fee)
+                cost[j] = amount
+                held[j] = True
+                cash -= amount
+        equity.append(cash + sum(value))
+    return np.array(equity), np.array(trades), np.array(pnl)
+
+
+def check_reference(n, width):
+    from xtquantai.formula import compile_signal
+    from xtquantai.portfolio import simulate_portfolio
+
+    bars = synthetic_panel(n, width)
+    failed = 0
+    for name, kwargs, use_score in CONFIGS:
+        values = compile_signal(SCORE_SIGNAL).evaluate(bars, names=["BK", "BP", "SCORE"])
+        bk, bp = values["BK"] > 0, values["BP"] > 0
+        score = values["SCORE"] if use_score else None
+        result = simulate_portfolio(bars["close"], bk, bp, score, **kwargs)
+        equity, trades, pnl = reference_portfolio(bars["close"], bk, bp, score, **kwargs)
+        ok = (np.allclose(result["equity"], equity, rtol=1e-9)
+              and np.array_equal(result["trades"], trades)
+              and np.allclose(result["pnl"], pnl, rtol=1e-9, atol=1e-6))
+        if not ok:
+            failed += 1
+            bad = np.flatnonzero(~np.isclose(result["equity"], equity, rtol=1e-9))
+            print(f"  参考实现 不一致 {name}: 首个不同的K线 {bad[:1]}，"
+                  f"交易次数 {int(result['trades'].sum())} != {int(trades.sum())}")
+    print(f"参考实现一致性: {len(CONFIGS) - failed}/{len(CONFIGS)} 个配置通过（{n} 根K线 x {width} 只股票）")
+    return failed
+
+
+def check_template(n, width):
+    """仓位不受限且没有停牌时，每只股票的开平仓与单股票回测模板相同"""
+    from xtquantai.backtest import run_template_backtest
+    from xtquantai.portfolio import run_portfolio_backtest
+
+    bars = synthetic_panel(n, width, seed=5)
+    bars["close"] = np.nan_to_num(bars["close"], nan=10.0)
+    codes = [f"{600000 + j:06d}.SH" for j in range(width)]
+    result = run_portfolio_backtest(SIGNAL, bars, codes, max_positions=width, initial_capital=1e12)
+    failed = 0
+    for j, code in enumerate(codes):
+        df = run_template_backtest(SIGNAL, {"time": bars["time"], "close": bars["close"][:, j]})
+        if int(df["交易次数"].iloc[-1]) != int(result["trades"][j]):
+            failed += 1
+            print(f"  模板 不一致 {code}: {int(result['trades'][j])} != {int(df['交易次数'].iloc[-1])}")
+    print(f"单股票模板一致性: {width - failed}/{width} 只股票交易次数一致")
+    return 1 if failed else 0
+
+
+def bench_engine(n, width):
+    from xtquantai.portfolio import run_portfolio_backtest
+
+    rng = np.random.default_rng(3)
+    bars = {"time": 1262275200000 + np.arange(n, dtype=np.int64) * 86400000,
+            "close": 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (n, width)), axis=0))}
+    codes = [f"{600000 + j:06d}.SH" for j in range(width)]
+    start = time.perf_counter()
+    result = run_portfolio_backtest(SCORE_SIGNAL, bars, codes, max_positions=20)
+    elapsed = time.perf_counter() - start
+    summary = result["summary"]
+    print(f"组合引擎: {width} 只股票 x {n} 根K线 {elapsed * 1000:.0f}ms，"
+          f"交易 {summary['交易次数']} 次，总收益率 {summary['总收益率']:.2f}%，最大回撤 {summary['最大回撤']:.2f}%")
+
+
+async def _call(handle_call_tool, name, arguments):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await handle_call_tool(None, name, arguments)
+
+
+async def bench_tool(n, width, latency):
+    fake_xtquant.set_latency(latency)
+    import xtquant.xtdata as xtdata
+    from xtquantai.server import handle_call_tool
+
+    codes = xtdata.get_stock_list_in_sector("沪深A股")[:width]
+    start = time.perf_counter()
+    for code in codes:
+        await _call(handle_call_tool, "run_single_stock_backtest", {
+            "stock_code": code, "signal": SIGNAL, "start_time": "", "end_time": "", "count": n, "engine": "local"})
+    per_symbol = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blocks = await _call(handle_call_tool, "run_sector_backtest", {
+        "signal": SIGNAL, "stock_codes": codes, "count": n, "max_positions": 20, "max_points": 500})
+    sector = time.perf_counter() - start
+    result = json.loads(blocks[0].text)
+    print(f"工具（延迟 {latency * 1000:.0f}ms）: 逐只股票 run_single_stock_backtest {per_symbol:.2f}s，"
+          f"run_sector_backtest {sector:.2f}s（{per_symbol / sector:.1f}x），"
+          f"权益曲线 {len(result['curve']['time'])} 点，交易 {result['summary']['交易次数']} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--bars", type=int, default=2500)
+    parser.add_argument("--latency", type=float, default=0.01, help="模拟 xtdata 调用延迟（秒）")
+    parser.add_argument("--check-bars", type=int, default=400)
+    parser.add_argument("--check-symbols", type=int, default=25)
+    args = parser.parse_args()
+
+    fake_xtquant.install(args.latency)
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    failed = check_reference(args.check_bars, args.check_symbols) + check_template(args.check_bars, args.check_symbols)
+    bench_engine(args.bars, args.symbols)
+    asyncio.run(bench_tool(args.bars, args.symbols, args.latency))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+目标权重调仓基准
+1. dry_run：交易清单与逐只按规则计算（目标股数按手取整、卖出不超过可用数量、清仓含零股、只交易差额）的结果相同，
+   估算成本与按成本模型逐笔计算相同；不下单，get_full_tick 只调用一次
+2. 资金不足：买入按比例缩减，买入金额加成本不超过卖出回款后的可用资金
+3. 下单：先卖后买（卖出的 seq 都小于买入的），回报推送完成后持仓与 当前 - 卖出 + 买入 相同；
+   与“查询持仓后逐只调用 sell_stock / buy_stock”对比耗时和接口调用次数
+4. 等待卖出回款：没有可等待的卖出委托时立即返回，回款到账后由成交回报唤醒，不等到超时
+
+    python benchmarks/bench_rebalance.py --latency 0.005 --names 50
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+ACCOUNT = "fake"
+CALLS = ("query_stock_asset", "query_stock_positions", "get_full_tick", "order_stock_async")
+
+
+def _calls():
+    return {name: fake_xtquant.CALL_COUNTS.get(name, 0) for name in CALLS}
+
+
+def _format(calls):
+    return "，".join(f"{name} {count}" for name, count in calls.items() if count)
+
+
+def _wait(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def setup(trader, codes, cash):
+    """持有前一半股票（部分当日买入不可卖、部分有零股），目标为后一半加前一半中的一部分"""
+    trader.cash = cash
+    trader.positions = {}
+    for i, code in enumerate(codes[:len(codes) // 2]):
+        volume = 1000 + 100 * (i % 7) + (37 if i % 5 == 0 else 0)
+        trader.positions[code] = {"volume": volume, "can_use_volume": volume if i % 3 else volume // 2}
+    held = codes[:len(codes) // 2]
+    targets = held[::2] + codes[len(codes) // 2:]
+    return [{"stock_code": code, "weight": 0.9 / len(targets)} for code in targets]
+
+
+def reference(trader, targets, ticks, cash):
+    """逐只按规则计算的交易（不含资金约束）"""
+    weights = {t["stock_code"]: t["weight"] for t in targets}
+    codes = list(weights) + [code for code in trader.positions if code not in weights]
+    equity = cash + sum(p["volume"] * ticks[code]["lastPrice"] for code, p in trader.positions.items())
+    trades = {}
+    for code in codes:
+        price = ticks[code]["lastPrice"]
+        position = trader.positions.get(code, {"volume": 0, "can_use_volume": 0})
+        target = int(weights.get(code, 0.0) * equity / price / 100) * 100
+        delta = target - position["volume"]
+        if delta < 0:
+            can_use = position["can_use_volume"]
+            volume = can_use if -delta >= can_use else -delta // 100 * 100
+            if volume:
+                trades[code] = ("SELL", volume)
+        elif delta >= 100:
+            trades[code] = ("BUY", delta // 100 * 100)
+    return trades
+
+
+async def check_dry_run(trader, codes):
+    import xtquant.xtdata as xtdata
+    from xtquantai.costs import CostModel
+    from xtquantai.tools.account_detail import get_account_book
+    from xtquantai.tools.basket_order import rebalance_portfolio
+
+    failed = 0
+    targets = setup(trader, codes, 2_000_000.0)
+    ticks = xtdata.get_full_tick(codes)
+    expected = reference(trader, targets, ticks, trader.cash)
+    with contextlib.redirect_stdout(io.StringIO()):
+        get_account_book(ACCOUNT, resync=True)
+        fake_xtquant.CALL_COUNTS.clear()
+        result = await rebalance_portfolio(ACCOUNT, targets, dry_run=True)
+    calls = _calls()
+    got = {t["stock_code"]: (t["direction"], t["volume"]) for t in result["trades"]}
+    if got != expected or result["buy_scale"] != 1.0:
+        failed += 1
+        diff = sorted(set(got.items()) ^ set(expected.items()))
+        print(f"  交易清单不同（缩减比例 {result['buy_scale']}）: {diff[:6]}")
+    model = CostModel()
+    for t in result["trades"]:
+        value = t["volume"] * t["price"]
+        cost = (max(value * model.commission_rate, model.min_commission) + value * model.transfer_fee
+                + t["volume"] * model.slippage + (value * model.stamp_duty if t["direction"] == "SELL" else 0))
+        if abs(cost - t["cost"]) > 1e-6:
+            failed += 1
+            print(f"  {t['stock_code']} 成本 {t['cost']} != {cost}")
+            break
+    if calls["order_stock_async"] or calls["get_full_tick"] != 1:
+        failed += 1
+        print(f"  dry_run 的接口调用: {_format(calls)}")
+    sells = sum(t["direction"] == "SELL" for t in result["trades"])
+    print(f"dry_run: 卖出 {sells} 笔、买入 {len(result['trades']) - sells} 笔，估算成本 {result['total_cost']:.2f} 元，"
+          f"{'通过' if not failed else '未通过'}")
+    return failed
+
+
+async def check_scaled(trader, codes):
+    from xtquantai.tools.account_detail import get_account_book
+    from xtquantai.tools.basket_order import rebalance_portfolio
+
+    failed = 0
+    targets = setup(trader, codes, 10_000.0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        book = get_account_book(ACCOUNT, resync=True)
+        result = await rebalance_portfolio(ACCOUNT, [{"stock_code": t["stock_code"], "weight": 0.98 / len(targets)}
+                                                     for t in targets], sell_unlisted=False, dry_run=True)
+    sell_cash = sum(t["amount"] - t["cost"] for t in result["trades"] if t["direction"] == "SELL")
+    buy_cash = sum(t["amount"] + t["cost"] for t in result["trades"] if t["direction"] == "BUY")
+    if not result["buy_scale"] < 1 or buy_cash > book.available + sell_cash + 1e-6:
+        failed += 1
+        print(f"  缩减比例 {result['buy_scale']}，买入 {buy_cash:.2f} > 可用 {book.available + sell_cash:.2f}")
+    print(f"资金不足: 买入缩减到 {result['buy_scale']:.3f}，买入加成本 {buy_cash:.0f} 元 ≤ 可用 "
+          f"{book.available + sell_cash:.0f} 元，{'通过' if not failed else '未通过'}")
+    return failed
+
+
+async def run_loop(targets):
+    """不用调仓工具时的做法：查询持仓后逐只调用 sell_stock / buy_stock"""
+    import xtquant.xtdata as xtdata
+    from xtquantai.tools.account_detail import buy_stock, get_account_info, get_account_positions, sell_stock
+
+    positions = await get_account_positions(ACCOUNT)
+    held = {p["stock_code"]: p["volume"] for p in positions["positions"]}
+    info = await get_account_info(ACCOUNT)
+    equity = info["account_info"]["available"] + sum(volume * xtdata.get_full_tick([code])[code]["lastPrice"] for code, volume in held.items())
+    weights = {t["stock_code"]: t["weight"] for t in targets}
+    for code in list(weights) + [code for code in held if code not in weights]:
+        price = xtdata.get_full_tick([code])[code]["lastPrice"]
+        delta = weights.get(code, 0.0) * equity / price - held.get(code, 0)
+        if delta < -100 or (code not in weights and held.get(code)):
+            await sell_stock(ACCOUNT, code, int(-delta) if code in weights else held[code])
+    for code in weights:
+        price = xtdata.get_full_tick([code])[code]["lastPrice"]
+        delta = weights[code] * equity / price - held.get(code, 0)
+        if delta >= 100:
+            await buy_stock(ACCOUNT, code, delta * price)
+
+
+async def check_execute(trader, codes):
+    from xtquantai.tools.account_detail import get_account_book
+    from xtquantai.tools.basket_order import rebalance_portfolio
+
+    failed = 0
+    targets = setup(trader, codes, 2_000_000.0)
+    fake_xtquant.CALL_COUNTS.clear()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await run_loop(targets)
+    loop_elapsed, loop_calls = time.perf_counter() - start, _calls()
+
+    targets = setup(trader, codes, 2_000_000.0)
+    before = {code: p["volume"] for code, p in trader.positions.items()}
+    with contextlib.redirect_stdout(io.StringIO()):
+        book = get_account_book(ACCOUNT, resync=True)
+        events = book.events
+        fake_xtquant.CALL_COUNTS.clear()
+        start = time.perf_counter()
+        result = await rebalance_portfolio(ACCOUNT, targets)
+        elapsed, calls = time.perf_counter() - start, _calls()
+        settled = _wait(lambda: book.events - events >= 3 * result["submitted"])
+    trades = result["trades"]
+    after = {code: p["volume"] for code, p in trader.positions.items()}
+    expected = dict(before)
+    for t in trades:
+        if t["status"] == "submitted":
+            sign = -1 if t["direction"] == "SELL" else 1
+            expected[t["stock_code"]] = expected.get(t["stock_code"], 0) + sign * t["volume"]
+    expected = {code: volume for code, volume in expected.items() if volume > 0}
+    sell_seqs = [t["seq"] for t in trades if t["direction"] == "SELL"]
+    buy_seqs = [t["seq"] for t in trades if t["direction"] == "BUY"]
+    if not settled or after != expected or result["failed"] or result["pending"]:
+        failed += 1
+        print(f"  回报完成 {settled}，失败 {result['failed']}，持仓差异 {sorted(set(after.items()) ^ set(expected.items()))[:5]}")
+    if sell_seqs and buy_seqs and max(sell_seqs) > min(buy_seqs):
+        failed += 1
+        print("  买入先于卖出提交")
+    if not result["sell_wait_ok"]:
+        failed += 1
+        print("  卖出委托未在等待时间内结束")
+    print(f"逐只 sell_stock / buy_stock: {loop_elapsed:.3f}s，{_format(loop_calls)}")
+    print(f"rebalance_portfolio: 卖出 {len(sell_seqs)} 笔、买入 {len(buy_seqs)} 笔 {elapsed:.3f}s，{_format(calls)}，"
+          f"{'通过' if not failed else '未通过'}")
+    return failed
+
+
+def check_wait():
+    from types import SimpleNamespace
+    from xtquant import xtconstant
+    from xtquantai.account_book import AccountBook
+    from xtquantai.tools.basket_order import _wait_for_sells
+
+    failed = 0
+    book = AccountBook(ACCOUNT)
+    book.seed(SimpleNamespace(cash=1000.0, available=1000.0), [SimpleNamespace(stock_code="600000.SH", volume=100,
+                                                                               can_use_volume=100)])
+    start = time.perf_counter()
+    ok = _wait_for_sells(book, 2000.0, [], 5)
+    empty_elapsed = time.perf_counter() - start
+    if ok or empty_elapsed > 0.1:
+        failed += 1
+        print(f"  没有卖出委托时等待 {empty_elapsed:.3f}s")
+
+    trade = SimpleNamespace(order_id=1, traded_id="t1", stock_code="600000.SH", traded_volume=100,
+                            traded_amount=1000.0, order_type=xtconstant.STOCK_SELL)
+    timer = threading.Timer(0.05, book.apply_trade, (trade,))
+    start = time.perf_counter()
+    timer.start()
+    ok = _wait_for_sells(book, 2000.0, [1], 5)
+    woken_elapsed = time.perf_counter() - start
+    if not ok or woken_elapsed > 1:
+        failed += 1
+        print(f"  回款后等待 {woken_elapsed:.3f}s，结果 {ok}")
+    print(f"等待卖出回款: 没有卖出委托 {empty_elapsed * 1000:.1f}ms，成交回报 50ms 后到达时等待 "
+          f"{woken_elapsed * 1000:.1f}ms，{'通过' if not failed else '未通过'}")
+    return failed
+
+
+async def main(args):
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    fake_xtquant.install(args.latency)
+    from xtquantai.tools.account_detail import get_trader_instance
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        trader = get_trader_instance()
+    codes = fake_xtquant._SECTORS["沪深300"][:args.names]
+    failed = await check_dry_run(trader, codes)
+    failed += await check_scaled(trader, codes)
+    failed += await check_execute(trader, codes)
+    failed += check_wait()
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.005, help="每次接口调用的模拟延迟（秒）")
+    parser.add_argument("--names", type=int, default=50, help="股票数")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(main(args)) else 0)
@@ -0,0 +1,77 @@
+"""
+板块索引基准测试
+对比旧的逐板块遍历建立股票->板块缓存，与持久化板块索引的冷构建、新进程内存映射加载、查询耗时，
+并用 xtdata 直接计算的集合校验 get_stock_sectors 和 query_sectors 的结果。
+
+    python benchmarks/bench_sector_index.py --latency 0.01
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+
+def _old_build(xtdata):
+    """旧实现：首次调用 get_stock_sectors 时逐个板块获取成分股"""
+    cache = {}
+    for sector in xtdata.get_sector_list():
+        for stock in xtdata.get_stock_list_in_sector(sector):
+            cache.setdefault(stock, []).append(sector)
+    return cache
+
+
+def main(args):
+    fake_xtquant.install(latency=args.latency)
+    root = os.path.join(tempfile.mkdtemp(prefix="xtquantai-cache-"), "sector_index")
+    import xtquant.xtdata as xtdata
+    from xtquantai.sector_index import SectorIndex
+
+    print(f"xtdata延迟 {args.latency * 1000:.0f}ms（成分股查询按 0.1 倍计），{len(fake_xtquant._SECTORS)} 个板块")
+    start = time.perf_counter()
+    old = _old_build(xtdata)
+    print(f"  旧缓存逐板块构建        {time.perf_counter() - start:8.3f}s（每次进程启动都要重建）")
+
+    start = time.perf_counter()
+    index = SectorIndex(root=root)
+    index.build()
+    print(f"  索引冷构建（并行）      {time.perf_counter() - start:8.3f}s")
+
+    calls = fake_xtquant.CALL_COUNTS.get("get_stock_list_in_sector", 0)
+    start = time.perf_counter()
+    reloaded = SectorIndex(root=root)
+    reloaded.sectors_of("600000.SH")
+    print(f"  新进程内存映射加载      {time.perf_counter() - start:8.3f}s")
+    assert fake_xtquant.CALL_COUNTS.get("get_stock_list_in_sector", 0) == calls
+
+    codes = list(old)[:: max(1, len(old) // 500)]
+    start = time.perf_counter()
+    for code in codes:
+        assert reloaded.sectors_of(code) == old[code], code
+    print(f"  get_stock_sectors       {(time.perf_counter() - start) / len(codes) * 1e6:8.1f}us/次（校验通过）")
+
+    members = {sector: set(xtdata.get_stock_list_in_sector(sector)) for sector in ("沪深300", "上证A股", "GN概念0003",
+                                                                                  "GN概念0100", "上证50")}
+    expected = (members["沪深300"] & members["上证A股"] & (members["GN概念0003"] | members["GN概念0100"])) - members["上证50"]
+    start = time.perf_counter()
+    result = reloaded.query(all_of=["沪深300", "上证A股"], any_of=["GN概念0003", "GN概念0100"], none_of=["上证50"])
+    elapsed = time.perf_counter() - start
+    assert result == sorted(expected, key=reloaded.get().code_ids.get)
+    print(f"  query_sectors           {elapsed * 1e6:8.1f}us（{len(result)} 个代码，校验通过）")
+
+    # 板块数据更新后后台重建，重建期间继续使用旧索引
+    reloaded.mark_sector_data_updated()
+    assert reloaded.sectors_of("600000.SH") == old["600000.SH"]
+    reloaded._refresh_thread.join()
+    assert not reloaded.stats()["stale"]
+    print("  板块数据更新后后台重建完成")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.01)
+    main(parser.parse_args())
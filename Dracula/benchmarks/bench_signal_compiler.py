@@ -0,0 +1,185 @@
+"""
+信号编译：化简、一致性检查与基准
+1. 化简：重复子表达式、交换律、镜像比较、函数别名和常数折叠后的节点数
+2. 一致性：在随机K线上把编译后的求值结果与直接在语法树上逐个运算求值（不去重、不折叠，复制在本文件中）比较，
+   NaN 与 NaN 视为相等；等价写法的信号得到相同的 canonical_hash 和同一个编译结果
+3. 基准：含重复子表达式的信号，编译后求值与逐树求值的耗时；编译缓存命中与重新编译的耗时
+4. 结构错误的信号：run_single_stock_backtest 直接返回错误，不调用 get_vba_func_result
+
+    python benchmarks/bench_signal_compiler.py --bars 1000000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+# 布林带和均线条件在多处重复书写
+REPEATED = """input:N(20,5,100,1);
+UP:MA(C,N)+2*STD(C,N);
+DN:MA(C,N)-2*STD(C,N);
+WIDTH:(MA(C,N)+2*STD(C,N)-(MA(C,N)-2*STD(C,N)))/MA(C,N);
+bk:CROSS(C,MA(C,N)-2*STD(C,N)) AND MA(C,N)>MA(C,60) AND V>MA(V,N);
+bp:CROSS(MA(C,N)+2*STD(C,N),C) OR MA(C,60)>MA(C,N) OR C<LLV(L,N)*1;
+"""
+
+# (信号, 等价写法)：两者应得到相同的 canonical_hash
+EQUIVALENT = [
+    ("bk:CROSS(MA(C,5),MA(C,20));bp:CROSS(MA(C,20),MA(C,5));",
+     "bk : cross( ma(close,5) , ma(CLOSE,20) ) ; // 注释\nbp:CROSS(MA(C,20),MA(C,5));"),
+    ("X:C+O;Y:C>O;", "X:O+C;Y:O<C;"),
+    ("X:EMA(C,12)*1+0;", "X:EXPMA(C,12);"),
+    ("X:MA(C,2*5);", "X:MA(C,10);"),
+    ("X:C*(1+ABS(-1)-2);", "X:C*0;"),
+]
+
+MALFORMED = [
+    "bk:CROSS(MA(C,5),MA(C,20);bp:0;",
+    "bk:C>;bp:0;",
+    "bk:C>O));bp:0;",
+    "input:N(5,1,100,1,2);bk:C>MA(C,N);bp:0;",
+]
+
+
+def random_bars(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = close * (1 + rng.normal(0, 0.003, n))
+    high = np.maximum(open_, close) * (1 + rng.random(n) * 0.01)
+    low = np.minimum(open_, close) * (1 - rng.random(n) * 0.01)
+    volume = rng.integers(1000, 100000, n).astype(np.float64)
+    return {"time": 1704072600000 + np.arange(n) * 60000, "open": open_, "high": high, "low": low,
+            "close": close, "volume": volume, "amount": volume * close}
+
+
+def tree_evaluate(source, bars, params=None):
+    """直接在语法树上求值：每次出现都重新计算，只有变量引用共享结果"""
+    from xtquantai.formula import FUNCTIONS, parse
+    from xtquantai.formula.compiler import FIELD_ALIASES, CompiledSignal
+    from xtquantai.formula.parser import Binary, Call, Name, Num, Unary
+
+    program = parse(source)
+    values = {spec.name: spec.default for spec in program.inputs}
+    values.update({k.upper(): float(v) for k, v in (params or {}).items()})
+    n = len(bars["close"])
+
+    def evaluate(expr):
+        if isinstance(expr, Num):
+            return expr.value
+        if isinstance(expr, Name):
+            if expr.name in values:
+                return values[expr.name]
+            return np.asarray(bars[FIELD_ALIASES[expr.name]], dtype=np.float64)
+        if isinstance(expr, Unary):
+            return CompiledSignal._apply_unary(expr.op, evaluate(expr.operand))
+        if isinstance(expr, Binary):
+            return CompiledSignal._apply_binary(expr.op, evaluate(expr.left), evaluate(expr.right))
+        return FUNCTIONS[expr.func][0](n, *(evaluate(arg) for arg in expr.args))
+
+    for statement in program.statements:
+        values[statement.name] = evaluate(statement.expr)
+    return {name: np.broadcast_to(np.asarray(values[name], dtype=np.float64), n)
+            for name in (statement.name for statement in program.statements)}
+
+
+def same(a, b):
+    return np.allclose(a, b, rtol=1e-12, atol=1e-12, equal_nan=True)
+
+
+def check():
+    from xtquantai.formula import clear_signal_cache, compile_signal
+
+    failed = 0
+    bars = random_bars(5000)
+    clear_signal_cache()
+    compiled = compile_signal(REPEATED)
+    stats = compiled.stats
+    print(f"化简: {stats['expressions']} 个运算 -> {stats['operations']} 个运算节点，"
+          f"复用 {stats['shared']} 次，折叠 {stats['folded']} 个")
+
+    signals = [REPEATED] + [source for pair in EQUIVALENT for source in pair]
+    for source in signals:
+        for params in ((None, {"N": 7}) if "input" in source else (None,)):
+            got = compile_signal(source).evaluate(bars, params)
+            expected = tree_evaluate(source, bars, params)
+            for name, values in expected.items():
+                if not same(got[name], values):
+                    failed += 1
+                    print(f"  {source.splitlines()[0]!r} 的 {name} 与逐树求值不同")
+
+    for a, b in EQUIVALENT:
+        if compile_signal(a) is not compile_signal(b):
+            failed += 1
+            print(f"  {a!r} 与 {b!r} 没有共享编译结果")
+    print(f"一致性: {'通过' if not failed else f'{failed} 处不一致'}")
+    return failed
+
+
+def bench(rows):
+    from xtquantai.formula import clear_signal_cache, compile_signal, signal_cache_info
+
+    bars = random_bars(rows)
+    compiled = compile_signal(REPEATED)
+    for label, run in (("逐树求值", lambda: tree_evaluate(REPEATED, bars)),
+                       ("编译后求值", lambda: compiled.evaluate(bars))):
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        print(f"{label}: {rows} 根K线 {best:.3f}s")
+
+    repeats = 2000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        clear_signal_cache()
+        compile_signal(REPEATED)
+    cold = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    for _ in range(repeats):
+        compile_signal(REPEATED)
+    warm = (time.perf_counter() - start) / repeats
+    print(f"编译: 重新编译 {cold * 1e6:.0f}us，缓存命中 {warm * 1e6:.1f}us，{signal_cache_info()}")
+
+
+async def check_malformed():
+    from xtquantai.tools.single_stock_backtest import run_single_stock_backtest
+
+    failed = 0
+    fake_xtquant.CALL_COUNTS.clear()
+    for source in MALFORMED:
+        for engine in ("auto", "vba"):
+            result = await run_single_stock_backtest("600000.SH", source, engine=engine)
+            if "error" not in result:
+                failed += 1
+                print(f"  {source!r}（{engine}）没有返回错误")
+    calls = fake_xtquant.CALL_COUNTS.get("get_vba_func_result", 0)
+    if calls:
+        failed += 1
+    print(f"结构错误: {len(MALFORMED)} 个信号，get_vba_func_result 调用 {calls} 次，"
+          f"{'通过' if not failed else '未通过'}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=1_000_000, help="基准的K线数")
+    args = parser.parse_args()
+
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    fake_xtquant.install(0.0)
+    failed = check()
+    failed += asyncio.run(check_malformed())
+    bench(args.bars)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
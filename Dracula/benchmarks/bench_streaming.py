@@ -0,0 +1,153 @@
+"""
+信号增量计算：一致性检查与基准
+1. 一致性：在含 NaN 的随机K线上逐根调用 StreamingSignal.update，与 CompiledSignal.evaluate 的整段结果逐点比较，
+   覆盖 MA/EMA/SMA/DMA/SUM/HHV/LLV/REF/CROSS/BARSLAST、运算符、逐元素函数、时间字段和 N 为 0 的累计形式；
+   中途 pickle 保存再恢复后继续更新，结果不变
+2. 基准：已有 1 千 / 1 万 / 10 万根历史时，增量更新一根的耗时（应与历史长度无关），以及整段重新计算的耗时
+3. update_live_signal：预热后模拟新增K线，只计算新增的部分，最新值与整段计算相同；
+   两根K线之间再次轮询时没有新增周期，latest 仍是上一次的最新值
+
+    python benchmarks/bench_streaming.py
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+CASES = [
+    "input:N(5,1,100,1);A:MA(C,N);B:SUM(V,N);B0:SUM(C,0);",
+    "A:EMA(C,12);B:EXPMA(C,26);D:SMA(C,9,2);E:DMA(C,0.3);",
+    "A:HHV(H,20);B:LLV(L,20);A0:HHV(H,0);B0:LLV(L,0);",
+    "A:REF(C,1);B:REF(C,10);R0:REF(C,0);",
+    "bk:CROSS(MA(C,5),MA(C,20));bp:CROSS(MA(C,20),MA(C,5));",
+    "A:BARSLAST(C>REF(C,1));B:BARSLAST(CROSS(C,MA(C,10)));",
+    "A:IF(C>O,MAX(C,O),MIN(C,O)-ABS(C-O));B:NOT(C>O) OR BETWEEN(C,L,H);D:SQRT(ABS(C-O))/(H-L);",
+    "A:C/0;B:-C*2+O;T:TIME;D:DATE;P:BARPOS;Y:YEAR;",
+    # KDJ
+    "input:N(9,1,100,1);RSV:=(C-LLV(L,N))/(HHV(H,N)-LLV(L,N))*100;K:SMA(RSV,3,1);D:SMA(K,3,1);J:3*K-2*D;",
+    # MACD
+    "DIF:EMA(C,12)-EMA(C,26);DEA:EMA(DIF,9);MACD:(DIF-DEA)*2;bk:CROSS(DIF,DEA);bp:CROSS(DEA,DIF);",
+]
+
+LIVE_SIGNAL = "input:N1(5,1,100,1);input:N2(20,1,200,1);MA1:=MA(C,N1);MA2:=MA(C,N2);" \
+              "bk:CROSS(MA1,MA2);bp:CROSS(MA2,MA1);"
+
+
+def random_bars(n, seed=5, nan_ratio=0.02):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = close * (1 + rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * (1 + rng.random(n) * 0.01)
+    low = np.minimum(open_, close) * (1 - rng.random(n) * 0.01)
+    volume = rng.integers(1000, 100000, n).astype(np.float64)
+    for values in (close, high, low, volume):
+        values[rng.random(n) < nan_ratio] = np.nan
+    return {"time": 1704072600000 + np.arange(n) * 60000, "open": open_, "high": high, "low": low,
+            "close": close, "volume": volume, "amount": volume * close}
+
+
+def check(rows):
+    from xtquantai.formula import StreamingSignal, compile_signal
+
+    failed = 0
+    bars = random_bars(rows)
+    for source in CASES:
+        compiled = compile_signal(source)
+        params = {"N": 7} if "input" in source else None
+        expected = compiled.evaluate(bars, params)
+        stream = StreamingSignal(compiled, params)
+        half = rows // 2
+        first = stream.run({field: values[:half] for field, values in bars.items()})
+        stream = pickle.loads(pickle.dumps(stream))
+        second = stream.run({field: values[half:] for field, values in bars.items()})
+        for name, values in expected.items():
+            got = np.concatenate([first[name], second[name]])
+            if not np.allclose(got, values, rtol=1e-10, atol=1e-10, equal_nan=True):
+                failed += 1
+                bad = int(np.flatnonzero(~np.isclose(got, values, rtol=1e-10, atol=1e-10, equal_nan=True))[0])
+                print(f"  {source[:40]!r} 的 {name} 第 {bad} 根: 增量 {got[bad]} != 整段 {values[bad]}")
+    print(f"一致性: {len(CASES)} 个信号，{rows} 根K线，{'通过' if not failed else f'{failed} 处不一致'}")
+    return failed
+
+
+def bench():
+    from xtquantai.formula import StreamingSignal, compile_signal
+
+    source = CASES[-1]
+    compiled = compile_signal(source)
+    updates = 2000
+    for history in (1_000, 10_000, 100_000):
+        bars = random_bars(history + updates, seed=9, nan_ratio=0)
+        stream = StreamingSignal(compiled)
+        stream.run({field: values[:history] for field, values in bars.items()})
+        rows = [{"close": float(c), "time": int(t)} for c, t in zip(bars["close"][history:], bars["time"][history:])]
+        start = time.perf_counter()
+        for row in rows:
+            stream.update(row)
+        incremental = (time.perf_counter() - start) / updates
+        window = {field: values[:history + 1] for field, values in bars.items()}
+        start = time.perf_counter()
+        for _ in range(20):
+            compiled.evaluate(window)
+        batch = (time.perf_counter() - start) / 20
+        print(f"历史 {history:>7} 根: 增量更新一根 {incremental * 1e6:6.1f}us，整段重新计算 {batch * 1e3:7.2f}ms")
+
+
+async def check_live():
+    from xtquantai.formula import compile_signal
+    from xtquantai.tools.design_signal import update_live_signal
+    from xtquantai.tools.market_data import load_kline
+
+    failed = 0
+    code, period = "600000.SH", "1m"
+    first = await update_live_signal(code, LIVE_SIGNAL, period, warmup=-1)
+    fake_xtquant.BAR_COUNT += 30
+    fake_xtquant.CALL_COUNTS.clear()
+    start = time.perf_counter()
+    second = await update_live_signal(code, LIVE_SIGNAL, period)
+    elapsed = time.perf_counter() - start
+    compiled = compile_signal(LIVE_SIGNAL)
+    bars = load_kline(code, sorted(compiled.fields | {"time"}), period, "", "", -1, "none")
+    expected = compiled.evaluate({field: values[:-1] for field, values in bars.items()}, None, ["BK", "BP"])
+    if not first["warmed_up"] or second["warmed_up"] or len(second["time"]) != 30:
+        failed += 1
+        print(f"  预热 {first['warmed_up']} / {second['warmed_up']}，新增 {len(second['time'])} 根（应为 30）")
+    for name in ("BK", "BP"):
+        if not np.allclose(second["values"][name], expected[name][-30:]):
+            failed += 1
+            print(f"  {name} 与整段计算不同")
+    third = await update_live_signal(code, LIVE_SIGNAL, period)
+    if third["time"] or third["latest"] != second["latest"] or third["signals"] != second["signals"] \
+            or third["latest_time"] != second["time"][-1]:
+        failed += 1
+        print(f"  没有新K线时 latest {third['latest']}，上一次 {second['latest']}")
+    print(f"update_live_signal: 预热 {first['processed']} 根，新增 {len(second['time'])} 根 "
+          f"{elapsed * 1e3:.1f}ms（get_market_data_ex_ori {fake_xtquant.CALL_COUNTS.get('get_market_data_ex_ori', 0)} 次），"
+          f"{'通过' if not failed else '未通过'}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="一致性检查的K线数")
+    args = parser.parse_args()
+
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    fake_xtquant.install(0.0)
+    failed = check(args.rows)
+    failed += asyncio.run(check_live())
+    bench()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
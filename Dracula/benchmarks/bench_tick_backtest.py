@@ -0,0 +1,120 @@
+"""
+分笔回放回测：一致性检查与基准
+1. 一致性：在几天的模拟分笔上，把 tick_backtest 的成交与逐笔循环的参考实现（复制在本文件中）比较：
+   逐笔维护持仓和挂起的委托，有对手盘时按卖一价买入、按买一价卖出
+2. 按盘口成交的收益不高于按最新价成交的收益（价差成本为正）
+3. 基准：一整年的分笔（约 120 万笔），第一次（生成模拟数据并写入K线缓存）和第二次（从缓存读取）的耗时
+
+    python benchmarks/bench_tick_backtest.py --days 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+SIGNAL = "input:N1(200,1,2000,1);\ninput:N2(1200,1,5000,1);\nMA1:=MA(C,N1);\nMA2:=MA(C,N2);\n" \
+         "bk:CROSS(MA1,MA2);\nbp:CROSS(MA2,MA1);"
+
+
+def reference_fills(bk, bp, ask, bid, delay):
+    """逐笔循环的参考实现：返回 [(买入笔, 卖出笔或 -1)]
+
+    逐笔先按信号更新持仓状态并把委托排入队列（最早在 i+delay 笔成交），再按顺序撮合队首的委托：
+    买入要求卖一有挂单，卖出要求买一有挂单且晚于对应的买入；平仓委托生效时仍未买入的交易不成交
+    """
+    holding = False
+    queue = []
+    position = None
+    fills = []
+    for i in range(len(ask)):
+        if not holding and bk[i] and not bp[i]:
+            holding = True
+            queue.append(("buy", i + delay))
+        elif holding and bp[i]:
+            holding = False
+            queue.append(("sell", i + delay))
+        while queue and i >= queue[0][1]:
+            side = queue[0][0]
+            if side == "buy" and not np.isnan(ask[i]):
+                position = i
+            elif side == "sell" and i > position and not np.isnan(bid[i]):
+                fills.append((position, i))
+                position = None
+            else:
+                break
+            queue.pop(0)
+        # 平仓委托生效时仍未买入（包括排在上一笔的卖出之后）：错过开仓，撤销这一对开平仓委托
+        j = 1 if queue and queue[0][0] == "sell" else 0
+        if len(queue) >= j + 2 and i >= queue[j + 1][1]:
+            del queue[j:j + 2]
+    if position is not None:
+        fills.append((position, -1))
+    return fills
+
+
+def check(days):
+    from xtquantai.tick_replay import run_tick_backtest, tick_series
+    from xtquantai.formula import compile_signal
+
+    failed = 0
+    ticks = fake_xtquant._ticks("600000.SH", "20240102", "", days * fake_xtquant._TICKS_PER_DAY)
+    ticks = {field: values[:days * fake_xtquant._TICKS_PER_DAY] for field, values in ticks.items()}
+    series = tick_series(ticks)
+    values = compile_signal(SIGNAL).evaluate(series, {"N1": 60, "N2": 300}, ["BK", "BP"])
+    for delay in (0, 1, 5):
+        result = run_tick_backtest(SIGNAL, ticks, {"N1": 60, "N2": 300}, delay)
+        expected = reference_fills(values["BK"], values["BP"], series["ask"], series["bid"], delay)
+        trades = result["trades"]
+        times = series["time"]
+        got = [(int(np.searchsorted(times, entry)), int(np.searchsorted(times, exit_)) if exit_ else -1)
+               for entry, exit_ in zip(trades["entry_time"], trades["exit_time"])]
+        if got != expected:
+            failed += 1
+            mismatch = next((i for i, (a, b) in enumerate(zip(got, expected)) if a != b), min(len(got), len(expected)))
+            print(f"  delay={delay}: 成交与参考实现不同（{len(got)} / {len(expected)} 笔），第 {mismatch} 笔")
+        summary = result["summary"]
+        if summary["交易次数"] and summary["价差成本"] <= 0:
+            failed += 1
+            print(f"  delay={delay}: 价差成本 {summary['价差成本']:.3f} 不为正")
+        print(f"  delay={delay}: {summary['交易次数']} 笔交易，总收益率 {summary['总收益率']:.2f}%，"
+              f"按最新价成交 {summary['最新价成交收益率']:.2f}%，价差成本 {summary['价差成本']:.2f}%")
+    print(f"一致性: {'通过' if not failed else f'{failed} 处不一致'}")
+    return failed
+
+
+async def bench():
+    from xtquantai.tools.tick_backtest import run_tick_backtest_tool
+
+    for label in ("第一次（生成并写入缓存）", "第二次（读取缓存）"):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = await run_tick_backtest_tool("600000.SH", SIGNAL, "20240101093000", "20241231150000")
+        elapsed = time.perf_counter() - start
+        summary = result["summary"]
+        print(f"{label}: {summary['分笔数']} 笔，{summary['交易次数']} 笔交易，{elapsed:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=5, help="一致性检查使用的交易日数")
+    args = parser.parse_args()
+
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    fake_xtquant.install(0.0)
+    failed = check(args.days)
+    asyncio.run(bench())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+交易连接会话基准
+1. 对比旧实现（每次查询前 connect + subscribe + 测试查询，每笔委托前 connect + subscribe）与交易会话
+   （连接一次、订阅一次后复用）在一串查询和委托中的交易接口调用次数和耗时
+2. 断线重连：模拟 on_disconnected 以及之后的连接失败，检查会话在后台按退避重连、重新订阅账户，
+   重连期间的请求直接报错；已丢弃的交易实例的断开通知被忽略；连接交易服务器耗时较长时，
+   重连期间查询会话状态、请求报错都不等待连接完成（连接不持有会话锁）
+
+    python benchmarks/bench_trader_session.py --latency 0.005 --orders 50
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+
+ACCOUNT = "fake"
+# 重连检查中成功的那次连接的耗时（秒）
+SLOW_CONNECT = 0.3
+CODES = ["600000.SH", "000001.SZ", "600519.SH", "300750.SZ", "601318.SH"]
+TRADER_CALLS = ("connect", "subscribe", "query_stock_asset", "query_stock_positions", "order_stock_async")
+
+
+def _calls():
+    return {name: fake_xtquant.CALL_COUNTS.get(name, 0) for name in TRADER_CALLS}
+
+
+def _format(calls):
+    return "，".join(f"{name} {count}" for name, count in calls.items() if count)
+
+
+def run_old(orders, queries):
+    """旧实现的调用顺序（复制自改动前的 connect_trader / get_trade_detail_data / place_order）"""
+    from xtquant import xtconstant
+    from xtquant.xttrader import XtQuantTrader
+    from xtquant.xttype import StockAccount
+
+    trader = XtQuantTrader("userdata", int(time.time()))
+    trader.start()
+    acc = StockAccount(ACCOUNT, "STOCK")
+    for i in range(queries):
+        trader.connect()
+        trader.subscribe(acc)
+        trader.query_stock_asset(acc)
+        if i % 2:
+            trader.query_stock_positions(acc)
+        else:
+            trader.query_stock_asset(acc)
+    for i in range(orders):
+        trader.connect()
+        trader.subscribe(acc)
+        trader.order_stock_async(acc, CODES[i % len(CODES)], xtconstant.STOCK_BUY, 100,
+                                 xtconstant.LATEST_PRICE, 0, "", "")
+
+
+def run_new(orders, queries):
+    from xtquantai.tools.account_detail import get_trade_detail_data, place_order
+
+    for i in range(queries):
+        get_trade_detail_data(ACCOUNT, "stock", "position" if i % 2 else "account")
+    for i in range(orders):
+        place_order(ACCOUNT, CODES[i % len(CODES)], "buy", 100)
+
+
+def compare(orders, queries):
+    # 先导入工具模块，导入耗时不计入对比
+    import xtquantai.tools.account_detail  # noqa: F401
+
+    results = {}
+    for label, run in (("旧实现", run_old), ("交易会话", run_new)):
+        fake_xtquant.CALL_COUNTS.clear()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(orders, queries)
+        elapsed = time.perf_counter() - start
+        results[label] = calls = _calls()
+        print(f"{label}: {queries} 次查询 + {orders} 笔委托 {elapsed:.3f}s，"
+              f"共 {sum(calls.values())} 次交易接口调用（{_format(calls)}）")
+    new = results["交易会话"]
+    # 交易会话只在第一次使用时连接、订阅一次
+    failed = int(new["connect"] > 1 or new["subscribe"] > 1 or new["order_stock_async"] != orders
+                 or new["query_stock_asset"] + new["query_stock_positions"] != queries)
+    print(f"调用次数: {'通过' if not failed else '未通过'}")
+    return failed
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+async def check_reconnect():
+    from xtquant.xttrader import XtQuantTrader
+    from xtquantai.tools.account_detail import get_account_info, get_trader_session
+    from xtquantai.trader_session import TraderConnectionError
+
+    failed = 0
+    session = get_trader_session()
+    session.reconnect_base = 0.02
+    with contextlib.redirect_stdout(io.StringIO()):
+        session.ensure(ACCOUNT, "STOCK")
+        session.ensure("fake2", "STOCK")
+    before = session.stats()
+    old_callback, old_session_id = session.callback, session.session_id
+
+    # 断开后的前两次连接失败，第三次连接耗时 SLOW_CONNECT 秒
+    failures = [2]
+    connect = XtQuantTrader.connect
+    connecting = threading.Event()
+
+    def flaky_connect(self):
+        if failures[0] > 0:
+            failures[0] -= 1
+            fake_xtquant.CALL_COUNTS["connect"] = fake_xtquant.CALL_COUNTS.get("connect", 0) + 1
+            return -1
+        connecting.set()
+        time.sleep(SLOW_CONNECT)
+        return connect(self)
+
+    XtQuantTrader.connect = flaky_connect
+    fake_xtquant.CALL_COUNTS.clear()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            old_callback.on_disconnected()
+            try:
+                session.ensure(ACCOUNT, "STOCK")
+                failed += 1
+                print("  断开后立即请求没有报错")
+            except TraderConnectionError:
+                pass
+            connecting.wait(5)
+            blocked = time.perf_counter()
+            session.stats()
+            try:
+                session.ensure(ACCOUNT, "STOCK")
+            except TraderConnectionError:
+                pass
+            blocked = time.perf_counter() - blocked
+            restored = _wait(lambda: session.stats()["reconnects"] > before["reconnects"])
+    finally:
+        XtQuantTrader.connect = connect
+    elapsed = time.perf_counter() - start
+    after = session.stats()
+    calls = _calls()
+    if not restored or not after["connected"] or sorted(after["accounts"]) != [ACCOUNT, "fake2"]:
+        failed += 1
+        print(f"  重连后的状态不对: {after}")
+    if blocked > SLOW_CONNECT / 2:
+        failed += 1
+        print(f"  重连期间查询会话状态等待了 {blocked * 1e3:.0f}ms（连接耗时 {SLOW_CONNECT * 1e3:.0f}ms）")
+    if session.session_id == old_session_id or calls["connect"] != 3 or calls["subscribe"] != 2:
+        failed += 1
+        print(f"  会话ID {old_session_id} -> {session.session_id}，{_format(calls)}（应为 connect 3，subscribe 2）")
+
+    # 重连后直接复用，不再连接或订阅
+    fake_xtquant.CALL_COUNTS.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        info = await get_account_info(ACCOUNT)
+        # 已丢弃的交易实例的断开通知不影响当前连接
+        old_callback.on_disconnected()
+    calls = _calls()
+    if not info.get("success") or calls["connect"] or calls["subscribe"] or not session.connected:
+        failed += 1
+        print(f"  重连后查询: {info.get('message')}，{_format(calls)}，connected={session.connected}")
+    failed += check_stop_during_reconnect(session)
+    print(f"断线重连: 2 次连接失败后 {elapsed * 1e3:.0f}ms 恢复，重新订阅 {len(after['accounts'])} 个账户，"
+          f"连接期间查询状态 {blocked * 1e3:.1f}ms，{'通过' if not failed else '未通过'}")
+    return failed
+
+
+def check_stop_during_reconnect(session):
+    """重连连接期间 stop()：新连接不被使用并被停止，会话保持停止状态
+
+    重连开始时没有交易实例（已停止的会话收到断开通知），stop() 之后交易实例仍为 None，不能只按实例判断
+    """
+    from xtquant.xttrader import XtQuantTrader
+
+    failed = 0
+    connect, stop = XtQuantTrader.connect, XtQuantTrader.stop
+    connecting = threading.Event()
+    opened, stopped = [], []
+
+    def slow_connect(self):
+        opened.append(self)
+        connecting.set()
+        time.sleep(SLOW_CONNECT)
+        return connect(self)
+
+    def recording_stop(self):
+        stopped.append(self)
+        return stop(self)
+
+    XtQuantTrader.connect, XtQuantTrader.stop = slow_connect, recording_stop
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            session.stop()
+            session.on_disconnected()
+            connecting.wait(5)
+            session.stop()
+            finished = _wait(lambda: opened and opened[-1] in stopped)
+            time.sleep(SLOW_CONNECT)
+    finally:
+        XtQuantTrader.connect, XtQuantTrader.stop = connect, stop
+    stats = session.stats()
+    if not finished or session.trader is not None or stats["connected"] or stats["reconnecting"] or stats["accounts"]:
+        failed += 1
+        print(f"  重连期间停止会话后状态不对: {stats}，trader={session.trader}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.005, help="每次交易接口调用的模拟延迟（秒）")
+    parser.add_argument("--orders", type=int, default=50, help="委托笔数")
+    parser.add_argument("--queries", type=int, default=20, help="查询次数")
+    args = parser.parse_args()
+
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    fake_xtquant.install(args.latency)
+    failed = compare(args.orders, args.queries)
+    failed += asyncio.run(check_reconnect())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+滚动窗口样本外回测：一致性检查与基准
+1. 一致性：
+   - 测试段首尾相接，覆盖第一个训练段之后的全部K线
+   - 每个窗口选出的参数等于在训练段上逐组调用 run_template_backtest 得到的最优组合
+   - 测试段汇总指标等于在 训练段+测试段 上屏蔽测试段之前的信号后运行模板的结果
+   - 拼接曲线逐段连续，总收益率等于各测试段收益之和
+2. 基准：逐窗口串行寻优与 run_walk_forward_backtest（窗口并行）的耗时
+
+    python benchmarks/bench_walkforward.py --bars 2500 --workers 8
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_xtquant
+from bench_optimize import SIGNAL, synthetic_bars
+
+RANGES = {"N1": [2, 20, 3], "N2": [10, 60, 10]}
+
+
+def reference_best(bars, start, stop):
+    from xtquantai.backtest import run_template_backtest, template_summary
+
+    window = {field: values[start:stop] for field, values in bars.items()}
+    best = None
+    for n1 in np.arange(2, 21, 3):
+        for n2 in np.arange(10, 61, 10):
+            if n1 >= n2:
+                continue
+            summary = template_summary(run_template_backtest(SIGNAL, window, params={"N1": n1, "N2": n2}))
+            if best is None or summary["收益回撤比"] > best[1]["收益回撤比"]:
+                best = ({"N1": float(n1), "N2": float(n2)}, summary)
+    return best
+
+
+def check(bars, train_bars, test_bars, anchored):
+    from xtquantai.backtest import template_backtest
+    from xtquantai.formula import compile_signal
+    from xtquantai.walk_forward import run_walk_forward, walk_forward_windows
+
+    n = len(bars["close"])
+    windows = walk_forward_windows(n, train_bars, test_bars, anchored)
+    result = run_walk_forward(SIGNAL, bars, train_bars, test_bars, anchored,
+                              optimize={"ranges": RANGES, "constraint": "N1<N2"})
+    failed = 0
+    tests = [index for _, _, start, stop in windows for index in range(start, stop)]
+    if tests != list(range(train_bars, n)) or not np.array_equal(result["curve"]["time"], bars["time"][train_bars:]):
+        failed += 1
+        print("  测试段没有首尾相接覆盖训练段之后的K线")
+
+    compiled = compile_signal(SIGNAL)
+    carry = 0.0
+    for (train_start, train_end, test_start, test_end), report in zip(windows, result["windows"]):
+        params, train_summary = reference_best(bars, train_start, train_end)
+        if report["params"] != params or report["train_summary"] != train_summary:
+            failed += 1
+            print(f"  窗口 {report['window']} 参数不一致: {report['params']} != {params}")
+
+        # 在整段上运行模板，测试段之前的信号全部屏蔽
+        segment = {field: values[train_start:test_end] for field, values in bars.items()}
+        values = compiled.evaluate(segment, params, ["BK", "BP"])
+        live = np.arange(test_end - train_start) >= test_start - train_start
+        columns = template_backtest(segment["close"], values["BK"] * live, values["BP"] * live)
+        strategy = np.nan_to_num(columns["策略收益"])[live]
+        drawdown = float(np.max(np.maximum.accumulate(strategy) - strategy))
+        trades = columns["交易次数"][-1]
+        expected = {
+            "总收益率": strategy[-1],
+            "最大回撤": drawdown,
+            "胜率": columns["胜率"][-1] if trades else 0.0,
+            "交易次数": trades,
+            "收益回撤比": strategy[-1] / drawdown if drawdown else 0.0,
+        }
+        got = report["test_summary"]
+        if any(not np.isclose(got[k], v, rtol=1e-12, atol=1e-12) for k, v in expected.items()):
+            failed += 1
+            print(f"  窗口 {report['window']} 测试段指标不一致: {got} != {expected}")
+        piece = result["curve"]["策略收益"][result["curve"]["window"] == report["window"]]
+        if not np.allclose(piece, strategy + carry, rtol=0, atol=1e-9):
+            failed += 1
+            print(f"  窗口 {report['window']} 拼接曲线不一致")
+        carry += got["总收益率"]
+
+    if not np.isclose(result["summary"]["总收益率"], carry, rtol=1e-12, atol=1e-9):
+        failed += 1
+        print(f"  总收益率 {result['summary']['总收益率']} != 各段之和 {carry}")
+    mode = "锚定" if anchored else "滚动"
+    print(f"一致性（{mode}，训练 {train_bars} / 测试 {test_bars}）: {len(windows)} 个窗口，"
+          f"{'通过' if not failed else f'{failed} 处不一致'}")
+    return failed
+
+
+async def _call(handle_call_tool, name, arguments):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await handle_call_tool(None, name, arguments)
+
+
+async def bench_tool(n, latency, train_bars, test_bars):
+    fake_xtquant.set_latency(latency)
+    from xtquantai.server import handle_call_tool
+
+    ranges = {"N1": [2, 30, 2], "N2": [20, 120, 5]}
+    arguments = {"stock_code": "600000.SH", "signal": SIGNAL, "start_time": "", "end_time": "", "count": n,
+                 "train_bars": train_bars, "test_bars": test_bars, "ranges": ranges, "constraint": "N1<N2"}
+    windows = (n - train_bars + test_bars - 1) // test_bars
+
+    # 串行：逐窗口调用 optimize_signal_params，训练段长度与滚动窗口相同
+    start = time.perf_counter()
+    for i in range(windows):
+        blocks = await _call(handle_call_tool, "optimize_signal_params", {
+            "stock_code": "600000.SH", "signal": SIGNAL, "start_time": "", "end_time": "",
+            "count": train_bars, "ranges": ranges, "constraint": "N1<N2", "top": 1})
+        json.loads(blocks[0].text)
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blocks = await _call(handle_call_tool, "run_walk_forward_backtest", arguments)
+    elapsed = time.perf_counter() - start
+    result = json.loads(blocks[0].text)
+    summary = result["summary"]
+    efficiency = result["efficiency"]
+    print(f"工具: {windows} 个窗口，逐窗口调用 optimize_signal_params {serial:.2f}s，"
+          f"run_walk_forward_backtest {elapsed:.2f}s（{serial / elapsed:.1f}x）")
+    print(f"  样本外 总收益率 {summary['总收益率']:.2f} 最大回撤 {summary['最大回撤']:.2f} "
+          f"交易次数 {summary['交易次数']}，效率 {'-' if efficiency is None else f'{efficiency:.2f}'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=2500)
+    parser.add_argument("--train", type=int, default=500, help="训练段K线数")
+    parser.add_argument("--test", type=int, default=250, help="测试段K线数")
+    parser.add_argument("--workers", type=int, default=0, help="cpu 进程池大小，0 为 CPU 核数")
+    parser.add_argument("--latency", type=float, default=0.01, help="模拟 xtdata 调用延迟（秒）")
+    args = parser.parse_args()
+
+    if args.workers:
+        os.environ["XTQUANTAI_CPU_WORKERS"] = str(args.workers)
+    fake_xtquant.install(args.latency)
+    os.environ.setdefault("XTQUANTAI_CACHE_DIR", tempfile.mkdtemp(prefix="xtquantai-cache-"))
+    from xtquantai.executor import CPU_WORKERS
+    print(f"cpu 进程池: {CPU_WORKERS} 个进程（本机 {os.cpu_count()} 核）")
+
+    bars = synthetic_bars(min(args.bars, 1500))
+    failed = check(bars, 400, 150, False) + check(bars, 400, 150, True)
+    asyncio.run(bench_tool(args.bars, args.latency, args.train, args.test))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,560 @@
+"""
+xtquant 替身模块
+QMT 只能在 Windows 下运行，为了在 Linux 上测量服务器的并发/吞吐表现，
+这里提供一个带人工延迟的 xtquant 替身（xtdata / xttrader / xttype / xtconstant），
+返回确定性的合成数据。在导入 xtquantai 之前调用 install() 即可。
+
+    import fake_xtquant
+    fake_xtquant.install(latency=0.05)
+    import xtquantai
+"""
+import sys
+import threading
+import time
+import types
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+# 每次 xtdata 调用的人工延迟（秒）
+LATENCY = 0.05
+
+# 调用计数，供基准测试统计实际打到 xtdata 的次数
+CALL_COUNTS: Dict[str, int] = {}
+
+# 每个代码当前可用的K线根数，增大它可模拟新K线产生
+BAR_COUNT = 5000
+
+# 已下载到本地的数据 {(code, period): K线根数}，供 get_local_data 使用
+LOCAL_DATA: Dict[tuple, int] = {}
+
+# 模拟下载失败 {code: 剩余失败次数}，每次下载该代码时先失败这么多次
+DOWNLOAD_FAILURES: Dict[str, int] = {}
+
+# 复权因子，修改它可模拟除权导致的历史价格变化（仅对 dividend_type 不为 none 的请求生效）
+ADJUST_FACTOR = 1.0
+
+_DAY_MS = 86400000
+_BASE_TIME_MS = 1262275200000  # 2010-01-01 00:00:00 UTC+8
+
+
+def _parse_time(value, end=False):
+    digits = "".join(c for c in str(value or "") if c.isdigit())
+    if not digits:
+        return None
+    if len(digits) <= 8:
+        digits = digits.ljust(8, "0") + ("235959" if end else "000000")
+    import datetime
+    dt = datetime.datetime.strptime(digits.ljust(14, "0")[:14], "%Y%m%d%H%M%S")
+    dt = dt.replace(tzinfo=datetime.timezone(datetime.timedelta(hours=8)))
+    return int(dt.timestamp() * 1000)
+
+
+def _sleep(name: str, scale: float = 1.0) -> None:
+    CALL_COUNTS[name] = CALL_COUNTS.get(name, 0) + 1
+    if LATENCY > 0:
+        time.sleep(LATENCY * scale)
+
+
+def _seed(code: str) -> int:
+    return zlib.crc32(code.encode("utf-8"))
+
+
+# 分笔：每个交易日 4800 笔（9:30-11:30、13:00-15:00 每 3 秒一笔），周末没有数据
+_TICKS_PER_DAY = 4800
+_SESSION_OFFSETS_MS = np.concatenate([
+    (9 * 3600 + 30 * 60) * 1000 + np.arange(2400, dtype=np.int64) * 3000,
+    13 * 3600 * 1000 + np.arange(2400, dtype=np.int64) * 3000,
+])
+
+# 未指定结束时间时分笔数据的最后一天（2024-12-31）
+_TICK_LAST_DAY = 5478
+
+
+def _tick_day(code: str, day: int) -> Dict[str, np.ndarray]:
+    """第 day 天（从 2010-01-01 起）的确定性分笔数据，五档盘口；偶尔出现卖盘全空（涨停）的快照"""
+    n = _TICKS_PER_DAY
+    rng = np.random.default_rng([_seed(code), day])
+    level = 10.0 * np.exp(0.15 * np.sin(day / 23.0) + 0.1 * np.sin(day / 7.0))
+    last = np.round(level * np.exp(np.cumsum(rng.normal(0, 0.0006, n))), 2)
+    ask1 = np.round(last + 0.01 * (rng.random(n) < 0.5), 2)
+    bid1 = np.round(ask1 - 0.01 * (1 + (rng.random(n) < 0.3)), 2)
+    depth = 0.01 * np.arange(5)
+    ask = ask1[:, None] + depth
+    bid = bid1[:, None] - depth
+    ask[rng.random(n) < 0.002] = 0.0
+    traded = rng.integers(0, 50, n) * 100
+    return {
+        "time": _BASE_TIME_MS + day * _DAY_MS + _SESSION_OFFSETS_MS,
+        "lastPrice": last,
+        "open": np.full(n, last[0]),
+        "high": np.maximum.accumulate(last),
+        "low": np.minimum.accumulate(last),
+        "lastClose": np.full(n, np.round(level, 2)),
+        "volume": np.cumsum(traded),
+        "amount": np.cumsum(traded * last),
+        "askPrice": ask,
+        "bidPrice": bid,
+        "askVol": np.tile(np.arange(5, 0, -1) * 100, (n, 1)),
+        "bidVol": np.tile(np.arange(5, 0, -1) * 100, (n, 1)),
+    }
+
+
+def _ticks(code: str, start_time: str, end_time: str, count: int) -> Dict[str, np.ndarray]:
+    lo, hi = _parse_time(start_time), _parse_time(end_time, end=True)
+    last_day = _TICK_LAST_DAY if hi is None else (hi - _BASE_TIME_MS) // _DAY_MS
+    if lo is not None:
+        first_day = (lo - _BASE_TIME_MS) // _DAY_MS
+    else:
+        first_day = last_day - (max(count, 1) // _TICKS_PER_DAY + 1) * 7 // 5 - 2
+    days = [day for day in range(max(first_day, 0), last_day + 1) if (4 + day) % 7 < 5]
+    if not days:
+        return {"time": np.zeros(0, dtype=np.int64)}
+    parts = [_tick_day(code, day) for day in days]
+    data = {field: np.concatenate([part[field] for part in parts]) for field in parts[0]}
+    times = data["time"]
+    start = 0 if lo is None else int(np.searchsorted(times, lo, side="left"))
+    stop = len(times) if hi is None else int(np.searchsorted(times, hi, side="right"))
+    if count is not None and count > 0:
+        start = max(start, stop - count)
+    return {field: values[start:stop] for field, values in data.items()}
+
+
+def _stock_universe(market: str, n: int) -> List[str]:
+    start = 600000 if market == "SH" else 1
+    return [f"{start + i:06d}.{market}" for i in range(n)]
+
+
+_MARKETS = {"SH": "上交所", "SZ": "深交所", "BJ": "北交所"}
+_UNIVERSE = {m: _stock_universe(m, 2000) for m in _MARKETS}
+_SECTORS = {
+    "沪深A股": _UNIVERSE["SH"] + _UNIVERSE["SZ"],
+    "上证A股": _UNIVERSE["SH"],
+    "深证A股": _UNIVERSE["SZ"],
+    "沪深300": _UNIVERSE["SH"][:150] + _UNIVERSE["SZ"][:150],
+    "上证50": _UNIVERSE["SH"][:50],
+}
+# 概念板块，数量与真实环境的几千个板块同一量级
+for _i in range(2000):
+    _start = (_i * 37) % 3800
+    _SECTORS[f"GN概念{_i:04d}"] = (_UNIVERSE["SH"] + _UNIVERSE["SZ"])[_start:_start + 200]
+
+
+# 合成合约名称：前缀 + 行业词，另有几个真实名称便于演示名称查找
+_NAME_HEADS = "中华东南西北新金海天长安宏华兴远大明光信达恒泰国航"
+_NAME_TAILS = ["银行", "证券", "科技", "电力", "能源", "医药", "汽车", "地产", "材料", "电子",
+               "传媒", "食品", "化工", "机械", "通信", "环保", "物流", "农业", "旅游", "软件"]
+_REAL_NAMES = {"600000.SH": "浦发银行", "600519.SH": "贵州茅台", "600036.SH": "招商银行",
+               "000001.SZ": "平安银行", "000002.SZ": "万科Ａ", "000858.SZ": "五粮液"}
+
+
+def _instrument_name(code: str) -> str:
+    if code in _REAL_NAMES:
+        return _REAL_NAMES[code]
+    seed = _seed(code)
+    heads = _NAME_HEADS[seed % len(_NAME_HEADS)] + _NAME_HEADS[(seed // 7) % len(_NAME_HEADS)]
+    return heads + _NAME_TAILS[(seed // 131) % len(_NAME_TAILS)]
+
+
+def _bars(code: str, period: str, n: int, end_index: int = None) -> Dict[str, np.ndarray]:
+    """生成 n 根确定性的合成K线"""
+    if period == "tick":
+        step = 3000
+    elif period.endswith("d"):
+        step = _DAY_MS
+    else:
+        step = 60000 * int(period[:-1] or 1)
+    total = max(n, end_index if end_index is not None else 5000)
+    idx = np.arange(total - n, total, dtype=np.int64)
+    rng = np.random.default_rng(_seed(code))
+    walk = np.cumsum(rng.normal(0, 0.02, total))[idx] if total > 0 else np.zeros(0)
+    close = 10.0 * np.exp(walk)
+    return {
+        "time": _BASE_TIME_MS + idx * step,
+        "open": close * 0.995,
+        "high": close * 1.01,
+        "low": close * 0.99,
+        "close": close,
+        "volume": (1e5 + (idx % 97) * 1e3).astype(np.int64),
+        "amount": close * 1e5,
+        "preClose": np.concatenate([[close[0]], close[:-1]]) if n else close,
+        "suspendFlag": np.zeros(n, dtype=np.int64),
+    }
+
+
+def _build_xtdata() -> types.ModuleType:
+    xtdata = types.ModuleType("xtquant.xtdata")
+
+    def get_period_list():
+        _sleep("get_period_list")
+        return [{"name": "tick", "desc": "分笔"}, {"name": "1m", "desc": "K线 1分钟"},
+                {"name": "1d", "desc": "K线 日线"}]
+
+    def get_markets():
+        _sleep("get_markets")
+        return dict(_MARKETS)
+
+    def get_trading_dates(market, start_time="", end_time="", count=-1):
+        _sleep("get_trading_dates")
+        dates = [_BASE_TIME_MS + i * _DAY_MS for i in range(5000)]
+        return dates[-count:] if count is not None and count > 0 else dates
+
+    def get_sector_list():
+        _sleep("get_sector_list")
+        return list(_SECTORS)
+
+    def get_stock_list_in_sector(sector, real_timetag=-1):
+        _sleep("get_stock_list_in_sector", 0.1)
+        if sector in _SECTORS:
+            return list(_SECTORS[sector])
+        return list(_UNIVERSE.get(sector, []))
+
+    def _detail(code):
+        if "." not in code:
+            return None
+        num, market = code.split(".")
+        return {"ExchangeID": market, "InstrumentID": num,
+                "InstrumentName": _instrument_name(code), "PreClose": 10.0,
+                "UpStopPrice": 11.0, "DownStopPrice": 9.0, "PriceTick": 0.01,
+                "VolumeMultiple": 1, "OpenDate": "20100101", "ExpireDate": "99999999"}
+
+    def get_instrument_detail(code, iscomplete=False):
+        _sleep("get_instrument_detail", 0.01)
+        return _detail(code)
+
+    def get_instrument_detail_list(stock_list, iscomplete=False):
+        _sleep("get_instrument_detail_list", 0.01 + len(stock_list) / 10000)
+        return {code: _detail(code) for code in stock_list}
+
+    def get_full_tick(code_list):
+        _sleep("get_full_tick")
+        result = {}
+        for code in code_list:
+            price = float(_bars(code, "1d", 1)["close"][-1])
+            result[code] = {"time": _BASE_TIME_MS, "lastPrice": price, "open": price,
+                            "high": price, "low": price, "lastClose": price,
+                            "amount": 0.0, "volume": 0,
+                            "askPrice": [price + 0.01, 0, 0, 0, 0],
+                            "bidPrice": [price - 0.01, 0, 0, 0, 0],
+                            "askVol": [100, 0, 0, 0, 0], "bidVol": [100, 0, 0, 0, 0]}
+        return result
+
+    def download_history_data(stock_code, period, start_time="", end_time="", incrementally=None):
+        _sleep("download_history_data", 4)
+        if DOWNLOAD_FAILURES.get(stock_code, 0) > 0:
+            DOWNLOAD_FAILURES[stock_code] -= 1
+            raise RuntimeError(f"download {stock_code} failed")
+        LOCAL_DATA[(stock_code, period)] = BAR_COUNT
+        return None
+
+    def get_local_data(field_list=[], stock_list=[], period="1d", start_time="", end_time="",
+                       count=-1, dividend_type="none", fill_data=True, data_dir=None):
+        _sleep("get_local_data", 0.1)
+        import pandas as pd
+        result = {}
+        for code in stock_list:
+            n = LOCAL_DATA.get((code, period), 0)
+            bars = _bars(code, period, n, n) if n else {"time": np.zeros(0, dtype=np.int64)}
+            times = bars["time"]
+            lo = _parse_time(start_time)
+            if lo is not None:
+                times = times[np.searchsorted(times, lo):]
+            if count is not None and count > 0:
+                times = times[-count:]
+            result[code] = pd.DataFrame({"time": times})
+        return result
+
+    def download_history_data2(stock_list, period, start_time="", end_time="", callback=None, incrementally=None):
+        for i, code in enumerate(stock_list):
+            download_history_data(code, period, start_time, end_time, incrementally)
+            if callback:
+                callback({"total": len(stock_list), "finished": i + 1, "stockcode": code, "message": ""})
+
+    def get_market_data_ex_ori(field_list=[], stock_list=[], period="1d", start_time="",
+                               end_time="", count=-1, dividend_type="none", fill_data=True):
+        _sleep("get_market_data_ex_ori", 1 + len(stock_list) / 100)
+        if period == "tick":
+            result = {}
+            for code in stock_list:
+                ticks = _ticks(code, start_time, end_time, count)
+                result[code] = {field: values for field, values in ticks.items()
+                                if not field_list or field == "time" or field in field_list}
+            return result
+        total = BAR_COUNT if count is None or count < 0 else max(BAR_COUNT, count)
+        result = {}
+        for code in stock_list:
+            bars = _bars(code, period, total, total)
+            lo, hi = _parse_time(start_time), _parse_time(end_time, end=True)
+            start = 0 if lo is None else int(np.searchsorted(bars["time"], lo, side="left"))
+            stop = total if hi is None else int(np.searchsorted(bars["time"], hi, side="right"))
+            if count is not None and count > 0:
+                start = max(start, stop - count)
+            bars = {field: arr[start:stop] for field, arr in bars.items()}
+            if dividend_type != "none":
+                for field in ("open", "high", "low", "close", "preClose"):
+                    bars[field] = bars[field] * ADJUST_FACTOR
+            fields = field_list or list(bars)
+            data = {"time": bars["time"].tolist()}
+            for field in fields:
+                if field in bars and field != "time":
+                    data[field] = bars[field].tolist()
+            result[code] = data
+        return result
+
+    def download_financial_data(stock_list, table_list=[]):
+        _sleep("download_financial_data", 4)
+
+    def get_financial_data(stock_list, table_list=[], start_time="", end_time="", report_type="report_time"):
+        _sleep("get_financial_data")
+        return {code: {} for code in stock_list}
+
+    def download_sector_data():
+        _sleep("download_sector_data", 20)
+
+    def download_history_contracts():
+        _sleep("download_history_contracts", 20)
+
+    def get_vba_func_result(formula_list, stock_code, period, start_time, end_time, count, dividend_type):
+        _sleep("get_vba_func_result", 10)
+        import pandas as pd
+        n = 250
+        return pd.DataFrame({
+            "time": _BASE_TIME_MS + np.arange(n) * _DAY_MS,
+            "策略收益": np.linspace(0, 12.5, n),
+            "持仓周期": np.arange(n) % 7,
+            "持仓收益": np.zeros(n),
+            "最近回撤": np.zeros(n),
+            "最大回撤": np.full(n, 3.0),
+            "交易次数": np.full(n, 8),
+            "胜率": np.full(n, 0.5),
+            "收益回撤比": np.full(n, 4.1),
+        }, index=[str(20100101 + i) for i in range(n)])
+
+    for func in (get_period_list, get_markets, get_trading_dates, get_sector_list,
+                 get_stock_list_in_sector, get_instrument_detail, get_instrument_detail_list, get_full_tick,
+                 download_history_data, download_history_data2, get_local_data, get_market_data_ex_ori,
+                 download_financial_data, get_financial_data, download_sector_data,
+                 download_history_contracts, get_vba_func_result):
+        setattr(xtdata, func.__name__, func)
+    return xtdata
+
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.__dict__})"
+
+
+def _build_trader_modules():
+    xtconstant = types.ModuleType("xtquant.xtconstant")
+    xtconstant.STOCK_BUY = 23
+    xtconstant.STOCK_SELL = 24
+    xtconstant.LATEST_PRICE = 5
+    xtconstant.FIX_PRICE = 11
+    xtconstant.ORDER_UNREPORTED = 48
+    xtconstant.ORDER_WAIT_REPORTING = 49
+    xtconstant.ORDER_REPORTED = 50
+    xtconstant.ORDER_REPORTED_CANCEL = 51
+    xtconstant.ORDER_PARTSUCC_CANCEL = 52
+    xtconstant.ORDER_PART_CANCEL = 53
+    xtconstant.ORDER_CANCELED = 54
+    xtconstant.ORDER_PART_SUCC = 55
+    xtconstant.ORDER_SUCCEEDED = 56
+    xtconstant.ORDER_JUNK = 57
+
+    xttype = types.ModuleType("xtquant.xttype")
+
+    class StockAccount:
+        def __init__(self, account_id, account_type="STOCK"):
+            self.account_id = account_id
+            self.account_type = account_type
+
+    xttype.StockAccount = StockAccount
+
+    xttrader = types.ModuleType("xtquant.xttrader")
+
+    class XtQuantTraderCallback:
+        pass
+
+    class XtQuantTrader:
+        """
+        交易接口替身，每个查询/下单调用带人工延迟，下单后异步推送回报。
+        plans 按股票代码指定委托的结果：fill（默认，全部成交）、partial（成交一半后挂单）、open（已报挂单）、
+        reject（废单并推送委托失败）；挂单可以用 cancel_order_stock_async 撤销
+        """
+
+        def __init__(self, path, session_id, callback=None):
+            self.path = path
+            self.session_id = session_id
+            self.callback = callback
+            self._seq = 0
+            self._order_id = 1000
+            self._lock = threading.Lock()
+            self.cash = 1_000_000.0
+            self.positions = {}
+            self.plans = {}
+            # 委托编号 -> 最近推送的委托回报；挂单的委托编号 -> 已成交数量
+            self._orders = {}
+            self._open = {}
+
+        def register_callback(self, callback):
+            self.callback = callback
+
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def connect(self):
+            _sleep("connect")
+            return 0
+
+        def subscribe(self, account):
+            _sleep("subscribe")
+            return 0
+
+        def query_stock_asset(self, account):
+            _sleep("query_stock_asset")
+            market_value = sum(p["volume"] * 10.0 for p in self.positions.values())
+            return _Obj(account_id=account.account_id, cash=self.cash, available=self.cash,
+                        frozen_cash=0.0, market_value=market_value,
+                        total_asset=self.cash + market_value)
+
+        def query_stock_positions(self, account):
+            _sleep("query_stock_positions")
+            return [_Obj(account_id=account.account_id, stock_code=code, volume=p["volume"],
+                         can_use_volume=p["can_use_volume"], open_price=10.0,
+                         market_value=p["volume"] * 10.0)
+                    for code, p in self.positions.items()]
+
+        def query_stock_orders(self, account, cancelable_only=False):
+            _sleep("query_stock_orders")
+            return []
+
+        def query_stock_order(self, account, order_id):
+            _sleep("query_stock_order")
+            return self._orders.get(order_id)
+
+        def _push_order(self, order, traded_volume, order_status, status_msg=""):
+            order = _Obj(**{**order.__dict__, "traded_volume": traded_volume,
+                            "traded_price": 10.0 if traded_volume else 0.0,
+                            "order_status": order_status, "status_msg": status_msg})
+            self._orders[order.order_id] = order
+            if hasattr(self.callback, "on_stock_order"):
+                self.callback.on_stock_order(order)
+
+        def _fill(self, stock_code, order_type, volume):
+            # 按 10.0 成交：买入当日不可卖，卖出减少持仓和可用数量
+            position = self.positions.setdefault(stock_code, {"volume": 0, "can_use_volume": 0})
+            if order_type == xtconstant.STOCK_BUY:
+                position["volume"] += volume
+                self.cash -= volume * 10.0
+            else:
+                position["volume"] -= volume
+                position["can_use_volume"] -= volume
+                self.cash += volume * 10.0
+            if position["volume"] <= 0:
+                del self.positions[stock_code]
+
+        def order_stock_async(self, account, stock_code, order_type, order_volume,
+                              price_type, price, strategy_name="", order_remark=""):
+            _sleep("order_stock_async", 0.2)
+            with self._lock:
+                self._seq += 1
+                self._order_id += 1
+                seq, order_id = self._seq, self._order_id
+            if self.callback is not None:
+                response = _Obj(account_id=account.account_id, order_id=order_id,
+                                seq=seq, strategy_name=strategy_name,
+                                order_remark=order_remark, error_msg="")
+                trade = _Obj(account_id=account.account_id, stock_code=stock_code,
+                             order_type=order_type, traded_id=str(order_id),
+                             traded_price=10.0, traded_volume=order_volume,
+                             traded_amount=order_volume * 10.0, order_id=order_id,
+                             offset_flag=48 if order_type == xtconstant.STOCK_BUY else 49,
+                             strategy_name=strategy_name, order_remark=order_remark)
+                order = _Obj(account_id=account.account_id, stock_code=stock_code,
+                             order_id=order_id, order_type=order_type,
+                             order_volume=order_volume, price=price,
+                             traded_volume=order_volume, traded_price=10.0,
+                             order_status=xtconstant.ORDER_SUCCEEDED,
+                             status_msg="", strategy_name=strategy_name,
+                             order_remark=order_remark)
+
+                plan = self.plans.get(stock_code, "fill")
+
+                def push():
+                    time.sleep(LATENCY)
+                    self.callback.on_order_stock_async_response(response)
+                    if plan == "reject":
+                        self._push_order(order, 0, xtconstant.ORDER_JUNK, "资金不足")
+                        if hasattr(self.callback, "on_order_error"):
+                            self.callback.on_order_error(_Obj(
+                                account_id=account.account_id, order_id=order_id, seq=seq, error_id=-61,
+                                error_msg="资金不足", strategy_name=strategy_name, order_remark=order_remark))
+                        return
+                    self._push_order(order, 0, xtconstant.ORDER_REPORTED)
+                    traded = {"fill": order_volume, "partial": order_volume // 200 * 100}.get(plan, 0)
+                    if traded:
+                        self._fill(stock_code, order_type, traded)
+                        if hasattr(self.callback, "on_stock_trade"):
+                            self.callback.on_stock_trade(_Obj(**{**trade.__dict__, "traded_volume": traded,
+                                                                 "traded_amount": traded * 10.0}))
+                    if plan == "fill":
+                        self._push_order(order, order_volume, xtconstant.ORDER_SUCCEEDED)
+                    else:
+                        self._open[order_id] = traded
+                        if traded:
+                            self._push_order(order, traded, xtconstant.ORDER_PART_SUCC)
+
+                threading.Thread(target=push, daemon=True).start()
+            return seq
+
+        def cancel_order_stock_async(self, account, order_id):
+            _sleep("cancel_order_stock_async")
+            with self._lock:
+                self._seq += 1
+                seq = self._seq
+            if order_id in self._open:
+                traded = self._open.pop(order_id)
+                status = xtconstant.ORDER_PART_CANCEL if traded else xtconstant.ORDER_CANCELED
+
+                def push():
+                    time.sleep(LATENCY)
+                    self._push_order(self._orders[order_id], traded, status)
+
+                threading.Thread(target=push, daemon=True).start()
+            return seq
+
+    xttrader.XtQuantTraderCallback = XtQuantTraderCallback
+    xttrader.XtQuantTrader = XtQuantTrader
+    return xttrader, xttype, xtconstant
+
+
+def install(latency: float = 0.05) -> None:
+    """把 xtquant 替身注册到 sys.modules"""
+    global LATENCY
+    LATENCY = latency
+    package = types.ModuleType("xtquant")
+    package.__path__ = []
+    xtdata = _build_xtdata()
+    xttrader, xttype, xtconstant = _build_trader_modules()
+    package.xtdata = xtdata
+    package.xttrader = xttrader
+    package.xttype = xttype
+    package.xtconstant = xtconstant
+    sys.modules["xtquant"] = package
+    sys.modules["xtquant.xtdata"] = xtdata
+    sys.modules["xtquant.xttrader"] = xttrader
+    sys.modules["xtquant.xttype"] = xttype
+    sys.modules["xtquant.xtconstant"] = xtconstant
+
+
+def set_latency(latency: float) -> None:
+    """调整人工延迟"""
+    global LATENCY
+    LATENCY = latency
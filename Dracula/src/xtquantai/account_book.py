@@ -0,0 +1,403 @@
+"""
+账户簿
+由交易回调维护的进程内资金和持仓快照，按账户和证券代码索引，查询单个持仓或可用资金不需要访问交易服务器：
+- 每个账户第一次使用时用一次资金、持仓和未结委托查询建立快照，之后由委托、成交、资金、持仓推送增量更新
+- 成交：买入增加持仓（当日不可卖）、减少现金和可用资金；卖出减少持仓和可用数量、增加现金和可用资金
+- 未结委托冻结卖出数量和限价买入金额，委托结束（成交、撤单、废单）后解冻；市价买单的冻结金额未知，成交时才扣减
+- 资金推送和持仓推送以交易服务器的数据为准直接覆盖（包括成交回报中没有的手续费）
+- 连接断开、账户状态异常、交易日切换或快照超过 XTQUANTAI_ACCOUNT_BOOK_MAX_AGE 秒后视为过期，下次使用时重新查询
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .instrument_store import current_trading_day
+
+# 快照的最长使用时间（秒），超过后重新查询；0 表示只在过期事件后重新查询
+ACCOUNT_BOOK_MAX_AGE = float(os.environ.get("XTQUANTAI_ACCOUNT_BOOK_MAX_AGE", "300"))
+
+# 委托结束的状态和买入的委托类型，首次使用时从 xtconstant 读取
+_FINAL_STATUS_NAMES = ("ORDER_PART_CANCEL", "ORDER_CANCELED", "ORDER_SUCCEEDED", "ORDER_JUNK")
+_BUY_TYPE_NAMES = ("STOCK_BUY", "CREDIT_BUY", "CREDIT_FIN_BUY")
+_constants: Optional[Tuple[frozenset, frozenset, int]] = None
+
+
+def _xtconstants() -> Tuple[frozenset, frozenset, int]:
+    global _constants
+    if _constants is None:
+        from xtquant import xtconstant
+        _constants = (
+            frozenset(getattr(xtconstant, name) for name in _FINAL_STATUS_NAMES if hasattr(xtconstant, name)),
+            frozenset(getattr(xtconstant, name) for name in _BUY_TYPE_NAMES if hasattr(xtconstant, name)),
+            getattr(xtconstant, "ACCOUNT_STATUS_OK", 0),
+        )
+    return _constants
+
+
+def _get(obj: Any, names: Tuple[str, ...], default: Any = 0) -> Any:
+    """按顺序读取第一个存在的属性（兼容 m_n / m_d 前缀和小写两种字段名）"""
+    for name in names:
+        value = getattr(obj, name, None)
+        if value is not None:
+            return value
+    return default
+
+
+class BookPosition:
+    """一个证券的持仓"""
+
+    __slots__ = ("stock_code", "volume", "can_use_volume", "open_price", "market_value")
+
+    def __init__(self, stock_code: str, volume: int = 0, can_use_volume: int = 0,
+                 open_price: float = 0.0, market_value: float = 0.0):
+        self.stock_code = stock_code
+        self.volume = volume
+        self.can_use_volume = can_use_volume
+        self.open_price = open_price
+        self.market_value = market_value
+
+    @classmethod
+    def from_position(cls, pos: Any) -> "BookPosition":
+        return cls(pos.stock_code,
+                   int(_get(pos, ("m_nVolume", "volume"))),
+                   int(_get(pos, ("m_nCanUseVolume", "can_use_volume"))),
+                   float(_get(pos, ("m_dOpenPrice", "open_price"), 0.0)),
+                   float(_get(pos, ("m_dMarketValue", "market_value"), 0.0)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _OpenOrder:
+    """未结委托及其在快照中冻结的数量（卖出为股数，买入为金额）"""
+
+    __slots__ = ("stock_code", "is_buy", "volume", "price", "traded", "frozen")
+
+    def __init__(self, stock_code: str, is_buy: bool, volume: int, price: float):
+        self.stock_code = stock_code
+        self.is_buy = is_buy
+        self.volume = volume
+        self.price = price
+        self.traded = 0
+        self.frozen = 0.0
+
+    def freeze(self) -> float:
+        remaining = max(self.volume - self.traded, 0)
+        return remaining * self.price if self.is_buy else remaining
+
+
+class AccountBook:
+    """一个账户的资金和持仓快照
+
+    Attributes:
+        account_id: 账户ID
+        positions: 证券代码 -> 持仓
+        cash / available / frozen_cash / market_value / total_asset: 资金
+        synced_at: 上次建立快照的时间（time.time()），0 表示尚未建立
+        stale_reason: 快照过期的原因，为空表示有效
+    """
+
+    def __init__(self, account_id: str):
+        self.account_id = account_id
+        self.positions: Dict[str, BookPosition] = {}
+        self.cash = 0.0
+        self.available = 0.0
+        self.frozen_cash = 0.0
+        self.market_value = 0.0
+        self.total_asset = 0.0
+        self.synced_at = 0.0
+        self.trading_day = ""
+        self.stale_reason = "尚未建立快照"
+        self.syncs = 0
+        self.events = 0
+        self.last_event_at = 0.0
+        self._orders: Dict[Any, _OpenOrder] = {}
+        # 已计入的成交和每个委托的成交数量（成交回报可能先于委托回报到达）
+        self._trades: set = set()
+        self._traded: Dict[Any, int] = {}
+        # 已结束（全部成交、撤单、废单）的委托编号
+        self._finished: set = set()
+        # 市价买入（委托价为 0）按下单时计算数量所用的价格冻结资金，证券代码 -> 价格
+        self._buy_prices: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        # 每次回报和重建快照后通知等待者（见 wait_until）
+        self._changed = threading.Condition(self._lock)
+
+    # ---------- 快照 ----------
+
+    def needs_sync(self, max_age: float = None) -> str:
+        """需要重新查询的原因，快照有效时返回空字符串"""
+        max_age = ACCOUNT_BOOK_MAX_AGE if max_age is None else max_age
+        with self._lock:
+            if self.stale_reason:
+                return self.stale_reason
+            if self.trading_day != current_trading_day():
+                return "交易日切换"
+            if max_age > 0 and time.time() - self.synced_at > max_age:
+                return f"快照超过 {max_age:g} 秒"
+            return ""
+
+    def seed(self, asset: Any, positions: Iterable[Any], orders: Iterable[Any] = ()) -> None:
+        """用资金、持仓和未结委托的查询结果建立快照，查询结果已包含未结委托的冻结"""
+        with self._lock:
+            self.positions = {}
+            for pos in positions:
+                position = BookPosition.from_position(pos)
+                self.positions[position.stock_code] = position
+            self._apply_asset(asset)
+            self._orders = {}
+            self._trades = set()
+            self._traded = {}
+            self._finished = set()
+            for order in orders:
+                open_order = self._open_order(order)
+                if open_order is not None:
+                    open_order.frozen = open_order.freeze()
+            self.synced_at = time.time()
+            self.trading_day = current_trading_day()
+            self.stale_reason = ""
+            self.syncs += 1
+            self._changed.notify_all()
+
+    def mark_stale(self, reason: str) -> None:
+        with self._lock:
+            if not self.stale_reason:
+                self.stale_reason = reason
+
+    # ---------- 回调 ----------
+
+    def _touch(self) -> None:
+        self.events += 1
+        self.last_event_at = time.time()
+        self._changed.notify_all()
+
+    def _position(self, stock_code: str) -> BookPosition:
+        position = self.positions.get(stock_code)
+        if position is None:
+            position = self.positions[stock_code] = BookPosition(stock_code)
+        return position
+
+    def _drop_empty(self, stock_code: str) -> None:
+        # 卖出委托结束、冻结释放之后才能判断持仓是否清空
+        position = self.positions.get(stock_code)
+        if position is not None and position.volume <= 0 and position.can_use_volume <= 0:
+            del self.positions[stock_code]
+
+    def _open_order(self, order: Any) -> Optional[_OpenOrder]:
+        final_status, buy_types, _ = _xtconstants()
+        order_id = order.order_id
+        open_order = self._orders.get(order_id)
+        if open_order is None:
+            if _get(order, ("order_status",), None) in final_status:
+                return None
+            is_buy = _get(order, ("order_type",), None) in buy_types
+            price = float(_get(order, ("price",), 0.0))
+            if is_buy and price <= 0:
+                price = self._buy_prices.get(order.stock_code, 0.0)
+            open_order = self._orders[order_id] = _OpenOrder(
+                order.stock_code, is_buy, int(_get(order, ("order_volume",))), max(price, 0.0))
+        open_order.traded = max(open_order.traded, int(_get(order, ("traded_volume",))),
+                                self._traded.get(order_id, 0))
+        return open_order
+
+    def _refreeze(self, order_id: Any, open_order: _OpenOrder, final: bool = False) -> None:
+        frozen = 0.0 if final else open_order.freeze()
+        delta = frozen - open_order.frozen
+        open_order.frozen = frozen
+        if delta:
+            if open_order.is_buy:
+                self.available -= delta
+                self.frozen_cash += delta
+            else:
+                self._position(open_order.stock_code).can_use_volume -= int(delta)
+        if final:
+            self._orders.pop(order_id, None)
+
+    def apply_order(self, order: Any) -> None:
+        """委托回报：更新未结委托的冻结"""
+        with self._lock:
+            if not self.synced_at:
+                return
+            self._touch()
+            final = _get(order, ("order_status",), None) in _xtconstants()[0]
+            if final:
+                self._finished.add(order.order_id)
+            open_order = self._open_order(order)
+            if open_order is not None:
+                self._refreeze(order.order_id, open_order, final)
+                self._drop_empty(open_order.stock_code)
+
+    def apply_trade(self, trade: Any) -> None:
+        """成交回报：更新持仓和资金，同一笔成交只计一次"""
+        with self._lock:
+            if not self.synced_at:
+                return
+            key = (trade.order_id, _get(trade, ("traded_id",), None))
+            if key[1] is not None:
+                if key in self._trades:
+                    return
+                self._trades.add(key)
+            self._touch()
+            volume = int(_get(trade, ("traded_volume",)))
+            amount = float(_get(trade, ("traded_amount",), 0.0)) or volume * float(_get(trade, ("traded_price",), 0.0))
+            open_order = self._orders.get(trade.order_id)
+            if open_order is not None:
+                is_buy = open_order.is_buy
+            else:
+                is_buy = _get(trade, ("order_type",), None) in _xtconstants()[1]
+            position = self._position(trade.stock_code)
+            if is_buy:
+                position.volume += volume
+                position.market_value += amount
+                self.market_value += amount
+                self.cash -= amount
+                self.available -= amount
+            else:
+                position.volume -= volume
+                position.can_use_volume -= volume
+                position.market_value = max(position.market_value - amount, 0.0)
+                self.market_value = max(self.market_value - amount, 0.0)
+                self.cash += amount
+                self.available += amount
+            self._traded[trade.order_id] = traded = self._traded.get(trade.order_id, 0) + volume
+            if open_order is not None:
+                open_order.traded = max(open_order.traded, traded)
+                self._refreeze(trade.order_id, open_order)
+            self._drop_empty(trade.stock_code)
+
+    def _apply_asset(self, asset: Any) -> None:
+        self.cash = float(_get(asset, ("m_dCash", "cash"), 0.0))
+        self.available = float(_get(asset, ("m_dAvailable", "available"), self.cash))
+        self.frozen_cash = float(_get(asset, ("m_dFrozenCash", "frozen_cash"), 0.0))
+        self.market_value = float(_get(asset, ("m_dMarketValue", "market_value"), 0.0))
+        self.total_asset = float(_get(asset, ("m_dBalance", "total_asset", "balance"), self.cash + self.market_value))
+
+    def apply_asset(self, asset: Any) -> None:
+        """资金推送：以交易服务器的数据为准"""
+        with self._lock:
+            if not self.synced_at:
+                return
+            self._touch()
+            self._apply_asset(asset)
+
+    def apply_position(self, pos: Any) -> None:
+        """持仓推送：以交易服务器的数据为准"""
+        with self._lock:
+            if not self.synced_at:
+                return
+            self._touch()
+            position = BookPosition.from_position(pos)
+            if position.volume <= 0 and position.can_use_volume <= 0:
+                self.positions.pop(position.stock_code, None)
+            else:
+                self.positions[position.stock_code] = position
+
+    def expect_buy(self, stock_code: str, price: float) -> None:
+        """登记即将提交的买入委托计算数量所用的价格（最新价或卖一价），市价委托回报的委托价为 0 时
+        按这个价格冻结资金，成交回报到达前可用资金不会偏高"""
+        if price and price > 0:
+            with self._lock:
+                self._buy_prices[stock_code] = float(price)
+
+    # ---------- 查询 ----------
+
+    def position(self, stock_code: str) -> Optional[BookPosition]:
+        return self.positions.get(stock_code)
+
+    def orders_finished(self, order_ids: Iterable[Any]) -> bool:
+        """这些委托是否都已收到结束状态的委托回报"""
+        with self._lock:
+            return all(order_id in self._finished for order_id in order_ids)
+
+    def wait_until(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        """等待回报更新账户簿直到 predicate 成立，不轮询；超时返回 False，timeout 为 0 时只检查一次"""
+        with self._changed:
+            return self._changed.wait_for(predicate, max(timeout, 0.0))
+
+    def snapshot(self, stock_codes: Iterable[str] = None) -> Dict[str, Any]:
+        """快照的字典形式，可只取部分证券的持仓"""
+        with self._lock:
+            if stock_codes is None:
+                positions = [p.to_dict() for p in self.positions.values()]
+            else:
+                positions = [self.positions[code].to_dict() for code in stock_codes if code in self.positions]
+            now = time.time()
+            return {
+                "account_id": self.account_id,
+                "cash": self.cash,
+                "available": self.available,
+                "frozen_cash": self.frozen_cash,
+                "market_value": self.market_value,
+                "total_asset": self.total_asset,
+                "positions": positions,
+                "open_orders": len(self._orders),
+                "synced_at": self.synced_at,
+                "age": now - self.synced_at if self.synced_at else None,
+                "stale_reason": self.needs_sync(),
+                "syncs": self.syncs,
+                "events": self.events,
+                "last_event_age": now - self.last_event_at if self.last_event_at else None,
+            }
+
+
+class AccountBooks:
+    """按账户ID管理账户簿，把交易回调分发给对应账户"""
+
+    def __init__(self):
+        self.books: Dict[str, AccountBook] = {}
+        self._lock = threading.Lock()
+
+    def book(self, account_id: str) -> AccountBook:
+        with self._lock:
+            book = self.books.get(account_id)
+            if book is None:
+                book = self.books[account_id] = AccountBook(account_id)
+            return book
+
+    def _dispatch(self, obj: Any) -> Optional[AccountBook]:
+        # 只更新已建立快照的账户
+        return self.books.get(_get(obj, ("account_id",), None))
+
+    def on_order(self, order: Any) -> None:
+        book = self._dispatch(order)
+        if book is not None:
+            book.apply_order(order)
+
+    def on_trade(self, trade: Any) -> None:
+        book = self._dispatch(trade)
+        if book is not None:
+            book.apply_trade(trade)
+
+    def on_asset(self, asset: Any) -> None:
+        book = self._dispatch(asset)
+        if book is not None:
+            book.apply_asset(asset)
+
+    def on_position(self, position: Any) -> None:
+        book = self._dispatch(position)
+        if book is not None:
+            book.apply_position(position)
+
+    def on_account_status(self, status: Any) -> None:
+        """账户状态异常时快照过期，异常期间的推送可能丢失，恢复后下次使用时重新查询"""
+        book = self._dispatch(status)
+        if book is not None and _get(status, ("status",), None) != _xtconstants()[2]:
+            book.mark_stale(f"账户状态变更: {_get(status, ('status',), None)}")
+
+    def mark_stale(self, reason: str, account_id: str = None) -> None:
+        """标记指定账户（为空时全部）的快照过期"""
+        with self._lock:
+            books = [b for a, b in self.books.items() if account_id is None or a == account_id]
+        for book in books:
+            book.mark_stale(reason)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            books = list(self.books.values())
+        return [{key: value for key, value in book.snapshot().items() if key != "positions"}
+                for book in books]
+
+
+# 全局账户簿
+account_books = AccountBooks()
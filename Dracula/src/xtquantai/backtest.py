@@ -0,0 +1,201 @@
+"""
+本地回测引擎
+用 NumPy 向量运算复现 run_single_stock_backtest 中 VBA 回测模板的语义，直接在本地K线上计算，
+不再需要把模板交给 xtdata.get_vba_func_result 逐只股票执行，也不依赖 xtquant。
+
+模板按K线逐根串行执行，TestHolding 等 VARIABLE 变量在每根K线上先保持上一根的值，
+执行到 IF 语句时才更新，因此：
+- 模板前半部分（持仓周期、持仓收益、策略收益）看到的是上一根K线结束时的持仓状态
+- 开仓：bk 成立、bp 不成立且空仓；平仓：bp 成立且持仓。持仓状态是一个锁存器，
+  等价于“最近一次开仓信号晚于最近一次 bp”
+- 持仓周期 t 为 BARSLAST(TestHolding=0)，策略收益累加持仓期间 (c/REF(c,t)-1) 的逐根变化，
+  即每笔交易贡献 开仓前一根收盘到当前收盘的涨幅
+- 指数（对应指数）在平仓时累加 (平仓价-开仓价)/开仓价，指数扣除 0.003 的手续费，对应指数为沪深300同期涨幅
+- 胜率为 指数上升的次数 / 交易次数
+"""
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .costs import CostModel, cost_backtest
+from .fills import holding_state
+from .formula import FormulaError, compile_signal
+from .formula.functions import divide, f_count, f_hhv, f_ref, f_sum
+
+# 模板中每笔交易扣除的手续费
+TEMPLATE_FEE = 0.003
+
+# 模板中的买入金额输出
+TEMPLATE_BUY_AMOUNT = 50000.0
+
+# 模板中 callstock('sh000300',...) 对应的基准
+BENCHMARK_CODE = "000300.SH"
+
+# 模板的输出列，顺序与 get_vba_func_result 的结果一致；后三列是模板中的对冲指标，仅本地引擎输出
+RESULT_COLUMNS = ("买入金额", "持仓周期", "持仓收益", "策略收益", "交易次数", "最近回撤", "最大回撤",
+                  "平均收益", "收益回撤比", "胜率", "指数", "对应指数", "对冲")
+
+_DAILY_UNITS = ("d", "w", "mon", "q", "hy", "y")
+
+# 北京时间相对 UTC 的偏移
+_UTC_OFFSET_MS = 8 * 3600 * 1000
+
+
+def align_close(times: np.ndarray, other_times: np.ndarray, other_close: np.ndarray) -> np.ndarray:
+    """把另一个代码的收盘价按时间对齐到 times（向前填充），对应 callstock 的取值方式"""
+    pos = np.searchsorted(np.asarray(other_times), np.asarray(times), side="right") - 1
+    out = np.full(len(times), np.nan)
+    valid = pos >= 0
+    out[valid] = np.asarray(other_close, dtype=np.float64)[pos[valid]]
+    return out
+
+
+def template_backtest(close: np.ndarray, bk: np.ndarray, bp: np.ndarray,
+                      benchmark_close: Optional[np.ndarray] = None,
+                      fee: float = TEMPLATE_FEE) -> Dict[str, np.ndarray]:
+    """按模板语义计算逐K线回测结果
+
+    Args:
+        close: 收盘价
+        bk: 开仓信号
+        bp: 平仓信号
+        benchmark_close: 对齐后的沪深300收盘价，为空时对应指数和对冲为 NaN
+        fee: 每笔交易扣除的手续费
+
+    Returns:
+        RESULT_COLUMNS 中各列 -> 数组
+    """
+    c = np.asarray(close, dtype=np.float64)
+    n = len(c)
+    idx = np.arange(n)
+    holding = holding_state(bk, bp)
+    before = np.zeros(n, dtype=bool)
+    before[1:] = holding[:-1]
+
+    # 持仓周期：上一根K线结束时持仓，则为距最近一次空仓的周期数
+    last_flat = np.maximum.accumulate(np.where(~holding, idx, -1))
+    last_flat_before = np.full(n, -1)
+    last_flat_before[1:] = last_flat[:-1]
+    t = np.where(before, idx - last_flat_before, 0).astype(np.float64)
+    t[before & (last_flat_before < 0)] = np.nan
+
+    base = f_ref(n, c, t)
+    cjt = divide(c - base, base)
+    cjt1 = np.where(before, (cjt - f_ref(n, cjt, 1)) * 100, 0.0)
+    strategy = f_sum(n, cjt1, 0)
+
+    # 开平仓
+    entries = np.flatnonzero(holding & ~before)
+    exits = np.flatnonzero(~holding & before)
+    paired = entries[:len(exits)]
+    trades = np.cumsum(~holding & before).astype(np.float64)
+
+    def closed_index(prices: np.ndarray, cost: float) -> np.ndarray:
+        step = np.zeros(n)
+        step[exits] = divide(prices[exits] - prices[paired], prices[paired]) - cost
+        return np.cumsum(step)
+
+    index = closed_index(c, fee)
+    if benchmark_close is None:
+        hs_index = np.full(n, np.nan)
+    else:
+        hs_index = closed_index(np.asarray(benchmark_close, dtype=np.float64), 0.0)
+
+    recent_drawdown = f_hhv(n, strategy, 0) - strategy
+    max_drawdown = f_hhv(n, recent_drawdown, 0)
+    with np.errstate(invalid="ignore"):
+        wins = f_count(n, index > f_ref(n, index, 1), 0)
+
+    return {
+        "买入金额": np.full(n, TEMPLATE_BUY_AMOUNT),
+        "持仓周期": t,
+        "持仓收益": cjt * 100,
+        "策略收益": strategy,
+        "交易次数": trades,
+        "最近回撤": recent_drawdown,
+        "最大回撤": max_drawdown,
+        "平均收益": divide(strategy, trades),
+        "收益回撤比": divide(strategy, max_drawdown),
+        "胜率": divide(wins, trades),
+        "指数": index,
+        "对应指数": hs_index,
+        "对冲": index - hs_index,
+    }
+
+
+def template_summary(columns: Mapping[str, np.ndarray]) -> Dict[str, Any]:
+    """最后一根K线的汇总指标，与 summarize_backtest_result 的 summary 相同（NaN 记为 0）
+
+    columns 可以是 template_backtest 的结果，也可以是 run_template_backtest 返回的 DataFrame
+    """
+    def last(name: str) -> float:
+        values = np.asarray(columns[name], dtype=np.float64)
+        value = float(values[-1]) if len(values) else 0.0
+        return 0.0 if np.isnan(value) else value
+
+    return {
+        "总收益率": last("策略收益"),
+        "最大回撤": last("最大回撤"),
+        "胜率": last("胜率"),
+        "交易次数": int(last("交易次数")),
+        "收益回撤比": last("收益回撤比"),
+    }
+
+
+def time_labels(times: np.ndarray, period: str) -> np.ndarray:
+    """结果索引：日线及以上周期为 'YYYYMMDD'，日内周期为 'YYYYMMDDHHMMSS'"""
+    # 按北京时间拆分年月日时分秒后拼成整数再转字符串，比逐个 strftime 快两个数量级
+    local = (np.asarray(times, dtype=np.int64) + _UTC_OFFSET_MS).astype("datetime64[ms]")
+    days = local.astype("datetime64[D]")
+    months = days.astype("datetime64[M]")
+    years = months.astype("datetime64[Y]")
+    ymd = ((years.astype(np.int64) + 1970) * 10000 + (months - years).astype(np.int64) * 100
+           + 100 + (days - months).astype(np.int64) + 1)
+    if period.endswith(_DAILY_UNITS):
+        return ymd.astype(str)
+    seconds = (local - days).astype("timedelta64[s]").astype(np.int64)
+    hms = seconds // 3600 * 10000 + seconds % 3600 // 60 * 100 + seconds % 60
+    return (ymd * 1000000 + hms).astype(str)
+
+
+def run_template_backtest(signal: str, bars: Mapping[str, Any], period: str = "1d",
+                          params: Optional[Dict[str, float]] = None,
+                          benchmark: Optional[Mapping[str, Any]] = None,
+                          fee: float = TEMPLATE_FEE, cost_model: Any = None,
+                          stock_code: str = "") -> pd.DataFrame:
+    """在本地K线上运行 VBA 回测模板
+
+    Args:
+        signal: 包含 bk/bp 的信号公式
+        bars: 股票K线，字段 -> 序列，至少包含 time、close 和信号用到的字段
+        period: K线周期，决定结果索引的格式
+        params: 覆盖信号中 input 参数的默认值
+        benchmark: 沪深300K线（time、close），为空时不计算对应指数
+        fee: 每笔交易扣除的手续费
+        cost_model: 成本模型（costs.CostModel、预设名或参数字典），提供时在模板输出列之后增加
+            costs.COST_COLUMNS（毛收益、净收益和成本明细），模板输出列不变
+        stock_code: 股票代码，成本模型据此判断涨跌停幅度
+
+    Returns:
+        与 get_vba_func_result 结果格式相同的 DataFrame：time 列 + 模板输出列，索引为时间字符串
+
+    Raises:
+        FormulaError: 信号无法在本地编译，或没有定义 bk/bp
+    """
+    compiled = compile_signal(signal)
+    missing = [name for name in ("BK", "BP") if name not in compiled.variables]
+    if missing:
+        raise FormulaError(f"信号中没有定义 {'/'.join(missing)}")
+    values = compiled.evaluate(bars, params, ["BK", "BP"])
+
+    times = np.asarray(bars["time"])
+    benchmark_close = None
+    if benchmark is not None and len(benchmark.get("time", ())):
+        benchmark_close = align_close(times, benchmark["time"], benchmark["close"])
+    columns = template_backtest(bars["close"], values["BK"], values["BP"], benchmark_close, fee)
+    model = CostModel.from_spec(cost_model)
+    if model is not None:
+        costs = cost_backtest(bars, values["BK"], values["BP"], model, TEMPLATE_BUY_AMOUNT, stock_code)
+        columns.update(costs["columns"])
+    return pd.DataFrame({"time": times, **columns}, index=time_labels(times, period))
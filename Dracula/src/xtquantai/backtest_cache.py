@@ -0,0 +1,273 @@
+"""
+回测结果缓存
+run_backtest、display_backtest_chart、save_interactive_backtest_chart 都会用相同参数重新调用
+run_single_stock_backtest，先“运行回测”再“显示图表”会把同一个回测算两遍。这里按内容寻址缓存逐K线回测结果：
+- 键为 规范化的信号（本地能编译时为编译结果的 canonical_hash，否则为按公式词法单元重新拼接的文本）+ 代码 + 周期 + 区间 + 除权方式 + 引擎 + 数据版本（+ 成本模型）的哈希
+- 数据版本是回测所用K线（经过本地K线缓存读取）内容的哈希，K线追加或除权后价格变化时键随之变化，旧结果自然失效；
+  get_vba_func_result 的结果不需要本地K线，数据版本取股票和基准在K线缓存中的序列版本（KlineCache.version），不读取K线
+- 内存中按最近使用顺序保留，总大小超过上限时淘汰最久未用的结果；可选的磁盘层保存为 .npz，
+  进程重启后仍可命中，同样按最近访问时间淘汰
+缓存的是回测结果 DataFrame 本身，daily_data 格式、降采样等展示参数不影响命中。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .formula import FormulaError, compile_signal, normalize_source
+from .kline_cache import CACHE_DIR
+
+# 内存层大小上限（MB）
+BACKTEST_CACHE_MEMORY_MB = float(os.environ.get("XTQUANTAI_BACKTEST_CACHE_MEMORY_MB", "256"))
+
+# 磁盘层大小上限（MB），0 表示不使用磁盘层
+BACKTEST_CACHE_DISK_MB = float(os.environ.get("XTQUANTAI_BACKTEST_CACHE_DISK_MB", "1024"))
+
+# 键的格式版本，回测模板或结果格式变化时递增，使磁盘上的旧结果不再命中
+_KEY_VERSION = 2
+
+_INDEX_KEY = "__index__"
+_COLUMNS_KEY = "__columns__"
+
+
+def normalize_signal(signal: str) -> str:
+    """规范化信号，只在空白、注释、全角符号或名称大小写上不同的信号得到相同的结果
+
+    本地能编译时返回编译结果的 canonical_hash，运算顺序（A+B 与 B+A）、函数别名、可折叠的常数运算
+    不同的等价信号也得到相同的结果；否则能被公式词法分析器切分时按词法单元重新拼接，
+    再否则只合并空白
+    """
+    try:
+        return "#" + compile_signal(signal).canonical_hash
+    except FormulaError:
+        pass
+    try:
+        return normalize_source(signal)
+    except FormulaError:
+        lines = (" ".join(line.split()) for line in str(signal).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+def data_version(*series: Optional[Mapping[str, Any]]) -> str:
+    """K线内容的哈希，series 为 {字段: 数组}，为空的序列也参与计算"""
+    digest = hashlib.blake2b(digest_size=16)
+    for bars in series:
+        if bars is None:
+            digest.update(b"-")
+            continue
+        for field in sorted(bars):
+            values = np.ascontiguousarray(bars[field])
+            digest.update(f"{field}:{values.dtype.str}:{values.shape};".encode())
+            digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def cache_key(signal: str, stock_code: str, period: str, start_time: str, end_time: str, count: int,
+              dividend_type: str, engine: str, version: str, options: str = "") -> str:
+    """回测结果的缓存键，options 为影响结果的其他选项（如成本模型）的规范化文本"""
+    parts = [_KEY_VERSION, normalize_signal(signal), stock_code, period, str(start_time), str(end_time), int(count),
+             dividend_type, engine, version]
+    if options:
+        parts.append(options)
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    """结果占用内存的估计：各列字节数 + 索引字符串（按第一个标签的长度估计）"""
+    size = int(df.memory_usage(index=False, deep=False).sum())
+    if len(df):
+        size += len(df) * (49 + len(str(df.index[0])))
+    return size
+
+
+class BacktestCache:
+    """回测结果的两级缓存：内存 LRU + 可选的磁盘层"""
+
+    def __init__(self, root: str = None, memory_bytes: int = None, disk_bytes: int = None):
+        self.root = os.path.join(root or CACHE_DIR, "backtest")
+        self.memory_bytes = int(memory_bytes if memory_bytes is not None
+                                else BACKTEST_CACHE_MEMORY_MB * 1024 * 1024)
+        self.disk_bytes = int(disk_bytes if disk_bytes is not None else BACKTEST_CACHE_DISK_MB * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._stats = {
+            "requests": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.npz")
+
+    # ---------- 内存层 ----------
+
+    def _remember(self, key: str, df: pd.DataFrame) -> None:
+        size = _frame_bytes(df)
+        if size > self.memory_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = df
+            self._sizes[key] = size
+            while sum(self._sizes.values()) > self.memory_bytes:
+                old, _ = self._entries.popitem(last=False)
+                del self._sizes[old]
+                evicted += 1
+            self._stats["evictions"] += evicted
+
+    # ---------- 磁盘层 ----------
+
+    def _read_disk(self, key: str) -> Optional[pd.DataFrame]:
+        path = self._path(key)
+        if self.disk_bytes <= 0 or not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                columns = [str(name) for name in data[_COLUMNS_KEY]]
+                df = pd.DataFrame({name: data[f"c{i}"] for i, name in enumerate(columns)},
+                                  index=data[_INDEX_KEY].astype(str))
+            os.utime(path)
+            return df
+        except (OSError, ValueError, KeyError) as e:
+            print(f"读取回测缓存 {path} 失败，删除: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, key: str, df: pd.DataFrame) -> None:
+        if self.disk_bytes <= 0:
+            return
+        arrays = {}
+        for i, name in enumerate(df.columns):
+            values = df[name].to_numpy()
+            if values.dtype == object:
+                # 非数值列（如 get_vba_func_result 的特殊结果）只保留在内存层
+                return
+            arrays[f"c{i}"] = values
+        arrays[_COLUMNS_KEY] = np.array([str(name) for name in df.columns])
+        arrays[_INDEX_KEY] = np.asarray(df.index.astype(str), dtype=str)
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"写入回测缓存 {path} 失败: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        self._enforce_disk_cap(keep=path)
+
+    def _disk_files(self) -> List[Tuple[float, int, str]]:
+        files = []
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                if name.endswith(".npz"):
+                    path = os.path.join(self.root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _enforce_disk_cap(self, keep: str) -> None:
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._count("disk_evictions")
+
+    # ---------- 接口 ----------
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """按键取回测结果，未命中返回 None；返回的 DataFrame 与缓存共享，调用方不要修改"""
+        with self._lock:
+            self._stats["requests"] += 1
+            df = self._entries.get(key)
+            if df is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return df
+        df = self._read_disk(key)
+        if df is not None:
+            self._count("disk_hits")
+            self._remember(key, df)
+            return df
+        self._count("misses")
+        return None
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """保存回测结果"""
+        if not isinstance(df, pd.DataFrame):
+            return
+        self._count("stores")
+        self._remember(key, df)
+        self._write_disk(key, df)
+
+    def clear(self) -> Dict[str, int]:
+        """清空内存层和磁盘层，返回删除的结果数"""
+        with self._lock:
+            memory = len(self._entries)
+            self._entries.clear()
+            self._sizes.clear()
+        disk = 0
+        for _, _, path in self._disk_files():
+            try:
+                os.remove(path)
+                disk += 1
+            except OSError:
+                pass
+        return {"memory_entries": memory, "disk_entries": disk}
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._entries)
+            stats["memory_bytes"] = sum(self._sizes.values())
+        files = self._disk_files()
+        stats["disk_entries"] = len(files)
+        stats["disk_bytes"] = sum(size for _, size, _ in files)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_ratio"] = round(hits / stats["requests"], 4) if stats["requests"] else 0.0
+        stats["max_memory_bytes"] = self.memory_bytes
+        stats["max_disk_bytes"] = self.disk_bytes
+        stats["root"] = self.root
+        return stats
+
+
+# 全局回测结果缓存
+backtest_cache = BacktestCache()
@@ -0,0 +1,79 @@
+"""
+篮子委托
+把一组股票的目标金额（或股数）换算成整手委托并批量提交：
+- 全部股票的最新价一次 get_full_tick 获取，股数按手向量计算
+- 卖出不超过可用数量，卖出全部可用数量时允许零股，否则按手向下取整
+- 买入总金额超过可用资金时按比例缩减
+- 调仓：目标权重与当前持仓逐只比较，只交易差额，每只股票只有买或卖一个方向
+- 委托在交易线程中用 order_stock_async 逐笔提交，不并发访问交易实例，提交顺序确定；order_stock_async 只是提交请求，
+  不等待回报，委托编号由之后的 on_order_stock_async_response 按 seq 推送
+"""
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# 每手股数
+LOT_SIZE = 100
+
+
+def tick_prices(ticks: Dict[str, Dict], codes: Iterable[str]) -> np.ndarray:
+    """get_full_tick 结果中各股票的最新价，没有行情或价格无效（停牌、未开盘）时为 NaN"""
+    prices = np.array([float((ticks.get(code) or {}).get("lastPrice") or np.nan) for code in codes],
+                      dtype=np.float64)
+    prices[~(prices > 0)] = np.nan
+    return prices
+
+
+def lot_volumes(amounts: np.ndarray, prices: np.ndarray, lot: int = LOT_SIZE) -> np.ndarray:
+    """金额按价格换算成整手股数（同 calculate_buy_volume），价格无效或不足一手时为 0"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lots = np.floor(np.asarray(amounts, dtype=np.float64) / (prices * lot))
+    return np.where(np.isfinite(lots) & (lots > 0), lots, 0).astype(np.int64) * lot
+
+
+def sell_volumes(volumes: np.ndarray, can_use: np.ndarray, lot: int = LOT_SIZE) -> np.ndarray:
+    """卖出股数：不超过可用数量；卖出全部可用数量时保留零股，否则按手向下取整"""
+    volumes = np.maximum(np.asarray(volumes, dtype=np.int64), 0)
+    can_use = np.maximum(np.asarray(can_use, dtype=np.int64), 0)
+    capped = np.minimum(volumes, can_use)
+    return np.where(capped >= can_use, capped, capped // lot * lot)
+
+
+def scale_to_cash(amounts: np.ndarray, available: float) -> Tuple[np.ndarray, float]:
+    """买入总金额超过可用资金时按比例缩减，返回 (缩减后的金额, 比例)"""
+    total = float(np.nansum(amounts))
+    if total <= available or total <= 0:
+        return amounts, 1.0
+    scale = max(available, 0.0) / total
+    return amounts * scale, scale
+
+
+def rebalance_volumes(weights: np.ndarray, prices: np.ndarray, volumes: np.ndarray, can_use: np.ndarray,
+                      equity: float, lot: int = LOT_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    目标权重换算成每只股票的卖出、买入股数
+
+    目标股数为 权重 × 总资产 / 价格 按手向下取整。当前多于目标时卖出差额（不超过可用数量，见 sell_volumes），
+    目标为 0 时清仓（含零股）；少于目标时买入差额，按手向下取整。价格无效的股票不交易
+
+    Returns:
+        (目标股数, 卖出股数, 买入股数)
+    """
+    volumes = np.asarray(volumes, dtype=np.int64)
+    priced = ~np.isnan(prices)
+    target = np.where(priced, lot_volumes(np.asarray(weights, dtype=np.float64) * equity, prices, lot), volumes)
+    delta = target - volumes
+    sell = np.where(priced, sell_volumes(np.maximum(-delta, 0), can_use, lot), 0)
+    buy = np.where(priced, np.maximum(delta, 0) // lot * lot, 0)
+    return target, sell, buy
+
+
+def submit_in_order(calls: List[Callable[[], Any]]) -> List[Tuple[Any, str]]:
+    """在当前（交易）线程中依次执行一组提交函数，返回 (结果, 错误信息)，单笔出错不影响其他委托"""
+    results = []
+    for call in calls:
+        try:
+            results.append((call(), ""))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
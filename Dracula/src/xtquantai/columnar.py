@@ -0,0 +1,165 @@
+"""
+列式二进制编码
+K线、回测结果都是“字段 -> 数组”的列式数据，逐个数字转成 JSON 文本开销很大。
+这里提供可选的二进制编码：
+- npy: 每个字段一个 NumPy .npy 缓冲区
+- arrow: 所有字段合成一个 Arrow IPC 流/文件（需要安装 pyarrow）
+编码结果可以 base64 放在 EmbeddedResource 中返回，也可以写入文件后返回路径，
+由调用方以内存映射方式零拷贝加载：
+    np.load(path, mmap_mode='r')
+    pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+"""
+import base64
+import io
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+ENCODING_JSON = "json"
+ENCODING_NPY = "npy"
+ENCODING_ARROW = "arrow"
+
+ENCODINGS = (ENCODING_JSON, ENCODING_NPY, ENCODING_ARROW)
+
+NPY_MIME_TYPE = "application/x-npy"
+ARROW_MIME_TYPE = "application/vnd.apache.arrow.stream"
+
+COLUMNS_URI_PREFIX = "xtquantai://columns/"
+
+
+class BinaryPayload:
+    """工具返回的二进制结果，由 encode_result 编码为 元数据文本块 + EmbeddedResource"""
+
+    def __init__(self, meta: Dict[str, Any], blobs: List[Tuple[str, str, bytes]]):
+        """
+        Args:
+            meta: 元数据（字段、类型、长度等），编码为文本块
+            blobs: (uri, mime_type, data) 列表，每项编码为一个 EmbeddedResource
+        """
+        self.meta = meta
+        self.blobs = blobs
+
+    def b64_blobs(self) -> List[Tuple[str, str, str]]:
+        return [(uri, mime, base64.b64encode(data).decode("ascii")) for uri, mime, data in self.blobs]
+
+
+def to_array(values: Any) -> np.ndarray:
+    """把字段值转换为 numpy 数组，避免产生需要 pickle 的 object 数组"""
+    arr = np.asarray(values)
+    if arr.dtype == object:
+        try:
+            arr = arr.astype(np.float64)
+        except (TypeError, ValueError):
+            arr = arr.astype(str)
+    return arr
+
+
+def to_columns(data: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """字段 -> 数组 的字典转换为 numpy 列"""
+    return {field: to_array(values) for field, values in data.items()}
+
+
+def _npy_bytes(arr: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.lib.format.write_array(buffer, arr, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _arrow_table(columns: Dict[str, np.ndarray]):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("arrow 编码需要安装 pyarrow: pip install pyarrow")
+    return pa.table({field: pa.array(arr) for field, arr in columns.items()})
+
+
+def _arrow_bytes(columns: Dict[str, np.ndarray]) -> bytes:
+    table = _arrow_table(columns)
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+
+
+def describe_columns(columns: Dict[str, np.ndarray]) -> Dict[str, Dict]:
+    """列的类型和长度描述"""
+    description = {}
+    for field, arr in columns.items():
+        description[field] = {"dtype": arr.dtype.str, "length": int(len(arr))}
+        if arr.ndim > 1:
+            description[field]["shape"] = list(arr.shape)
+    return description
+
+
+def encode_columns(columns: Dict[str, Any], encoding: str, name: str,
+                   output_dir: str = "", meta: Dict[str, Any] = None) -> Any:
+    """按指定编码输出列式数据
+
+    Args:
+        columns: 字段 -> 数组/列表
+        encoding: 'npy' 或 'arrow'
+        name: 数据名称，用于资源 URI 和文件名，如 '600000.SH_1d'
+        output_dir: 输出目录；为空时以 base64 EmbeddedResource 返回，否则写入文件并返回路径
+        meta: 附加到元数据中的其他信息
+
+    Returns:
+        output_dir 为空时返回 BinaryPayload，否则返回包含文件路径的字典
+    """
+    if encoding not in (ENCODING_NPY, ENCODING_ARROW):
+        raise ValueError(f"不支持的编码: {encoding}，可选值: {', '.join(ENCODINGS)}")
+
+    columns = to_columns(columns)
+    info = {
+        **(meta or {}),
+        "encoding": encoding,
+        "name": name,
+        "columns": describe_columns(columns),
+    }
+    safe_name = _safe_name(name)
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        if encoding == ENCODING_NPY:
+            files = {}
+            for field, arr in columns.items():
+                path = os.path.abspath(os.path.join(output_dir, f"{safe_name}.{_safe_name(field)}.npy"))
+                np.save(path, arr, allow_pickle=False)
+                files[field] = path
+            info["files"] = files
+            info["usage"] = "np.load(path, mmap_mode='r')"
+        else:
+            table = _arrow_table(columns)
+            import pyarrow as pa
+            path = os.path.abspath(os.path.join(output_dir, f"{safe_name}.arrow"))
+            with pa.OSFile(path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            info["file"] = path
+            info["usage"] = "pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()"
+        return info
+
+    if encoding == ENCODING_NPY:
+        blobs = [(f"{COLUMNS_URI_PREFIX}{safe_name}/{_safe_name(field)}.npy", NPY_MIME_TYPE, _npy_bytes(arr))
+                 for field, arr in columns.items()]
+    else:
+        blobs = [(f"{COLUMNS_URI_PREFIX}{safe_name}.arrow", ARROW_MIME_TYPE, _arrow_bytes(columns))]
+    info["resources"] = [uri for uri, _, _ in blobs]
+    return BinaryPayload(info, blobs)
+
+
+def decode_npy(data: bytes) -> np.ndarray:
+    """解码 npy 缓冲区"""
+    return np.lib.format.read_array(io.BytesIO(data), allow_pickle=False)
+
+
+def decode_arrow(data: bytes) -> Dict[str, np.ndarray]:
+    """解码 Arrow IPC 流为 numpy 列"""
+    import pyarrow as pa
+    table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+    return {name: table.column(name).to_numpy() for name in table.column_names}
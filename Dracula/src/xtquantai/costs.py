@@ -0,0 +1,296 @@
+"""
+交易成本模型
+回测模板每笔交易固定扣除 0.003，不考虑整手、滑点和无法成交的K线。这里在模板的持仓信号上另算一套按成交股数计的收益：
+- 每笔交易买入固定金额（本地引擎中为模板的买入金额 50000），按 lot_size 向下取整（同 calculate_buy_volume），不足一手时不成交
+- 成交价为K线收盘价加减滑点：按股（slippage，元/股）和按比例（slippage_rate）两部分
+- 佣金按成交金额 × commission_rate 计，每次不低于 min_commission；印花税只在卖出时收取；过户费双向收取
+- 停牌（suspendFlag 为 1 或成交量为 0）的K线不能成交；收盘在涨停价（以上一交易日收盘价为基准）的K线买不进，在跌停价的K线卖不出，
+  委托顺延到下一根可成交的K线。涨跌停幅度默认按代码判断（科创板、创业板 20%，北交所 30%，其余 10%）
+- t_plus_one 时买入当天不能卖出，分钟K线的平仓委托顺延到下一个交易日
+收益（毛收益、净收益）和各项成本都以每笔交易买入时的成交金额（不含滑点）为基数，折算为百分比逐笔累加，与模板的策略收益口径相同；
+持仓期间按收盘价计算浮动收益，净收益中已扣除买入时的成本。
+开平仓判断、成交条件和收益曲线都是整列向量运算，只有撮合开平仓位置时按交易循环（见 fills.match_trades）。
+"""
+import json
+from typing import Any, Dict, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from .fills import holding_state, match_trades, next_available
+from .formula.functions import divide
+
+# 成本模型的参数及默认值（A股普通账户）
+COST_DEFAULTS = {
+    "commission_rate": 0.00025,
+    "min_commission": 5.0,
+    "stamp_duty": 0.0005,
+    "transfer_fee": 0.00001,
+    "slippage": 0.01,
+    "slippage_rate": 0.0,
+    "lot_size": 100,
+    "limit_ratio": None,
+    "t_plus_one": True,
+}
+
+# 预设的成本模型：a_share 为默认值；template 近似模板每笔交易扣除的 0.003（买卖各 0.0015，不考虑整手和涨跌停）；none 不计成本
+COST_PRESETS = {
+    "a_share": {},
+    "template": {
+        "commission_rate": 0.0015, "min_commission": 0.0, "stamp_duty": 0.0, "transfer_fee": 0.0,
+        "slippage": 0.0, "lot_size": 1, "limit_ratio": 0.0, "t_plus_one": False,
+    },
+    "none": {
+        "commission_rate": 0.0, "min_commission": 0.0, "stamp_duty": 0.0, "transfer_fee": 0.0,
+        "slippage": 0.0, "lot_size": 1, "limit_ratio": 0.0, "t_plus_one": False,
+    },
+}
+
+# 成本模型在回测结果中增加的列
+COST_COLUMNS = ("毛收益", "净收益", "佣金", "印花税", "过户费", "滑点", "顺延次数")
+
+# 成本明细的列
+COST_ITEMS = ("佣金", "印花税", "过户费", "滑点")
+
+# 判断涨跌停时允许的误差（半个最小价位），涨跌停价按昨收 × (1 ± 幅度) 四舍五入到分
+_LIMIT_TOLERANCE = 0.005 + 1e-9
+
+_DAY_MS = 86400 * 1000
+_UTC_OFFSET_MS = 8 * 3600 * 1000
+
+
+def price_limit_ratio(stock_code: str) -> float:
+    """按代码判断涨跌停幅度：科创板、创业板 20%，北交所 30%，其余 10%；无法判断 ST 股票的 5%"""
+    code, _, market = str(stock_code).upper().partition(".")
+    if market == "BJ":
+        return 0.3
+    if (market == "SH" and code.startswith("688")) or (market == "SZ" and code.startswith(("300", "301"))):
+        return 0.2
+    return 0.1
+
+
+class CostModel:
+    """交易成本模型，参数见 COST_DEFAULTS"""
+
+    __slots__ = tuple(COST_DEFAULTS)
+
+    def __init__(self, **params: Any):
+        unknown = sorted(set(params) - set(COST_DEFAULTS))
+        if unknown:
+            raise ValueError(f"不支持的成本参数: {', '.join(unknown)}，可选 {', '.join(COST_DEFAULTS)}")
+        for name, default in COST_DEFAULTS.items():
+            setattr(self, name, params.get(name, default))
+        if self.lot_size < 1:
+            raise ValueError(f"lot_size 必须不小于 1: {self.lot_size}")
+
+    @classmethod
+    def from_spec(cls, spec: Union[None, str, Mapping[str, Any], "CostModel"]) -> Optional["CostModel"]:
+        """由预设名或参数字典创建；字典中的 preset 指定基础预设，其余键覆盖预设的参数。spec 为空时返回 None"""
+        if spec is None or spec == "" or isinstance(spec, CostModel):
+            return spec or None
+        if isinstance(spec, str):
+            spec = {"preset": spec}
+        params = dict(spec)
+        preset = params.pop("preset", "a_share")
+        if preset not in COST_PRESETS:
+            raise ValueError(f"不支持的成本模型预设: {preset}，可选 {', '.join(COST_PRESETS)}")
+        return cls(**{**COST_PRESETS[preset], **params})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in COST_DEFAULTS}
+
+    def key(self) -> str:
+        """用于缓存键的规范化文本"""
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+
+def day_bounds(times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """每根K线所在交易日（北京时间）的第一根K线位置，以及下一个交易日第一根K线的位置"""
+    day = (np.asarray(times, dtype=np.int64) + _UTC_OFFSET_MS) // _DAY_MS
+    n = len(day)
+    change = np.flatnonzero(day[1:] != day[:-1]) + 1
+    starts = np.concatenate([[0], change])
+    ends = np.concatenate([change, [n]])
+    return np.repeat(starts, ends - starts), np.repeat(ends, ends - starts)
+
+
+def tradable_masks(bars: Mapping[str, Any], limit_ratio: float,
+                   first: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """每根K线能否买入、卖出
+
+    涨跌停价以上一交易日收盘价为基准：取当天第一根K线的 preClose，没有 preClose 时取上一根K线（前一天最后一根）的收盘价，
+    日线和分钟线都适用。first 为 day_bounds 的第一个结果，为空时按 bars["time"] 计算
+
+    Returns:
+        {buy: 可买入, sell: 可卖出, suspended: 停牌, limit_up: 收盘涨停, limit_down: 收盘跌停}
+    """
+    close = np.asarray(bars["close"], dtype=np.float64)
+    n = len(close)
+    suspended = np.isnan(close)
+    if "suspendFlag" in bars:
+        suspended |= np.nan_to_num(np.asarray(bars["suspendFlag"], dtype=np.float64)) == 1
+    if "volume" in bars:
+        suspended |= ~(np.asarray(bars["volume"], dtype=np.float64) > 0)
+    limit_up = np.zeros(n, dtype=bool)
+    limit_down = np.zeros(n, dtype=bool)
+    if limit_ratio and n:
+        if first is None:
+            first = day_bounds(bars["time"])[0]
+        if "preClose" in bars:
+            pre = np.asarray(bars["preClose"], dtype=np.float64)[first]
+        else:
+            pre = np.where(first > 0, close[first - 1], np.nan)
+        with np.errstate(invalid="ignore"):
+            limit_up = close >= pre * (1 + limit_ratio) - _LIMIT_TOLERANCE
+            limit_down = close <= pre * (1 - limit_ratio) + _LIMIT_TOLERANCE
+    return {
+        "buy": ~suspended & ~limit_up,
+        "sell": ~suspended & ~limit_down,
+        "suspended": suspended,
+        "limit_up": limit_up,
+        "limit_down": limit_down,
+    }
+
+
+def cost_backtest(bars: Mapping[str, Any], bk: np.ndarray, bp: np.ndarray, model: CostModel,
+                  amount: float, stock_code: str = "") -> Dict[str, Any]:
+    """按成本模型计算逐K线的毛收益、净收益和成本明细
+
+    Args:
+        bars: K线，至少包含 time、close；有 preClose、suspendFlag、volume 时用于判断涨跌停和停牌（见 tradable_masks）
+        bk: 开仓信号
+        bp: 平仓信号
+        model: 成本模型
+        amount: 每笔交易的买入金额
+        stock_code: 股票代码，model.limit_ratio 为 None 时据此判断涨跌停幅度
+
+    Returns:
+        {columns: COST_COLUMNS 中各列 -> 数组（百分比，逐笔累加）, trades: 逐笔交易列}
+    """
+    close = np.asarray(bars["close"], dtype=np.float64)
+    n = len(close)
+    holding = holding_state(bk, bp)
+    before = np.zeros(n, dtype=bool)
+    before[1:] = holding[:-1]
+    entries = np.flatnonzero(holding & ~before)
+    exits = np.flatnonzero(~holding & before)
+
+    ratio = price_limit_ratio(stock_code) if model.limit_ratio is None else float(model.limit_ratio)
+    first, settle = day_bounds(bars["time"]) if n else (None, None)
+    masks = tradable_masks(bars, ratio, first)
+    if not model.t_plus_one:
+        settle = None
+    fills = match_trades(entries, exits, next_available(masks["buy"]), next_available(masks["sell"]), 0, settle)
+
+    # 不足一手的交易不成交
+    entry_signal, buy, exit_signal, sell = fills.T
+    buy_close = close[buy]
+    buy_price = buy_close * (1 + model.slippage_rate) + model.slippage
+    shares = np.floor(divide(amount, buy_price) / model.lot_size) * model.lot_size
+    filled = shares > 0
+    entry_signal, buy, exit_signal, sell = fills[filled].T
+    buy_close, buy_price, shares = buy_close[filled], buy_price[filled], shares[filled]
+    closed = sell >= 0
+    sell_at = np.where(closed, sell, 0)
+    sell_close = np.where(closed, close[sell_at], np.nan)
+    sell_price = np.maximum(sell_close * (1 - model.slippage_rate) - model.slippage, 0.0)
+
+    # 每笔交易的金额（元）
+    buy_value = shares * buy_price
+    sell_value = np.where(closed, shares * sell_price, 0.0)
+    buy_commission = np.maximum(buy_value * model.commission_rate, model.min_commission)
+    sell_commission = np.where(closed, np.maximum(sell_value * model.commission_rate, model.min_commission), 0.0)
+    base = shares * buy_close
+
+    # 成本按发生的K线记入，折算为百分比后累加
+    def booked(at_buy: np.ndarray, at_sell: np.ndarray) -> np.ndarray:
+        step = np.zeros(n)
+        np.add.at(step, buy, at_buy / base * 100)
+        np.add.at(step, sell[closed], (at_sell / base * 100)[closed])
+        return np.cumsum(step)
+
+    zero = np.zeros(len(buy))
+    costs = {
+        "佣金": booked(buy_commission, sell_commission),
+        "印花税": booked(zero, sell_value * model.stamp_duty),
+        "过户费": booked(buy_value * model.transfer_fee, sell_value * model.transfer_fee),
+        "滑点": booked(shares * (buy_price - buy_close), np.where(closed, shares * (sell_close - sell_price), 0.0)),
+    }
+
+    # 毛收益：已平仓交易按收盘价计的收益 + 持仓期间的浮动收益
+    trade_gross = (divide(sell_close, buy_close) - 1) * 100
+    realized = np.zeros(n)
+    np.add.at(realized, sell[closed], trade_gross[closed])
+    realized = np.cumsum(realized)
+    position = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(position, buy, 1)
+    np.add.at(position, np.where(closed, sell, n), -1)
+    position = np.cumsum(position[:n]) > 0
+    # 每根K线所属的（最近一次买入的）交易
+    trade = np.zeros(n, dtype=np.int64)
+    trade[buy] = 1
+    trade = np.maximum(np.cumsum(trade) - 1, 0)
+    if len(buy):
+        floating = (divide(close, buy_close[trade]) - 1) * 100
+        floating = np.where(position, np.nan_to_num(floating), 0.0)
+    else:
+        floating = np.zeros(n)
+    gross = realized + floating
+    total_cost = sum(costs.values())
+
+    delayed = np.zeros(n)
+    np.add.at(delayed, buy, (buy > entry_signal).astype(np.float64))
+    np.add.at(delayed, sell[closed], (sell > exit_signal)[closed].astype(np.float64))
+
+    columns = {"毛收益": gross, "净收益": gross - total_cost, **costs, "顺延次数": np.cumsum(delayed)}
+    fees = (buy_commission + sell_commission + sell_value * model.stamp_duty
+            + (buy_value + sell_value) * model.transfer_fee)
+    times = np.asarray(bars["time"])
+    return {
+        "columns": columns,
+        "trades": {
+            "entry_time": times[buy],
+            "entry_price": buy_price,
+            "exit_time": np.where(closed, times[sell_at], 0),
+            "exit_price": np.where(closed, sell_price, np.nan),
+            "shares": shares,
+            "gross": np.where(closed, shares * (sell_close - buy_close), np.nan),
+            "net": np.where(closed, sell_value - buy_value - fees, np.nan),
+            "fees": fees,
+        },
+    }
+
+
+def order_costs(model: CostModel, volumes: np.ndarray, prices: np.ndarray, is_sell: np.ndarray) -> Dict[str, np.ndarray]:
+    """按成本模型估算一组委托的成本（元），口径同 cost_backtest：滑点按成交价偏离报价计，佣金每笔不低于 min_commission
+
+    Returns:
+        {佣金, 印花税, 过户费, 滑点}，股数为 0 的委托各项为 0
+    """
+    volumes = np.asarray(volumes, dtype=np.float64)
+    prices = np.nan_to_num(np.asarray(prices, dtype=np.float64))
+    is_sell = np.asarray(is_sell, dtype=bool)
+    traded = volumes > 0
+    value = volumes * prices
+    return {
+        "佣金": np.where(traded, np.maximum(value * model.commission_rate, model.min_commission), 0.0),
+        "印花税": np.where(is_sell, value * model.stamp_duty, 0.0),
+        "过户费": value * model.transfer_fee,
+        "滑点": volumes * (prices * model.slippage_rate + model.slippage),
+    }
+
+
+def cost_summary(columns: Mapping[str, np.ndarray]) -> Dict[str, Any]:
+    """成本相关的汇总指标（最后一根K线），columns 可以是 cost_backtest 的列或含这些列的回测结果"""
+    def last(name: str) -> float:
+        values = np.asarray(columns[name], dtype=np.float64)
+        value = float(values[-1]) if len(values) else 0.0
+        return 0.0 if np.isnan(value) else value
+
+    gross, net = last("毛收益"), last("净收益")
+    return {
+        "毛收益率": gross,
+        "净收益率": net,
+        "交易成本": gross - net,
+        "成本明细": {name: last(name) for name in COST_ITEMS},
+        "顺延次数": int(last("顺延次数")),
+    }
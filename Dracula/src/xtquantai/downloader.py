@@ -0,0 +1,224 @@
+"""
+批量历史数据下载
+xtdata.download_history_data 一次只下载一个代码，并且同步阻塞到完成。
+这里把整个板块/市场的下载拆成按代码的任务：
+- 有界线程池并行下载，失败按指数退避重试
+- 每个代码完成后追加写入检查点清单（JSON Lines），中断后重新执行同一任务时跳过已完成的代码
+- 本地数据已覆盖目标区间的代码直接跳过
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from .kline_cache import CACHE_DIR
+
+# 检查点清单目录
+DOWNLOAD_DIR = os.path.join(CACHE_DIR, "downloads")
+
+# 默认并行下载数
+DOWNLOAD_WORKERS = int(os.environ.get("XTQUANTAI_DOWNLOAD_WORKERS", "4"))
+
+# 单个代码失败后的最大重试次数
+DOWNLOAD_RETRIES = int(os.environ.get("XTQUANTAI_DOWNLOAD_RETRIES", "3"))
+
+# 重试退避的基础间隔（秒），第 n 次重试等待 基础间隔 * 2^n * [0.5, 1.5) 的随机倍数
+DOWNLOAD_BACKOFF = float(os.environ.get("XTQUANTAI_DOWNLOAD_BACKOFF", "1.0"))
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def make_job_id(source: str, period: str, start_time: str, end_time: str) -> str:
+    """同一数据源、周期、区间的下载任务使用相同的任务ID，从而可以续传"""
+    key = "|".join([source, period, start_time or "", end_time or ""])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+class DownloadManifest:
+    """检查点清单，每行一个 JSON 记录，后写的记录覆盖先写的"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header: Dict = {}
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 进程中断时最后一行可能不完整
+                        continue
+                    if "code" in record:
+                        self.entries[record["code"]] = record
+                    else:
+                        self.header = record
+
+    def is_done(self, code: str, target: str) -> bool:
+        """代码是否已按同一目标日期下载完成"""
+        entry = self.entries.get(code)
+        return entry is not None and entry["status"] == STATUS_DONE and entry.get("target") == target
+
+    def _append(self, record: Dict) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_header(self, header: Dict) -> None:
+        with self._lock:
+            self.header = header
+            self._append(header)
+
+    def record(self, code: str, status: str, **info) -> None:
+        with self._lock:
+            record = {"code": code, "status": status, "time": time.time(), **info}
+            self.entries[code] = record
+            self._append(record)
+
+    def summary(self) -> Dict:
+        done = sum(1 for e in self.entries.values() if e["status"] == STATUS_DONE)
+        return {
+            "job": self.header,
+            "done": done,
+            "failed": [{"code": code, "error": e.get("error", "")} for code, e in self.entries.items()
+                       if e["status"] == STATUS_FAILED],
+        }
+
+
+class BulkDownloadJob:
+    """一次批量下载任务"""
+
+    def __init__(self, job_id: str, codes: List[str], target: str,
+                 download: Callable[[str], None], manifest: DownloadManifest,
+                 workers: int = DOWNLOAD_WORKERS, retries: int = DOWNLOAD_RETRIES,
+                 backoff: float = DOWNLOAD_BACKOFF,
+                 on_success: Optional[Callable[[str], None]] = None,
+                 progress: Optional[Callable] = None):
+        """
+        Args:
+            job_id: 任务ID
+            codes: 需要下载的代码（已去重，不含本地已有数据的代码）
+            target: 目标日期，检查点记录只在目标日期相同时视为完成
+            download: 下载单个代码的函数，失败时抛出异常
+            manifest: 检查点清单
+            workers: 并行下载数
+            retries: 单个代码的最大重试次数
+            backoff: 重试退避的基础间隔（秒）
+            on_success: 单个代码下载成功后的回调
+            progress: 进度回调 progress(完成数, 总数, 消息)
+        """
+        self.job_id = job_id
+        self.codes = codes
+        self.target = target
+        self.download = download
+        self.manifest = manifest
+        self.workers = max(1, workers)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.on_success = on_success
+        self.progress = progress
+
+        self.status = "pending"
+        self.total = len(codes)
+        self.completed = 0
+        self.downloaded = 0
+        self.retried = 0
+        self.failed: Dict[str, str] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _download_one(self, code: str) -> None:
+        error = ""
+        attempts = 0
+        for attempt in range(self.retries + 1):
+            attempts = attempt + 1
+            try:
+                self.download(code)
+                error = ""
+                break
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if attempt < self.retries:
+                    with self._lock:
+                        self.retried += 1
+                    time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+        if error:
+            self.manifest.record(code, STATUS_FAILED, target=self.target, attempts=attempts, error=error)
+        else:
+            self.manifest.record(code, STATUS_DONE, target=self.target, attempts=attempts)
+            if self.on_success:
+                self.on_success(code)
+
+        with self._lock:
+            self.completed += 1
+            if error:
+                self.failed[code] = error
+            else:
+                self.downloaded += 1
+            completed = self.completed
+        if self.progress:
+            self.progress(completed, self.total, f"{code} {'失败' if error else '完成'}")
+
+    def run(self) -> Dict:
+        """执行下载，返回任务状态"""
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.workers, max(1, self.total)),
+                                    thread_name_prefix="xtquantai-download") as pool:
+                list(pool.map(self._download_one, self.codes))
+        finally:
+            self.finished_at = time.time()
+            self.status = "failed" if self.failed else "finished"
+        return self.state()
+
+    def state(self) -> Dict:
+        """任务当前状态"""
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "target": self.target,
+            "total": self.total,
+            "completed": self.completed,
+            "downloaded": self.downloaded,
+            "retried": self.retried,
+            "failed": [{"code": code, "error": error} for code, error in self.failed.items()],
+            "elapsed": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "manifest": self.manifest.path,
+        }
+
+
+class DownloadJobRegistry:
+    """进程内的下载任务表，同一任务同时只允许运行一个"""
+
+    def __init__(self, root: str = DOWNLOAD_DIR):
+        self.root = root
+        self.jobs: Dict[str, BulkDownloadJob] = {}
+        self._lock = threading.Lock()
+
+    def manifest(self, job_id: str) -> DownloadManifest:
+        return DownloadManifest(os.path.join(self.root, f"{job_id}.jsonl"))
+
+    def start(self, job: BulkDownloadJob) -> None:
+        """登记任务，同一任务正在运行时抛出 ValueError"""
+        with self._lock:
+            running = self.jobs.get(job.job_id)
+            if running is not None and running.status in ("pending", "running"):
+                raise ValueError(f"下载任务 {job.job_id} 正在运行，可通过 get_bulk_download_status 查询进度")
+            self.jobs[job.job_id] = job
+
+    def get(self, job_id: str) -> Optional[BulkDownloadJob]:
+        return self.jobs.get(job_id)
+
+
+# 全局下载任务表
+download_jobs = DownloadJobRegistry()
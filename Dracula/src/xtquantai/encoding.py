@@ -0,0 +1,183 @@
+"""
+工具结果编码
+把工具返回值编码为 MCP 内容块：
+- 使用紧凑 JSON（无缩进），numpy/日期等类型直接转换
+- 列式二进制结果（BinaryPayload）编码为 元数据文本块 + EmbeddedResource
+- 结果中的长数组（K线字段列、回测 daily_data 等）超过分页大小时，
+  结果存入结果仓库，只返回清单和第一页；
+  其余部分通过 get_result_page 工具按游标翻页，或通过资源 URI 一次性读取
+"""
+import json
+import os
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+import mcp.types as types
+
+from .columnar import BinaryPayload
+
+# 结果资源 URI 前缀
+RESULT_URI_PREFIX = "xtquantai://result/"
+
+# 单页最多包含的数组元素个数
+PAGE_SIZE = int(os.environ.get("XTQUANTAI_PAGE_SIZE", "10000"))
+
+# 结果仓库最多保留的结果个数
+RESULT_STORE_SIZE = int(os.environ.get("XTQUANTAI_RESULT_STORE_SIZE", "16"))
+
+
+def _json_default(obj: Any) -> Any:
+    """json 无法直接序列化的类型的转换"""
+    if hasattr(obj, "tolist"):        # numpy 数组和标量
+        return obj.tolist()
+    if hasattr(obj, "isoformat"):     # datetime / pandas.Timestamp
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def dumps(obj: Any) -> str:
+    """紧凑 JSON 序列化"""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+def max_array_length(obj: Any) -> int:
+    """结果中最长数组的长度"""
+    if isinstance(obj, dict):
+        return max((max_array_length(v) for v in obj.values()), default=0)
+    if isinstance(obj, (list, tuple)):
+        if len(obj) > PAGE_SIZE:
+            return len(obj)
+        return max([len(obj)] + [max_array_length(v) for v in obj])
+    if hasattr(obj, "shape") and getattr(obj, "ndim", 0) > 0:
+        return len(obj)
+    return 0
+
+
+def slice_arrays(obj: Any, start: int, stop: int, threshold: int = PAGE_SIZE) -> Any:
+    """把结果中长度超过 threshold 的数组统一截取为 [start:stop]，其余部分原样保留"""
+    if isinstance(obj, dict):
+        return {k: slice_arrays(v, start, stop, threshold) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)) or (hasattr(obj, "shape") and getattr(obj, "ndim", 0) > 0):
+        if len(obj) > threshold:
+            return obj[start:stop]
+        if isinstance(obj, (list, tuple)):
+            return [slice_arrays(v, start, stop, threshold) for v in obj]
+    return obj
+
+
+class ResultStore:
+    """大结果仓库，按最近使用顺序保留有限个结果"""
+
+    def __init__(self, max_size: int = RESULT_STORE_SIZE):
+        self.max_size = max_size
+        self.results: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def put(self, result: Any, total: int, tool_name: str = "") -> str:
+        """保存结果，返回结果ID"""
+        result_id = uuid.uuid4().hex[:16]
+        self.results[result_id] = {"result": result, "total": total, "tool": tool_name}
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+        return result_id
+
+    def get(self, result_id: str) -> Dict:
+        """获取结果记录"""
+        if result_id not in self.results:
+            raise ValueError(f"结果不存在或已过期: {result_id}")
+        self.results.move_to_end(result_id)
+        return self.results[result_id]
+
+    def page(self, result_id: str, cursor: int = 0, page_size: int = PAGE_SIZE) -> Dict:
+        """按游标获取一页结果"""
+        entry = self.get(result_id)
+        page_size = max(1, min(page_size, PAGE_SIZE))
+        cursor = max(0, cursor)
+        stop = min(cursor + page_size, entry["total"])
+        return {
+            "result_id": result_id,
+            "cursor": cursor,
+            "next_cursor": stop if stop < entry["total"] else None,
+            "total": entry["total"],
+            "data": slice_arrays(entry["result"], cursor, stop),
+        }
+
+
+# 全局结果仓库
+result_store = ResultStore()
+
+
+def result_uri(result_id: str) -> str:
+    return f"{RESULT_URI_PREFIX}{result_id}"
+
+
+def encode_result(result: Any, tool_name: str = "") -> List[Union[types.TextContent, types.EmbeddedResource]]:
+    """把工具返回值编码为内容块列表
+
+    二进制结果编码为元数据文本块和若干 EmbeddedResource；
+    小结果直接编码为一个紧凑 JSON 文本块；
+    包含长数组的大结果编码为两个文本块：分页清单 + 第一页数据。
+    """
+    if isinstance(result, BinaryPayload):
+        return [types.TextContent(type="text", text=dumps(result.meta))] + [
+            types.EmbeddedResource(
+                type="resource",
+                resource=types.BlobResourceContents(uri=uri, mimeType=mime, blob=blob),
+            )
+            for uri, mime, blob in result.b64_blobs()
+        ]
+
+    total = max_array_length(result)
+    if total <= PAGE_SIZE:
+        return [types.TextContent(type="text", text=dumps(result))]
+
+    result_id = result_store.put(result, total, tool_name)
+    first_page = result_store.page(result_id, 0, PAGE_SIZE)
+    manifest = {
+        "paged": True,
+        "result_id": result_id,
+        "resource_uri": result_uri(result_id),
+        "total": total,
+        "page_size": PAGE_SIZE,
+        "next_cursor": first_page["next_cursor"],
+        "message": (f"结果包含 {total} 条数据，仅返回第一页；"
+                    f"请使用 get_result_page 工具按 next_cursor 翻页，或读取资源 {result_uri(result_id)}"),
+    }
+    return [
+        types.TextContent(type="text", text=dumps(manifest)),
+        types.TextContent(type="text", text=dumps(first_page["data"])),
+    ]
+
+
+def list_result_resources() -> List[types.Resource]:
+    """列出结果仓库中的结果资源"""
+    return [
+        types.Resource(
+            uri=result_uri(result_id),
+            name=f"{entry['tool'] or 'result'}-{result_id}",
+            description=f"工具 {entry['tool']} 的大结果，共 {entry['total']} 条数据",
+            mimeType="application/json",
+        )
+        for result_id, entry in result_store.results.items()
+    ]
+
+
+def parse_result_uri(uri: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """解析结果资源 URI，支持 ?cursor=&page_size= 查询参数"""
+    parsed = urlparse(str(uri))
+    result_id = parsed.path.strip("/")
+    query = parse_qs(parsed.query)
+    cursor = int(query["cursor"][0]) if "cursor" in query else None
+    page_size = int(query["page_size"][0]) if "page_size" in query else None
+    return result_id, cursor, page_size
+
+
+def read_result_resource(uri: str) -> str:
+    """读取结果资源，不带游标时返回完整结果"""
+    result_id, cursor, page_size = parse_result_uri(uri)
+    if cursor is None and page_size is None:
+        return dumps(result_store.get(result_id)["result"])
+    return dumps(result_store.page(result_id, cursor or 0, page_size or PAGE_SIZE))
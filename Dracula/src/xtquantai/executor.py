@@ -0,0 +1,90 @@
+"""
+工具执行调度
+xtdata / XtQuantTrader 的接口都是同步阻塞的，而工具函数均为 async def，
+直接在事件循环里调用会让一个慢请求阻塞整个 stdio 服务器。
+这里按工具注册时声明的执行类别，把工具派发到对应的有界执行池中运行。
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# 执行类别
+EXECUTION_INLINE = "inline"      # 直接在事件循环中执行
+EXECUTION_IO = "io"              # 阻塞IO（xtdata 行情/数据下载），线程池
+EXECUTION_CPU = "cpu"            # 本地重计算，进程池
+EXECUTION_TRADING = "trading"    # 交易接口，单线程池，保证顺序且避免并发访问交易实例
+
+EXECUTION_CLASSES = (EXECUTION_INLINE, EXECUTION_IO, EXECUTION_CPU, EXECUTION_TRADING)
+
+# 工具注册时可声明的执行类别。cpu 进程池只接收纯计算的模块级函数（参数寻优的批次等，K线经共享内存传递），
+# 不能整个派发工具：ProgressReporter 持有 MCP 会话和事件循环，不能序列化到子进程；
+# K线缓存、回测结果缓存、信号编译缓存等模块级缓存在子进程中各有一份，命中和淘汰都不会回到主进程，
+# 其中的线程锁也不跨进程；子进程还要各自连接 xtdata。回测、寻优、滚动窗口等工具因此注册为 io，
+# 在线程中读取K线后把重计算交给 cpu 进程池
+TOOL_EXECUTION_CLASSES = (EXECUTION_INLINE, EXECUTION_IO, EXECUTION_TRADING)
+
+# 各执行池的大小，可通过环境变量调整
+IO_WORKERS = int(os.environ.get("XTQUANTAI_IO_WORKERS", "8"))
+CPU_WORKERS = int(os.environ.get("XTQUANTAI_CPU_WORKERS", str(os.cpu_count() or 2)))
+
+_executors: Dict[str, Executor] = {}
+
+
+def get_executor(execution: str) -> Executor:
+    """获取执行类别对应的执行池（懒创建）"""
+    if execution not in _executors:
+        if execution == EXECUTION_IO:
+            _executors[execution] = ThreadPoolExecutor(
+                max_workers=IO_WORKERS, thread_name_prefix="xtquantai-io")
+        elif execution == EXECUTION_CPU:
+            _executors[execution] = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+        elif execution == EXECUTION_TRADING:
+            _executors[execution] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="xtquantai-trading")
+        else:
+            raise ValueError(f"不支持的执行类别: {execution}")
+    return _executors[execution]
+
+
+def _run_tool_sync(func: Callable, kwargs: Dict) -> Any:
+    """在工作线程/进程中运行异步工具函数
+
+    工具内部只有同步阻塞调用，为其单独创建事件循环执行即可。
+    必须是模块级函数，才能被进程池序列化。
+    """
+    return asyncio.run(func(**kwargs))
+
+
+async def run_tool(func: Callable, kwargs: Dict, execution: str = EXECUTION_IO) -> Any:
+    """按执行类别运行工具函数
+
+    Args:
+        func: 注册的异步工具函数
+        kwargs: 调用参数
+        execution: 执行类别
+
+    Returns:
+        工具函数的返回值
+    """
+    if execution == EXECUTION_INLINE:
+        return await func(**kwargs)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(execution), functools.partial(_run_tool_sync, func, kwargs))
+
+
+async def run_blocking(func: Callable, *args, execution: str = EXECUTION_IO, **kwargs) -> Any:
+    """在执行池中运行单个同步阻塞函数，供 inline 工具内部使用"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(execution), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """关闭所有执行池"""
+    for executor in _executors.values():
+        executor.shutdown(wait=wait)
+    _executors.clear()
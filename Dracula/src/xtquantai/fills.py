@@ -0,0 +1,68 @@
+"""
+撮合
+回测模板的持仓状态（锁存器），以及把开平仓信号撮合到可成交位置的函数，供分笔回放和成本模型共用
+"""
+from typing import Optional
+
+import numpy as np
+
+from .formula.functions import truth
+
+
+def holding_state(bk: np.ndarray, bp: np.ndarray) -> np.ndarray:
+    """每根K线结束时的持仓状态（TestHolding）"""
+    n = len(bk)
+    idx = np.arange(n)
+    bk, bp = truth(bk), truth(bp)
+    last_entry = np.maximum.accumulate(np.where(bk & ~bp, idx, -1))
+    last_exit = np.maximum.accumulate(np.where(bp, idx, -1))
+    return last_entry > last_exit
+
+
+def next_available(available: np.ndarray) -> np.ndarray:
+    """每个位置及之后第一个可成交位置，长度为 n+1，没有时为 n"""
+    n = len(available)
+    index = np.where(available, np.arange(n), n)
+    out = np.full(n + 1, n)
+    out[:n] = np.minimum.accumulate(index[::-1])[::-1]
+    return out
+
+
+def match_trades(entries: np.ndarray, exits: np.ndarray, next_buy: np.ndarray, next_sell: np.ndarray,
+                 delay: int = 0, settle: Optional[np.ndarray] = None) -> np.ndarray:
+    """把开平仓信号撮合为成交位置
+
+    按交易循环（而非按K线）：第 k 笔交易在开仓信号后第 delay 根及之后第一个可买入的位置买入，且不早于上一笔的卖出；
+    在平仓信号后第 delay 根及之后第一个可卖出的位置卖出，且不早于 settle[买入位置]（默认买入的下一根）。
+    平仓委托生效（平仓信号后第 delay 根）时仍未买入的交易视为错过开仓，开平仓都不成交
+
+    Args:
+        entries: 开仓信号位置
+        exits: 平仓信号位置
+        next_buy: next_available(可买入)
+        next_sell: next_available(可卖出)
+        delay: 信号后第几根开始撮合
+        settle: 每个买入位置之后最早可卖出的位置，如 T+1 时为下一个交易日的第一根
+
+    Returns:
+        (交易数, 4) 数组：开仓信号、买入位置、平仓信号、卖出位置；未平仓的交易平仓信号和卖出位置为 -1
+    """
+    n = len(next_buy) - 1
+    fills = []
+    ready = 0
+    for k, signal in enumerate(entries):
+        buy = next_buy[min(max(signal + delay, ready), n)]
+        if buy >= n:
+            break
+        if k >= len(exits):
+            fills.append((signal, buy, -1, -1))
+            break
+        if buy > exits[k] + delay:
+            continue
+        earliest = buy + 1 if settle is None else settle[buy]
+        sell = next_sell[min(max(exits[k] + delay, earliest), n)]
+        fills.append((signal, buy, exits[k], sell if sell < n else -1))
+        if sell >= n:
+            break
+        ready = sell
+    return np.array(fills, dtype=np.int64).reshape(-1, 4)
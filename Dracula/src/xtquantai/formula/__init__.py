@@ -0,0 +1,23 @@
+"""
+信号公式本地求值
+解析 create_ma_cross_signal / create_custom_signal 使用的公式语言，编译为 NumPy 向量运算，
+在本地缓存的K线上直接计算，不再需要把公式交给 xtdata.get_vba_func_result 逐只股票执行。
+
+    signal = compile_signal("input:N1(5,1,100,1);ma1:=ma(c,N1);bk:=cross(c,ma1);")
+    signal.evaluate({"close": closes}, params={"N1": 10})["BK"]
+
+实盘中逐根K线（或分笔）增量计算：
+
+    stream = StreamingSignal(signal, params={"N1": 10})
+    stream.update({"close": 10.5})["BK"]
+"""
+from .parser import FormulaError, FormulaSyntaxError, InputSpec, Program, normalize_source, parse
+from .functions import FUNCTIONS
+from .compiler import CompiledSignal, clear_signal_cache, compile_signal, evaluate_signal, signal_cache_info
+from .streaming import StreamingSignal
+
+__all__ = [
+    "FormulaError", "FormulaSyntaxError", "InputSpec", "Program", "normalize_source", "parse",
+    "FUNCTIONS", "CompiledSignal", "clear_signal_cache", "compile_signal", "evaluate_signal", "signal_cache_info",
+    "StreamingSignal",
+]
@@ -0,0 +1,426 @@
+"""
+信号公式编译与求值
+把语法树编译为向量运算的有向无环图：每个节点是对整段序列的一次数组运算。编译时规范化并化简：
+- 相同的节点（同一运算、同样的子节点）只保留一个，MA(C,5) 在公式中出现多次也只计算一次；
+  变量、行情字段别名（C 与 CLOSE）、函数别名（EXPMA 与 EMA）、满足交换律的运算（A+B 与 B+A）
+  以及镜像的比较（A<B 与 B>A）都归并到同一个节点
+- 只含常数的运算和逐元素函数在编译时折叠为常数，X+0、X*1 等恒等运算直接取 X
+求值时只计算所需输出依赖的节点，按拓扑序逐个执行。
+编译结果按规范化的公式文本缓存，规范化后结构相同（canonical_hash 相同）的公式共享同一个编译结果。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta, timezone
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .functions import ELEMENTWISE, FUNCTIONS, divide, truth
+from .parser import Assign, Binary, Call, FormulaError, InputSpec, Name, Num, Program, Str, Unary, parse, \
+    normalize_source
+
+# 行情字段别名 -> get_market_data_ex_ori 字段名
+FIELD_ALIASES = {
+    "O": "open", "OPEN": "open",
+    "H": "high", "HIGH": "high",
+    "L": "low", "LOW": "low",
+    "C": "close", "CLOSE": "close",
+    "V": "volume", "VOL": "volume", "VOLUME": "volume",
+    "AMO": "amount", "AMOUNT": "amount",
+}
+
+# 由时间列派生的序列
+TIME_FIELDS = ("DATE", "TIME", "YEAR", "MONTH", "DAY", "BARPOS")
+
+_TZ = timezone(timedelta(hours=8))
+
+# 比较与算术运算
+_COMPARE = {">": np.greater, "<": np.less, ">=": np.greater_equal, "<=": np.less_equal,
+            "=": np.equal, "<>": np.not_equal}
+_ARITHMETIC = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": divide}
+
+# 满足交换律的运算，操作数按结构摘要排列
+_COMMUTATIVE = {"+", "*", "=", "<>", "AND", "OR"}
+
+# 镜像的比较：A<B 即 B>A
+_MIRRORED = {"<": ">", "<=": ">="}
+
+# 同一实现的函数名 -> 规范名
+_FUNCTION_ALIASES = {"EXPMA": "EMA", "IFF": "IF"}
+
+# 编译结果缓存的大小（按公式文本计）
+SIGNAL_CACHE_SIZE = int(os.environ.get("XTQUANTAI_SIGNAL_CACHE_SIZE", "256"))
+
+
+def _time_field(name: str, times: np.ndarray) -> np.ndarray:
+    if name == "BARPOS":
+        return np.arange(1, len(times) + 1, dtype=np.float64)
+    # time 列为毫秒时间戳，转换为北京时间
+    stamps = pd.to_datetime(times, unit="ms", utc=True).tz_convert(_TZ)
+    if name == "DATE":
+        # QMT 公式的 DATE 为 年份-1900 后接月日，如 2024-01-05 为 1240105
+        values = (stamps.year - 1900) * 10000 + stamps.month * 100 + stamps.day
+    elif name == "TIME":
+        values = stamps.hour * 10000 + stamps.minute * 100 + stamps.second
+    else:
+        values = getattr(stamps, name.lower())
+    return np.asarray(values, dtype=np.float64)
+
+
+class CompiledSignal:
+    """编译后的信号公式
+
+    Attributes:
+        inputs: input 声明的参数，名称 -> InputSpec
+        variables: 赋值语句的变量名 -> 节点序号
+        outputs: ':' 声明的输出变量名
+        fields: 用到的行情字段（get_market_data_ex_ori 字段名）
+        nodes: 节点列表 (类型, 参数)，按拓扑序排列，没有重复
+        canonical_hash: 规范化后的参数、节点和变量的哈希，结构相同的公式哈希相同
+        stats: 编译统计 {expressions: 语法树中的运算数, operations: 化简后的运算节点数, nodes: 节点数（含常数、参数和字段）,
+               shared: 复用已有节点的次数, folded: 折叠的运算数}
+
+    编译结果可能被多个调用方共享（见 compile_signal），不要修改
+    """
+
+    def __init__(self, program: Program, source: str = ""):
+        self.source = source
+        self.inputs: Dict[str, InputSpec] = {spec.name: spec for spec in program.inputs}
+        self.nodes: List[Tuple[str, Any]] = []
+        self.variables: Dict[str, int] = {}
+        self.outputs: List[str] = []
+        self.fields: set = set()
+        self.stats = {"expressions": 0, "operations": 0, "nodes": 0, "shared": 0, "folded": 0}
+        self._index: Dict[Tuple[str, Any], int] = {}
+        # 每个节点的结构摘要：由运算和子节点的摘要决定，与节点编号无关
+        self._digests: List[str] = []
+        for statement in program.statements:
+            self._statement(statement)
+        self._prune()
+        self.stats["nodes"] = len(self.nodes)
+        self.stats["operations"] = sum(kind in ("unary", "binary", "call") for kind, _ in self.nodes)
+        inputs = sorted((spec.name, spec.default, spec.min, spec.max, spec.step) for spec in program.inputs)
+        variables = sorted((name, self._digests[index]) for name, index in self.variables.items())
+        self.canonical_hash = _digest((inputs, variables, self.outputs))
+        del self._index, self._digests
+
+    # ---------- 编译 ----------
+
+    def _add(self, kind: str, arg: Any) -> int:
+        """添加节点，已有相同节点时返回它的序号"""
+        key = (kind, arg)
+        index = self._index.get(key)
+        if index is not None:
+            self.stats["shared"] += 1
+            return index
+        self.nodes.append(key)
+        if kind in ("unary", "binary"):
+            arg = (arg[0],) + tuple(self._digests[j] for j in arg[1:])
+        elif kind == "call":
+            arg = (arg[0], tuple(self._digests[j] for j in arg[1]))
+        self._digests.append(_digest((kind, arg)))
+        index = self._index[key] = len(self.nodes) - 1
+        return index
+
+    def _prune(self) -> None:
+        """去掉变量不再引用的节点（折叠后留下的常数等）并重新编号"""
+        live = [False] * len(self.nodes)
+        for index in self.variables.values():
+            live[index] = True
+        for i in range(len(self.nodes) - 1, -1, -1):
+            if live[i]:
+                for j in self._children(i):
+                    live[j] = True
+        renumber = {}
+        nodes = []
+        self._digests = [digest for digest, keep in zip(self._digests, live) if keep]
+        for i, (kind, arg) in enumerate(self.nodes):
+            if not live[i]:
+                continue
+            if kind == "unary":
+                arg = (arg[0], renumber[arg[1]])
+            elif kind == "binary":
+                arg = (arg[0], renumber[arg[1]], renumber[arg[2]])
+            elif kind == "call":
+                arg = (arg[0], tuple(renumber[j] for j in arg[1]))
+            renumber[i] = len(nodes)
+            nodes.append((kind, arg))
+        self.nodes = nodes
+        self.variables = {name: renumber[index] for name, index in self.variables.items()}
+        self.fields = {arg for kind, arg in nodes if kind == "field"} | ({"time"} if any(
+            kind == "time" for kind, _ in nodes) else set())
+
+    def _const(self, value: Any) -> int:
+        # + 0.0 把 -0.0 统一为 0.0
+        return self._add("const", float(np.asarray(value, dtype=np.float64)) + 0.0)
+
+    def _folded(self, value: Any) -> int:
+        self.stats["folded"] += 1
+        return self._const(value)
+
+    def _statement(self, statement: Assign) -> None:
+        if statement.name in self.inputs or statement.name in FIELD_ALIASES:
+            raise FormulaError(f"变量名 {statement.name} 与参数或行情字段重名")
+        self.variables[statement.name] = self._expr(statement.expr)
+        if statement.output and statement.name not in self.outputs:
+            self.outputs.append(statement.name)
+
+    def _expr(self, expr) -> int:
+        if isinstance(expr, Num):
+            return self._const(expr.value)
+        if isinstance(expr, Name):
+            return self._name(expr.name)
+        self.stats["expressions"] += 1
+        if isinstance(expr, Unary):
+            return self._unary(expr.op, self._expr(expr.operand))
+        if isinstance(expr, Binary):
+            return self._binary(expr.op, self._expr(expr.left), self._expr(expr.right))
+        if isinstance(expr, Call):
+            spec = FUNCTIONS.get(expr.func)
+            if spec is None:
+                raise FormulaError(f"不支持的函数 {expr.func}")
+            _, min_args, max_args = spec
+            if not min_args <= len(expr.args) <= max_args:
+                raise FormulaError(f"{expr.func} 需要 {min_args} 个参数，实际为 {len(expr.args)} 个")
+            return self._call(_FUNCTION_ALIASES.get(expr.func, expr.func), tuple(self._expr(arg) for arg in expr.args))
+        if isinstance(expr, Str):
+            raise FormulaError(f"不支持字符串参数 {expr.value!r}")
+        raise FormulaError(f"无法编译的表达式 {expr!r}")
+
+    def _unary(self, op: str, operand: int) -> int:
+        kind, arg = self.nodes[operand]
+        if kind == "const":
+            return self._folded(self._apply_unary(op, arg))
+        if op == "-" and kind == "unary" and arg[0] == "-":
+            # --X 即 X
+            self.stats["folded"] += 1
+            return arg[1]
+        return self._add("unary", (op, operand))
+
+    def _binary(self, op: str, left: int, right: int) -> int:
+        if op in _MIRRORED:
+            op, left, right = _MIRRORED[op], right, left
+        if op in _COMMUTATIVE and self._digests[left] > self._digests[right]:
+            left, right = right, left
+        (left_kind, a), (right_kind, b) = self.nodes[left], self.nodes[right]
+        if left_kind == "const" and right_kind == "const":
+            return self._folded(self._apply_binary(op, a, b))
+        # 恒等运算：X+0、X-0、X*1、X/1（交换律的运算中常数可能在左边）
+        if right_kind == "const" and ((op in ("+", "-") and b == 0) or (op in ("*", "/") and b == 1)):
+            self.stats["folded"] += 1
+            return left
+        if left_kind == "const" and ((op == "+" and a == 0) or (op == "*" and a == 1)):
+            self.stats["folded"] += 1
+            return right
+        return self._add("binary", (op, left, right))
+
+    def _call(self, func: str, args: Tuple[int, ...]) -> int:
+        if func in ELEMENTWISE and all(self.nodes[j][0] == "const" for j in args):
+            with np.errstate(all="ignore"):
+                return self._folded(FUNCTIONS[func][0](1, *(self.nodes[j][1] for j in args)))
+        return self._add("call", (func, args))
+
+    def _name(self, name: str) -> int:
+        if name in self.variables:
+            return self.variables[name]
+        if name in self.inputs:
+            return self._add("param", name)
+        if name in FIELD_ALIASES:
+            self.fields.add(FIELD_ALIASES[name])
+            return self._add("field", FIELD_ALIASES[name])
+        if name in TIME_FIELDS:
+            self.fields.add("time")
+            return self._add("time", name)
+        raise FormulaError(f"未定义的名称 {name}")
+
+    # ---------- 求值 ----------
+
+    def defaults(self) -> Dict[str, float]:
+        """参数默认值"""
+        return {name: spec.default for name, spec in self.inputs.items()}
+
+    def _children(self, index: int) -> Tuple[int, ...]:
+        kind, arg = self.nodes[index]
+        if kind == "unary":
+            return (arg[1],)
+        if kind == "binary":
+            return arg[1:]
+        if kind == "call":
+            return arg[1]
+        return ()
+
+    def _needed(self, roots: List[int]) -> np.ndarray:
+        needed = np.zeros(len(self.nodes), dtype=bool)
+        needed[roots] = True
+        # 节点按拓扑序排列，逆序传播即可得到全部依赖
+        for i in range(len(self.nodes) - 1, -1, -1):
+            if needed[i]:
+                needed[list(self._children(i))] = True
+        return needed
+
+    def evaluate(self, bars: Mapping[str, Any], params: Optional[Dict[str, float]] = None,
+                 names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """在K线上计算公式
+
+        Args:
+            bars: 字段 -> 序列，字段名同 get_market_data_ex_ori（open/high/low/close/volume/amount/time），
+                  也可以直接传入 DataFrame；行情字段也可以是 (时间, 股票) 的二维面板，
+                  此时 time 为共享的一维时间轴，公式在各列上同时计算
+            params: 覆盖 input 参数的默认值
+            names: 需要返回的变量，为空时返回全部赋值变量
+
+        Returns:
+            变量名（大写） -> 形状与K线相同的 float64 数组，无效值为 NaN
+        """
+        names = [name.upper() for name in names] if names else list(self.variables)
+        unknown = [name for name in names if name not in self.variables]
+        if unknown:
+            raise FormulaError(f"公式中没有变量 {', '.join(unknown)}")
+        values = self.defaults()
+        for name, value in (params or {}).items():
+            if name.upper() not in self.inputs:
+                raise FormulaError(f"公式中没有参数 {name}")
+            values[name.upper()] = float(value)
+
+        missing = [field for field in self.fields if field not in bars]
+        if missing:
+            raise FormulaError(f"缺少行情字段 {', '.join(sorted(missing))}")
+        columns = {field: np.asarray(bars[field], dtype=np.float64) for field in self.fields}
+        shapes = [np.shape(bars[field]) for field in bars if field != "time"] or \
+            [np.shape(bars[field]) for field in bars]
+        n = max(shapes, key=len) if shapes else 0
+        n = n[0] if len(n) == 1 else n
+        panel = np.ndim(n) > 0
+
+        roots = [self.variables[name] for name in names]
+        needed = self._needed(roots)
+        results: List[Any] = [None] * len(self.nodes)
+        for i, (kind, arg) in enumerate(self.nodes):
+            if not needed[i]:
+                continue
+            if kind == "const":
+                value = arg
+            elif kind == "param":
+                value = values[arg]
+            elif kind == "field":
+                value = columns[arg]
+                if panel and value.ndim == 1:
+                    value = value.reshape(-1, 1)
+            elif kind == "time":
+                value = _time_field(arg, columns["time"])
+                if panel:
+                    value = value.reshape(-1, 1)
+            elif kind == "unary":
+                op, operand = arg
+                value = self._apply_unary(op, results[operand])
+            elif kind == "binary":
+                op, left, right = arg
+                value = self._apply_binary(op, results[left], results[right])
+            else:
+                func, args = arg
+                value = FUNCTIONS[func][0](n, *(results[j] for j in args))
+            results[i] = value
+
+        out = {}
+        emitted = set()
+        for name, root in zip(names, roots):
+            value = np.asarray(results[root], dtype=np.float64)
+            if value.ndim == 0:
+                value = np.full(n, float(value))
+            elif panel and value.shape != tuple(n):
+                value = np.broadcast_to(value, n).copy()
+            elif root in emitted:
+                # 多个输出归并到同一个节点时各自返回一份
+                value = value.copy()
+            emitted.add(root)
+            out[name] = value
+        return out
+
+    @staticmethod
+    def _apply_unary(op: str, x):
+        return -x if op == "-" else (~truth(x)).astype(np.float64)
+
+    @staticmethod
+    def _apply_binary(op: str, a, b):
+        if op == "AND":
+            return (truth(a) & truth(b)).astype(np.float64)
+        if op == "OR":
+            return (truth(a) | truth(b)).astype(np.float64)
+        if op in _COMPARE:
+            with np.errstate(invalid="ignore"):
+                # 与 NaN 比较的结果为不成立
+                return _COMPARE[op](a, b).astype(np.float64)
+        with np.errstate(invalid="ignore", over="ignore"):
+            return _ARITHMETIC[op](a, b)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.blake2b(repr(value).encode("utf-8"), digest_size=16).hexdigest()
+
+
+_cache: "OrderedDict[str, CompiledSignal]" = OrderedDict()
+_by_hash: Dict[str, CompiledSignal] = {}
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def compile_signal(source: str) -> CompiledSignal:
+    """解析并编译公式文本
+
+    结果按公式原文和规范化的公式文本（见 parser.normalize_source，空白、注释、大小写和全角符号不影响）缓存，
+    最多保留 SIGNAL_CACHE_SIZE 个文本；规范化后结构相同的公式返回同一个 CompiledSignal
+
+    Raises:
+        FormulaSyntaxError: 结构错误
+        FormulaError: 本地无法编译
+    """
+    # 先按原文查找，省去词法分析
+    with _cache_lock:
+        compiled = _cache.get(source)
+        if compiled is not None:
+            _cache.move_to_end(source)
+            _cache_stats["hits"] += 1
+            return compiled
+    key = normalize_source(source)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            _cache[source] = compiled
+            _cache_stats["hits"] += 1
+            return compiled
+        _cache_stats["misses"] += 1
+    compiled = CompiledSignal(parse(source), source)
+    with _cache_lock:
+        compiled = _by_hash.setdefault(compiled.canonical_hash, compiled)
+        _cache[key] = compiled
+        _cache[source] = compiled
+        while len(_cache) > SIGNAL_CACHE_SIZE:
+            _cache.popitem(last=False)
+        if len(_by_hash) > SIGNAL_CACHE_SIZE:
+            live = {id(value) for value in _cache.values()}
+            for digest in [digest for digest, value in _by_hash.items() if id(value) not in live]:
+                del _by_hash[digest]
+    return compiled
+
+
+def signal_cache_info() -> Dict[str, int]:
+    """编译缓存统计：命中、未命中次数，缓存的公式文本数（原文和规范化文本各计一次）和不同的编译结果数"""
+    with _cache_lock:
+        return {**_cache_stats, "entries": len(_cache), "signals": len(_by_hash), "max_entries": SIGNAL_CACHE_SIZE}
+
+
+def clear_signal_cache() -> None:
+    """清空编译缓存"""
+    with _cache_lock:
+        _cache.clear()
+        _by_hash.clear()
+
+
+def evaluate_signal(source: str, bars: Mapping[str, Any], params: Optional[Dict[str, float]] = None,
+                    names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """编译并计算公式，见 CompiledSignal.evaluate"""
+    return compile_signal(source).evaluate(bars, params, names)
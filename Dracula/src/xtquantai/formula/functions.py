@@ -0,0 +1,369 @@
+"""
+公式函数库
+每个函数接收 NumPy 数组（或标量）并返回整段序列，窗口类函数由 pandas 的 rolling/ewm 实现（C 循环）。
+无效值用 NaN 表示，约定与 QMT 公式一致：
+- MA / SUM / STD / AVEDEV / WMA / EVERY 数据不足 N 个周期时无效；HHV / LLV / COUNT / EXIST 按已有周期计算
+- SUM / HHV / LLV / COUNT 的 N 为 0 时从第一个周期累计
+- EMA / SMA / DMA 从第一个有效值开始递推
+- 条件中 NaN 视为不成立；X/0 的结果为 0
+
+除单只股票的一维序列外，也支持 (时间, 股票) 的二维面板：时间在第 0 维，各列独立计算，
+此时参数 n 为面板形状。
+"""
+from typing import Callable, Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .parser import FormulaError
+
+
+Shape = Union[int, Tuple[int, ...]]
+
+
+def as_series(x, n: Shape) -> np.ndarray:
+    """标量广播为长度（形状）为 n 的序列；面板中按时间变化的一维序列广播到各列"""
+    arr = np.asarray(x, dtype=np.float64)
+    if arr.ndim == 0:
+        return np.full(n, float(arr))
+    if np.ndim(n) and arr.shape != tuple(n):
+        return np.broadcast_to(arr, n)
+    return arr
+
+
+def length(n: Shape) -> int:
+    """时间轴长度"""
+    return n[0] if np.ndim(n) else n
+
+
+def time_index(n: Shape) -> np.ndarray:
+    """各周期的序号，面板时为 (时间, 1) 以便按列广播"""
+    idx = np.arange(length(n))
+    return idx.reshape(-1, 1) if np.ndim(n) else idx
+
+
+def truth(x) -> np.ndarray:
+    """条件值：非零且非 NaN 为真"""
+    arr = np.asarray(x, dtype=np.float64)
+    return (arr != 0) & ~np.isnan(arr)
+
+
+def divide(a, b):
+    """除法，除数为 0 时结果为 0"""
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(b == 0, 0.0, a / np.where(b == 0, 1.0, b))
+
+
+def as_period(value, func: str) -> int:
+    """窗口参数必须在整段序列上取同一个值（常数或 input 参数）"""
+    arr = np.asarray(value, dtype=np.float64)
+    if arr.ndim > 0:
+        valid = arr[~np.isnan(arr)]
+        if len(valid) == 0 or (valid != valid[0]).any():
+            raise FormulaError(f"{func} 的周期参数必须是常数")
+        arr = valid[0]
+    if np.isnan(arr):
+        raise FormulaError(f"{func} 的周期参数无效")
+    return int(arr)
+
+
+def _frame(x: np.ndarray):
+    return pd.Series(x, copy=False) if x.ndim == 1 else pd.DataFrame(x, copy=False)
+
+
+def _rolling(x: np.ndarray, window: int, min_periods: int):
+    return _frame(x).rolling(window, min_periods=min_periods)
+
+
+def _ewm(x: np.ndarray, alpha: float) -> np.ndarray:
+    return _frame(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def _windows(x: np.ndarray, period: int) -> np.ndarray:
+    """沿时间轴的滑动窗口视图，窗口在最后一维"""
+    return np.lib.stride_tricks.sliding_window_view(x, period, axis=0)
+
+
+# ---------- 均线 ----------
+
+def f_ma(n, x, period):
+    x, period = as_series(x, n), as_period(period, "MA")
+    if period <= 0:
+        return np.full(n, np.nan)
+    return _rolling(x, period, period).mean().to_numpy()
+
+
+def f_ema(n, x, period):
+    x, period = as_series(x, n), as_period(period, "EMA")
+    return _ewm(x, 2.0 / (max(period, 1) + 1))
+
+
+def f_sma(n, x, period, weight):
+    x, period, weight = as_series(x, n), as_period(period, "SMA"), float(weight)
+    if period <= 0 or not 0 < weight <= period:
+        raise FormulaError("SMA(X,N,M) 要求 0<M<=N")
+    return _ewm(x, weight / period)
+
+
+def f_wma(n, x, period):
+    x, period = as_series(x, n), as_period(period, "WMA")
+    out = np.full(n, np.nan)
+    if 0 < period <= length(n):
+        weights = np.arange(1, period + 1, dtype=np.float64)
+        out[period - 1:] = _windows(x, period) @ weights / weights.sum()
+    return out
+
+
+def f_dma(n, x, alpha):
+    x = as_series(x, n)
+    if np.ndim(alpha) == 0:
+        return _ewm(x, float(np.clip(alpha, 0.0, 1.0)))
+    # 权重随周期变化时只能逐个周期递推，面板的各列在同一步内向量计算
+    alpha = np.clip(as_series(alpha, n), 0.0, 1.0)
+    out = np.full(n, np.nan)
+    prev = np.full(x.shape[1:], np.nan)
+    for i in range(length(n)):
+        step = np.where(np.isnan(prev), x[i], alpha[i] * x[i] + (1 - alpha[i]) * prev)
+        prev = np.where(np.isnan(x[i]) | np.isnan(alpha[i]), prev, step)
+        out[i] = prev
+    return out
+
+
+# ---------- 引用与统计 ----------
+
+def f_ref(n, x, offset):
+    x = as_series(x, n)
+    if np.ndim(offset) == 0:
+        offset = as_period(offset, "REF")
+        out = np.full(n, np.nan)
+        if offset <= 0:
+            return x.copy()
+        if offset < length(n):
+            out[offset:] = x[:-offset]
+        return out
+    # 变量周期：逐个周期向前引用
+    size = length(n)
+    offset = as_series(offset, n)
+    idx = time_index(n) - np.nan_to_num(offset, nan=size + 1).astype(np.int64)
+    valid = (idx >= 0) & (idx < size) & ~np.isnan(offset)
+    out = np.take_along_axis(np.broadcast_to(x, idx.shape), np.clip(idx, 0, max(size - 1, 0)), axis=0)
+    return np.where(valid, out, np.nan)
+
+
+def f_hhv(n, x, period):
+    x, period = as_series(x, n), as_period(period, "HHV")
+    if period <= 0:
+        return np.fmax.accumulate(x)
+    return _rolling(x, period, 1).max().to_numpy()
+
+
+def f_llv(n, x, period):
+    x, period = as_series(x, n), as_period(period, "LLV")
+    if period <= 0:
+        return np.fmin.accumulate(x)
+    return _rolling(x, period, 1).min().to_numpy()
+
+
+def _bars_since_extreme(x: np.ndarray, period: int, pick) -> np.ndarray:
+    idx = time_index(x.shape if x.ndim > 1 else len(x))
+    if period <= 0:
+        # 从第一个周期累计：最近一次达到累计极值的位置
+        running = (np.fmax if pick is np.argmax else np.fmin).accumulate(x)
+        last = np.maximum.accumulate(np.where(x == running, idx, -1))
+        out = (idx - last).astype(np.float64)
+        out[last < 0] = np.nan
+        return out
+    fill = -np.inf if pick is np.argmax else np.inf
+    padded = np.concatenate([np.full((period - 1,) + x.shape[1:], fill), np.where(np.isnan(x), fill, x)])
+    out = pick(_windows(padded, period)[..., ::-1], axis=-1).astype(np.float64)
+    out[np.isnan(np.fmax.accumulate(x))] = np.nan
+    return out
+
+
+def f_hhvbars(n, x, period):
+    return _bars_since_extreme(as_series(x, n), as_period(period, "HHVBARS"), np.argmax)
+
+
+def f_llvbars(n, x, period):
+    return _bars_since_extreme(as_series(x, n), as_period(period, "LLVBARS"), np.argmin)
+
+
+def f_sum(n, x, period):
+    x, period = as_series(x, n), as_period(period, "SUM")
+    if period <= 0:
+        out = np.nancumsum(x, axis=0)
+        out[np.isnan(np.fmax.accumulate(x))] = np.nan
+        return out
+    return _rolling(x, period, period).sum().to_numpy()
+
+
+def f_count(n, cond, period):
+    cond, period = truth(as_series(cond, n)).astype(np.float64), as_period(period, "COUNT")
+    if period <= 0:
+        return np.cumsum(cond, axis=0)
+    return _rolling(cond, period, 1).sum().to_numpy()
+
+
+def f_every(n, cond, period):
+    period = as_period(period, "EVERY")
+    counts = _rolling(truth(as_series(cond, n)).astype(np.float64), max(period, 1), max(period, 1)).sum()
+    return (counts.to_numpy() == max(period, 1)).astype(np.float64)
+
+
+def f_exist(n, cond, period):
+    return (f_count(n, cond, period) > 0).astype(np.float64)
+
+
+def f_std(n, x, period):
+    x, period = as_series(x, n), as_period(period, "STD")
+    return _rolling(x, period, period).std(ddof=1).to_numpy()
+
+
+def f_stdp(n, x, period):
+    x, period = as_series(x, n), as_period(period, "STDP")
+    return _rolling(x, period, period).std(ddof=0).to_numpy()
+
+
+def f_avedev(n, x, period):
+    x, period = as_series(x, n), as_period(period, "AVEDEV")
+    out = np.full(n, np.nan)
+    if 0 < period <= length(n):
+        windows = _windows(x, period)
+        out[period - 1:] = np.abs(windows - windows.mean(axis=-1, keepdims=True)).mean(axis=-1)
+    return out
+
+
+# ---------- 信号 ----------
+
+def f_cross(n, a, b):
+    a, b = as_series(a, n), as_series(b, n)
+    out = np.zeros(n)
+    if length(n) > 1:
+        out[1:] = (truth(a[1:] > b[1:]) & (a[:-1] <= b[:-1])).astype(np.float64)
+    return out
+
+
+def f_barslast(n, cond):
+    hit, idx = truth(as_series(cond, n)), time_index(n)
+    last = np.maximum.accumulate(np.where(hit, idx, -1))
+    out = (idx - last).astype(np.float64)
+    out[last < 0] = np.nan
+    return out
+
+
+def f_barssince(n, cond):
+    hit = truth(as_series(cond, n))
+    first = np.argmax(hit, axis=0)
+    seen = np.logical_or.accumulate(hit, axis=0)
+    return np.where(seen, time_index(n) - first, np.nan)
+
+
+def f_valuewhen(n, cond, x):
+    hit, x = truth(as_series(cond, n)), as_series(x, n)
+    last = np.maximum.accumulate(np.where(hit, time_index(n), -1))
+    out = np.take_along_axis(np.broadcast_to(x, last.shape), np.maximum(last, 0), axis=0)
+    return np.where(last >= 0, out, np.nan)
+
+
+def f_filter(n, cond, period):
+    # 信号出现后 N 个周期内的信号被过滤，只需遍历信号所在的周期
+    hit, period = truth(as_series(cond, n)), as_period(period, "FILTER")
+    if hit.ndim > 1:
+        return np.stack([f_filter(length(n), hit[:, j], period) for j in range(hit.shape[1])], axis=1)
+    out = np.zeros(n)
+    blocked_until = -1
+    for i in np.flatnonzero(hit):
+        if i > blocked_until:
+            out[i] = 1.0
+            blocked_until = i + period
+    return out
+
+
+def f_if(n, cond, a, b):
+    return np.where(truth(cond), a, b).astype(np.float64)
+
+
+def f_between(n, x, a, b):
+    x, a, b = (np.asarray(v, dtype=np.float64) for v in (x, a, b))
+    return (((a <= x) & (x <= b)) | ((b <= x) & (x <= a))).astype(np.float64)
+
+
+def f_const(n, x):
+    x = as_series(x, n)
+    if not length(n):
+        return np.full(n, np.nan)
+    return np.broadcast_to(x[-1], np.shape(x)).astype(np.float64)
+
+
+def _unary(ufunc) -> Callable:
+    def apply(n, x):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return ufunc(np.asarray(x, dtype=np.float64))
+    return apply
+
+
+def _binary(ufunc) -> Callable:
+    def apply(n, a, b):
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            return ufunc(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    return apply
+
+
+def f_not(n, x):
+    return (~truth(x)).astype(np.float64)
+
+
+def f_mod(n, a, b):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(b == 0, 0.0, np.fmod(a, np.where(b == 0, 1.0, b)))
+
+
+# 函数名 -> (实现, 最少参数个数, 最多参数个数)
+FUNCTIONS: Dict[str, Tuple[Callable, int, int]] = {
+    "MA": (f_ma, 2, 2),
+    "EMA": (f_ema, 2, 2),
+    "EXPMA": (f_ema, 2, 2),
+    "SMA": (f_sma, 3, 3),
+    "WMA": (f_wma, 2, 2),
+    "DMA": (f_dma, 2, 2),
+    "REF": (f_ref, 2, 2),
+    "HHV": (f_hhv, 2, 2),
+    "LLV": (f_llv, 2, 2),
+    "HHVBARS": (f_hhvbars, 2, 2),
+    "LLVBARS": (f_llvbars, 2, 2),
+    "SUM": (f_sum, 2, 2),
+    "COUNT": (f_count, 2, 2),
+    "EVERY": (f_every, 2, 2),
+    "EXIST": (f_exist, 2, 2),
+    "STD": (f_std, 2, 2),
+    "STDP": (f_stdp, 2, 2),
+    "AVEDEV": (f_avedev, 2, 2),
+    "CROSS": (f_cross, 2, 2),
+    "BARSLAST": (f_barslast, 1, 1),
+    "BARSSINCE": (f_barssince, 1, 1),
+    "VALUEWHEN": (f_valuewhen, 2, 2),
+    "FILTER": (f_filter, 2, 2),
+    "IF": (f_if, 3, 3),
+    "IFF": (f_if, 3, 3),
+    "BETWEEN": (f_between, 3, 3),
+    "CONST": (f_const, 1, 1),
+    "NOT": (f_not, 1, 1),
+    "ABS": (_unary(np.abs), 1, 1),
+    "SQRT": (_unary(np.sqrt), 1, 1),
+    "LN": (_unary(np.log), 1, 1),
+    "LOG": (_unary(np.log10), 1, 1),
+    "EXP": (_unary(np.exp), 1, 1),
+    "ROUND": (_unary(np.round), 1, 1),
+    "INTPART": (_unary(np.trunc), 1, 1),
+    "SIGN": (_unary(np.sign), 1, 1),
+    "MAX": (_binary(np.maximum), 2, 2),
+    "MIN": (_binary(np.minimum), 2, 2),
+    "POW": (_binary(np.power), 2, 2),
+    "MOD": (f_mod, 2, 2),
+}
+
+# 逐元素计算（不依赖历史）的函数，参数都是常数时可以在编译时折叠
+ELEMENTWISE = frozenset({"IF", "IFF", "BETWEEN", "NOT", "ABS", "SQRT", "LN", "LOG", "EXP", "ROUND", "INTPART",
+                         "SIGN", "MAX", "MIN", "POW", "MOD"})
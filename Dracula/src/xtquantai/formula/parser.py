@@ -0,0 +1,304 @@
+"""
+信号公式解析
+把 create_ma_cross_signal / create_custom_signal 生成的公式文本解析为语法树：
+- 语句以 ';' 分隔，支持 '//' 行注释和 '{...}' 块注释，全角标点按半角处理
+- input:N1(5,1,100,1),N2(...) 参数声明
+- NAME:=表达式 中间变量，NAME:表达式 输出变量，表达式后以逗号分隔的绘图属性（nodraw 等）忽略
+- 运算符：+ - * /、> < >= <= = == <> !=、AND OR NOT（以及 && || !）
+- 名称不区分大小写，统一转为大写
+"""
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+
+class FormulaError(ValueError):
+    """公式语法或语义错误"""
+
+
+class FormulaSyntaxError(FormulaError):
+    """公式结构错误（括号不匹配、缺少运算数、空表达式等），在完整的公式语言中同样无效
+
+    本地不支持的字符、函数或语法只报告为 FormulaError，这类公式可能仍能由 get_vba_func_result 执行
+    """
+
+
+# ---------- 语法树 ----------
+
+@dataclass(frozen=True)
+class Num:
+    value: float
+
+
+@dataclass(frozen=True)
+class Name:
+    name: str
+
+
+@dataclass(frozen=True)
+class Str:
+    value: str
+
+
+@dataclass(frozen=True)
+class Call:
+    func: str
+    args: Tuple
+
+
+@dataclass(frozen=True)
+class Unary:
+    op: str
+    operand: object
+
+
+@dataclass(frozen=True)
+class Binary:
+    op: str
+    left: object
+    right: object
+
+
+Expr = Union[Num, Name, Str, Call, Unary, Binary]
+
+
+@dataclass(frozen=True)
+class InputSpec:
+    """input: 声明的参数：默认值、最小值、最大值、步长"""
+    name: str
+    default: float
+    min: Optional[float] = None
+    max: Optional[float] = None
+    step: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class Assign:
+    """赋值语句，output 为 True 时是 ':' 声明的输出变量"""
+    name: str
+    expr: object
+    output: bool
+
+
+@dataclass(frozen=True)
+class Program:
+    inputs: Tuple[InputSpec, ...]
+    statements: Tuple[Assign, ...]
+
+
+# ---------- 词法 ----------
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<num>\d+\.\d*|\.\d+|\d+)
+  | (?P<str>'[^']*'|"[^"]*")
+  | (?P<name>[^\W\d]\w*)
+  | (?P<op>:=|>=|<=|<>|!=|==|&&|\|\||[-+*/()<>=:,;!])
+""", re.VERBOSE)
+
+_COMMENT_RE = re.compile(r"//[^\n]*|\{[^}]*\}")
+
+_KEYWORD_OPS = {"AND": "AND", "OR": "OR", "NOT": "NOT"}
+_SYMBOL_OPS = {"&&": "AND", "||": "OR", "!": "NOT", "==": "=", "!=": "<>"}
+
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    """把公式切分为 (类型, 值) 词法单元，类型为 num / str / name / op"""
+    text = _COMMENT_RE.sub(" ", unicodedata.normalize("NFKC", text))
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if m is None:
+            raise FormulaError(f"无法识别的字符 {text[pos]!r}（位置 {pos}）")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "ws":
+            continue
+        value = m.group()
+        if kind == "name":
+            value = value.upper()
+            if value in _KEYWORD_OPS:
+                kind, value = "op", _KEYWORD_OPS[value]
+        elif kind == "op":
+            value = _SYMBOL_OPS.get(value, value)
+        elif kind == "str":
+            value = value[1:-1]
+        tokens.append((kind, value))
+    return tokens
+
+
+def normalize_source(text: str) -> str:
+    """规范化公式文本：按词法单元重新拼接，只在空白、注释、全角符号或名称大小写上不同的公式得到相同的结果
+
+    Raises:
+        FormulaError: 含无法识别的字符
+    """
+    return " ".join(f"'{value}'" if kind == "str" else value for kind, value in tokenize(text))
+
+
+# ---------- 语法 ----------
+
+# 二元运算符优先级，数值越大结合越紧
+_PRECEDENCE = {
+    "OR": 1,
+    "AND": 2,
+    "=": 3, "<>": 3, ">": 3, "<": 3, ">=": 3, "<=": 3,
+    "+": 4, "-": 4,
+    "*": 5, "/": 5,
+}
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else ("end", "")
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, value: str) -> None:
+        kind, got = self.next()
+        if kind != "op" or got != value:
+            raise FormulaSyntaxError(f"期望 {value!r}，实际为 {got or '结尾'!r}")
+
+    def at_end(self) -> bool:
+        return self.peek()[0] == "end"
+
+    def expression(self, min_prec: int = 1) -> Expr:
+        left = self.unary()
+        while True:
+            kind, op = self.peek()
+            prec = _PRECEDENCE.get(op) if kind == "op" else None
+            if prec is None or prec < min_prec:
+                return left
+            self.next()
+            left = Binary(op, left, self.expression(prec + 1))
+
+    def unary(self) -> Expr:
+        kind, value = self.peek()
+        if kind == "op" and value in ("-", "+"):
+            self.next()
+            operand = self.unary()
+            return operand if value == "+" else Unary("-", operand)
+        if kind == "op" and value == "NOT" and self.peek(1) != ("op", "("):
+            self.next()
+            # NOT 的优先级低于比较：NOT A>B 即 NOT(A>B)
+            return Unary("NOT", self.expression(_PRECEDENCE["="]))
+        return self.primary()
+
+    def primary(self) -> Expr:
+        kind, value = self.next()
+        if kind == "num":
+            return Num(float(value))
+        if kind == "str":
+            return Str(value)
+        if kind == "op" and value == "(":
+            expr = self.expression()
+            self.expect(")")
+            return expr
+        if kind == "name" or (kind == "op" and value == "NOT"):
+            if self.peek() == ("op", "("):
+                self.next()
+                args = []
+                if self.peek() != ("op", ")"):
+                    args.append(self.expression())
+                    while self.peek() == ("op", ","):
+                        self.next()
+                        args.append(self.expression())
+                self.expect(")")
+                return Call(value, tuple(args))
+            return Name(value)
+        raise FormulaSyntaxError(f"表达式中出现意外的 {value or '结尾'!r}")
+
+
+def _split_statements(tokens: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+    statements, current, depth = [], [], 0
+    for token in tokens:
+        if token == ("op", "("):
+            depth += 1
+        elif token == ("op", ")"):
+            depth -= 1
+            if depth < 0:
+                raise FormulaSyntaxError(f"第{len(statements) + 1}条语句: 多余的 ')'")
+        if token == ("op", ";") and depth == 0:
+            if current:
+                statements.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        statements.append(current)
+    return statements
+
+
+def _number(parser: _Parser) -> float:
+    sign = 1.0
+    if parser.peek() == ("op", "-"):
+        parser.next()
+        sign = -1.0
+    kind, value = parser.next()
+    if kind != "num":
+        raise FormulaSyntaxError(f"input 参数的取值必须是数字，实际为 {value!r}")
+    return sign * float(value)
+
+
+def _parse_inputs(parser: _Parser) -> List[InputSpec]:
+    specs = []
+    while True:
+        kind, name = parser.next()
+        if kind != "name":
+            raise FormulaSyntaxError(f"input 声明中期望参数名，实际为 {name!r}")
+        parser.expect("(")
+        values = [_number(parser)]
+        while parser.peek() == ("op", ","):
+            parser.next()
+            values.append(_number(parser))
+        parser.expect(")")
+        if len(values) > 4:
+            raise FormulaSyntaxError(f"input 参数 {name} 最多有4个取值(默认值,最小值,最大值,步长)")
+        specs.append(InputSpec(name, *values))
+        if parser.at_end():
+            return specs
+        parser.expect(",")
+
+
+def parse(text: str) -> Program:
+    """解析公式文本
+
+    Raises:
+        FormulaSyntaxError: 结构错误，消息中包含出错的语句序号
+        FormulaError: 其他本地无法解析的写法
+    """
+    inputs: List[InputSpec] = []
+    statements: List[Assign] = []
+    unnamed = 0
+    for n, tokens in enumerate(_split_statements(tokenize(text)), 1):
+        parser = _Parser(tokens)
+        try:
+            first, second = parser.peek(), parser.peek(1)
+            if first == ("name", "INPUT") and second == ("op", ":"):
+                parser.pos = 2
+                inputs.extend(_parse_inputs(parser))
+                continue
+            if first[0] == "name" and second in (("op", ":="), ("op", ":")):
+                parser.pos = 2
+                name, output = first[1], second[1] == ":"
+            else:
+                unnamed += 1
+                name, output = f"_OUT{unnamed}", True
+            expr = parser.expression()
+            # 表达式之后的 ,NODRAW ,COLORRED 等绘图属性不影响计算
+            if not parser.at_end() and parser.peek() != ("op", ","):
+                raise FormulaError(f"表达式后出现多余的 {parser.peek()[1]!r}")
+            statements.append(Assign(name, expr, output))
+        except FormulaError as e:
+            raise type(e)(f"第{n}条语句: {e}") from None
+    return Program(tuple(inputs), tuple(statements))
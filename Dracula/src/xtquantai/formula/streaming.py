@@ -0,0 +1,388 @@
+"""
+信号公式增量计算
+CompiledSignal.evaluate 每次在整段序列上重新计算；实盘中每来一根K线（或一笔分笔）只需要在已有状态上前进一步。
+StreamingSignal 为编译结果的每个节点建立一个增量算子，算子保存计算下一步所需的状态，单次更新的耗时与历史长度无关：
+- MA / SUM：长度为 N 的环形缓冲和滑动和，每 N 次更新重新求和一次，避免舍入误差累积
+- EMA / SMA / DMA：按 pandas ewm(adjust=False) 的递推，NaN 的处理与批量计算相同
+- HHV / LLV：单调队列，均摊 O(1)
+- REF：长度为 N 的环形缓冲
+- CROSS：上一步的两个值；BARSLAST：上次条件成立的位置
+- 运算符、逐元素函数和时间字段逐个值计算
+窗口参数必须是常数或 input 参数；其他函数（可变窗口、需要全部历史）不支持增量计算，构造时报错。
+同一序列上逐根更新的结果与 evaluate 的结果一致（滑动和的舍入误差在 1e-12 量级）。
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+from .compiler import _TZ, CompiledSignal
+from .functions import ELEMENTWISE, FUNCTIONS, as_period
+from .parser import FormulaError
+
+_NAN = float("nan")
+
+
+def _truth(x: float) -> bool:
+    return x != 0 and x == x
+
+
+def _divide(a: float, b: float) -> float:
+    return 0.0 if b == 0 else a / b
+
+
+_BINARY = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": _divide,
+    ">": lambda a, b: float(a > b),
+    ">=": lambda a, b: float(a >= b),
+    "<": lambda a, b: float(a < b),
+    "<=": lambda a, b: float(a <= b),
+    "=": lambda a, b: float(a == b),
+    "<>": lambda a, b: float(a != b),
+    "AND": lambda a, b: float(_truth(a) and _truth(b)),
+    "OR": lambda a, b: float(_truth(a) or _truth(b)),
+}
+
+
+def _maximum(a: float, b: float) -> float:
+    return a + b if a != a or b != b else (a if a >= b else b)
+
+
+def _minimum(a: float, b: float) -> float:
+    return a + b if a != a or b != b else (a if a <= b else b)
+
+
+# 常用逐元素函数的标量实现（NaN 的传播与 NumPy 相同），其余逐元素函数调用 FUNCTIONS 中的向量实现
+_SCALAR_FUNCTIONS = {
+    "IF": lambda cond, a, b: a if _truth(cond) else b,
+    "NOT": lambda x: float(not _truth(x)),
+    "ABS": abs,
+    "MAX": _maximum,
+    "MIN": _minimum,
+    "BETWEEN": lambda x, a, b: float(a <= x <= b or b <= x <= a),
+}
+
+
+def _time_value(name: str, time_ms: float) -> float:
+    stamp = datetime.fromtimestamp(time_ms / 1000, _TZ)
+    if name == "DATE":
+        return float((stamp.year - 1900) * 10000 + stamp.month * 100 + stamp.day)
+    if name == "TIME":
+        return float(stamp.hour * 10000 + stamp.minute * 100 + stamp.second)
+    return float(getattr(stamp, name.lower()))
+
+
+# ---------- 增量算子 ----------
+
+class _Window:
+    """MA / SUM：最近 N 个值的环形缓冲和滑动和（NaN 不计入和，单独计数）"""
+    __slots__ = ("period", "mean", "buffer", "pos", "seen", "total", "nans", "since_resum")
+
+    def __init__(self, period: int, mean: bool):
+        self.period = period
+        self.mean = mean
+        self.buffer = [_NAN] * max(period, 0)
+        self.pos = 0
+        self.seen = 0
+        self.total = 0.0
+        self.nans = 0
+        self.since_resum = 0
+
+    def update(self, x: float) -> float:
+        if self.period <= 0:
+            return _NAN
+        old = self.buffer[self.pos]
+        if self.seen >= self.period:
+            if old == old:
+                self.total -= old
+            else:
+                self.nans -= 1
+        if x == x:
+            self.total += x
+        else:
+            self.nans += 1
+        self.buffer[self.pos] = x
+        self.pos = (self.pos + 1) % self.period
+        self.seen += 1
+        self.since_resum += 1
+        if self.since_resum >= self.period:
+            self.total = sum(v for v in self.buffer if v == v)
+            self.since_resum = 0
+        if self.seen < self.period or self.nans:
+            return _NAN
+        return self.total / self.period if self.mean else self.total
+
+
+class _CumulativeSum:
+    """SUM(X,0)：从第一个有效值起累计"""
+    __slots__ = ("total", "started")
+
+    def __init__(self):
+        self.total = 0.0
+        self.started = False
+
+    def update(self, x: float) -> float:
+        if x == x:
+            self.total += x
+            self.started = True
+        return self.total if self.started else _NAN
+
+
+class _Smooth:
+    """EMA / SMA / DMA：pandas ewm(adjust=False) 的递推，NaN 周期延续上一个值并继续衰减旧值的权重"""
+    __slots__ = ("alpha", "value", "old_weight")
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value = _NAN
+        self.old_weight = 1.0
+
+    def update(self, x: float) -> float:
+        if self.value != self.value:
+            if x == x:
+                self.value = x
+            return self.value
+        self.old_weight *= 1 - self.alpha
+        if x == x:
+            if self.value != x:
+                self.value = (self.old_weight * self.value + self.alpha * x) / (self.old_weight + self.alpha)
+            self.old_weight = 1.0
+        return self.value
+
+
+class _Extreme:
+    """HHV / LLV：最近 N 个周期的极值，单调队列中保存 (位置, 值)；N 为 0 时从第一个周期累计"""
+    __slots__ = ("period", "highest", "queue", "index")
+
+    def __init__(self, period: int, highest: bool):
+        self.period = period
+        self.highest = highest
+        self.queue = deque()
+        self.index = 0
+
+    def update(self, x: float) -> float:
+        queue = self.queue
+        if x == x:
+            if self.highest:
+                while queue and queue[-1][1] <= x:
+                    queue.pop()
+            else:
+                while queue and queue[-1][1] >= x:
+                    queue.pop()
+            queue.append((self.index, x))
+        if self.period > 0:
+            while queue and queue[0][0] <= self.index - self.period:
+                queue.popleft()
+        self.index += 1
+        return queue[0][1] if queue else _NAN
+
+
+class _Ref:
+    """REF(X,N)：N 个周期前的值"""
+    __slots__ = ("offset", "buffer", "pos", "seen")
+
+    def __init__(self, offset: int):
+        self.offset = offset
+        self.buffer = [_NAN] * max(offset, 0)
+        self.pos = 0
+        self.seen = 0
+
+    def update(self, x: float) -> float:
+        if self.offset <= 0:
+            return x
+        out = self.buffer[self.pos] if self.seen >= self.offset else _NAN
+        self.buffer[self.pos] = x
+        self.pos = (self.pos + 1) % self.offset
+        self.seen += 1
+        return out
+
+
+class _Cross:
+    """CROSS(A,B)：本周期 A>B 且上一周期 A<=B"""
+    __slots__ = ("prev_a", "prev_b")
+
+    def __init__(self):
+        self.prev_a = None
+        self.prev_b = None
+
+    def update(self, a: float, b: float) -> float:
+        crossed = self.prev_a is not None and a > b and self.prev_a <= self.prev_b
+        self.prev_a, self.prev_b = a, b
+        return float(crossed)
+
+
+class _BarsLast:
+    """BARSLAST(X)：距上次条件成立的周期数，从未成立时无效"""
+    __slots__ = ("index", "last")
+
+    def __init__(self):
+        self.index = 0
+        self.last = -1
+
+    def update(self, cond: float) -> float:
+        if _truth(cond):
+            self.last = self.index
+        self.index += 1
+        return float(self.index - 1 - self.last) if self.last >= 0 else _NAN
+
+
+def _build_operator(func: str, constants: List[Optional[float]]):
+    """按函数名和常数参数（不是常数的参数为 None）建立增量算子，返回 (算子, 作为序列输入的参数个数)"""
+    def period(position: int) -> int:
+        if constants[position] is None:
+            raise FormulaError(f"{func} 的周期参数必须是常数才能增量计算")
+        return as_period(constants[position], func)
+
+    if func in ("MA", "SUM"):
+        n = period(1)
+        if func == "SUM" and n <= 0:
+            return _CumulativeSum(), 1
+        return _Window(n, func == "MA"), 1
+    if func == "EMA":
+        return _Smooth(2.0 / (max(period(1), 1) + 1)), 1
+    if func == "SMA":
+        n = period(1)
+        if constants[2] is None:
+            raise FormulaError("SMA 的权重参数必须是常数才能增量计算")
+        weight = float(constants[2])
+        if n <= 0 or not 0 < weight <= n:
+            raise FormulaError("SMA(X,N,M) 要求 0<M<=N")
+        return _Smooth(weight / n), 1
+    if func == "DMA":
+        if constants[1] is None:
+            raise FormulaError("DMA 的权重参数必须是常数才能增量计算")
+        return _Smooth(float(np.clip(constants[1], 0.0, 1.0))), 1
+    if func in ("HHV", "LLV"):
+        return _Extreme(period(1), func == "HHV"), 1
+    if func == "REF":
+        return _Ref(period(1)), 1
+    if func == "CROSS":
+        return _Cross(), 2
+    if func == "BARSLAST":
+        return _BarsLast(), 1
+    raise FormulaError(f"{func} 不支持增量计算")
+
+
+class StreamingSignal:
+    """在逐个到来的K线（或分笔）上增量计算编译后的信号
+
+    Attributes:
+        compiled: 编译后的信号
+        params: 使用的参数值（默认值被 params 覆盖）
+        names: 每次更新返回的变量
+        count: 已更新的周期数
+        last_time: 最后一次更新的 time 字段（没有时为 None）
+        latest: 最后一次更新时各变量的值（没有时为 NaN）
+
+    对象只包含 Python 基本类型和 deque，可以 pickle 保存状态，恢复后继续更新
+    """
+
+    def __init__(self, compiled: CompiledSignal, params: Optional[Dict[str, float]] = None,
+                 names: Optional[List[str]] = None):
+        """
+        Raises:
+            FormulaError: 参数或变量名无效，或信号中有不支持增量计算的函数
+        """
+        self.compiled = compiled
+        values = compiled.defaults()
+        for name, value in (params or {}).items():
+            key = name.upper()
+            if key not in values:
+                raise FormulaError(f"公式中没有参数 {key}")
+            values[key] = float(value)
+        self.params = values
+        self.names = [name.upper() for name in names] if names else list(compiled.variables)
+        for name in self.names:
+            if name not in compiled.variables:
+                raise FormulaError(f"公式中没有变量 {name}")
+        self.count = 0
+        self.last_time = None
+        # 常数节点（含参数）的值，其余为 None
+        self._constants: List[Optional[float]] = []
+        # 每个节点的 (类型, 参数, 算子)：函数节点分为 scalar（有标量实现）、elementwise（调用向量实现）
+        # 和 call（有状态的增量算子，参数中只保留作为序列输入的子节点）；不保存函数对象，以便 pickle
+        self._steps: List[tuple] = []
+        for kind, arg in compiled.nodes:
+            constant = None
+            operator = None
+            if kind == "const":
+                constant = arg
+            elif kind == "param":
+                constant = values[arg]
+            elif kind == "call":
+                func, args = arg
+                if func in _SCALAR_FUNCTIONS:
+                    kind = "scalar"
+                elif func in ELEMENTWISE:
+                    kind = "elementwise"
+                else:
+                    operator, inputs = _build_operator(func, [self._constants[j] for j in args])
+                    arg = (func, args[:inputs])
+            self._constants.append(constant)
+            self._steps.append((kind, arg, operator))
+        self._roots = [compiled.variables[name] for name in self.names]
+        self._values: List[float] = [_NAN if c is None else c for c in self._constants]
+
+    @property
+    def latest(self) -> Dict[str, float]:
+        """最后一次更新时各变量的值，没有新的周期时可以直接取用；还没有更新时为 NaN"""
+        if not self.count:
+            return {name: _NAN for name in self.names}
+        return {name: self._values[root] for name, root in zip(self.names, self._roots)}
+
+    def update(self, bar: Mapping[str, Any]) -> Dict[str, float]:
+        """前进一个周期
+
+        Args:
+            bar: 字段 -> 值，字段名同 get_market_data_ex_ori（close/open/.../time），只需要信号用到的字段
+
+        Returns:
+            {变量: 本周期的值}，无效值为 NaN
+        """
+        values = self._values
+        self.count += 1
+        for i, (kind, arg, operator) in enumerate(self._steps):
+            if kind == "field":
+                values[i] = float(bar[arg])
+            elif kind == "time":
+                values[i] = float(self.count) if arg == "BARPOS" else _time_value(arg, float(bar["time"]))
+            elif kind == "unary":
+                op, operand = arg
+                x = values[operand]
+                values[i] = -x if op == "-" else float(not _truth(x))
+            elif kind == "binary":
+                op, left, right = arg
+                values[i] = _BINARY[op](values[left], values[right])
+            elif kind == "call":
+                values[i] = operator.update(*(values[j] for j in arg[1]))
+            elif kind == "scalar":
+                func, args = arg
+                values[i] = _SCALAR_FUNCTIONS[func](*(values[j] for j in args))
+            elif kind == "elementwise":
+                func, args = arg
+                with np.errstate(all="ignore"):
+                    values[i] = float(np.asarray(FUNCTIONS[func][0](1, *(values[j] for j in args))))
+        if "time" in bar:
+            self.last_time = bar["time"]
+        return {name: values[root] for name, root in zip(self.names, self._roots)}
+
+    def run(self, bars: Mapping[str, Any]) -> Dict[str, np.ndarray]:
+        """依次用一段序列更新（如用历史K线预热），返回各周期的值
+
+        Args:
+            bars: 字段 -> 序列，同 CompiledSignal.evaluate 的一维输入
+        """
+        fields = sorted(self.compiled.fields | ({"time"} if "time" in bars else set()))
+        columns = [np.asarray(bars[field]).tolist() for field in fields]
+        n = len(columns[0]) if columns else len(next(iter(bars.values()), ()))
+        out = {name: np.empty(n) for name in self.names}
+        rows = zip(*columns) if columns else (() for _ in range(n))
+        for t, row in enumerate(rows):
+            result = self.update(dict(zip(fields, row)))
+            for name, value in result.items():
+                out[name][t] = value
+        return out
@@ -0,0 +1,210 @@
+"""
+合约信息仓库
+进程内共享的合约基本信息（get_instrument_detail）缓存，所有工具都通过它获取合约信息：
+- 每个合约一条 __slots__ 记录，常用字段作为属性保存，其余字段放在 extra 中
+- 记录在获取时所在的交易日内有效，交易日切换后（涨跌停价、前收盘价等会变化）重新获取
+- 缺失的合约批量获取：xtquant 提供 get_instrument_detail_list 时按块一次获取，否则并行逐个获取
+- 可按市场批量预取
+- 统计请求数、命中数和实际 xtdata 调用数，计算节省的调用次数
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from .panel import chunk_codes
+
+# 交易日切换时刻（北京时间，小时），此前仍视为上一个交易日
+TRADING_DAY_ROLLOVER_HOUR = int(os.environ.get("XTQUANTAI_TRADING_DAY_ROLLOVER_HOUR", "8"))
+
+# 批量获取时每次请求的合约个数
+DETAIL_CHUNK = int(os.environ.get("XTQUANTAI_DETAIL_CHUNK", "1000"))
+
+# 不支持批量接口时并行获取的线程数
+DETAIL_WORKERS = int(os.environ.get("XTQUANTAI_DETAIL_WORKERS", "8"))
+
+_TZ = timezone(timedelta(hours=8))
+
+# get_instrument_detail 的标准字段
+DETAIL_FIELDS = (
+    "ExchangeID", "InstrumentID", "InstrumentName", "ProductID", "ProductName", "ExchangeCode",
+    "UniCode", "CreateDate", "OpenDate", "ExpireDate", "PreClose", "SettlementPrice",
+    "UpStopPrice", "DownStopPrice", "FloatVolume", "TotalVolume", "LongMarginRatio",
+    "ShortMarginRatio", "PriceTick", "VolumeMultiple", "MainContract", "LastVolume",
+    "InstrumentStatus", "IsTrading", "IsRecent", "OpenInterestMultiple",
+)
+
+_MISSING = object()
+
+
+def current_trading_day(now: float = None) -> str:
+    """当前交易日 'YYYYMMDD'，每天 TRADING_DAY_ROLLOVER_HOUR 点切换"""
+    dt = datetime.fromtimestamp(time.time() if now is None else now, _TZ)
+    return (dt - timedelta(hours=TRADING_DAY_ROLLOVER_HOUR)).strftime("%Y%m%d")
+
+
+class InstrumentRecord:
+    """一个合约的基本信息，detail 为 None 时表示 xtdata 中不存在该合约"""
+
+    __slots__ = ("code", "trading_day", "exists", "extra") + DETAIL_FIELDS
+
+    def __init__(self, code: str, detail: Optional[Dict], trading_day: str):
+        self.code = code
+        self.trading_day = trading_day
+        self.exists = detail is not None
+        self.extra = None
+        for field in DETAIL_FIELDS:
+            setattr(self, field, _MISSING)
+        for key, value in (detail or {}).items():
+            if key in DETAIL_FIELDS:
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def to_dict(self, fields: Iterable[str] = None) -> Optional[Dict]:
+        """还原为 get_instrument_detail 的字典格式，可只取部分字段"""
+        if not self.exists:
+            return None
+        result = {}
+        for field in DETAIL_FIELDS:
+            value = getattr(self, field)
+            if value is not _MISSING:
+                result[field] = value
+        if self.extra:
+            result.update(self.extra)
+        if fields:
+            result = {field: result[field] for field in fields if field in result}
+        return result
+
+
+class InstrumentStore:
+    """进程内共享的合约信息仓库"""
+
+    def __init__(self, chunk_size: int = DETAIL_CHUNK, workers: int = DETAIL_WORKERS):
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.records: Dict[str, InstrumentRecord] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.xtdata_calls = 0
+        self.fetched = 0
+        self.expired = 0
+        self.prefetched_markets: Dict[str, str] = {}
+
+    def _fetch(self, codes: List[str]) -> Dict[str, Optional[Dict]]:
+        """从 xtdata 批量获取合约信息"""
+        import xtquant.xtdata as xtdata
+
+        details: Dict[str, Optional[Dict]] = {}
+        calls = 0
+        if hasattr(xtdata, "get_instrument_detail_list"):
+            for chunk in chunk_codes(codes, self.chunk_size):
+                details.update(xtdata.get_instrument_detail_list(chunk) or {})
+                calls += 1
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="xtquantai-instrument") as pool:
+                details.update(zip(codes, pool.map(xtdata.get_instrument_detail, codes)))
+            calls = len(codes)
+        with self._lock:
+            self.xtdata_calls += calls
+            self.fetched += len(codes)
+        return {code: details.get(code) or None for code in codes}
+
+    def get_many(self, codes: Iterable[str], fields: Iterable[str] = None) -> Dict[str, Optional[Dict]]:
+        """获取多个合约的信息，缺失或过期的合约一次批量获取
+
+        Args:
+            codes: 合约代码
+            fields: 只返回这些字段，为空时返回全部字段
+
+        Returns:
+            {code: detail}，不存在的合约为 None
+        """
+        codes = list(dict.fromkeys(codes))
+        day = current_trading_day()
+        # 命中的记录在检查时就取出，之后并发的 invalidate 不影响本次结果
+        found: Dict[str, InstrumentRecord] = {}
+        with self._lock:
+            self.requests += len(codes)
+            missing = []
+            for code in codes:
+                record = self.records.get(code)
+                if record is not None and record.trading_day == day:
+                    self.hits += 1
+                    found[code] = record
+                else:
+                    if record is not None:
+                        self.expired += 1
+                    missing.append(code)
+
+        if missing:
+            fetched = self._fetch(missing)
+            with self._lock:
+                for code, detail in fetched.items():
+                    found[code] = self.records[code] = InstrumentRecord(code, detail, day)
+
+        return {code: found[code].to_dict(fields) for code in codes}
+
+    def get(self, code: str, fields: Iterable[str] = None) -> Optional[Dict]:
+        """获取单个合约的信息，不存在时返回 None"""
+        return self.get_many([code], fields)[code]
+
+    def get_name(self, code: str, default: str = "") -> str:
+        """合约名称"""
+        detail = self.get(code)
+        return detail.get("InstrumentName", default) if detail else default
+
+    def prefetch_market(self, market: str) -> int:
+        """预取整个市场的合约信息，返回合约个数"""
+        import xtquant.xtdata as xtdata
+
+        codes = xtdata.get_stock_list_in_sector(market)
+        # 预取只是填充仓库，不计入请求统计
+        day = current_trading_day()
+        with self._lock:
+            missing = [code for code in codes
+                       if code not in self.records or self.records[code].trading_day != day]
+        if missing:
+            fetched = self._fetch(missing)
+            with self._lock:
+                for code, detail in fetched.items():
+                    self.records[code] = InstrumentRecord(code, detail, day)
+        self.prefetched_markets[market] = day
+        return len(codes)
+
+    def invalidate(self, codes: Iterable[str] = None) -> int:
+        """删除指定合约（为空时全部）的记录，返回删除个数"""
+        with self._lock:
+            if codes is None:
+                removed = len(self.records)
+                self.records.clear()
+                self.prefetched_markets.clear()
+                return removed
+            return sum(self.records.pop(code, None) is not None for code in codes)
+
+    def stats(self) -> Dict[str, Any]:
+        """统计信息"""
+        with self._lock:
+            return {
+                "records": len(self.records),
+                "missing_records": sum(1 for r in self.records.values() if not r.exists),
+                "trading_day": current_trading_day(),
+                "requests": self.requests,
+                "hits": self.hits,
+                "hit_ratio": round(self.hits / self.requests, 4) if self.requests else 0.0,
+                "expired": self.expired,
+                "fetched": self.fetched,
+                "xtdata_calls": self.xtdata_calls,
+                # 没有仓库时每个请求都是一次 get_instrument_detail 调用
+                "saved_calls": self.requests - self.xtdata_calls,
+                "prefetched_markets": dict(self.prefetched_markets),
+            }
+
+
+# 全局合约信息仓库
+instrument_store = InstrumentStore()
@@ -0,0 +1,491 @@
+"""
+K线本地缓存
+按 代码/周期/除权方式 保存K线序列，每个序列按日期分区，每个分区每个字段一个 .npy 文件，
+读取时以内存映射方式加载。
+- 分区重写时写入新的版本目录，元数据原子替换后才删除旧目录，不覆盖仍被内存映射的文件
+  （Windows 下被映射的文件无法覆盖或删除，留到之后写入该序列时再清理）
+- 请求的历史区间已在缓存中时直接从磁盘读取
+- 请求超出缓存末尾时，先增量下载，再只取最后一根缓存K线之后的数据追加
+- 前复权等除权方式下，追加时发现最后一根K线的价格变化，说明发生了除权，整段失效重取
+- 缓存总大小超过上限时，按最近访问时间淘汰序列
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .columnar import to_array
+
+# 缓存根目录
+CACHE_DIR = os.environ.get("XTQUANTAI_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".xtquantai", "cache"))
+
+# K线缓存大小上限（MB）
+KLINE_CACHE_MAX_MB = float(os.environ.get("XTQUANTAI_KLINE_CACHE_MB", "2048"))
+
+# 末尾刷新间隔（秒），间隔内不重复检查最新数据
+KLINE_TAIL_TTL = float(os.environ.get("XTQUANTAI_KLINE_TAIL_TTL", "60"))
+
+# 判断除权变化时价格的相对容差
+_ADJUST_TOLERANCE = 1e-6
+
+# 行情时间为北京时间
+_TZ = timezone(timedelta(hours=8))
+
+_META_FILE = "meta.json"
+
+
+def parse_time(value: str, end: bool = False) -> Optional[int]:
+    """把 '20240101' / '20240101093000' 形式的时间转换为毫秒时间戳，空字符串返回 None
+
+    Args:
+        value: 时间字符串
+        end: 是否为区间结束时间，仅有日期时取当天最后一刻
+    """
+    digits = "".join(c for c in str(value or "") if c.isdigit())
+    if not digits:
+        return None
+    if len(digits) <= 8:
+        digits = digits.ljust(8, "0") + ("235959" if end else "000000")
+    digits = digits.ljust(14, "0")[:14]
+    dt = datetime.strptime(digits, "%Y%m%d%H%M%S").replace(tzinfo=_TZ)
+    return int(dt.timestamp() * 1000)
+
+
+def format_time(ms: int) -> str:
+    """毫秒时间戳转换为 '20240101093000' 形式"""
+    return datetime.fromtimestamp(ms / 1000, _TZ).strftime("%Y%m%d%H%M%S")
+
+
+def _covered_to(hi: Optional[int]) -> int:
+    """一次获取覆盖到的时间：请求的结束时间，不晚于当前时间"""
+    now = int(time.time() * 1000)
+    return now if hi is None else min(hi, now)
+
+
+def _partition_unit(period: str) -> str:
+    """分区粒度：日线及以上按年，分钟线按月，分笔按日"""
+    if period == "tick":
+        return "D"
+    if period.endswith("m") and not period.endswith("mon"):
+        return "M"
+    if period.endswith("h"):
+        return "M"
+    return "Y"
+
+
+def partition_keys(times: np.ndarray, period: str) -> np.ndarray:
+    """每根K线所属的分区键"""
+    local = (np.asarray(times, dtype=np.int64) + 8 * 3600 * 1000).astype("datetime64[ms]")
+    unit = _partition_unit(period)
+    keys = local.astype(f"datetime64[{unit}]").astype(str)
+    return np.char.replace(keys, "-", "")
+
+
+def _safe(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+
+
+class KlineCache:
+    """K线磁盘缓存"""
+
+    def __init__(self, root: str = None, max_bytes: int = None, tail_ttl: float = None):
+        self.root = os.path.join(root or CACHE_DIR, "kline")
+        self.max_bytes = int(max_bytes if max_bytes is not None else KLINE_CACHE_MAX_MB * 1024 * 1024)
+        self.tail_ttl = KLINE_TAIL_TTL if tail_ttl is None else tail_ttl
+        self._lock = threading.Lock()
+        self._series_locks: Dict[str, threading.Lock] = {}
+        self._index: Optional[Dict[str, Dict]] = None
+        self._stats = {
+            "requests": 0,
+            "hits": 0,
+            "partial_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "rows_served": 0,
+            "rows_fetched": 0,
+            "evictions": 0,
+            "dividend_invalidations": 0,
+        }
+
+    # ---------- 索引与统计 ----------
+
+    def _series_dir(self, stock_code: str, period: str, dividend_type: str) -> str:
+        return os.path.join(self.root, _safe(period), _safe(dividend_type), _safe(stock_code))
+
+    def _load_index(self) -> Dict[str, Dict]:
+        """扫描缓存目录，建立 序列目录 -> 元数据 的索引"""
+        if self._index is None:
+            index = {}
+            if os.path.isdir(self.root):
+                for dirpath, _, filenames in os.walk(self.root):
+                    if _META_FILE in filenames:
+                        try:
+                            with open(os.path.join(dirpath, _META_FILE), "r", encoding="utf-8") as f:
+                                index[dirpath] = json.load(f)
+                        except (OSError, ValueError):
+                            shutil.rmtree(dirpath, ignore_errors=True)
+            self._index = index
+        return self._index
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            index = self._load_index()
+            stats = dict(self._stats)
+            stats["series"] = len(index)
+            stats["bytes"] = sum(meta.get("bytes", 0) for meta in index.values())
+        served = stats["requests"] - stats["bypassed"]
+        stats["hit_ratio"] = round(stats["hits"] / served, 4) if served else 0.0
+        stats["partial_hit_ratio"] = round(stats["partial_hits"] / served, 4) if served else 0.0
+        stats["max_bytes"] = self.max_bytes
+        stats["root"] = self.root
+        return stats
+
+    def record_bypass(self) -> None:
+        """记录一次未使用缓存的请求"""
+        self._count("requests")
+        self._count("bypassed")
+
+    # ---------- 磁盘读写 ----------
+
+    def _read_partition(self, series_dir: str, meta: Dict, key: str, fields: List[str]) -> Dict[str, np.ndarray]:
+        # 旧版本缓存的分区目录名即分区键
+        part_dir = os.path.join(series_dir, meta.get("dirs", {}).get(key, key))
+        return {field: np.load(os.path.join(part_dir, f"{_safe(field)}.npy"), mmap_mode="r", allow_pickle=False)
+                for field in fields}
+
+    def _read(self, series_dir: str, meta: Dict, fields: List[str],
+              lo: Optional[int] = None, hi: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """读取 [lo, hi] 范围内的数据"""
+        keys = sorted(meta["partitions"])
+        if lo is not None:
+            lo_key = str(partition_keys(np.array([lo]), meta["period"])[0])
+            keys = [k for k in keys if k >= lo_key]
+        if hi is not None:
+            hi_key = str(partition_keys(np.array([hi]), meta["period"])[0])
+            keys = [k for k in keys if k <= hi_key]
+        read_fields = list(dict.fromkeys(["time"] + fields))
+        parts = [self._read_partition(series_dir, meta, key, read_fields) for key in keys]
+        if not parts:
+            return {field: np.empty(0) for field in read_fields}
+        if len(parts) == 1:
+            data = parts[0]
+        else:
+            data = {field: np.concatenate([part[field] for part in parts]) for field in read_fields}
+        times = data["time"]
+        start = 0 if lo is None else int(np.searchsorted(times, lo, side="left"))
+        stop = len(times) if hi is None else int(np.searchsorted(times, hi, side="right"))
+        return {field: arr[start:stop] for field, arr in data.items()}
+
+    def _write(self, series_dir: str, meta: Dict, data: Dict[str, np.ndarray], keys: Optional[set] = None) -> None:
+        """写入数据中属于 keys 的分区（keys 为 None 时写入全部分区），并更新元数据
+
+        每个分区写入新的版本目录，元数据替换后旧目录不再被读取，随后尽量删除
+        """
+        part_keys = partition_keys(data["time"], meta["period"])
+        dirs = meta.setdefault("dirs", {})
+        for key in np.unique(part_keys):
+            key = str(key)
+            if keys is not None and key not in keys:
+                continue
+            mask = part_keys == key
+            name = f"{key}.{uuid.uuid4().hex[:8]}"
+            part_dir = os.path.join(series_dir, name)
+            os.makedirs(part_dir, exist_ok=True)
+            for field, arr in data.items():
+                np.save(os.path.join(part_dir, f"{_safe(field)}.npy"), np.ascontiguousarray(arr[mask]),
+                        allow_pickle=False)
+            meta["partitions"][key] = int(mask.sum())
+            dirs[key] = name
+
+        times = data["time"]
+        meta["rows"] = int(sum(meta["partitions"].values()))
+        meta["first_time"] = int(times[0]) if meta["first_time"] is None else min(meta["first_time"], int(times[0]))
+        meta["last_time"] = int(times[-1]) if meta["last_time"] is None else max(meta["last_time"], int(times[-1]))
+        referenced = {dirs.get(key, key) for key in meta["partitions"]}
+        meta["bytes"] = sum(os.path.getsize(os.path.join(dirpath, name))
+                            for part in referenced
+                            for dirpath, _, names in os.walk(os.path.join(series_dir, part)) for name in names)
+        self._save_meta(series_dir, meta)
+        # 元数据已指向新目录，删除不再引用的旧目录；Windows 下仍被内存映射的文件删除失败，下次写入时再清理
+        for entry in os.listdir(series_dir):
+            path = os.path.join(series_dir, entry)
+            if entry not in referenced and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _save_meta(self, series_dir: str, meta: Dict) -> None:
+        os.makedirs(series_dir, exist_ok=True)
+        tmp_path = os.path.join(series_dir, _META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(series_dir, _META_FILE))
+        with self._lock:
+            self._load_index()[series_dir] = meta
+
+    def _drop(self, series_dir: str) -> None:
+        shutil.rmtree(series_dir, ignore_errors=True)
+        with self._lock:
+            self._load_index().pop(series_dir, None)
+
+    def _merge(self, series_dir: str, meta: Dict, new: Dict[str, np.ndarray]) -> None:
+        """把新数据合并进缓存，新数据时间范围内的旧数据被替换，只重写受影响的分区"""
+        if len(new["time"]) == 0:
+            return
+        lo, hi = int(new["time"][0]), int(new["time"][-1])
+        keys = set(str(k) for k in np.unique(partition_keys(new["time"], meta["period"])))
+        fields = meta["fields"]
+        old_parts = [self._read_partition(series_dir, meta, key, fields)
+                     for key in sorted(keys) if key in meta["partitions"]]
+        if old_parts:
+            old = {field: np.concatenate([np.asarray(part[field]) for part in old_parts]) for field in fields}
+            keep = (old["time"] < lo) | (old["time"] > hi)
+            merged = {field: np.concatenate([old[field][keep], new[field]]) for field in fields}
+            order = np.argsort(merged["time"], kind="stable")
+            merged = {field: arr[order] for field, arr in merged.items()}
+        else:
+            merged = new
+        self._write(series_dir, meta, merged, keys)
+
+    def _enforce_cap(self, keep: str) -> None:
+        """缓存超过上限时按最近访问时间淘汰序列，正在被其他线程读写的序列跳过"""
+        with self._lock:
+            index = self._load_index()
+            total = sum(meta.get("bytes", 0) for meta in index.values())
+            if total <= self.max_bytes:
+                return
+            victims = sorted((meta.get("last_access", 0), path) for path, meta in index.items() if path != keep)
+        for _, path in victims:
+            if total <= self.max_bytes:
+                break
+            lock = self._series_lock(path)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                total -= self._load_index().get(path, {}).get("bytes", 0)
+                self._drop(path)
+            finally:
+                lock.release()
+            self._count("evictions")
+
+    # ---------- 对外接口 ----------
+
+    def _series_lock(self, series_dir: str) -> threading.Lock:
+        with self._lock:
+            if series_dir not in self._series_locks:
+                self._series_locks[series_dir] = threading.Lock()
+            return self._series_locks[series_dir]
+
+    def get(self, stock_code: str, period: str, dividend_type: str, field_list: List[str],
+            start_time: str, end_time: str, count: int,
+            fetch: Callable[[List[str], str, str, int], Dict[str, Any]],
+            download: Callable[[], Any] = None) -> Dict[str, np.ndarray]:
+        """读取K线，缓存未覆盖的部分通过 fetch 获取
+
+        Args:
+            stock_code, period, dividend_type: 序列标识
+            field_list: 字段列表，为空表示全部字段
+            start_time, end_time, count: 与 xtdata.get_market_data_ex_ori 含义相同
+            fetch: fetch(field_list, start_time, end_time, count) -> {field: values}，从 xtdata 获取单个代码的数据
+            download: 增量下载回调，刷新缓存末尾前调用
+
+        Returns:
+            {field: ndarray}
+        """
+        self._count("requests")
+        series_dir = self._series_dir(stock_code, period, dividend_type)
+        lo = parse_time(start_time)
+        hi = parse_time(end_time, end=True)
+
+        with self._series_lock(series_dir):
+            meta, data = self._refresh(series_dir, stock_code, period, dividend_type, field_list,
+                                       start_time, end_time, count, fetch, download)
+            if data is not None:
+                return self._select(data, field_list, count) if meta is not None else data
+            fields = list(meta["fields"]) if not field_list else [f for f in field_list if f in meta["fields"]]
+            if "stime" in meta["fields"] and "stime" not in fields:
+                fields.append("stime")
+            data = self._read(series_dir, meta, fields, lo, hi)
+            return self._select(data, field_list, count)
+
+    def version(self, stock_code: str, period: str, dividend_type: str, start_time: str, end_time: str, count: int,
+                fetch: Callable[[List[str], str, str, int], Dict[str, Any]],
+                download: Callable[[], Any] = None) -> Optional[str]:
+        """序列的数据版本：与 get 一样补取、刷新缓存，但不读取K线
+
+        每次写入分区都换用新的版本目录，版本为序列路径和各分区目录名，K线追加、补取或除权重取后都会变化。
+        没有K线时返回 None
+
+        Args:
+            与 get 相同；只保证缓存中有收盘价
+        """
+        series_dir = self._series_dir(stock_code, period, dividend_type)
+        with self._series_lock(series_dir):
+            meta, _ = self._refresh(series_dir, stock_code, period, dividend_type, ["close"],
+                                    start_time, end_time, count, fetch, download)
+            if meta is None:
+                return None
+            return json.dumps([series_dir, meta["rows"], sorted(meta["dirs"].items())], ensure_ascii=False)
+
+    def _refresh(self, series_dir: str, stock_code: str, period: str, dividend_type: str, field_list: List[str],
+                 start_time: str, end_time: str, count: int, fetch: Callable,
+                 download: Optional[Callable]) -> Tuple[Optional[Dict], Optional[Dict[str, np.ndarray]]]:
+        """补取缓存未覆盖的部分并刷新末尾（调用方持有序列锁），返回 (元数据, 新建序列时取到的数据)
+
+        序列不在缓存中时整段获取并写入，返回取到的数据；没有K线时元数据为 None
+        """
+        lo = parse_time(start_time)
+        hi = parse_time(end_time, end=True)
+        with self._lock:
+            meta = self._load_index().get(series_dir)
+        wanted = [f for f in field_list if f != "time"] if field_list else None
+        if meta is not None and ((wanted is None and not meta["all_fields"])
+                                 or (wanted is not None and not meta["all_fields"]
+                                     and not set(wanted) <= set(meta["fields"]))):
+            # 缓存中缺少请求的字段，扩充字段后整体重取
+            wanted = None if wanted is None else sorted(set(wanted) | set(meta["fields"]) - {"time"})
+            self._drop(series_dir)
+            meta = None
+
+        if meta is None:
+            data = self._fetch(fetch, wanted, start_time, end_time, count)
+            self._count("misses")
+            if len(data.get("time", ())) == 0:
+                return None, data
+            meta = {
+                "stock_code": stock_code, "period": period, "dividend_type": dividend_type,
+                "fields": list(data), "all_fields": wanted is None,
+                "first_time": None, "last_time": None, "rows": 0, "partitions": {}, "dirs": {},
+                "covered_from": lo if lo is not None and lo < int(data["time"][0]) else int(data["time"][0]),
+                "head_complete": lo is None and count < 0,
+                "covered_to": _covered_to(hi),
+                "checked_at": time.time(), "stale": False, "last_access": time.time(), "bytes": 0,
+            }
+            self._write(series_dir, meta, data)
+            self._enforce_cap(series_dir)
+            return meta, data
+
+        fetched = False
+        # 缓存开头之前的数据
+        if lo is not None and lo < meta["covered_from"] and not meta["head_complete"]:
+            head = self._fetch(fetch, meta["fields"], start_time, format_time(meta["first_time"]), -1)
+            self._merge(series_dir, meta, head)
+            meta["covered_from"] = lo
+            fetched = True
+        elif lo is None and count < 0 and not meta["head_complete"]:
+            head = self._fetch(fetch, meta["fields"], "", format_time(meta["first_time"]), -1)
+            self._merge(series_dir, meta, head)
+            meta["head_complete"] = True
+            fetched = True
+        elif lo is None and count > 0 and not meta["head_complete"]:
+            available = self._read(series_dir, meta, ["time"], None, hi)["time"]
+            if len(available) < count:
+                head = self._fetch(fetch, meta["fields"], "", end_time or format_time(meta["last_time"]), count)
+                self._merge(series_dir, meta, head)
+                if len(head.get("time", ())) < count:
+                    meta["head_complete"] = True
+                fetched = True
+
+        # 缓存末尾之后的数据；复权序列即使只请求历史区间，也定期用最后一根K线检查除权变化
+        tail_due = meta["stale"] or time.time() - meta["checked_at"] >= self.tail_ttl
+        need_tail = hi is None or hi > meta["last_time"]
+        # 请求的区间超出以前取过的范围（如先取上半年再取全年，或先取历史区间再取到最新）时，不受刷新间隔限制；
+        # 不限结束时间或结束时间在刷新间隔内的请求，需要覆盖到刷新间隔之前
+        now = int(time.time() * 1000)
+        reach = min(now if hi is None else hi, now - int(self.tail_ttl * 1000))
+        gap = reach > meta.get("covered_to", meta["last_time"])
+        if (tail_due or gap) and (need_tail or meta["dividend_type"] != "none"):
+            last_time = format_time(meta["last_time"])
+            if need_tail and download is not None:
+                download()
+            tail = self._fetch(fetch, meta["fields"], last_time, end_time if need_tail else last_time, -1)
+            if self._adjustment_changed(series_dir, meta, tail):
+                # 除权因子变化，整段重取
+                self._count("dividend_invalidations")
+                head_start = "" if meta["head_complete"] else format_time(meta["covered_from"])
+                data = self._fetch(fetch, meta["fields"], head_start, end_time if need_tail else "", -1)
+                self._drop(series_dir)
+                meta.update({"first_time": None, "last_time": None, "partitions": {}, "dirs": {}, "rows": 0})
+                self._write(series_dir, meta, data)
+            else:
+                self._merge(series_dir, meta, tail)
+            meta["checked_at"] = time.time()
+            meta["covered_to"] = max(meta.get("covered_to", meta["last_time"]), _covered_to(hi))
+            meta["stale"] = False
+            fetched = True
+
+        meta["last_access"] = time.time()
+        if fetched:
+            self._save_meta(series_dir, meta)
+            self._enforce_cap(series_dir)
+        self._count("partial_hits" if fetched else "hits")
+        return meta, None
+
+    def _fetch(self, fetch: Callable, fields: Optional[List[str]], start_time: str, end_time: str,
+               count: int) -> Dict[str, np.ndarray]:
+        raw = fetch(list(dict.fromkeys(["time"] + fields)) if fields else [], start_time, end_time, count) or {}
+        data = {field: to_array(values) for field, values in raw.items()}
+        if "time" in data and len(data["time"]):
+            data["time"] = data["time"].astype(np.int64)
+            order = np.argsort(data["time"], kind="stable")
+            if not np.all(order[:-1] < order[1:]):
+                data = {field: arr[order] for field, arr in data.items()}
+        self._count("rows_fetched", len(data.get("time", ())))
+        return data
+
+    def _adjustment_changed(self, series_dir: str, meta: Dict, tail: Dict[str, np.ndarray]) -> bool:
+        """除权方式不为 none 时，比较重叠K线的收盘价判断除权因子是否变化"""
+        if meta["dividend_type"] == "none" or "close" not in tail or len(tail["time"]) == 0:
+            return False
+        last = meta["last_time"]
+        overlap = np.nonzero(tail["time"] == last)[0]
+        if len(overlap) == 0:
+            return False
+        cached = self._read(series_dir, meta, ["close"], last, last)["close"]
+        if len(cached) == 0:
+            return False
+        old, new = float(cached[-1]), float(tail["close"][overlap[0]])
+        return abs(old - new) > _ADJUST_TOLERANCE * max(abs(old), 1.0)
+
+    def _select(self, data: Dict[str, np.ndarray], field_list: List[str], count: int) -> Dict[str, np.ndarray]:
+        """按字段和条数截取结果"""
+        if field_list:
+            keep = [f for f in ["time", "stime"] + list(field_list) if f in data]
+            data = {f: data[f] for f in dict.fromkeys(keep)}
+        if count is not None and count >= 0:
+            data = {f: arr[len(arr) - min(count, len(arr)):] for f, arr in data.items()}
+        self._count("rows_served", len(data.get("time", ())))
+        return data
+
+    def mark_stale(self, stock_code: str, period: str = None) -> None:
+        """标记序列需要刷新末尾（如下载历史数据之后）"""
+        with self._lock:
+            targets = [(path, meta) for path, meta in self._load_index().items()
+                       if meta["stock_code"] == stock_code and (period is None or meta["period"] == period)]
+        for path, meta in targets:
+            meta["stale"] = True
+            self._save_meta(path, meta)
+
+    def invalidate(self, stock_code: str = None, period: str = None, dividend_type: str = None) -> int:
+        """删除匹配的序列，参数为空表示不限，返回删除的序列数"""
+        with self._lock:
+            targets = [path for path, meta in self._load_index().items()
+                       if (stock_code is None or meta["stock_code"] == stock_code)
+                       and (period is None or meta["period"] == period)
+                       and (dividend_type is None or meta["dividend_type"] == dividend_type)]
+        for path in targets:
+            self._drop(path)
+        return len(targets)
+
+
+# 全局K线缓存
+kline_cache = KlineCache()
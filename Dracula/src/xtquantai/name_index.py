@@ -0,0 +1,246 @@
+"""
+合约名称索引
+覆盖全部市场的 名称 -> 代码 索引，支持：
+- 精确匹配、前缀匹配：有序名称表上二分查找，O(log n)
+- 拼音首字母匹配（如 'PFYH' -> 浦发银行），需要安装 pypinyin，未安装时跳过
+- 包含匹配和编辑距离模糊匹配：先用字符倒排表取共享字符的候选，再逐个计算编辑距离
+构建时通过合约信息仓库批量获取合约详情，结果持久化到磁盘，超过有效期后在后台重建。
+"""
+import json
+import os
+import threading
+import time
+import unicodedata
+import uuid
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from .instrument_store import instrument_store
+from .kline_cache import CACHE_DIR
+
+# 索引文件
+NAME_INDEX_PATH = os.path.join(CACHE_DIR, "name_index.json")
+
+# 索引最大有效期（秒），超过后后台重建
+NAME_INDEX_MAX_AGE = float(os.environ.get("XTQUANTAI_NAME_INDEX_MAX_AGE", str(24 * 3600)))
+
+# 默认市场优先级，同分的候选按此顺序排列
+DEFAULT_MARKETS = ['SH', 'SZ', 'BJ', 'BKZS', 'IF', 'SF', 'DF', 'ZF', 'GF', 'INE', 'SHO', 'SZO', 'HK', 'HGT', 'SGT']
+
+# 各匹配方式的基础分
+SCORE_EXACT = 1.0
+SCORE_INITIALS = 0.9
+SCORE_PREFIX = 0.8
+SCORE_INITIALS_PREFIX = 0.7
+SCORE_CONTAINS = 0.6
+SCORE_FUZZY = 0.6
+
+
+def normalize_name(name: str) -> str:
+    """名称规范化：全角转半角、去空白、字母大写，如 '万科Ａ' -> '万科A'"""
+    return "".join(unicodedata.normalize("NFKC", name or "").split()).upper()
+
+
+def pinyin_initials(name: str) -> str:
+    """名称的拼音首字母（大写），未安装 pypinyin 时返回空字符串"""
+    try:
+        from pypinyin import Style, lazy_pinyin
+    except ImportError:
+        return ""
+    return "".join(p[:1] for p in lazy_pinyin(name, style=Style.FIRST_LETTER, errors="default")).upper()
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein 编辑距离"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class NameIndex:
+    """全市场合约名称索引"""
+
+    def __init__(self, path: str = NAME_INDEX_PATH, max_age: float = NAME_INDEX_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.built_at = 0.0
+        # (合约列表[(名称, 代码, 市场)], 有序规范化名称, 对应合约序号, 有序拼音首字母, 对应合约序号, 字符倒排表)
+        # 重建时整体替换，查询时一次取出，避免读到新旧混合的数据
+        self._tables: tuple = ([], [], [], [], [], {})
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    # ---------- 构建与加载 ----------
+
+    def _index(self, entries: List[tuple], initials: List[str], built_at: float) -> None:
+        names = sorted((normalize_name(name), i) for i, (name, _, _) in enumerate(entries))
+        pinyin = sorted((key, i) for i, key in enumerate(initials) if key)
+        chars: Dict[str, List[int]] = {}
+        for key, i in names:
+            for c in set(key):
+                chars.setdefault(c, []).append(i)
+        self._tables = (entries, [key for key, _ in names], [i for _, i in names],
+                        [key for key, _ in pinyin], [i for _, i in pinyin], chars)
+        self.built_at = built_at
+        self._loaded = True
+
+    def build(self, markets: List[str] = None) -> None:
+        """批量获取全部市场的合约名称并持久化"""
+        import xtquant.xtdata as xtdata
+
+        start = time.time()
+        if markets is None:
+            available = list(xtdata.get_markets().keys())
+            markets = [m for m in DEFAULT_MARKETS if m in available] + \
+                      [m for m in available if m not in DEFAULT_MARKETS]
+        entries = []
+        for market in markets:
+            codes = xtdata.get_stock_list_in_sector(market)
+            details = instrument_store.get_many(codes, fields=["InstrumentName"])
+            entries.extend((details[code]["InstrumentName"], code, market) for code in codes
+                           if details[code] and details[code].get("InstrumentName"))
+        initials = [pinyin_initials(name) for name, _, _ in entries]
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{uuid.uuid4().hex[:8]}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"built_at": start, "markets": markets, "entries": entries, "initials": initials},
+                      f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self._index(entries, initials, start)
+        print(f"合约名称索引已重建: {len(entries)} 个合约，耗时 {time.time() - start:.2f}s")
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        entries = [tuple(entry) for entry in data["entries"]]
+        initials = data.get("initials") or [""] * len(entries)
+        if not any(initials):
+            # 构建时未安装 pypinyin，加载时补算
+            initials = [pinyin_initials(name) for name, _, _ in entries]
+        self._index(entries, initials, data.get("built_at", 0.0))
+        return True
+
+    def refresh(self, background: bool = True) -> None:
+        """重建索引；后台模式下已有重建在进行时不重复启动"""
+        if not background:
+            self.build()
+            return
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_quietly, daemon=True,
+                                                    name="xtquantai-name-index-refresh")
+            self._refresh_thread.start()
+
+    def _refresh_quietly(self) -> None:
+        try:
+            self.build()
+        except Exception as e:
+            print(f"合约名称索引后台重建失败: {e}")
+
+    def ensure_loaded(self) -> None:
+        """首次使用时从磁盘加载，磁盘上没有时同步构建；过期时后台重建"""
+        if not self._loaded:
+            with self._build_lock:
+                if not self._loaded and not self._load():
+                    self.build()
+        elif time.time() - self.built_at > self.max_age:
+            self.refresh(background=True)
+
+    # ---------- 查询 ----------
+
+    def _prefix_range(self, keys: List[str], prefix: str) -> range:
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\U0010ffff", lo)
+        return range(lo, hi)
+
+    def search(self, query: str, markets: List[str] = None, limit: int = 10) -> List[Dict]:
+        """按名称查找合约，返回按得分降序排列的候选
+
+        Args:
+            query: 名称、名称前缀、拼音首字母或近似名称
+            markets: 限定的市场列表，同分时按列表顺序排列；为空时不限定，按默认市场优先级排列
+            limit: 最多返回的候选个数
+
+        Returns:
+            候选列表，每项包括 code / name / market / score / match
+        """
+        self.ensure_loaded()
+        entries, names, name_ids, initials_keys, initial_ids, chars = self._tables
+        key = normalize_name(query)
+        if not key:
+            return []
+        order = {m: i for i, m in enumerate(markets or DEFAULT_MARKETS)}
+        allowed = set(markets) if markets else None
+        scores: Dict[int, tuple] = {}
+
+        def add(i: int, score: float, match: str) -> None:
+            if allowed is not None and entries[i][2] not in allowed:
+                return
+            if i not in scores or scores[i][0] < score:
+                scores[i] = (score, match)
+
+        for pos in self._prefix_range(names, key):
+            name = names[pos]
+            if name == key:
+                add(name_ids[pos], SCORE_EXACT, "exact")
+            else:
+                add(name_ids[pos], SCORE_PREFIX + 0.1 * len(key) / len(name), "prefix")
+
+        if key.isascii() and key.isalpha():
+            for pos in self._prefix_range(initials_keys, key):
+                initials = initials_keys[pos]
+                if initials == key:
+                    add(initial_ids[pos], SCORE_INITIALS, "pinyin")
+                else:
+                    add(initial_ids[pos], SCORE_INITIALS_PREFIX + 0.1 * len(key) / len(initials),
+                        "pinyin_prefix")
+
+        # 已有精确匹配或候选已足够时，不再做较慢的包含/模糊匹配
+        if len(scores) >= limit or any(match == "exact" for _, match in scores.values()):
+            return self._ranked(entries, scores, order, limit)
+
+        # 包含匹配与模糊匹配：取与查询共享字符最多的名称作为候选
+        shared: Dict[int, int] = {}
+        for c in set(key):
+            for i in chars.get(c, ()):
+                shared[i] = shared.get(i, 0) + 1
+        # 至少共享两个字符（查询只有一个字符时为一个），允许最多两个字符不同
+        distinct = len(set(key))
+        need = max(distinct - 2, min(distinct, 2))
+        for i, count in shared.items():
+            if count < need or i in scores:
+                continue
+            name = normalize_name(entries[i][0])
+            if key in name:
+                add(i, SCORE_CONTAINS + 0.1 * len(key) / len(name), "contains")
+                continue
+            distance = edit_distance(key, name)
+            similarity = 1.0 - distance / max(len(key), len(name))
+            if similarity >= 0.5:
+                add(i, SCORE_FUZZY * similarity, "fuzzy")
+
+        return self._ranked(entries, scores, order, limit)
+
+    @staticmethod
+    def _ranked(entries: List[tuple], scores: Dict[int, tuple], order: Dict[str, int], limit: int) -> List[Dict]:
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], order.get(entries[item[0]][2], len(order))))
+        return [{"code": entries[i][1], "name": entries[i][0], "market": entries[i][2],
+                 "score": round(score, 4), "match": match}
+                for i, (score, match) in ranked[:limit]]
+
+
+# 全局名称索引
+name_index = NameIndex()
@@ -0,0 +1,389 @@
+"""
+信号参数寻优
+展开信号中 input 声明的取值范围，在本地回测引擎上评估各组参数，按指标排序并给出热力图数据。
+- 参数组合分批交给 cpu 进程池计算；K线只放进共享内存一次，任务只携带参数
+- 约束条件（如 N1<N2）在展开网格时整体向量过滤，不满足的组合不评估
+- 剪枝：先在前一半K线上评估全部组合，只把排名靠前的部分放到完整区间上评估。
+  回测是因果的，前半段的结果就是完整回测进行到中点时的状态
+- 网格过大时可随机抽样，或用 TPE（树结构 Parzen 估计）做贝叶斯序贯抽样：按已评估结果把组合分成好、差两组，
+  在每个参数维度上做核密度估计，优先评估 好/差 密度比最高的组合
+"""
+import math
+import os
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .backtest import template_backtest, template_summary
+from .executor import CPU_WORKERS, EXECUTION_CPU, get_executor
+from .formula import FormulaError, compile_signal, parse
+from .formula.compiler import CompiledSignal
+from .formula.functions import FUNCTIONS, truth
+from .formula.parser import Binary, Call, Name, Num, Unary
+from .shared_arrays import Handle, SharedArrays, attach
+
+# 网格搜索允许的最大组合数，超过时需要改用抽样
+OPTIMIZE_MAX_COMBINATIONS = int(os.environ.get("XTQUANTAI_OPTIMIZE_MAX_COMBINATIONS", "200000"))
+
+# 每个进程池任务最多包含的参数组合数
+OPTIMIZE_BATCH = int(os.environ.get("XTQUANTAI_OPTIMIZE_BATCH", "64"))
+
+# 寻优方式
+METHODS = ("grid", "random", "bayes")
+
+# 可作为寻优目标的指标（summarize_backtest_result 的 summary），最大回撤越小越好，其余越大越好
+METRICS = ("收益回撤比", "总收益率", "最大回撤", "胜率", "交易次数")
+_MINIMIZE = ("最大回撤",)
+
+# TPE 中好样本的比例
+_TPE_GAMMA = 0.25
+
+# 组合数过多时，TPE 每轮从随机抽取的候选池中挑选
+_TPE_POOL = 20000
+
+
+def parameter_axes(compiled: CompiledSignal, ranges: Optional[Mapping[str, Any]] = None) -> Dict[str, np.ndarray]:
+    """各参数的取值
+
+    默认取 input 声明的 最小值..最大值（按步长）；没有声明范围的参数固定为默认值。
+    ranges 可以覆盖：{名称: [最小值, 最大值, 步长]} 或 {名称: 固定值}
+    """
+    ranges = {name.upper(): value for name, value in (ranges or {}).items()}
+    unknown = [name for name in ranges if name not in compiled.inputs]
+    if unknown:
+        raise FormulaError(f"信号中没有参数 {', '.join(unknown)}")
+    axes = {}
+    for name, spec in compiled.inputs.items():
+        if name in ranges:
+            value = ranges[name]
+            if np.ndim(value) == 0:
+                low = high = float(value)
+                step = 1.0
+            elif len(value) == 3:
+                low, high, step = (float(v) for v in value)
+            else:
+                raise ValueError(f"参数 {name} 的范围应为 [最小值, 最大值, 步长]")
+        elif spec.min is not None and spec.max is not None:
+            low, high, step = spec.min, spec.max, spec.step
+        else:
+            low = high = spec.default
+            step = 1.0
+        step = step if step and step > 0 else 1.0
+        if high < low:
+            raise ValueError(f"参数 {name} 的最大值小于最小值")
+        # 按步数生成，避免浮点步长累积误差
+        count = int(math.floor((high - low) / step + 1e-9)) + 1
+        axes[name] = np.round(low + np.arange(count) * step, 10)
+    return axes
+
+
+def _evaluate_expr(expr, columns: Dict[str, np.ndarray], n: int):
+    if isinstance(expr, Num):
+        return expr.value
+    if isinstance(expr, Name):
+        if expr.name not in columns:
+            raise FormulaError(f"约束条件中的 {expr.name} 不是信号参数")
+        return columns[expr.name]
+    if isinstance(expr, Unary):
+        return CompiledSignal._apply_unary(expr.op, _evaluate_expr(expr.operand, columns, n))
+    if isinstance(expr, Binary):
+        return CompiledSignal._apply_binary(expr.op, _evaluate_expr(expr.left, columns, n),
+                                            _evaluate_expr(expr.right, columns, n))
+    if isinstance(expr, Call) and expr.func in FUNCTIONS:
+        return FUNCTIONS[expr.func][0](n, *(_evaluate_expr(arg, columns, n) for arg in expr.args))
+    raise FormulaError(f"约束条件中无法计算的表达式 {expr!r}")
+
+
+def constraint_mask(constraint: str, axes: Dict[str, np.ndarray], index: np.ndarray) -> np.ndarray:
+    """约束条件在各组合上是否成立
+
+    Args:
+        constraint: 公式语法的条件表达式，只能引用参数名，如 'N1<N2 AND N2-N1>=5'
+        axes: parameter_axes 的结果
+        index: (组合数, 参数个数) 的取值下标
+    """
+    if not constraint.strip():
+        return np.ones(len(index), dtype=bool)
+    program = parse(f"OK:{constraint};")
+    if len(program.statements) != 1:
+        raise FormulaError("约束条件只能是一个表达式")
+    columns = {name: values[index[:, d]] for d, (name, values) in enumerate(axes.items())}
+    result = _evaluate_expr(program.statements[0].expr, columns, len(index))
+    return np.broadcast_to(truth(result), (len(index),))
+
+
+def evaluate_batch(handle: Handle, source: str, combos: List[Dict[str, float]],
+                   stop: int = 0) -> List[Tuple[Optional[Dict], str]]:
+    """进程池任务：在共享内存中的K线上逐组参数运行回测模板
+
+    Args:
+        handle: 共享K线的句柄
+        source: 信号公式
+        combos: 参数组合
+        stop: 只使用前 stop 根K线，0 表示全部
+
+    Returns:
+        每组参数的 (template_summary, 错误信息)；参数无效（如 SMA 的 M>N）或回测出错时为 (None, 错误信息)，
+        单组参数出错不影响同一批的其他组合
+    """
+    bars = attach(handle)
+    if stop:
+        bars = {field: values[:stop] for field, values in bars.items()}
+    compiled = compile_signal(source)
+    results = []
+    for params in combos:
+        try:
+            values = compiled.evaluate(bars, params, ["BK", "BP"])
+            results.append((template_summary(template_backtest(bars["close"], values["BK"], values["BP"])), ""))
+        except Exception as e:
+            results.append((None, str(e) or type(e).__name__))
+    return results
+
+
+class _Evaluator:
+    """把参数组合分批提交到进程池，并汇报进度"""
+
+    def __init__(self, executor: Executor, handle: Handle, source: str, names: List[str],
+                 axes: Dict[str, np.ndarray], progress: Optional[Callable] = None, planned: int = 0):
+        self.executor = executor
+        self.handle = handle
+        self.source = source
+        self.names = names
+        self.axes = axes
+        self.progress = progress
+        self.planned = planned
+        self.done = 0
+        # 参数取值 -> 评估出错的信息
+        self.errors: Dict[Tuple, str] = {}
+
+    def params(self, index: np.ndarray) -> List[Dict[str, float]]:
+        columns = [self.axes[name][index[:, d]].tolist() for d, name in enumerate(self.names)]
+        return [dict(zip(self.names, values)) for values in zip(*columns)]
+
+    def __call__(self, index: np.ndarray, stop: int = 0, stage: str = "") -> List[Optional[Dict]]:
+        combos = self.params(index)
+        if not combos:
+            return []
+        # 每个工作进程至少分到几个任务，便于负载均衡
+        size = max(1, min(OPTIMIZE_BATCH, math.ceil(len(combos) / (CPU_WORKERS * 4))))
+        futures = [self.executor.submit(evaluate_batch, self.handle, self.source, combos[i:i + size], stop)
+                   for i in range(0, len(combos), size)]
+        results = []
+        for start, future in zip(range(0, len(combos), size), futures):
+            batch = future.result()
+            for params, (result, error) in zip(combos[start:start + size], batch):
+                results.append(result)
+                if result is None:
+                    self.errors[tuple(params.values())] = error
+            self.done += len(batch)
+            if self.progress:
+                self.progress(self.done, max(self.planned, self.done), stage)
+        return results
+
+
+def _scores(results: List[Optional[Dict]], metric: str) -> np.ndarray:
+    sign = -1.0 if metric in _MINIMIZE else 1.0
+    return np.array([-np.inf if r is None else sign * r[metric] for r in results], dtype=np.float64)
+
+
+def _tpe_propose(sizes: List[int], observed: np.ndarray, scores: np.ndarray, pool: np.ndarray,
+                 count: int) -> np.ndarray:
+    """按 好/差 两组在各维度上的核密度比挑选候选组合"""
+    order = np.argsort(-scores, kind="stable")
+    n_good = max(1, math.ceil(_TPE_GAMMA * len(observed)))
+    good, bad = observed[order[:n_good]], observed[order[n_good:]]
+    ratio = np.zeros(len(pool))
+    for d, size in enumerate(sizes):
+        grid = np.arange(size, dtype=np.float64)
+        bandwidth = max(1.0, size / 10)
+
+        def density(points: np.ndarray) -> np.ndarray:
+            kernel = np.exp(-0.5 * ((grid[:, None] - points[None, :]) / bandwidth) ** 2).sum(axis=1)
+            # 均匀先验，避免密度为 0
+            kernel = kernel + 1.0 / size
+            return kernel / kernel.sum()
+
+        ratio += np.log(density(good[:, d]))[pool[:, d]] - np.log(density(bad[:, d]))[pool[:, d]]
+    return pool[np.argsort(-ratio, kind="stable")[:count]]
+
+
+def optimize_signal(signal: str, bars: Mapping[str, Any], ranges: Optional[Mapping[str, Any]] = None,
+                    constraint: str = "", metric: str = "收益回撤比", method: str = "grid", samples: int = 200,
+                    prune_keep: float = 0.0, min_trades: int = 0, seed: int = 0, top: int = 20,
+                    heatmap: Optional[List[str]] = None, progress: Optional[Callable] = None,
+                    executor: Optional[Executor] = None) -> Dict[str, Any]:
+    """在一只股票的K线上寻找信号参数
+
+    Args:
+        signal: 包含 bk/bp 和 input 参数的信号公式
+        bars: K线，至少包含 time、close 和信号用到的字段
+        ranges: 覆盖参数取值范围，见 parameter_axes
+        constraint: 参数约束条件，如 'N1<N2'
+        metric: 排序指标，见 METRICS
+        method: grid 全部组合；random 随机抽取 samples 组；bayes 用 TPE 序贯抽取 samples 组
+        samples: random/bayes 评估的组合数
+        prune_keep: 大于 0 时先在前一半K线上评估，只保留该比例的组合做完整评估（grid/random）
+        min_trades: 交易次数少于此值的组合不参与排名
+        seed: 抽样的随机种子
+        top: 返回排名前几的组合
+        heatmap: 热力图的两个参数，默认取前两个参数
+        progress: 进度回调 (已完成, 总数, 说明)
+        executor: 进程池，默认使用 cpu 执行池
+
+    Returns:
+        {metric, method, parameters, axes, combinations, candidates, evaluated, pruned, failed, errors, ranked,
+         best, top: [{参数..., 总收益率, 最大回撤, 胜率, 交易次数, 收益回撤比}], heatmap: {x, y, x_values, y_values, z}}
+    """
+    if metric not in METRICS:
+        raise ValueError(f"不支持的指标: {metric}，可选 {', '.join(METRICS)}")
+    if method not in METHODS:
+        raise ValueError(f"不支持的寻优方式: {method}，可选 {', '.join(METHODS)}")
+    compiled = compile_signal(signal)
+    missing = [name for name in ("BK", "BP") if name not in compiled.variables]
+    if missing:
+        raise FormulaError(f"信号中没有定义 {'/'.join(missing)}")
+    axes = parameter_axes(compiled, ranges)
+    if not axes:
+        raise FormulaError("信号中没有 input 参数")
+    names = list(axes)
+    sizes = [len(values) for values in axes.values()]
+    total = int(np.prod(sizes, dtype=np.float64)) if sizes else 0
+    rng = np.random.default_rng(seed)
+
+    def unravel(flat: np.ndarray) -> np.ndarray:
+        return np.stack(np.unravel_index(flat, sizes), axis=1) if len(flat) else np.zeros((0, len(sizes)), dtype=np.int64)
+
+    def sample(count: int) -> np.ndarray:
+        if total <= OPTIMIZE_MAX_COMBINATIONS:
+            return rng.permutation(total)[:count]
+        return np.unique(rng.integers(0, total, count))
+
+    # 候选组合（grid/random）或候选池（bayes，组合数不大时为全部组合）
+    if method == "grid":
+        if total > OPTIMIZE_MAX_COMBINATIONS:
+            raise ValueError(f"参数组合数 {total} 超过上限 {OPTIMIZE_MAX_COMBINATIONS}，"
+                             f"请缩小范围或使用 method='random'/'bayes'")
+        flat = np.arange(total)
+    elif method == "random":
+        # 多抽一些，约束过滤后再截取
+        flat = sample(min(total, max(samples, 1) * 4))
+    else:
+        flat = np.arange(total) if total <= OPTIMIZE_MAX_COMBINATIONS else None
+    candidates = None
+    if flat is not None:
+        index = unravel(flat)
+        keep = constraint_mask(constraint, axes, index)
+        candidates = index[keep]
+        if method == "random":
+            candidates = candidates[:samples]
+    else:
+        # 检查约束条件语法
+        constraint_mask(constraint, axes, np.zeros((1, len(sizes)), dtype=np.int64))
+
+    n_bars = len(bars["close"])
+    fields = sorted(compiled.fields | {"close"})
+    arrays = {field: np.asarray(bars[field], dtype=np.float64) for field in fields}
+    if "time" in bars:
+        arrays["time"] = np.asarray(bars["time"], dtype=np.int64)
+    planned = len(candidates) if candidates is not None else samples
+    pruned = 0
+    with SharedArrays(arrays) as shared:
+        evaluate = _Evaluator(executor or get_executor(EXECUTION_CPU), shared.handle, signal, names, axes,
+                              progress, planned)
+        if method in ("grid", "random"):
+            evaluated = candidates
+            if prune_keep > 0 and len(candidates) > 1 and n_bars >= 4:
+                keep = max(1, math.ceil(len(candidates) * min(prune_keep, 1.0)))
+                evaluate.planned = len(candidates) + keep
+                partial = _scores(evaluate(candidates, n_bars // 2, "前半段剪枝"), metric)
+                evaluated = candidates[np.sort(np.argsort(-partial, kind="stable")[:keep])]
+                pruned = len(candidates) - len(evaluated)
+            results = evaluate(evaluated, 0, "完整评估")
+        else:
+            evaluated, results = _bayes(evaluate, sizes, samples, candidates, unravel, sample,
+                                        lambda index: constraint_mask(constraint, axes, index), metric, rng)
+
+    rows = []
+    failed = []
+    for params, result in zip(evaluate.params(evaluated), results):
+        if result is None:
+            failed.append({**params, "error": evaluate.errors.get(tuple(params.values()), "")})
+            continue
+        rows.append({**params, **result})
+    ranked = [row for row in rows if row["交易次数"] >= min_trades]
+    sign = -1.0 if metric in _MINIMIZE else 1.0
+    ranked.sort(key=lambda row: sign * row[metric], reverse=True)
+
+    return {
+        "metric": metric,
+        "method": method,
+        "parameters": names,
+        "axes": {name: values.tolist() for name, values in axes.items()},
+        "combinations": total,
+        "candidates": len(candidates) if candidates is not None else None,
+        "evaluated": len(rows) + len(failed),
+        "pruned": pruned,
+        "failed": len(failed),
+        "errors": failed[:top],
+        "ranked": len(ranked),
+        "best": ranked[0] if ranked else None,
+        "top": ranked[:top],
+        "heatmap": _heatmap(rows, axes, heatmap or names[:2], metric),
+    }
+
+
+def _bayes(evaluate: _Evaluator, sizes: List[int], samples: int, pool: Optional[np.ndarray],
+           unravel: Callable, sample: Callable, allowed: Callable, metric: str, rng: np.random.Generator):
+    """TPE 序贯抽样：先随机评估一批，之后每轮按已有结果挑选一批"""
+    batch = max(4, CPU_WORKERS)
+    seen = np.zeros(0, dtype=np.int64)
+    observed = np.zeros((0, len(sizes)), dtype=np.int64)
+    results: List[Optional[Dict]] = []
+
+    def fresh(index: np.ndarray) -> np.ndarray:
+        if not len(index):
+            return index
+        return index[~np.isin(np.ravel_multi_index(index.T, sizes), seen)]
+
+    while len(observed) < samples:
+        if pool is not None:
+            candidates = fresh(pool)
+        else:
+            index = unravel(sample(_TPE_POOL))
+            candidates = fresh(index[allowed(index)])
+        if not len(candidates):
+            break
+        count = min(batch, samples - len(observed), len(candidates))
+        if len(observed) < max(batch, samples // 4):
+            # 初始阶段随机评估
+            chosen = candidates[rng.permutation(len(candidates))[:count]]
+        else:
+            chosen = _tpe_propose(sizes, observed, _scores(results, metric), candidates, count)
+        seen = np.concatenate([seen, np.ravel_multi_index(chosen.T, sizes)])
+        results.extend(evaluate(chosen, 0, "贝叶斯抽样"))
+        observed = np.concatenate([observed, chosen])
+    return observed, results
+
+
+def _heatmap(rows: List[Dict], axes: Dict[str, np.ndarray], pair: List[str], metric: str) -> Optional[Dict]:
+    """两个参数上的指标矩阵：每个格子取其余参数中最好的结果，未评估的格子为 None"""
+    pair = [name.upper() for name in pair]
+    unknown = [name for name in pair if name not in axes]
+    if unknown:
+        raise FormulaError(f"热力图参数 {', '.join(unknown)} 不是信号参数")
+    x = pair[0]
+    y = pair[1] if len(pair) > 1 else None
+    x_values = axes[x].tolist()
+    y_values = axes[y].tolist() if y else [None]
+    x_pos = {value: i for i, value in enumerate(x_values)}
+    y_pos = {value: i for i, value in enumerate(y_values)}
+    sign = -1.0 if metric in _MINIMIZE else 1.0
+    best = np.full((len(y_values), len(x_values)), np.nan)
+    for row in rows:
+        i, j = y_pos[row[y] if y else None], x_pos[row[x]]
+        value = sign * row[metric]
+        if np.isnan(best[i, j]) or value > best[i, j]:
+            best[i, j] = value
+    z = [[None if np.isnan(v) else sign * v for v in line] for line in best.tolist()]
+    return {"x": x, "y": y, "x_values": x_values, "y_values": y_values, "z": z, "metric": metric}
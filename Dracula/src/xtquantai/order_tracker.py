@@ -0,0 +1,399 @@
+"""
+委托跟踪
+order_stock_async 只返回本次请求的序号 seq，委托编号随之后的 on_order_stock_async_response 推送回来。
+这里记录 seq 与委托编号的对应关系，以及每个委托的状态：
+- 回报可能先于调用方登记到达，所有回报都按 seq 记录，最多保留 XTQUANTAI_ORDER_TRACKER_LIMIT 条；
+  超出时从最早的开始丢弃，还有 future 在等待的委托保留
+- 调用方可以一次等待一批 seq 的回报，超时仍未到达的为 None
+- 委托回报、成交回报和委托失败推送更新委托状态（已提交、已报、部分成交、全部成交、已撤、废单、失败），
+  状态只前进不后退，回报乱序到达时不会把已成交的委托改回已报
+- 可以按 seq 或委托编号注册回调，或者在事件循环中等待 asyncio future（下一次状态变化或委托结束时完成），
+  回调线程通过 loop.call_soon_threadsafe 完成 future，调用方不需要轮询查询委托；
+  只能等待本进程登记过（expect）或收到过回报的委托，其他 seq / 委托编号立即返回 unknown 状态
+- 交易实例重新创建后 seq 重新编号，清空旧的对应关系；仍在等待下单回报的委托按失败结束
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 等待异步下单回报的默认超时（秒）
+ORDER_RESPONSE_TIMEOUT = float(os.environ.get("XTQUANTAI_ORDER_RESPONSE_TIMEOUT", "3"))
+
+# 保留的 seq 对应关系和委托状态条数
+ORDER_TRACKER_LIMIT = int(os.environ.get("XTQUANTAI_ORDER_TRACKER_LIMIT", "10000"))
+
+# 委托状态，按先后排列；后四个为结束状态
+ORDER_STATUSES = ("submitted", "reported", "partial", "filled", "cancelled", "rejected", "error")
+FINAL_STATUSES = frozenset(ORDER_STATUSES[3:])
+
+# xtconstant 委托状态对应的跟踪状态，首次使用时读取
+_STATUS_BY_NAME = {
+    "ORDER_UNREPORTED": "submitted",
+    "ORDER_WAIT_REPORTING": "submitted",
+    "ORDER_REPORTED": "reported",
+    "ORDER_REPORTED_CANCEL": "reported",    # 已报待撤
+    "ORDER_PARTSUCC_CANCEL": "partial",     # 部成待撤
+    "ORDER_PART_SUCC": "partial",
+    "ORDER_SUCCEEDED": "filled",
+    "ORDER_PART_CANCEL": "cancelled",       # 部成已撤
+    "ORDER_CANCELED": "cancelled",
+    "ORDER_JUNK": "rejected",
+}
+_status_codes: Optional[Dict[int, str]] = None
+
+
+def _status_of(order_status: Any) -> Optional[str]:
+    global _status_codes
+    if _status_codes is None:
+        from xtquant import xtconstant
+        _status_codes = {getattr(xtconstant, name): status for name, status in _STATUS_BY_NAME.items()
+                         if hasattr(xtconstant, name)}
+    return _status_codes.get(order_status)
+
+
+def unknown_status(seq: Optional[int] = None, order_id: Any = None) -> Dict[str, Any]:
+    """没有记录（未经本进程下单、没有收到回报或已超出保留条数）的委托的状态"""
+    return {"seq": seq, "order_id": order_id, "status": "unknown", "final": False}
+
+
+def _resolve(future: asyncio.Future, result: Dict[str, Any]) -> None:
+    # 在 future 所属的事件循环中执行；等待超时的 future 已被取消
+    if not future.done():
+        future.set_result(result)
+
+
+class OrderState:
+    """一个委托的状态"""
+
+    __slots__ = ("seq", "order_id", "stock_code", "order_volume", "reported_volume", "reported_price",
+                 "trade_volume", "trade_amount", "status", "error_msg", "updated_at", "trades", "waiters",
+                 "callbacks")
+
+    def __init__(self, seq: Optional[int] = None, order_id: Any = None):
+        self.seq = seq
+        self.order_id = order_id
+        self.stock_code = ""
+        self.order_volume = 0
+        # 委托回报中的累计成交，和按成交回报累加的成交（两种回报先后不定，取较多的一方）
+        self.reported_volume = 0
+        self.reported_price = 0.0
+        self.trade_volume = 0
+        self.trade_amount = 0.0
+        self.status = "submitted"
+        self.error_msg = ""
+        self.updated_at = time.time()
+        # 已计入的成交编号
+        self.trades: set = set()
+        # (事件循环, future, 是否等到结束)
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future, bool]] = []
+        # (回调类别 order / trade / error, 回调函数)
+        self.callbacks: List[Tuple[str, Callable[[Any], None]]] = []
+
+    @property
+    def final(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    @property
+    def waiting(self) -> bool:
+        """是否还有未完成的 future 在等待"""
+        return any(not waiter[1].done() for waiter in self.waiters)
+
+    @property
+    def traded_volume(self) -> int:
+        return max(self.trade_volume, self.reported_volume)
+
+    @property
+    def traded_price(self) -> float:
+        if self.trade_volume >= self.reported_volume:
+            return self.trade_amount / self.trade_volume if self.trade_volume else 0.0
+        return self.reported_price
+
+    def advance(self, status: str) -> None:
+        """状态只前进：结束后不再变化，乱序到达的较早状态忽略"""
+        if not self.final and ORDER_STATUSES.index(status) >= ORDER_STATUSES.index(self.status):
+            self.status = status
+
+    def merge(self, other: "OrderState") -> None:
+        """合并只按 seq 登记的状态（下单回报到达前注册的回调和 future）"""
+        self.stock_code = self.stock_code or other.stock_code
+        self.order_volume = self.order_volume or other.order_volume
+        self.waiters.extend(other.waiters)
+        self.callbacks.extend(other.callbacks)
+        if other.final:
+            self.advance(other.status)
+            self.error_msg = self.error_msg or other.error_msg
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "order_id": self.order_id,
+            "stock_code": self.stock_code,
+            "status": self.status,
+            "final": self.final,
+            "order_volume": self.order_volume,
+            "traded_volume": self.traded_volume,
+            "traded_price": self.traded_price,
+            "error_msg": self.error_msg,
+            "updated_at": self.updated_at,
+        }
+
+
+class OrderTracker:
+    """异步委托的 seq -> 委托编号，以及委托编号 -> 委托状态"""
+
+    def __init__(self, limit: int = ORDER_TRACKER_LIMIT):
+        self.limit = limit
+        self._responses: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._by_seq: "OrderedDict[int, OrderState]" = OrderedDict()
+        self._by_order: "OrderedDict[Any, OrderState]" = OrderedDict()
+        self._cond = threading.Condition()
+        self.responses = 0
+        self.errors = 0
+        self.notified = 0
+
+    def _record(self, seq: int, record: Dict[str, Any]) -> None:
+        with self._cond:
+            self._responses[seq] = record
+            self._responses.move_to_end(seq)
+            while len(self._responses) > self.limit:
+                self._responses.popitem(last=False)
+            self._cond.notify_all()
+
+    # ---------- 委托状态 ----------
+
+    def _state(self, seq: Optional[int] = None, order_id: Any = None, create: bool = True) -> Optional[OrderState]:
+        """按委托编号或 seq 查找委托状态（调用方持有锁）"""
+        state = self._by_order.get(order_id) if order_id is not None else None
+        if state is None and seq is not None:
+            state = self._by_seq.get(seq)
+        if state is None and create and (seq is not None or order_id is not None):
+            state = OrderState(seq, order_id)
+            if order_id is not None:
+                self._by_order[order_id] = state
+            if seq is not None:
+                self._by_seq[seq] = state
+            self._evict()
+        return state
+
+    def _evict(self) -> None:
+        """超出保留条数时从最早的开始丢弃，还有 future 在等待的委托跳过（调用方持有锁）"""
+        for index in (self._by_order, self._by_seq):
+            excess = len(index) - self.limit
+            if excess <= 0:
+                continue
+            victims = []
+            for key, state in index.items():
+                if not state.waiting:
+                    victims.append(key)
+                    if len(victims) >= excess:
+                        break
+            for key in victims:
+                del index[key]
+
+    def _link(self, seq: int, order_id: Any) -> OrderState:
+        """下单回报把 seq 对应到委托编号，合并两边已有的状态（调用方持有锁）"""
+        pending = self._by_seq.get(seq)
+        state = self._by_order.get(order_id)
+        if state is None:
+            state = pending or OrderState(seq, order_id)
+        elif pending is not None and pending is not state:
+            state.merge(pending)
+        state.seq, state.order_id = seq, order_id
+        self._by_seq[seq] = self._by_order[order_id] = state
+        self._by_seq.move_to_end(seq)
+        self._by_order.move_to_end(order_id)
+        self._evict()
+        return state
+
+    def _notify(self, state: OrderState, kind: str, obj: Any) -> None:
+        """完成等待中的 future，并在锁外调用注册的回调"""
+        state.updated_at = time.time()
+        result = state.to_dict()
+        waiters = []
+        for waiter in state.waiters:
+            if waiter[1].done():
+                continue
+            if waiter[2] and not state.final:
+                waiters.append(waiter)
+                continue
+            try:
+                waiter[0].call_soon_threadsafe(_resolve, waiter[1], result)
+                self.notified += 1
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+        state.waiters = waiters
+        callbacks = [callback for callback_kind, callback in state.callbacks if callback_kind == kind]
+        self._cond.notify_all()
+        self._cond.release()
+        try:
+            for callback in callbacks:
+                try:
+                    callback(obj)
+                except Exception as e:
+                    print(f"委托 {state.order_id} 的{kind}回调出错: {str(e)}")
+        finally:
+            self._cond.acquire()
+
+    def expect(self, seq: int, stock_code: str, volume: int) -> None:
+        """登记刚提交的委托，回报到达前也能按 seq 查询和等待"""
+        with self._cond:
+            state = self._state(seq)
+            state.stock_code = state.stock_code or stock_code
+            state.order_volume = state.order_volume or int(volume)
+
+    # ---------- 回调 ----------
+
+    def on_response(self, response: Any) -> None:
+        """on_order_stock_async_response 调用"""
+        seq = getattr(response, "seq", None)
+        if seq is None:
+            return
+        order_id = getattr(response, "order_id", None)
+        error_msg = getattr(response, "error_msg", "") or ""
+        self.responses += 1
+        self._record(seq, {
+            "order_id": order_id,
+            "error_msg": error_msg,
+            "order_remark": getattr(response, "order_remark", ""),
+        })
+        with self._cond:
+            if order_id is not None and order_id >= 0:
+                state = self._link(seq, order_id)
+            else:
+                state = self._state(seq)
+            if error_msg:
+                state.error_msg = error_msg
+                state.advance("error")
+                self._notify(state, "error", response)
+
+    def on_order(self, order: Any) -> None:
+        """on_stock_order 调用：按委托状态前进"""
+        status = _status_of(getattr(order, "order_status", None))
+        with self._cond:
+            state = self._state(order_id=order.order_id)
+            state.stock_code = getattr(order, "stock_code", "") or state.stock_code
+            state.order_volume = int(getattr(order, "order_volume", 0) or state.order_volume)
+            traded_volume = int(getattr(order, "traded_volume", 0) or 0)
+            if traded_volume >= state.reported_volume:
+                state.reported_volume = traded_volume
+                state.reported_price = float(getattr(order, "traded_price", 0.0) or 0.0)
+            if status is not None:
+                state.advance(status)
+            if status == "rejected":
+                state.error_msg = getattr(order, "status_msg", "") or state.error_msg
+            self._notify(state, "order", order)
+
+    def on_trade(self, trade: Any) -> None:
+        """on_stock_trade 调用：同一笔成交只计一次"""
+        with self._cond:
+            state = self._state(order_id=trade.order_id)
+            traded_id = getattr(trade, "traded_id", None)
+            if traded_id is not None:
+                if traded_id in state.trades:
+                    return
+                state.trades.add(traded_id)
+            volume = int(getattr(trade, "traded_volume", 0) or 0)
+            state.trade_volume += volume
+            state.trade_amount += float(getattr(trade, "traded_amount", 0.0) or 0.0) or \
+                volume * float(getattr(trade, "traded_price", 0.0) or 0.0)
+            state.stock_code = state.stock_code or getattr(trade, "stock_code", "")
+            state.advance("filled" if 0 < state.order_volume <= state.traded_volume else "partial")
+            self._notify(state, "trade", trade)
+
+    def on_error(self, order_error: Any) -> None:
+        """on_order_error 调用：带 seq 的下单失败也作为该 seq 的回报"""
+        seq = getattr(order_error, "seq", None)
+        order_id = getattr(order_error, "order_id", None)
+        error_msg = getattr(order_error, "error_msg", "") or "下单失败"
+        if seq is not None:
+            self.errors += 1
+            self._record(seq, {
+                "order_id": order_id,
+                "error_msg": error_msg,
+                "order_remark": getattr(order_error, "order_remark", ""),
+            })
+        with self._cond:
+            if seq is not None and order_id is not None and order_id >= 0:
+                state = self._link(seq, order_id)
+            else:
+                state = self._state(seq, order_id if order_id is not None and order_id >= 0 else None)
+            if state is None:
+                return
+            state.error_msg = error_msg
+            state.advance("error")
+            self._notify(state, "error", order_error)
+
+    def new_session(self) -> None:
+        """交易实例重新创建（seq 重新编号）时清空对应关系，仍在等待下单回报的委托按失败结束"""
+        with self._cond:
+            self._responses.clear()
+            for state in list(self._by_seq.values()):
+                if state.order_id is None and not state.final:
+                    state.error_msg = "交易实例重新创建，未收到下单回报"
+                    state.advance("error")
+                    self._notify(state, "error", None)
+            self._by_seq.clear()
+
+    # ---------- 查询和等待 ----------
+
+    def response(self, seq: int) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            return self._responses.get(seq)
+
+    def wait_responses(self, seqs: Iterable[int], timeout: float = None) -> Dict[int, Optional[Dict[str, Any]]]:
+        """等待一批 seq 的回报，返回 seq -> 回报（超时未到达的为 None）"""
+        seqs = list(seqs)
+        deadline = time.monotonic() + (ORDER_RESPONSE_TIMEOUT if timeout is None else timeout)
+        with self._cond:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or all(seq in self._responses for seq in seqs):
+                    break
+                self._cond.wait(remaining)
+            return {seq: self._responses.get(seq) for seq in seqs}
+
+    def status(self, seq: int = None, order_id: Any = None) -> Optional[Dict[str, Any]]:
+        """委托的当前状态，没有记录时为 None"""
+        with self._cond:
+            state = self._state(seq, order_id, create=False)
+            return state.to_dict() if state is not None else None
+
+    def watch(self, seq: int = None, order_id: Any = None, final: bool = True) -> asyncio.Future:
+        """
+        当前事件循环中的 future，委托结束（final=False 时为下一次状态变化）时以委托状态字典为结果。
+        委托已结束时立即完成；已登记（expect）但回报尚未到达的 seq 也可以等待。
+        没有记录的 seq / 委托编号不会再有回报，立即以 unknown 状态完成
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            state = self._state(seq, order_id, create=False)
+            if state is None:
+                future.set_result(unknown_status(seq, order_id))
+            elif state.final:
+                future.set_result(state.to_dict())
+            else:
+                state.waiters = [waiter for waiter in state.waiters if not waiter[1].done()]
+                state.waiters.append((loop, future, final))
+        return future
+
+    def add_callback(self, kind: str, callback: Callable[[Any], None], order_id: Any = None,
+                     seq: int = None) -> None:
+        """按委托编号或 seq 注册回调，kind 为 order / trade / error，在交易回调线程中调用
+
+        Raises:
+            ValueError: 没有该 seq / 委托编号的记录（未经本进程下单或没有收到回报）
+        """
+        with self._cond:
+            state = self._state(seq, order_id, create=False)
+            if state is None:
+                raise ValueError(f"没有委托记录: seq={seq}, order_id={order_id}")
+            state.callbacks.append((kind, callback))
+
+
+# 全局委托跟踪
+order_tracker = OrderTracker()
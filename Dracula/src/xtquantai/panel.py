@@ -0,0 +1,163 @@
+"""
+多股票K线面板
+把多只股票的K线按共享的时间轴对齐为面板：每个字段一个 (股票数, 时间数) 的二维数组，
+行顺序与股票列表一致，与 xtdata.get_market_data 返回的 DataFrame（index 为股票，columns 为时间）布局相同。
+- 股票较多时按块拆分，多个 get_market_data_ex_ori 调用并行执行
+- 某只股票在某个时间点没有数据时填 NaN
+- 可按时间分桶降采样，open 取桶内第一个，high/low 取最大/最小，成交量/额求和，其余取最后一个
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .columnar import to_array
+
+# 单次 get_market_data_ex_ori 调用包含的股票个数
+KLINE_BATCH_CHUNK = int(os.environ.get("XTQUANTAI_KLINE_BATCH_CHUNK", "500"))
+
+# 并行获取的最大线程数
+KLINE_BATCH_WORKERS = int(os.environ.get("XTQUANTAI_KLINE_BATCH_WORKERS", "8"))
+
+# 降采样时各字段的聚合方式，未列出的字段取桶内最后一个值
+_FIRST_FIELDS = ("open",)
+_MAX_FIELDS = ("high",)
+_MIN_FIELDS = ("low",)
+_SUM_FIELDS = ("volume", "amount")
+
+
+def chunk_codes(codes: List[str], chunk_size: int) -> List[List[str]]:
+    """把股票列表按块拆分"""
+    chunk_size = max(1, chunk_size)
+    return [codes[i:i + chunk_size] for i in range(0, len(codes), chunk_size)]
+
+
+def fetch_chunks(fetch: Callable[[List[str]], Dict[str, Dict]], codes: List[str],
+                 chunk_size: int = KLINE_BATCH_CHUNK, workers: int = KLINE_BATCH_WORKERS) -> Dict[str, Dict]:
+    """分块并行获取多只股票的数据
+
+    Args:
+        fetch: 获取一块股票数据的函数，参数为股票列表，返回 {code: {field: values}}
+        codes: 股票列表
+        chunk_size: 每块股票个数
+        workers: 最大并行线程数
+
+    Returns:
+        合并后的 {code: {field: values}}
+    """
+    chunks = chunk_codes(codes, chunk_size)
+    if len(chunks) <= 1:
+        return fetch(codes) if codes else {}
+
+    # 工具本身已运行在 io 执行池中，这里使用独立的线程池，避免占满共享执行池导致互相等待
+    result = {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks)),
+                            thread_name_prefix="xtquantai-kline-batch") as pool:
+        for data in pool.map(fetch, chunks):
+            result.update(data)
+    return result
+
+
+def align_panel(data: Dict[str, Dict], codes: List[str], field_list: List[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray], List[str]]:
+    """把 {code: {field: values}} 对齐到共享时间轴
+
+    Args:
+        data: 各股票的K线数据，须包含 time 字段
+        codes: 股票列表，决定面板的行顺序
+        field_list: 字段列表，为空时使用数据中出现的全部数值字段
+
+    Returns:
+        (时间轴, {field: (股票数, 时间数) 数组}, 没有数据的股票列表)
+    """
+    times = {}
+    for code in codes:
+        series = data.get(code) or {}
+        if len(series.get("time", [])):
+            times[code] = np.asarray(series["time"], dtype=np.int64)
+    missing = [code for code in codes if code not in times]
+
+    if not field_list:
+        seen = {}
+        for code in times:
+            for field in data[code]:
+                if field != "time":
+                    seen[field] = None
+        field_list = list(seen)
+    field_list = [field for field in field_list if field != "time"]
+
+    arrays = list(times.values())
+    if not arrays:
+        time_axis = np.zeros(0, dtype=np.int64)
+    elif all(len(a) == len(arrays[0]) and np.array_equal(a, arrays[0]) for a in arrays[1:]):
+        time_axis = arrays[0]
+    else:
+        time_axis = np.unique(np.concatenate(arrays))
+    same_axis = {code: len(t) == len(time_axis) and np.array_equal(t, time_axis) for code, t in times.items()}
+
+    panel = {}
+    for field in field_list:
+        out = np.full((len(codes), len(time_axis)), np.nan)
+        numeric = True
+        for row, code in enumerate(codes):
+            if code not in times or field not in data[code]:
+                continue
+            values = to_array(data[code][field])
+            if values.dtype.kind not in "biuf":
+                numeric = False
+                break
+            if same_axis[code]:
+                out[row] = values
+            else:
+                out[row, np.searchsorted(time_axis, times[code])] = values
+        # 非数值字段（如 stime）与时间轴重复，不放入面板
+        if numeric:
+            panel[field] = out
+    return time_axis, panel, missing
+
+
+def downsample_panel(time_axis: np.ndarray, panel: Dict[str, np.ndarray], max_points: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """按时间分桶把面板降采样到不超过 max_points 个时间点
+
+    每个桶的时间取桶内最后一个时间点，字段按 open 首个、high 最大、low 最小、
+    volume/amount 求和、其余取最后一个值聚合。
+    """
+    total = len(time_axis)
+    if max_points <= 0 or total <= max_points:
+        return time_axis, panel
+
+    starts = np.unique(np.linspace(0, total, max_points, endpoint=False).astype(np.int64))
+    ends = np.append(starts[1:], total) - 1
+    result = {}
+    for field, values in panel.items():
+        if field in _FIRST_FIELDS:
+            result[field] = values[:, starts]
+        elif field in _MAX_FIELDS:
+            result[field] = np.fmax.reduceat(values, starts, axis=1)
+        elif field in _MIN_FIELDS:
+            result[field] = np.fmin.reduceat(values, starts, axis=1)
+        elif field in _SUM_FIELDS:
+            summed = np.add.reduceat(np.nan_to_num(values), starts, axis=1)
+            # 整个桶都没有数据时保持 NaN
+            counts = np.add.reduceat(~np.isnan(values), starts, axis=1)
+            result[field] = np.where(counts > 0, summed, np.nan)
+        else:
+            result[field] = values[:, ends]
+    return time_axis[ends], result
+
+
+def wide_columns(time_axis: np.ndarray, panel: Dict[str, np.ndarray], codes: List[str]) -> Dict[str, Any]:
+    """面板展开为宽表列：time + 'field:code'，供只支持一维列的 Arrow 编码使用"""
+    columns = {"time": time_axis}
+    for field, values in panel.items():
+        for row, code in enumerate(codes):
+            columns[f"{field}:{code}"] = values[row]
+    return columns
+
+
+def panel_to_lists(values: np.ndarray) -> List[List]:
+    """面板数组转换为嵌套列表，NaN 无法用标准 JSON 表示，转换为 None"""
+    mask = np.isnan(values)
+    if mask.any():
+        return np.where(mask, None, values).tolist()
+    return values.tolist()
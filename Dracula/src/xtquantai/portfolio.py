@@ -0,0 +1,225 @@
+"""
+板块组合回测
+把同一个信号公式同时运行在一组股票（通常是板块成分股）上，按资金和仓位限制组合成一条权益曲线。
+- 行情和信号都是 (时间, 股票) 的二维面板，信号在整个面板上一次向量计算
+- 资金分配与仓位上限使各股票的成交互相依赖，只能沿时间逐根推进，
+  每根K线内对全部股票做向量运算，不逐只股票循环
+- 成交在信号K线的收盘价，与单股票回测模板一致：bk 成立、bp 不成立且空仓时开仓，bp 成立且持仓时平仓
+- 开仓信号多于空余仓位时，信号定义了 SCORE 变量则按 SCORE 从高到低选取，否则按股票顺序选取
+- 停牌（收盘价为 NaN）的股票不能开平仓，持仓市值保持不变
+"""
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+
+from .backtest import TEMPLATE_FEE
+from .formula import FormulaError, compile_signal
+from .formula.functions import truth
+
+# 单边手续费率，开平各收一次，合计与模板每笔交易的手续费相同
+PORTFOLIO_FEE = TEMPLATE_FEE / 2
+
+# 默认初始资金
+PORTFOLIO_CAPITAL = 1000000.0
+
+# 默认最大持仓股票数
+PORTFOLIO_MAX_POSITIONS = 10
+
+# 单笔最小开仓金额，可用资金低于此值时不再开仓（避免浮点误差留下的零头开出空仓位）
+MIN_ORDER_AMOUNT = 1.0
+
+# 资金分配方式
+ALLOCATIONS = ("equal", "cash")
+
+# 开仓优先级变量
+SCORE_VARIABLE = "SCORE"
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """沿时间轴（第 0 维）向前填充 NaN"""
+    idx = np.where(np.isnan(values), 0, np.arange(len(values)).reshape(-1, 1))
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return np.take_along_axis(values, idx, axis=0)
+
+
+def simulate_portfolio(close: np.ndarray, bk: np.ndarray, bp: np.ndarray,
+                       score: Optional[np.ndarray] = None,
+                       initial_capital: float = PORTFOLIO_CAPITAL,
+                       max_positions: int = PORTFOLIO_MAX_POSITIONS,
+                       max_weight: float = 0.0,
+                       allocation: str = "equal",
+                       fee: float = PORTFOLIO_FEE) -> Dict[str, Any]:
+    """按资金和仓位限制模拟组合
+
+    Args:
+        close: (时间, 股票) 收盘价，停牌为 NaN
+        bk: (时间, 股票) 开仓信号
+        bp: (时间, 股票) 平仓信号
+        score: (时间, 股票) 开仓优先级，越大越优先，为空时按股票顺序
+        initial_capital: 初始资金
+        max_positions: 最大同时持仓股票数
+        max_weight: 单只股票开仓金额占总权益的上限，0 表示不额外限制
+        allocation: equal 为每只股票开仓 总权益/max_positions；cash 为把可用资金平分给当根K线的开仓股票
+        fee: 单边手续费率
+
+    Returns:
+        equity / cash / market_value / positions: 每根K线收盘后的总权益、现金、持仓市值、持仓股票数
+        trades / wins / pnl: 每只股票已平仓的交易次数、盈利次数、盈亏金额
+        holding: 最后一根K线收盘后各股票是否持仓
+        rejected: 因仓位或资金不足未能执行的开仓信号数
+    """
+    if allocation not in ALLOCATIONS:
+        raise ValueError(f"不支持的资金分配方式: {allocation}，可选 {', '.join(ALLOCATIONS)}")
+    if max_positions <= 0:
+        raise ValueError("max_positions 必须大于 0")
+    close = np.asarray(close, dtype=np.float64)
+    n, width = close.shape
+    tradable = ~np.isnan(close)
+    filled = forward_fill(close)
+    # 逐根K线的价格变化倍数，停牌和上市前为 1
+    growth = np.ones_like(filled)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        growth[1:] = filled[1:] / filled[:-1]
+    growth[~np.isfinite(growth)] = 1.0
+    exit_signal = truth(bp) & tradable
+    entry_signal = truth(bk) & ~truth(bp) & tradable
+    priority = None if score is None else np.nan_to_num(np.asarray(score, dtype=np.float64), nan=-np.inf)
+
+    value = np.zeros(width)
+    cost = np.zeros(width)
+    held = np.zeros(width, dtype=bool)
+    trades = np.zeros(width, dtype=np.int64)
+    wins = np.zeros(width, dtype=np.int64)
+    pnl = np.zeros(width)
+    cash = float(initial_capital)
+    rejected = 0
+    equity_curve = np.empty(n)
+    cash_curve = np.empty(n)
+    positions = np.empty(n, dtype=np.int64)
+
+    for t in range(n):
+        value *= growth[t]
+
+        # 先平仓，释放的资金和仓位当根K线即可用于开仓
+        exits = held & exit_signal[t]
+        if exits.any():
+            proceeds = value[exits] * (1 - fee)
+            cash += proceeds.sum()
+            profit = proceeds - cost[exits]
+            trades[exits] += 1
+            wins[exits] += profit > 0
+            pnl[exits] += profit
+            value[exits] = 0.0
+            cost[exits] = 0.0
+            held &= ~exits
+
+        candidates = np.flatnonzero(entry_signal[t] & ~held)
+        if len(candidates):
+            equity = cash + value.sum()
+            slots = max_positions - int(held.sum())
+            if priority is not None and len(candidates) > slots > 0:
+                candidates = candidates[np.argsort(-priority[t, candidates], kind="stable")]
+            chosen = candidates[:max(slots, 0)]
+            if len(chosen):
+                if allocation == "equal":
+                    amount = equity / max_positions
+                else:
+                    amount = cash / len(chosen)
+                if max_weight > 0:
+                    amount = min(amount, equity * max_weight)
+                # 按优先级依次开仓，资金不足的部分不再开仓
+                count = min(len(chosen), int(cash / amount + 1e-9)) if amount >= MIN_ORDER_AMOUNT else 0
+                chosen = chosen[:count]
+                if count:
+                    value[chosen] = amount * (1 - fee)
+                    cost[chosen] = amount
+                    held[chosen] = True
+                    cash -= amount * count
+            rejected += len(candidates) - len(chosen)
+
+        equity_curve[t] = cash + value.sum()
+        cash_curve[t] = cash
+        positions[t] = int(held.sum())
+
+    return {
+        "equity": equity_curve,
+        "cash": cash_curve,
+        "market_value": equity_curve - cash_curve,
+        "positions": positions,
+        "trades": trades,
+        "wins": wins,
+        "pnl": pnl,
+        "holding": held,
+        "rejected": rejected,
+    }
+
+
+def summarize_portfolio(result: Dict[str, Any], initial_capital: float) -> Dict[str, Any]:
+    """组合回测的汇总指标，收益和回撤以百分比表示"""
+    equity = result["equity"]
+    if not len(equity):
+        return {"初始资金": initial_capital, "期末权益": initial_capital, "总收益率": 0.0, "最大回撤": 0.0,
+                "收益回撤比": 0.0, "交易次数": 0, "胜率": 0.0, "平均持仓数": 0.0, "最大持仓数": 0,
+                "未执行开仓信号": 0}
+    peak = np.maximum.accumulate(np.maximum(equity, initial_capital))
+    max_drawdown = float(((peak - equity) / peak).max() * 100)
+    total_return = float((equity[-1] / initial_capital - 1) * 100)
+    trades = int(result["trades"].sum())
+    return {
+        "初始资金": initial_capital,
+        "期末权益": float(equity[-1]),
+        "总收益率": total_return,
+        "最大回撤": max_drawdown,
+        "收益回撤比": total_return / max_drawdown if max_drawdown else 0.0,
+        "交易次数": trades,
+        "胜率": float(result["wins"].sum() / trades) if trades else 0.0,
+        "平均持仓数": float(result["positions"].mean()),
+        "最大持仓数": int(result["positions"].max()),
+        "未执行开仓信号": int(result["rejected"]),
+    }
+
+
+def run_portfolio_backtest(signal: str, bars: Mapping[str, Any], codes: List[str],
+                           params: Optional[Dict[str, float]] = None,
+                           initial_capital: float = PORTFOLIO_CAPITAL,
+                           max_positions: int = PORTFOLIO_MAX_POSITIONS,
+                           max_weight: float = 0.0,
+                           allocation: str = "equal",
+                           fee: float = PORTFOLIO_FEE) -> Dict[str, Any]:
+    """在 (时间, 股票) 面板上运行组合回测
+
+    Args:
+        signal: 包含 bk/bp 的信号公式，可选定义 SCORE 作为开仓优先级
+        bars: time 为一维时间轴，其余字段为 (时间, 股票) 面板，至少包含 close 和信号用到的字段
+        codes: 面板各列对应的股票代码
+        params: 覆盖信号中 input 参数的默认值
+        其余参数见 simulate_portfolio
+
+    Returns:
+        simulate_portfolio 的结果，另加 time（时间轴）、summary（汇总指标）和 per_stock（各股票交易统计）
+
+    Raises:
+        FormulaError: 信号无法在本地编译，或没有定义 bk/bp
+    """
+    compiled = compile_signal(signal)
+    missing = [name for name in ("BK", "BP") if name not in compiled.variables]
+    if missing:
+        raise FormulaError(f"信号中没有定义 {'/'.join(missing)}")
+    names = ["BK", "BP"] + ([SCORE_VARIABLE] if SCORE_VARIABLE in compiled.variables else [])
+    values = compiled.evaluate(bars, params, names)
+
+    result = simulate_portfolio(bars["close"], values["BK"], values["BP"], values.get(SCORE_VARIABLE),
+                                initial_capital, max_positions, max_weight, allocation, fee)
+    result["time"] = np.asarray(bars["time"])
+    result["summary"] = summarize_portfolio(result, initial_capital)
+    traded = np.flatnonzero((result["trades"] > 0) | result["holding"])
+    result["per_stock"] = sorted(
+        ({
+            "stock_code": codes[j],
+            "交易次数": int(result["trades"][j]),
+            "胜率": float(result["wins"][j] / result["trades"][j]) if result["trades"][j] else 0.0,
+            "盈亏": float(result["pnl"][j]),
+            "持仓中": bool(result["holding"][j]),
+        } for j in traded),
+        key=lambda row: row["盈亏"], reverse=True)
+    return result
@@ -0,0 +1,62 @@
+"""
+MCP 进度通知
+客户端在请求的 _meta.progressToken 中提供进度令牌时，长耗时工具可以通过
+notifications/progress 汇报进度。工具运行在执行池的工作线程中，
+这里把进度回调安全地投递回服务器事件循环发送。
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Optional
+
+# 两次进度通知的最小间隔（秒），完成时的通知不受限制
+PROGRESS_INTERVAL = 0.2
+
+
+class ProgressReporter:
+    """进度回调，可在任意线程中调用：reporter(progress, total, message)"""
+
+    def __init__(self, session: Any = None, token: Any = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 min_interval: float = PROGRESS_INTERVAL):
+        self.session = session
+        self.token = token
+        self.loop = loop
+        self.min_interval = min_interval
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_server(cls, server: Any) -> "ProgressReporter":
+        """从当前请求上下文创建；没有请求上下文或客户端未提供进度令牌时返回空回调"""
+        try:
+            ctx = server.request_context
+        except (AttributeError, LookupError):
+            return cls()
+        token = getattr(ctx.meta, "progressToken", None) if ctx.meta else None
+        if token is None:
+            return cls()
+        return cls(ctx.session, token, asyncio.get_running_loop())
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None
+
+    def __call__(self, progress: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last < self.min_interval and (total is None or progress < total):
+                return
+            self._last = now
+
+        coro = self.session.send_progress_notification(self.token, progress, total, message)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.loop.create_task(coro)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, self.loop)
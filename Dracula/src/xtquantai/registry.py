@@ -1,23 +1,36 @@
 from typing import Dict, Any
+from .executor import TOOL_EXECUTION_CLASSES
 
 class ToolRegistry:
     """工具函数注册器"""
     def __init__(self):
         self.tools = {}
     
-    def register(self, name: str, description: str, input_schema: Dict = None):
+    def register(self, name: str, description: str, input_schema: Dict = None,
+                 execution: str = "io", progress: bool = False):
         """将函数注册为工具
         
         Args:
             name: 工具名称
             description: 工具描述
             input_schema: 输入参数模式
+            execution: 执行类别，决定 handle_call_tool 把工具派发到哪个执行池
+                - 'inline': 纯异步/纯计算的轻量工具，直接在事件循环中执行
+                - 'io': 调用 xtdata 等阻塞接口，派发到有界线程池
+                - 'trading': 调用 XtQuantTrader，派发到单线程交易池，保证下单顺序
+                可选类别见 executor.TOOL_EXECUTION_CLASSES
+            progress: 工具函数是否接收 progress 参数（ProgressReporter），用于发送 MCP 进度通知
         """
+        if execution not in TOOL_EXECUTION_CLASSES:
+            raise ValueError(f"不支持的执行类别: {execution}，可选 {', '.join(TOOL_EXECUTION_CLASSES)}")
+        
         def decorator(func):
             self.tools[name] = {
                 "function": func,
                 "description": description,
-                "input_schema": input_schema or {}
+                "input_schema": input_schema or {},
+                "execution": execution,
+                "progress": progress
             }
             return func
         return decorator
@@ -0,0 +1,259 @@
+"""
+板块倒排索引
+股票 <-> 板块 的双向索引，持久化到磁盘，进程启动后以内存映射方式懒加载。
+- 代码和板块名各保存一份字符串表，索引中只存放整数ID
+- 两个方向的成员列表都是 CSR 结构：offsets[i]:offsets[i+1] 为第 i 个板块/代码的有序ID数组
+- 索引记录构建时的板块数据版本（download_sector_data 完成的时间），
+  板块数据更新或索引超过最大有效期后，在后台线程重建，重建完成前继续使用旧索引
+- 板块交集/并集/差集直接在有序ID数组上计算，不再调用 xtdata
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .kline_cache import CACHE_DIR
+
+# 索引目录
+SECTOR_INDEX_DIR = os.path.join(CACHE_DIR, "sector_index")
+
+# 索引最大有效期（秒），超过后后台重建
+SECTOR_INDEX_MAX_AGE = float(os.environ.get("XTQUANTAI_SECTOR_INDEX_MAX_AGE", str(24 * 3600)))
+
+# 构建索引时并行获取板块成分股的线程数
+SECTOR_INDEX_WORKERS = int(os.environ.get("XTQUANTAI_SECTOR_INDEX_WORKERS", "8"))
+
+_CURRENT_FILE = "CURRENT"
+_VERSION_FILE = "sector_data.version"
+_META_FILE = "meta.json"
+_ARRAYS = ("sector_offsets", "sector_members", "code_offsets", "code_members")
+
+
+class _IndexData:
+    """已加载的一份索引"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, _META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.sectors: List[str] = self.meta["sectors"]
+        self.codes: List[str] = self.meta["codes"]
+        self.sector_ids = {name: i for i, name in enumerate(self.sectors)}
+        self.code_ids = {code: i for i, code in enumerate(self.codes)}
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+    def members(self, sector: str) -> np.ndarray:
+        """板块的成分股ID（有序）"""
+        i = self.sector_ids.get(sector)
+        if i is None:
+            raise ValueError(f"未知板块: {sector}")
+        return self.sector_members[self.sector_offsets[i]:self.sector_offsets[i + 1]]
+
+    def sectors_of(self, code: str) -> np.ndarray:
+        """代码所属的板块ID（有序）"""
+        i = self.code_ids.get(code)
+        if i is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.code_members[self.code_offsets[i]:self.code_offsets[i + 1]]
+
+
+def _csr(lists: List[np.ndarray]):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(ids) for ids in lists])
+    members = np.concatenate(lists).astype(np.int32) if lists else np.zeros(0, dtype=np.int32)
+    return offsets, members
+
+
+class SectorIndex:
+    """持久化的股票-板块双向索引"""
+
+    def __init__(self, root: str = SECTOR_INDEX_DIR, max_age: float = SECTOR_INDEX_MAX_AGE,
+                 workers: int = SECTOR_INDEX_WORKERS):
+        self.root = root
+        self.max_age = max_age
+        self.workers = workers
+        self._data: Optional[_IndexData] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    # ---------- 版本 ----------
+
+    def data_version(self) -> float:
+        """板块数据版本：最近一次 download_sector_data 完成的时间，未知时为0"""
+        try:
+            with open(os.path.join(self.root, _VERSION_FILE), "r") as f:
+                return float(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0.0
+
+    def mark_sector_data_updated(self) -> None:
+        """板块数据已下载更新，记录新版本并在后台重建索引"""
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f"{_VERSION_FILE}.{uuid.uuid4().hex[:8]}")
+        with open(tmp, "w") as f:
+            f.write(repr(time.time()))
+        os.replace(tmp, os.path.join(self.root, _VERSION_FILE))
+        self.refresh(background=True)
+
+    def is_stale(self, data: _IndexData) -> bool:
+        if data.meta.get("data_version", 0.0) < self.data_version():
+            return True
+        return time.time() - data.meta.get("built_at", 0.0) > self.max_age
+
+    # ---------- 加载与构建 ----------
+
+    def _load_current(self) -> Optional[_IndexData]:
+        try:
+            with open(os.path.join(self.root, _CURRENT_FILE), "r") as f:
+                name = f.read().strip()
+            return _IndexData(os.path.join(self.root, name))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def build(self) -> _IndexData:
+        """从 xtdata 重新构建索引，写入新目录后原子切换"""
+        import xtquant.xtdata as xtdata
+
+        with self._build_lock:
+            version = self.data_version()
+            start = time.time()
+            sectors = list(xtdata.get_sector_list())
+            with ThreadPoolExecutor(max_workers=max(1, self.workers),
+                                    thread_name_prefix="xtquantai-sector-index") as pool:
+                member_lists = list(pool.map(xtdata.get_stock_list_in_sector, sectors))
+
+            # 代码字符串驻留为整数ID
+            code_ids: Dict[str, int] = {}
+            sector_lists = []
+            for members in member_lists:
+                ids = [code_ids.setdefault(code, len(code_ids)) for code in members]
+                sector_lists.append(np.unique(np.asarray(ids, dtype=np.int32)))
+            sector_offsets, sector_members = _csr(sector_lists)
+
+            # 反向：按代码ID稳定排序，得到每个代码所属的板块ID（保持板块列表顺序）
+            owner = np.repeat(np.arange(len(sectors), dtype=np.int32), np.diff(sector_offsets))
+            order = np.argsort(sector_members, kind="stable")
+            code_members = owner[order]
+            code_offsets = np.zeros(len(code_ids) + 1, dtype=np.int64)
+            code_offsets[1:] = np.cumsum(np.bincount(sector_members, minlength=len(code_ids)))
+
+            name = f"v{int(start * 1000)}-{uuid.uuid4().hex[:6]}"
+            path = os.path.join(self.root, name)
+            os.makedirs(path, exist_ok=True)
+            arrays = {"sector_offsets": sector_offsets, "sector_members": sector_members,
+                      "code_offsets": code_offsets, "code_members": code_members}
+            for key, arr in arrays.items():
+                np.save(os.path.join(path, f"{key}.npy"), arr, allow_pickle=False)
+            meta = {"data_version": version, "built_at": start, "build_seconds": round(time.time() - start, 3),
+                    "sectors": sectors, "codes": list(code_ids)}
+            with open(os.path.join(path, _META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+            tmp = os.path.join(self.root, f"{_CURRENT_FILE}.{uuid.uuid4().hex[:8]}")
+            with open(tmp, "w") as f:
+                f.write(name)
+            os.replace(tmp, os.path.join(self.root, _CURRENT_FILE))
+
+            data = _IndexData(path)
+            with self._lock:
+                self._data = data
+            self._remove_old(keep=name)
+            print(f"板块索引已重建: {len(sectors)} 个板块，{len(code_ids)} 个代码，耗时 {meta['build_seconds']}s")
+            return data
+
+    def _remove_old(self, keep: str) -> None:
+        for entry in os.listdir(self.root):
+            if entry.startswith("v") and entry != keep:
+                # Windows 下仍被内存映射的旧文件无法删除，下次重建时再清理
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+
+    def refresh(self, background: bool = True) -> None:
+        """重建索引；后台模式下已有重建在进行时不重复启动"""
+        if not background:
+            self.build()
+            return
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_quietly, daemon=True,
+                                                    name="xtquantai-sector-index-refresh")
+            self._refresh_thread.start()
+
+    def _refresh_quietly(self) -> None:
+        try:
+            self.build()
+        except Exception as e:
+            print(f"板块索引后台重建失败: {e}")
+
+    def get(self) -> _IndexData:
+        """获取索引：优先使用内存中的索引，其次从磁盘内存映射加载，都没有时同步构建；
+        索引过期时在后台重建"""
+        data = self._data
+        if data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self._load_current()
+                data = self._data
+            if data is None:
+                return self.build()
+        if self.is_stale(data):
+            self.refresh(background=True)
+        return data
+
+    # ---------- 查询 ----------
+
+    def sectors_of(self, code: str) -> List[str]:
+        """代码所属的全部板块"""
+        data = self.get()
+        return [data.sectors[i] for i in data.sectors_of(code)]
+
+    def members(self, sector: str) -> List[str]:
+        """板块的全部成分股"""
+        data = self.get()
+        return [data.codes[i] for i in data.members(sector)]
+
+    def query(self, all_of: List[str] = None, any_of: List[str] = None, none_of: List[str] = None) -> List[str]:
+        """板块集合运算：同时属于 all_of 全部板块、属于 any_of 任一板块、不属于 none_of 任何板块的代码
+
+        all_of 和 any_of 都为空时，从全部代码出发只做排除。
+        """
+        data = self.get()
+        ids = None
+        for sector in all_of or []:
+            members = data.members(sector)
+            ids = np.asarray(members) if ids is None else np.intersect1d(ids, members, assume_unique=True)
+        if any_of:
+            union = np.unique(np.concatenate([data.members(sector) for sector in any_of]))
+            ids = union if ids is None else np.intersect1d(ids, union, assume_unique=True)
+        if ids is None:
+            ids = np.arange(len(data.codes), dtype=np.int32)
+        for sector in none_of or []:
+            ids = np.setdiff1d(ids, data.members(sector), assume_unique=True)
+        return [data.codes[i] for i in ids]
+
+    def stats(self) -> Dict:
+        """索引信息"""
+        data = self.get()
+        return {
+            "sectors": len(data.sectors),
+            "codes": len(data.codes),
+            "memberships": int(len(data.sector_members)),
+            "data_version": data.meta.get("data_version", 0.0),
+            "built_at": data.meta.get("built_at", 0.0),
+            "build_seconds": data.meta.get("build_seconds", 0.0),
+            "stale": self.is_stale(data),
+            "refreshing": self._refresh_thread is not None and self._refresh_thread.is_alive(),
+            "path": data.path,
+        }
+
+
+# 全局板块索引
+sector_index = SectorIndex()
@@ -10,6 +10,10 @@ from mcp.server.models import InitializationOptions
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 from .registry import tool_registry
+from .executor import run_tool
+from .progress import ProgressReporter
+from .encoding import (RESULT_URI_PREFIX, encode_result, list_result_resources,
+                       read_result_resource)
 
 # 导入所有工具函数
 from . import tools
@@ -27,7 +31,8 @@ from . import tools
                 "default": "hello"
             }
         }
-    }
+    },
+    execution="inline"
 )
 async def test_connection(message: str = "hello") -> Dict:
     """测试连接工具函数"""
@@ -47,12 +52,14 @@ async def handle_list_resources(server) -> list[types.Resource]:
     """
     List available resources.
     """
-    return []
+    return list_result_resources()
 
 async def handle_read_resource(server, uri) -> str:
     """
     Read a specific resource.
     """
+    if str(uri).startswith(RESULT_URI_PREFIX):
+        return read_result_resource(uri)
     raise ValueError(f"Unsupported URI: {uri}")
 
 async def handle_list_prompts(server) -> list[types.Prompt]:
@@ -95,17 +102,16 @@ async def handle_call_tool(
     """
     # 检查工具是否存在
     if name in tool_registry.tools:
-        tool_func = tool_registry.tools[name]["function"]
+        tool_info = tool_registry.tools[name]
         kwargs = arguments or {}
+        if tool_info["progress"]:
+            kwargs = {**kwargs, "progress": ProgressReporter.from_server(server)}
         
-        # 调用工具函数
-        result = await tool_func(**kwargs)
+        # 按执行类别调用工具函数，阻塞调用不占用事件循环
+        result = await run_tool(tool_info["function"], kwargs, tool_info["execution"])
         
-        # 将结果转换为文本内容
-        return [types.TextContent(
-            type="text", 
-            text=json.dumps(result, ensure_ascii=False, indent=2)
-        )]
+        # 将结果编码为内容块，大结果分页返回
+        return encode_result(result, name)
     else:
         raise ValueError(f"未知工具: {name}")
 
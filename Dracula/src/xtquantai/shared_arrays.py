@@ -0,0 +1,73 @@
+"""
+进程间共享的数组
+参数寻优、滚动窗口等工具把同一段K线交给进程池中的大量任务计算。若随每个任务序列化K线，
+传输开销会与任务数成正比，因此主进程把数组一次性放进一块共享内存，任务只携带共享内存名称和布局，
+工作进程按名称映射为 NumPy 视图，同一块共享内存在工作进程中只映射一次。
+"""
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+
+# 任务中传递的共享数组句柄：(共享内存名称, {名称: (偏移, dtype, 形状)})
+Handle = Tuple[str, Dict[str, Tuple[int, str, Tuple[int, ...]]]]
+
+# 工作进程中最多保留的共享内存映射数
+_MAX_ATTACHED = 4
+
+_attached: "OrderedDict[str, Tuple[shared_memory.SharedMemory, Dict[str, np.ndarray]]]" = OrderedDict()
+
+
+class SharedArrays:
+    """把一组数值数组复制到一块共享内存中，用完后调用 close 释放（也可用 with 语句）"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        layout = {}
+        offset = 0
+        arrays = {name: np.ascontiguousarray(values) for name, values in arrays.items()}
+        for name, values in arrays.items():
+            # 每个数组按 8 字节对齐
+            offset = (offset + 7) // 8 * 8
+            layout[name] = (offset, values.dtype.str, values.shape)
+            offset += values.nbytes
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, values in arrays.items():
+            start, dtype, shape = layout[name]
+            np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=start)[...] = values
+        self.handle: Handle = (self._shm.name, layout)
+
+    def close(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def attach(handle: Handle) -> Dict[str, np.ndarray]:
+    """在工作进程中按句柄取得共享数组的只读视图"""
+    name, layout = handle
+    if name in _attached:
+        _attached.move_to_end(name)
+        return _attached[name][1]
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = {}
+    for field, (offset, dtype, shape) in layout.items():
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        view.flags.writeable = False
+        arrays[field] = view
+    _attached[name] = (shm, arrays)
+    while len(_attached) > _MAX_ATTACHED:
+        _, (old, _) = _attached.popitem(last=False)
+        try:
+            old.close()
+        except BufferError:
+            # 仍有视图被引用时无法关闭，交给进程退出时回收
+            pass
+    return arrays
@@ -0,0 +1,171 @@
+"""
+分笔回放回测
+K线回测在信号K线的收盘价成交，日内策略的成交价因此被高估：买入实际要付卖一价，卖出只能拿到买一价。
+这里把分笔数据当作逐笔的“K线”交给信号求值器，再按盘口成交：
+- 信号字段：C 为最新价，O/H/L 为当日开盘/最高/最低，V/AMO 为两笔之间的成交量/成交额（分笔中是当日累计值）
+- 持仓状态与回测模板相同（bk 成立、bp 不成立时开仓，bp 成立时平仓）；在第 i 笔发出的委托，
+  在第 i+delay 笔及之后第一笔有对手盘的快照成交：买入按卖一价，卖出按买一价。
+  卖盘为空（涨停）时买不进，买盘为空（跌停）时卖不出，顺延到有对手盘的快照
+- 每笔交易的收益为 卖出价/买入价-1 扣除手续费，策略收益为各笔收益（%）的累加，
+  持仓期间按买一价计算浮动收益；回测结束时仍持仓的交易只计入浮动收益，不计入交易次数
+- 五档盘口只保留一档，按 TICK_CHUNK 分块从内存映射的缓存文件中读取，避免一次展开整年的五档数组；
+  成交判断、持仓和收益曲线都是整列向量运算，只有撮合每笔交易的开平仓快照时按交易（而非按分笔）循环（见 fills.match_trades）
+"""
+import os
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+
+from .backtest import TEMPLATE_FEE
+from .fills import holding_state, match_trades, next_available
+from .formula import FormulaError, compile_signal
+from .formula.functions import divide
+
+# 分笔回放读取的字段
+TICK_FIELDS = ["time", "lastPrice", "open", "high", "low", "volume", "amount", "askPrice", "bidPrice"]
+
+# 分块处理的分笔数
+TICK_CHUNK = int(os.environ.get("XTQUANTAI_TICK_CHUNK", "262144"))
+
+
+def best_quote(values: np.ndarray, chunk: int = TICK_CHUNK) -> np.ndarray:
+    """取一档价格，没有挂单（价格为 0 或缺失）时为 NaN
+
+    values 可以是 (分笔数,) 或 (分笔数, 档位数)，按 chunk 分块读取
+    """
+    n = len(values)
+    out = np.empty(n, dtype=np.float64)
+    for start in range(0, n, chunk):
+        block = np.asarray(values[start:start + chunk], dtype=np.float64)
+        out[start:start + chunk] = block[:, 0] if block.ndim == 2 else block
+    out[~(out > 0)] = np.nan
+    return out
+
+
+def _increments(cumulative: np.ndarray, day: np.ndarray) -> np.ndarray:
+    """当日累计值转换为相邻两笔之间的增量，每天第一笔为其累计值"""
+    values = np.nan_to_num(np.asarray(cumulative, dtype=np.float64))
+    out = np.empty_like(values)
+    if len(values):
+        out[0] = values[0]
+        out[1:] = np.where(day[1:] != day[:-1], values[1:], values[1:] - values[:-1])
+    return out
+
+
+def tick_series(ticks: Mapping[str, Any], chunk: int = TICK_CHUNK) -> Dict[str, np.ndarray]:
+    """把分笔数据转换为信号求值和撮合用的序列
+
+    Returns:
+        {time, close, open, high, low, volume, amount, ask, bid}，ask/bid 为一档价格（无挂单为 NaN）
+    """
+    times = np.asarray(ticks["time"], dtype=np.int64)
+    # 北京时间的日期序号，用于把累计成交量拆成逐笔增量
+    day = (times + 8 * 3600 * 1000) // 86400000
+    last = np.asarray(ticks["lastPrice"], dtype=np.float64)
+    series = {"time": times, "close": last}
+    for field in ("open", "high", "low"):
+        series[field] = np.asarray(ticks[field], dtype=np.float64) if field in ticks else last
+    for field in ("volume", "amount"):
+        series[field] = _increments(ticks[field], day) if field in ticks else np.zeros(len(times))
+    series["ask"] = best_quote(ticks["askPrice"], chunk) if "askPrice" in ticks else last.copy()
+    series["bid"] = best_quote(ticks["bidPrice"], chunk) if "bidPrice" in ticks else last.copy()
+    return series
+
+
+def tick_backtest(series: Mapping[str, np.ndarray], bk: np.ndarray, bp: np.ndarray, delay: int = 1,
+                  fee: float = TEMPLATE_FEE) -> Dict[str, Any]:
+    """按盘口撮合的分笔回测
+
+    Args:
+        series: tick_series 的结果
+        bk: 开仓信号
+        bp: 平仓信号
+        delay: 信号发出后第几笔快照开始撮合，0 表示按发出信号那一笔的盘口成交
+        fee: 每笔交易扣除的手续费
+
+    Returns:
+        {curve: {策略收益, 持仓}, trades: 逐笔交易列, summary: 汇总指标}
+    """
+    last = np.asarray(series["close"], dtype=np.float64)
+    ask, bid = series["ask"], series["bid"]
+    n = len(last)
+    holding = holding_state(bk, bp)
+    before = np.zeros(n, dtype=bool)
+    before[1:] = holding[:-1]
+    entries = np.flatnonzero(holding & ~before)
+    exits = np.flatnonzero(~holding & before)
+    next_ask = next_available(~np.isnan(ask))
+    next_bid = next_available(~np.isnan(bid))
+
+    fills = match_trades(entries, exits, next_ask, next_bid, delay)
+    entry_signal, buy, exit_signal, sell = fills.T
+    closed = sell >= 0
+    buy_price = ask[buy]
+    sell_price = np.where(closed, bid[np.where(closed, sell, 0)], np.nan)
+    returns = (divide(sell_price, buy_price) - 1 - fee) * 100
+    # 对照：按信号那一笔的最新价成交（K线回测的成交方式）
+    last_returns = (divide(last[np.where(closed, exit_signal, 0)], last[entry_signal]) - 1 - fee) * 100
+
+    # 收益曲线：已平仓收益累加 + 持仓期间按买一价（没有买盘时沿用上一个买一价）计算的浮动收益
+    realized = np.zeros(n)
+    np.add.at(realized, sell[closed], returns[closed])
+    realized = np.cumsum(realized)
+    position = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(position, buy, 1)
+    np.add.at(position, np.where(closed, sell, n), -1)
+    position = np.cumsum(position[:n]) > 0
+    trade = np.maximum(np.searchsorted(buy, np.arange(n), side="right") - 1, 0)
+    valid_bid = np.where(np.isnan(bid), -1, np.arange(n))
+    mark = bid[np.maximum.accumulate(valid_bid).clip(0)]
+    mark = np.where(np.isnan(mark), last, mark)
+    floating = (divide(mark, buy_price[trade]) - 1) * 100 if len(buy) else np.zeros(n)
+    strategy = realized + np.where(position, floating, 0.0)
+
+    max_drawdown = float(np.max(np.maximum.accumulate(strategy) - strategy)) if n else 0.0
+    total = float(strategy[-1]) if n else 0.0
+    trades = int(closed.sum())
+    wins = int(np.sum(returns[closed] > 0))
+    last_total = float(np.sum(last_returns[closed]))
+    summary = {
+        "总收益率": total,
+        "最大回撤": max_drawdown,
+        "胜率": wins / trades if trades else 0.0,
+        "交易次数": trades,
+        "收益回撤比": float(divide(total, max_drawdown)) if max_drawdown else 0.0,
+        # 已平仓交易按最新价成交时的收益，以及盘口价差造成的差额
+        "最新价成交收益率": last_total,
+        "价差成本": last_total - float(np.sum(returns[closed])),
+        "平均持仓笔数": float(np.mean(sell[closed] - buy[closed])) if trades else 0.0,
+        "分笔数": n,
+    }
+    times = series["time"]
+    return {
+        "curve": {"time": times, "策略收益": strategy, "持仓": position.astype(np.float64)},
+        "trades": {
+            "entry_time": times[buy],
+            "entry_price": buy_price,
+            "exit_time": np.where(closed, times[np.where(closed, sell, 0)], 0),
+            "exit_price": sell_price,
+            "return": returns,
+            "last_return": np.where(closed, last_returns, np.nan),
+            "entry_delay": buy - entry_signal,
+            "exit_delay": np.where(closed, sell - exit_signal, -1),
+        },
+        "summary": summary,
+    }
+
+
+def run_tick_backtest(signal: str, ticks: Mapping[str, Any], params: Optional[Dict[str, float]] = None,
+                      delay: int = 1, fee: float = TEMPLATE_FEE) -> Dict[str, Any]:
+    """在分笔数据上运行信号并按盘口撮合，见 tick_backtest
+
+    Raises:
+        FormulaError: 信号无法在本地编译，或没有定义 bk/bp
+    """
+    compiled = compile_signal(signal)
+    missing = [name for name in ("BK", "BP") if name not in compiled.variables]
+    if missing:
+        raise FormulaError(f"信号中没有定义 {'/'.join(missing)}")
+    series = tick_series(ticks)
+    values = compiled.evaluate(series, params, ["BK", "BP"])
+    return tick_backtest(series, values["BK"], values["BP"], delay, fee)
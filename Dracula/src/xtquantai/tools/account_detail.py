@@ -1,10 +1,16 @@
 from typing import List, Any, Dict, Literal, Optional, Union, Tuple
 from ..registry import tool_registry
+from ..account_book import AccountBook, account_books
+from ..basket import lot_volumes
+from ..instrument_store import instrument_store
+from ..order_tracker import order_tracker
+from ..trader_session import TraderConnectionError, TraderSession, trader_sessions
 import xtquant.xttrader as xttrader
 from xtquant.xttrader import XtQuantTrader, XtQuantTraderCallback
 from xtquant.xttype import StockAccount
 from xtquant import xtconstant
 import xtquant.xtdata as xtdata
+import numpy as np
 import time
 import datetime
 import traceback
@@ -40,53 +46,49 @@ class TradeDetailData:
                     setattr(self, key, value)
 
 
-# 全局交易实例
-_trader_instance = None
-_callback_instance = None
-_session_id = None
+# 默认的交易终端路径，可以用 trader_path.txt 或 connect_account 的 path 参数覆盖
+DEFAULT_TRADER_PATH = r'C:\Program Files\821\迅投极速交易终端睿智融科版\userdata'
+
+# 当前使用的交易终端路径，第一次使用时确定
+_trader_path = None
 
 
 class XtQuantTraderCallbackImpl(XtQuantTraderCallback):
     """量化交易回调实现类"""
     
-    def __init__(self):
+    def __init__(self, session: TraderSession = None):
         super().__init__()
-        self.order_callbacks = {}
-        self.trade_callbacks = {}
-        self.error_callbacks = {}
+        self.session = session
         
     def on_disconnected(self):
-        """连接断开回调"""
+        """连接断开回调，通知交易会话在后台重连"""
         print(f"{datetime.datetime.now()} 连接断开回调")
+        # 断开期间的推送会丢失，账户簿下次使用时重新查询
+        account_books.mark_stale("交易连接断开")
+        if self.session is not None:
+            self.session.on_disconnected(self)
 
     def on_stock_order(self, order):
         """委托回报推送"""
         print(f"{datetime.datetime.now()} 委托回调 投资备注: {order.order_remark}")
-        
-        # 执行回调函数（如果有）
-        order_id = order.order_id
-        if order_id in self.order_callbacks:
-            self.order_callbacks[order_id](order)
+        account_books.on_order(order)
+        # 更新委托状态，调用注册的委托回调
+        order_tracker.on_order(order)
             
     def on_stock_trade(self, trade):
         """成交变动推送"""
         print(f"{datetime.datetime.now()} 成交回调 {trade.order_remark} "
               f"委托方向(48买 49卖) {trade.offset_flag} 成交价格 {trade.traded_price} "
               f"成交数量 {trade.traded_volume}")
-        
-        # 执行回调函数（如果有）
-        order_id = trade.order_id
-        if order_id in self.trade_callbacks:
-            self.trade_callbacks[order_id](trade)
+        account_books.on_trade(trade)
+        # 更新委托状态，调用注册的成交回调
+        order_tracker.on_trade(trade)
 
     def on_order_error(self, order_error):
         """委托失败推送"""
         print(f"委托报错回调 {order_error.order_remark} {order_error.error_msg}")
-        
-        # 执行回调函数（如果有）
-        order_id = order_error.order_id
-        if order_id in self.error_callbacks:
-            self.error_callbacks[order_id](order_error)
+        # 更新委托状态，调用注册的错误回调
+        order_tracker.on_error(order_error)
 
     def on_cancel_error(self, cancel_error):
         """撤单失败推送"""
@@ -95,6 +97,7 @@ class XtQuantTraderCallbackImpl(XtQuantTraderCallback):
     def on_order_stock_async_response(self, response):
         """异步下单回报推送"""
         print(f"异步委托回调 投资备注: {response.order_remark}")
+        order_tracker.on_response(response)
 
     def on_cancel_order_stock_async_response(self, response):
         """异步撤单回报推送"""
@@ -103,27 +106,35 @@ class XtQuantTraderCallbackImpl(XtQuantTraderCallback):
     def on_account_status(self, status):
         """账户状态推送"""
         print(f"{datetime.datetime.now()} 账户状态变更: {status.account_id}, 状态: {status.status}")
+        account_books.on_account_status(status)
+
+    def on_stock_asset(self, asset):
+        """资金变动推送"""
+        account_books.on_asset(asset)
+
+    def on_stock_position(self, position):
+        """持仓变动推送"""
+        account_books.on_position(position)
         
-    def register_order_callback(self, order_id, callback):
-        """注册委托回调函数"""
-        self.order_callbacks[order_id] = callback
+    def register_order_callback(self, order_id, callback, seq=None):
+        """注册委托回调函数；还不知道委托编号时 order_id 传 None，按 place_order 返回的 seq 注册"""
+        order_tracker.add_callback("order", callback, order_id=order_id, seq=seq)
         
-    def register_trade_callback(self, order_id, callback):
-        """注册成交回调函数"""
-        self.trade_callbacks[order_id] = callback
+    def register_trade_callback(self, order_id, callback, seq=None):
+        """注册成交回调函数；还不知道委托编号时 order_id 传 None，按 place_order 返回的 seq 注册"""
+        order_tracker.add_callback("trade", callback, order_id=order_id, seq=seq)
         
-    def register_error_callback(self, order_id, callback):
-        """注册错误回调函数"""
-        self.error_callbacks[order_id] = callback
+    def register_error_callback(self, order_id, callback, seq=None):
+        """注册错误回调函数；还不知道委托编号时 order_id 传 None，按 place_order 返回的 seq 注册"""
+        order_tracker.add_callback("error", callback, order_id=order_id, seq=seq)
 
 
-def get_trader_instance() -> XtQuantTrader:
-    """获取交易实例（单例模式）"""
-    global _trader_instance, _callback_instance, _session_id
+def get_trader_path() -> str:
+    """交易终端路径：trader_path.txt 中的自定义路径，没有时为默认路径"""
+    global _trader_path
     
-    if _trader_instance is None:
-        # 尝试从文件读取自定义路径
-        path = r'C:\Program Files\821\迅投极速交易终端睿智融科版\userdata'
+    if _trader_path is None:
+        path = DEFAULT_TRADER_PATH
         try:
             if os.path.exists("trader_path.txt"):
                 with open("trader_path.txt", "r") as f:
@@ -132,36 +143,40 @@ def get_trader_instance() -> XtQuantTrader:
                         path = custom_path
         except:
             pass
-            
         print(f"正在使用交易路径: {path}")
-        
-        # 生成session id
-        _session_id = int(time.time())
-        print(f"生成会话ID: {_session_id}")
-        
-        # 创建交易实例
-        _trader_instance = XtQuantTrader(path, _session_id)
-        
-        # 创建回调实例
-        _callback_instance = XtQuantTraderCallbackImpl()
-        _trader_instance.register_callback(_callback_instance)
-        
-        # 启动交易线程
-        _trader_instance.start()
-        print("交易线程已启动")
-        
-    return _trader_instance
+        _trader_path = path
+    return _trader_path
+
+
+def _create_trader(path: str, session_id: int, session: TraderSession):
+    """交易会话的交易实例工厂：创建交易实例，注册回调并启动交易线程"""
+    # 新的交易实例重新编号 seq
+    order_tracker.new_session()
+    trader = XtQuantTrader(path, session_id)
+    callback = XtQuantTraderCallbackImpl(session)
+    trader.register_callback(callback)
+    trader.start()
+    return trader, callback
+
+
+trader_sessions.configure(_create_trader, StockAccount)
+
+
+def get_trader_session() -> TraderSession:
+    """当前交易终端路径的交易会话（连接一次后复用，断线后自动重连）"""
+    return trader_sessions.session(get_trader_path())
+
+
+def get_trader_instance() -> XtQuantTrader:
+    """获取交易实例（每个终端路径一个，由交易会话管理，不保证已连接）"""
+    return get_trader_session().trader_instance()
 
 
 def get_callback_instance() -> XtQuantTraderCallbackImpl:
     """获取回调实例"""
-    global _callback_instance
-    
-    if _callback_instance is None:
-        # 确保已创建交易实例
-        get_trader_instance()
-    
-    return _callback_instance
+    session = get_trader_session()
+    session.trader_instance()
+    return session.callback
 
 
 def connect_trader(account_id: str, account_type: str = 'STOCK') -> bool:
@@ -175,25 +190,43 @@ def connect_trader(account_id: str, account_type: str = 'STOCK') -> bool:
     Returns:
         连接是否成功
     """
-    trader = get_trader_instance()
-    
-    # 创建账户对象
-    account = StockAccount(account_id, account_type)
-    
-    # 建立交易连接
-    connect_result = trader.connect()
-    if connect_result != 0:
-        print(f"连接交易服务器失败，错误码: {connect_result}")
+    # 已连接、已订阅时不再访问交易服务器
+    try:
+        get_trader_session().ensure(account_id, account_type)
+    except TraderConnectionError as e:
+        print(e)
         return False
+    return True
+
+
+def get_account_book(account_id: str, account_type: str = 'STOCK', resync: bool = False) -> AccountBook:
+    """
+    获取账户簿：快照有效时直接返回，不访问交易服务器；尚未建立、已过期或要求重新同步时
+    查询资金、持仓和未结委托重新建立
     
-    # 订阅账户
-    subscribe_result = trader.subscribe(account)
-    if subscribe_result != 0:
-        print(f"订阅账户失败，错误码: {subscribe_result}")
-        return False
+    Args:
+        account_id: 账户ID
+        account_type: 账户类型
+        resync: 是否强制重新查询
     
-    print(f"成功连接并订阅账户: {account_id}")
-    return True
+    Returns:
+        账户簿
+    
+    Raises:
+        TraderConnectionError: 无法连接交易服务器或订阅账户
+    """
+    trader, acc = get_trader_session().ensure(account_id, account_type)
+    book = account_books.book(account_id)
+    reason = "强制重新同步" if resync else book.needs_sync()
+    if reason:
+        print(f"重新查询账户簿 {account_id}: {reason}")
+        asset = trader.query_stock_asset(acc)
+        if asset is None:
+            raise TraderConnectionError(f"账户 {account_id} 不存在或未登录")
+        positions = trader.query_stock_positions(acc)
+        orders = trader.query_stock_orders(acc, True)
+        book.seed(asset, positions, orders or [])
+    return book
 
 
 def get_trade_detail_data(account: str, market_type: str, query_type: str) -> List[TradeDetailData]:
@@ -213,40 +246,12 @@ def get_trade_detail_data(account: str, market_type: str, query_type: str) -> Li
     try:
         print(f"开始查询账户: {account}, 市场类型: {market_type}, 查询类型: {query_type}")
         
-        # 获取交易实例
-        trader = get_trader_instance()
-        
-        # 创建账户对象
-        acc = StockAccount(account, market_type.upper())
-        print(f"创建账户对象: {acc.account_id}, 类型: {acc.account_type}")
-        
-        # 建立交易连接
-        connect_result = trader.connect()
-        print(f"连接交易服务器结果: {connect_result}")
-        if connect_result != 0:
-            print(f"连接交易服务器失败，错误码: {connect_result}")
-            return result
-        
-        # 订阅账户
-        subscribe_result = trader.subscribe(acc)
-        print(f"订阅账户结果: {subscribe_result}")
-        if subscribe_result != 0:
-            print(f"订阅账户失败，错误码: {subscribe_result}")
-            return result
-        
-        print(f"成功连接并订阅账户: {account}")
-        
-        # 尝试通过更简单的方式获取一下账户信息，确认基本连接是否正常
+        # 复用已连接的交易实例和已订阅的账户
         try:
-            print(f"测试获取账户资产是否正常...")
-            test_account_info = trader.query_stock_asset(acc)
-            if test_account_info:
-                print(f"账户基本信息获取成功: {test_account_info}")
-            else:
-                print(f"测试获取账户资产返回空值，请检查账户ID是否有效")
-        except Exception as e:
-            print(f"测试获取账户资产失败: {str(e)}")
-            traceback.print_exc()
+            trader, acc = get_trader_session().ensure(account, market_type)
+        except TraderConnectionError as e:
+            print(e)
+            return result
         
         if query_type.lower() == 'position':
             # 查询持仓信息
@@ -257,6 +262,13 @@ def get_trade_detail_data(account: str, market_type: str, query_type: str) -> Li
             if len(positions) > 0:
                 print(f"第一条持仓记录: {positions[0]}")
             
+            # 从合约信息仓库一次性获取所有持仓的证券名称
+            try:
+                instrument_details = instrument_store.get_many([pos.stock_code for pos in positions], fields=['InstrumentName'])
+            except Exception as e:
+                print(f"批量获取证券名称失败: {e}")
+                instrument_details = {}
+            
             for pos in positions:
                 # 转换为TradeDetailData对象
                 data = TradeDetailData()
@@ -265,7 +277,7 @@ def get_trade_detail_data(account: str, market_type: str, query_type: str) -> Li
                 
                 # 尝试获取证券名称，如果失败则留空
                 try:
-                    instrument_detail = xtdata.get_instrument_detail(pos.stock_code)
+                    instrument_detail = instrument_details[pos.stock_code]
                     data.m_strInstrumentName = instrument_detail.get('InstrumentName', '')
                 except Exception as e:
                     print(f"获取证券名称失败: {e}")
@@ -370,6 +382,24 @@ def get_trade_detail_data(account: str, market_type: str, query_type: str) -> Li
     return result
 
 
+def order_type_code(direction: str) -> int:
+    """交易方向 'BUY' / 'SELL' 对应的委托类型"""
+    if direction.upper() == 'BUY':
+        return xtconstant.STOCK_BUY
+    if direction.upper() == 'SELL':
+        return xtconstant.STOCK_SELL
+    raise ValueError(f"不支持的交易方向: {direction}")
+
+
+def price_type_code(price_type: str) -> int:
+    """价格类型 'LATEST'（市价）/ 'FIX'（限价）对应的报价类型"""
+    if price_type.upper() == 'LATEST':
+        return xtconstant.LATEST_PRICE
+    if price_type.upper() == 'FIX':
+        return xtconstant.FIX_PRICE
+    raise ValueError(f"不支持的价格类型: {price_type}")
+
+
 def place_order(account_id: str, stock_code: str, direction: str, volume: int,
                 price_type: str = 'LATEST', price: float = -1, 
                 strategy_name: str = '', remark: str = '') -> str:
@@ -387,37 +417,21 @@ def place_order(account_id: str, stock_code: str, direction: str, volume: int,
         remark: 投资备注
     
     Returns:
-        委托编号
-    """
-    trader = get_trader_instance()
-    
-    # 创建账户对象
-    acc = StockAccount(account_id, 'STOCK')
+        异步下单的请求序号 seq，委托编号随之后的下单回报推送，可以用 order_tracker 或 wait_orders 工具按 seq 跟踪
     
-    # 确保已连接并已订阅
-    connect_trader(account_id, 'STOCK')
-    
-    # 设置交易方向
-    if direction.upper() == 'BUY':
-        direction_code = xtconstant.STOCK_BUY
-    elif direction.upper() == 'SELL':
-        direction_code = xtconstant.STOCK_SELL
-    else:
-        raise ValueError(f"不支持的交易方向: {direction}")
-    
-    # 设置价格类型
-    if price_type.upper() == 'LATEST':
-        price_type_code = xtconstant.LATEST_PRICE
-    elif price_type.upper() == 'FIX':
-        price_type_code = xtconstant.FIX_PRICE
-    else:
-        raise ValueError(f"不支持的价格类型: {price_type}")
+    Raises:
+        TraderConnectionError: 无法连接交易服务器或订阅账户
+    """
+    # 已连接、已订阅时直接下单，只有一次交易接口往返
+    trader, acc = get_trader_session().ensure(account_id, 'STOCK')
     
     # 下单
-    order_id = trader.order_stock_async(acc, stock_code, direction_code, volume, 
-                                        price_type_code, price, strategy_name, remark)
+    seq = trader.order_stock_async(acc, stock_code, order_type_code(direction), volume, 
+                                   price_type_code(price_type), price, strategy_name, remark)
+    if seq is not None and seq >= 0:
+        order_tracker.expect(seq, stock_code, volume)
     
-    return order_id
+    return seq
 
 
 def calculate_buy_volume(stock_code: str, amount: float) -> int:
@@ -467,7 +481,8 @@ def calculate_buy_volume(stock_code: str, amount: float) -> int:
                 "default": ""
             }
         }
-    }
+    },
+    execution="trading"
 )
 async def connect_account(account: str, market_type: str = "stock", path: str = "") -> Dict:
     """
@@ -482,16 +497,15 @@ async def connect_account(account: str, market_type: str = "stock", path: str =
         连接结果字典
     """
     try:
-        global _trader_instance
+        global _trader_path
         
         print(f"开始连接账户: {account}, 市场类型: {market_type}")
         
-        # 如果提供了自定义路径，重新初始化交易实例
-        if path and _trader_instance is not None:
-            print(f"提供了自定义路径: {path}，重新初始化交易实例")
-            # 关闭旧的交易实例
-            _trader_instance.stop()
-            _trader_instance = None
+        # 如果提供了新的自定义路径，停止旧路径的交易会话，之后使用新路径
+        if path and path != get_trader_path():
+            print(f"提供了自定义路径: {path}，切换交易会话")
+            trader_sessions.close(get_trader_path())
+            _trader_path = path
         
         # 如果提供了自定义路径，覆盖默认路径
         if path:
@@ -499,33 +513,14 @@ async def connect_account(account: str, market_type: str = "stock", path: str =
             with open("trader_path.txt", "w") as f:
                 f.write(path)
         
-        # 获取交易实例
-        trader = get_trader_instance()
-        
-        # 创建账户对象
-        acc = StockAccount(account, market_type.upper())
-        print(f"创建账户对象: {acc.account_id}, 类型: {acc.account_type}")
-        
-        # 建立交易连接
-        connect_result = trader.connect()
-        print(f"连接交易服务器结果: {connect_result}")
-        if connect_result != 0:
-            print(f"连接交易服务器失败，错误码: {connect_result}")
-            return {
-                "success": False,
-                "message": f"连接交易服务器失败，错误码: {connect_result}",
-                "account": account,
-                "market_type": market_type
-            }
-        
-        # 订阅账户
-        subscribe_result = trader.subscribe(acc)
-        print(f"订阅账户结果: {subscribe_result}")
-        if subscribe_result != 0:
-            print(f"订阅账户失败，错误码: {subscribe_result}")
+        # 连接并订阅账户，已连接、已订阅时直接复用
+        try:
+            trader, acc = get_trader_session().ensure(account, market_type)
+        except TraderConnectionError as e:
+            print(e)
             return {
                 "success": False,
-                "message": f"订阅账户失败，错误码: {subscribe_result}",
+                "message": str(e),
                 "account": account,
                 "market_type": market_type
             }
@@ -608,7 +603,8 @@ async def connect_account(account: str, market_type: str = "stock", path: str =
                 "default": "stock"
             }
         }
-    }
+    },
+    execution="trading"
 )
 async def get_account_positions(account: str, market_type: str = "stock") -> Dict:
     """
@@ -624,11 +620,8 @@ async def get_account_positions(account: str, market_type: str = "stock") -> Dic
     try:
         print(f"开始获取账户 {account} 的持仓信息")
         
-        # 获取交易实例
-        trader = get_trader_instance()
-        
-        # 创建账户对象
-        acc = StockAccount(account, market_type.upper())
+        # 复用已连接的交易实例和已订阅的账户
+        trader, acc = get_trader_session().ensure(account, market_type)
         
         # 查询持仓信息
         try:
@@ -639,13 +632,20 @@ async def get_account_positions(account: str, market_type: str = "stock") -> Dic
             if len(positions) > 0:
                 print(f"第一条持仓记录: {positions[0]}")
                 
+            # 从合约信息仓库一次性获取所有持仓的证券名称
+            try:
+                instrument_details = instrument_store.get_many([getattr(pos, 'stock_code', '') for pos in positions], fields=['InstrumentName'])
+            except Exception as e:
+                print(f"批量获取证券名称失败: {e}")
+                instrument_details = {}
+            
             # 将查询结果转换为字典列表
             positions_list = []
             for pos in positions:
                 # 尝试获取证券名称，如果失败则留空
                 stock_name = ""
                 try:
-                    instrument_detail = xtdata.get_instrument_detail(pos.stock_code)
+                    instrument_detail = instrument_details[pos.stock_code]
                     stock_name = instrument_detail.get('InstrumentName', '')
                 except Exception as e:
                     print(f"获取证券名称失败: {e}")
@@ -783,7 +783,8 @@ async def get_account_positions(account: str, market_type: str = "stock") -> Dic
                 "default": "stock"
             }
         }
-    }
+    },
+    execution="trading"
 )
 async def get_account_info(account: str, market_type: str = "stock") -> Dict:
     """
@@ -799,11 +800,8 @@ async def get_account_info(account: str, market_type: str = "stock") -> Dict:
     try:
         print(f"开始获取账户 {account} 的资金信息")
         
-        # 获取交易实例
-        trader = get_trader_instance()
-        
-        # 创建账户对象
-        acc = StockAccount(account, market_type.upper())
+        # 复用已连接的交易实例和已订阅的账户
+        trader, acc = get_trader_session().ensure(account, market_type)
         
         # 查询账户资金信息
         try:
@@ -941,7 +939,8 @@ async def get_account_info(account: str, market_type: str = "stock") -> Dict:
                 "default": "auto_trade"
             }
         }
-    }
+    },
+    execution="trading"
 )
 async def buy_stock(account: str, stock_code: str, amount: float, 
                     price_type: str = "LATEST", price: float = -1,
@@ -961,13 +960,12 @@ async def buy_stock(account: str, stock_code: str, amount: float,
         买入结果字典
     """
     try:
-        # 获取账户资金信息
-        accounts = get_trade_detail_data(account, "stock", "account")
-        if not accounts:
-            return {"success": False, "message": "获取账户资金信息失败"}
-        
-        # 获取可用资金
-        available_cash = accounts[0].m_dAvailable
+        # 从账户簿获取可用资金
+        try:
+            book = get_account_book(account)
+        except TraderConnectionError as e:
+            return {"success": False, "message": f"获取账户资金信息失败: {e}"}
+        available_cash = book.available
         
         # 计算实际买入金额，不超过可用资金
         actual_amount = min(amount, available_cash)
@@ -979,22 +977,25 @@ async def buy_stock(account: str, stock_code: str, amount: float,
         
         current_price = full_tick[stock_code]['lastPrice']
         
-        # 计算买入数量
-        buy_vol = calculate_buy_volume(stock_code, actual_amount)
+        # 用已获取的最新价计算买入数量，不再重复获取行情
+        buy_vol = int(lot_volumes([actual_amount], np.array([current_price], dtype=np.float64))[0])
         if buy_vol <= 0:
             return {"success": False, "message": "计算买入数量为0"}
         
-        # 买入股票
+        # 买入股票；市价委托回报中没有委托价，账户簿按计算数量所用的最新价冻结资金
         if price_type.upper() == "LATEST":
             price = -1
+        book.expect_buy(stock_code, current_price)
         
-        order_id = place_order(account, stock_code, "BUY", buy_vol, 
-                               price_type.upper(), price, strategy_name, stock_code)
+        seq = place_order(account, stock_code, "BUY", buy_vol, 
+                          price_type.upper(), price, strategy_name, stock_code)
         
         return {
             "success": True,
             "message": "委托成功",
-            "order_id": order_id,
+            # order_id 保留为 seq 以兼容旧的调用方，委托状态用 wait_orders 按 seq 查询
+            "order_id": seq,
+            "seq": seq,
             "stock_code": stock_code,
             "volume": buy_vol,
             "price": current_price,
@@ -1041,7 +1042,8 @@ async def buy_stock(account: str, stock_code: str, amount: float,
                 "default": "auto_trade"
             }
         }
-    }
+    },
+    execution="trading"
 )
 async def sell_stock(account: str, stock_code: str, volume: int, 
                      price_type: str = "LATEST", price: float = -1,
@@ -1061,21 +1063,18 @@ async def sell_stock(account: str, stock_code: str, volume: int,
         卖出结果字典
     """
     try:
-        # 获取持仓信息
-        positions = get_trade_detail_data(account, "stock", "position")
-        
-        # 找出对应股票的持仓
-        position = None
-        for pos in positions:
-            if pos.m_strInstrumentID == stock_code:
-                position = pos
-                break
+        # 从账户簿获取对应股票的持仓
+        try:
+            book = get_account_book(account)
+        except TraderConnectionError as e:
+            return {"success": False, "message": f"获取持仓信息失败: {e}"}
+        position = book.position(stock_code)
         
         if not position:
             return {"success": False, "message": f"未持有股票 {stock_code}"}
         
         # 计算实际卖出数量，不超过可用持仓
-        actual_volume = min(volume, position.m_nCanUseVolume)
+        actual_volume = min(volume, position.can_use_volume)
         if actual_volume <= 0:
             return {"success": False, "message": f"股票 {stock_code} 可用数量为0"}
         
@@ -1090,19 +1089,21 @@ async def sell_stock(account: str, stock_code: str, volume: int,
         if price_type.upper() == "LATEST":
             price = -1
         
-        order_id = place_order(account, stock_code, "SELL", actual_volume, 
-                               price_type.upper(), price, strategy_name, stock_code)
+        seq = place_order(account, stock_code, "SELL", actual_volume, 
+                          price_type.upper(), price, strategy_name, stock_code)
         
         return {
             "success": True,
             "message": "委托成功",
-            "order_id": order_id,
+            # order_id 保留为 seq 以兼容旧的调用方，委托状态用 wait_orders 按 seq 查询
+            "order_id": seq,
+            "seq": seq,
             "stock_code": stock_code,
             "volume": actual_volume,
             "price": current_price,
             "amount": actual_volume * current_price,
-            "position_volume": position.m_nVolume,
-            "available_volume": position.m_nCanUseVolume
+            "position_volume": position.volume,
+            "available_volume": position.can_use_volume
         }
     
     except Exception as e:
@@ -1126,7 +1127,8 @@ async def sell_stock(account: str, stock_code: str, volume: int,
                 "default": "stock"
             }
         }
-    }
+    },
+    execution="trading"
 )
 async def test_account_connection(account: str, market_type: str = "stock") -> Dict:
     """
@@ -1142,41 +1144,14 @@ async def test_account_connection(account: str, market_type: str = "stock") -> D
     try:
         print(f"开始测试账户连接: {account}, 市场类型: {market_type}")
         
-        # 使用预设路径
-        path = r'C:\Program Files\821\迅投极速交易终端睿智融科版\userdata'
-        
-        # 创建新的交易实例（不使用全局实例）
-        session_id = int(time.time())
-        trader = XtQuantTrader(path, session_id)
-        
-        # 启动交易线程
-        trader.start()
-        print(f"交易线程已启动，会话ID: {session_id}")
-        
-        # 创建账户对象
-        acc = StockAccount(account, market_type.upper())
-        print(f"创建账户对象: {acc.account_id}, 类型: {acc.account_type}")
-        
-        # 建立交易连接
-        connect_result = trader.connect()
-        print(f"连接交易服务器结果: {connect_result}")
-        if connect_result != 0:
-            trader.stop()
-            return {
-                "success": False,
-                "message": f"连接交易服务器失败，错误码: {connect_result}",
-                "account": account,
-                "path": path
-            }
-        
-        # 订阅账户
-        subscribe_result = trader.subscribe(acc)
-        print(f"订阅账户结果: {subscribe_result}")
-        if subscribe_result != 0:
-            trader.stop()
+        # 使用交易会话的连接，不再为测试单独创建、启动和停止交易实例
+        path = get_trader_path()
+        try:
+            trader, acc = get_trader_session().ensure(account, market_type)
+        except TraderConnectionError as e:
             return {
                 "success": False,
-                "message": f"订阅账户失败，错误码: {subscribe_result}",
+                "message": str(e),
                 "account": account,
                 "path": path
             }
@@ -1224,10 +1199,6 @@ async def test_account_connection(account: str, market_type: str = "stock") -> D
                 "error_type": str(type(e).__name__)
             }
         
-        # 停止交易线程
-        trader.stop()
-        print("交易线程已停止")
-        
         return result
     
     except Exception as e:
@@ -1237,6 +1208,90 @@ async def test_account_connection(account: str, market_type: str = "stock") -> D
             "success": False,
             "message": f"测试账户连接出错: {str(e)}",
             "account": account,
-            "path": r'C:\Program Files\821\迅投极速交易终端睿智融科版\userdata',
+            "path": get_trader_path(),
             "error_type": str(type(e).__name__)
-        } 
\ No newline at end of file
+        }
+
+
+@tool_registry.register(
+    name="get_trader_sessions",
+    description="获取交易连接会话的状态（是否已连接、已订阅的账户、连接/订阅/断开/重连次数和最近的错误）",
+    input_schema={
+        "type": "object",
+        "properties": {}
+    },
+    execution="inline"
+)
+async def get_trader_sessions() -> Dict:
+    """
+    获取交易连接会话的状态
+    
+    Returns:
+        状态字典，包括:
+        - path: 当前使用的交易终端路径
+        - sessions: 每个终端路径的会话状态，包括 connected / reconnecting / accounts（已订阅的账户）、
+          connects / subscribes（实际的 connect、subscribe 调用次数）、disconnects / reconnects 和 last_error
+    """
+    return {
+        "path": get_trader_path(),
+        "sessions": trader_sessions.stats()
+    }
+
+
+@tool_registry.register(
+    name="get_account_book",
+    description="获取由交易回调维护的账户资金和持仓快照（不访问交易服务器），包括快照时间和是否过期，可强制重新查询",
+    input_schema={
+        "type": "object",
+        "required": ["account"],
+        "properties": {
+            "account": {
+                "type": "string",
+                "description": "账户ID"
+            },
+            "market_type": {
+                "type": "string",
+                "description": "市场类型，如'stock'表示股票市场",
+                "default": "stock"
+            },
+            "stock_codes": {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                },
+                "description": "只返回这些股票的持仓，不提供则返回全部"
+            },
+            "resync": {
+                "type": "boolean",
+                "description": "是否强制重新查询资金、持仓和未结委托",
+                "default": False
+            }
+        }
+    },
+    execution="trading"
+)
+async def get_account_book_snapshot(account: str, market_type: str = "stock", stock_codes: List[str] = None,
+                                    resync: bool = False) -> Dict:
+    """
+    获取账户簿快照
+    
+    Args:
+        account: 账户ID
+        market_type: 市场类型，如'stock'表示股票市场
+        stock_codes: 只返回这些股票的持仓
+        resync: 是否强制重新查询
+    
+    Returns:
+        快照字典，包括:
+        - cash / available / frozen_cash / market_value / total_asset: 资金
+        - positions: 持仓列表（stock_code / volume / can_use_volume / open_price / market_value）
+        - open_orders: 冻结中的未结委托数
+        - synced_at / age: 上次查询建立快照的时间和距今秒数
+        - stale_reason: 快照过期的原因（下次使用时重新查询），为空表示有效
+        - syncs / events / last_event_age: 查询次数、收到的推送数和距上次推送的秒数
+    """
+    try:
+        book = get_account_book(account, market_type, resync)
+        return {"success": True, **book.snapshot(stock_codes)}
+    except Exception as e:
+        return {"success": False, "message": f"获取账户簿失败: {str(e)}", "account": account}
@@ -0,0 +1,477 @@
+from typing import Any, Dict, List
+import os
+import time
+
+import numpy as np
+import xtquant.xtdata as xtdata
+
+from ..registry import tool_registry
+from ..account_book import account_books
+from ..basket import (LOT_SIZE, lot_volumes, rebalance_volumes, scale_to_cash, sell_volumes, submit_in_order,
+                      tick_prices)
+from ..costs import COST_ITEMS, COST_PRESETS, CostModel, order_costs
+from ..order_tracker import ORDER_RESPONSE_TIMEOUT, order_tracker
+from ..trader_session import TraderConnectionError
+from .account_detail import get_account_book, get_trader_session, order_type_code, price_type_code
+
+# 调仓时卖出委托提交后，等待卖出回款覆盖买入金额的最长时间（秒），超时后按当时的可用资金缩减买入
+REBALANCE_SELL_WAIT = float(os.environ.get("XTQUANTAI_REBALANCE_SELL_WAIT", "5"))
+
+
+def submit_basket(account: str, market_type: str, rows: List[Dict[str, Any]], price_type: str,
+                  strategy_name: str, wait: bool = True) -> Dict[str, Any]:
+    """
+    在交易线程中依次提交一组异步委托，并按 seq 等待异步下单回报得到委托编号
+
+    Args:
+        account: 账户ID
+        market_type: 市场类型
+        rows: 委托列表，每项包括 stock_code / direction / volume / price（限价委托的价格）；
+              volume 为 0 的跳过，提交后写入 seq / order_id / error_msg / status
+        price_type: 价格类型，'LATEST' 或 'FIX'
+        strategy_name: 策略名称
+        wait: 是否等待异步下单回报
+
+    Returns:
+        统计字典: submitted / failed / skipped / submit_seconds / pending（超时未收到回报的笔数）
+    """
+    trader, acc = get_trader_session().ensure(account, market_type)
+    price_code = price_type_code(price_type)
+    pending = [row for row in rows if row["volume"] > 0]
+    for row in rows:
+        if row["volume"] <= 0:
+            row.update(status="skipped", seq=None, order_id=None)
+    # 市价买入的委托回报中没有委托价，账户簿按计算数量所用的价格冻结资金
+    book = account_books.book(account)
+    for row in pending:
+        if row["direction"] == "BUY" and row["price"]:
+            book.expect_buy(row["stock_code"], row["price"])
+
+    def make_call(row):
+        price = row["price"] if price_type.upper() == "FIX" else -1
+        return lambda: trader.order_stock_async(acc, row["stock_code"], order_type_code(row["direction"]),
+                                                int(row["volume"]), price_code, price, strategy_name,
+                                                row["stock_code"])
+
+    start = time.perf_counter()
+    results = submit_in_order([make_call(row) for row in pending])
+    elapsed = time.perf_counter() - start
+    for row, (seq, error) in zip(pending, results):
+        if error or seq is None or seq < 0:
+            row.update(status="failed", seq=seq, order_id=None, error_msg=error or f"提交失败，返回 {seq}")
+        else:
+            row.update(status="submitted", seq=seq, order_id=None, error_msg="")
+            order_tracker.expect(seq, row["stock_code"], row["volume"])
+
+    submitted = [row for row in pending if row["status"] == "submitted"]
+    missing = 0
+    if wait and submitted:
+        responses = order_tracker.wait_responses([row["seq"] for row in submitted], ORDER_RESPONSE_TIMEOUT)
+        for row in submitted:
+            response = responses[row["seq"]]
+            if response is None:
+                missing += 1
+            elif response["error_msg"]:
+                row.update(status="failed", order_id=response["order_id"], error_msg=response["error_msg"])
+            else:
+                row["order_id"] = response["order_id"]
+    return {
+        "submitted": sum(row["status"] == "submitted" for row in rows),
+        "failed": sum(row["status"] == "failed" for row in rows),
+        "skipped": sum(row["status"] == "skipped" for row in rows),
+        "pending": missing,
+        "submit_seconds": elapsed,
+    }
+
+
+@tool_registry.register(
+    name="place_basket_order",
+    description="篮子委托：一组股票按金额、权重或股数一次下单。一次获取全部行情，按手计算股数，依次异步提交全部委托，返回每笔的请求序号和委托编号",
+    input_schema={
+        "type": "object",
+        "required": ["account", "orders"],
+        "properties": {
+            "account": {
+                "type": "string",
+                "description": "账户ID"
+            },
+            "orders": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "required": ["stock_code"],
+                    "properties": {
+                        "stock_code": {"type": "string", "description": "股票代码，如'600000.SH'"},
+                        "amount": {"type": "number", "description": "委托金额"},
+                        "weight": {"type": "number", "description": "占 total_amount 的比例"},
+                        "volume": {"type": "integer", "description": "委托股数，买入按手向下取整"},
+                        "direction": {"type": "string", "description": "'BUY' 或 'SELL'，不提供时使用 direction"},
+                        "price": {"type": "number", "description": "限价委托的价格，不提供时用最新价"}
+                    }
+                },
+                "description": "委托列表，每项提供 amount、weight、volume 之一"
+            },
+            "direction": {
+                "type": "string",
+                "description": "默认交易方向，'BUY' 或 'SELL'",
+                "default": "BUY"
+            },
+            "total_amount": {
+                "type": "number",
+                "description": "按权重委托时的总金额，为 0 时使用可用资金",
+                "default": 0
+            },
+            "price_type": {
+                "type": "string",
+                "description": "价格类型，'LATEST'表示市价，'FIX'表示限价",
+                "default": "LATEST"
+            },
+            "strategy_name": {
+                "type": "string",
+                "description": "策略名称",
+                "default": "basket"
+            },
+            "market_type": {
+                "type": "string",
+                "description": "市场类型，如'stock'表示股票市场",
+                "default": "stock"
+            },
+            "wait": {
+                "type": "boolean",
+                "description": "是否等待异步下单回报以返回委托编号",
+                "default": True
+            }
+        }
+    },
+    execution="trading"
+)
+async def place_basket_order(account: str, orders: List[Dict], direction: str = "BUY", total_amount: float = 0,
+                             price_type: str = "LATEST", strategy_name: str = "basket",
+                             market_type: str = "stock", wait: bool = True) -> Dict:
+    """
+    篮子委托
+
+    Args:
+        account: 账户ID
+        orders: 委托列表，每项包括 stock_code 和 amount / weight / volume 之一，可选 direction、price
+        direction: 默认交易方向
+        total_amount: 按权重委托时的总金额，为 0 时使用可用资金
+        price_type: 价格类型，'LATEST'表示市价，'FIX'表示限价
+        strategy_name: 策略名称
+        market_type: 市场类型
+        wait: 是否等待异步下单回报
+
+    Returns:
+        结果字典，包括:
+        - orders: 每笔委托的 stock_code / direction / price / volume / amount / status（submitted / failed / skipped）/
+          seq（order_stock_async 的请求序号）/ order_id（回报中的委托编号）/ error_msg 或 reason
+        - submitted / failed / skipped / pending: 各状态的笔数，pending 为超时未收到回报的笔数
+        - buy_scale: 买入金额超过可用资金时的缩减比例
+        - available_cash: 下单前的可用资金
+    """
+    try:
+        if not orders:
+            return {"success": False, "message": "委托列表为空"}
+        codes = [item["stock_code"] for item in orders]
+        directions = np.array([str(item.get("direction") or direction).upper() for item in orders])
+        bad = sorted(set(directions) - {"BUY", "SELL"})
+        if bad:
+            return {"success": False, "message": f"不支持的交易方向: {bad}"}
+        price_type_code(price_type)
+
+        try:
+            book = get_account_book(account, market_type)
+        except TraderConnectionError as e:
+            return {"success": False, "message": f"获取账户信息失败: {e}"}
+        available = book.available
+        total = total_amount if total_amount and total_amount > 0 else available
+
+        # 全部股票一次获取行情
+        ticks = xtdata.get_full_tick(sorted(set(codes)))
+        prices = tick_prices(ticks, codes)
+        limit_prices = np.array([float(item.get("price") or np.nan) for item in orders], dtype=np.float64)
+        order_prices = np.where(limit_prices > 0, limit_prices, prices) if price_type.upper() == "FIX" else prices
+
+        nan = np.full(len(orders), np.nan)
+        amounts = np.array([float(item["amount"]) if item.get("amount") is not None else np.nan
+                            for item in orders], dtype=np.float64)
+        weights = np.array([float(item["weight"]) if item.get("weight") is not None else np.nan
+                            for item in orders], dtype=np.float64)
+        given = np.array([int(item["volume"]) if item.get("volume") is not None else -1 for item in orders],
+                         dtype=np.int64)
+        amounts = np.where(np.isnan(amounts), weights * total, amounts)
+        # 指定股数的按股数估算金额
+        amounts = np.where(given >= 0, given * order_prices, amounts)
+        is_buy = directions == "BUY"
+
+        buy_amounts, scale = scale_to_cash(np.where(is_buy, amounts, nan), available)
+        volumes = np.where(is_buy, lot_volumes(buy_amounts, order_prices), 0)
+        can_use = np.array([getattr(book.position(code), "can_use_volume", 0) for code in codes], dtype=np.int64)
+        sell_wanted = np.where(given >= 0, given, lot_volumes(amounts, order_prices))
+        volumes = np.where(is_buy, volumes, sell_volumes(sell_wanted, can_use))
+
+        rows = []
+        for i, code in enumerate(codes):
+            row = {"stock_code": code, "direction": str(directions[i]),
+                   "price": None if np.isnan(order_prices[i]) else float(order_prices[i]),
+                   "volume": int(volumes[i]),
+                   "amount": 0.0 if np.isnan(order_prices[i]) else float(volumes[i] * order_prices[i])}
+            if volumes[i] <= 0:
+                if np.isnan(order_prices[i]):
+                    row["reason"] = "没有有效行情"
+                elif not is_buy[i]:
+                    row["reason"] = "可用数量为0" if can_use[i] <= 0 else "不足一手"
+                else:
+                    row["reason"] = "金额不足一手"
+            rows.append(row)
+
+        summary = submit_basket(account, market_type, rows, price_type, strategy_name, wait)
+        return {
+            "success": summary["submitted"] > 0,
+            "message": f"提交 {summary['submitted']} 笔，失败 {summary['failed']} 笔，跳过 {summary['skipped']} 笔",
+            "orders": rows,
+            "buy_scale": scale,
+            "available_cash": available,
+            **summary
+        }
+    except Exception as e:
+        return {"success": False, "message": f"篮子委托失败: {str(e)}"}
+
+
+def _wait_for_sells(book, needed: float, order_ids: List[Any], timeout: float) -> bool:
+    """
+    等待卖出回款：账户簿的可用资金（由成交回报更新，不访问交易服务器）达到 needed，或卖出委托都已结束
+    （成交价低于估算时回款达不到 needed）。在账户簿的条件变量上等待回报，不轮询；
+    没有可等待的卖出委托时立即返回。超时返回 False
+    """
+    if book.available >= needed:
+        return True
+    if not order_ids:
+        return False
+    return book.wait_until(lambda: book.available >= needed or book.orders_finished(order_ids), timeout)
+
+
+@tool_registry.register(
+    name="rebalance_portfolio",
+    description="按目标权重调仓：与当前持仓逐只比较只交易差额，按整手和可用数量取整，先卖后买；dry_run 时只返回交易清单和估算成本",
+    input_schema={
+        "type": "object",
+        "required": ["account", "targets"],
+        "properties": {
+            "account": {
+                "type": "string",
+                "description": "账户ID"
+            },
+            "targets": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "required": ["stock_code", "weight"],
+                    "properties": {
+                        "stock_code": {"type": "string", "description": "股票代码，如'600000.SH'"},
+                        "weight": {"type": "number", "description": "目标权重（占总资产的比例），0 表示清仓"}
+                    }
+                },
+                "description": "目标持仓，权重之和不超过 1，剩余部分保留为现金"
+            },
+            "total_amount": {
+                "type": "number",
+                "description": "计算目标市值的总资产，为 0 时使用可用资金加全部持仓按最新价计的市值",
+                "default": 0
+            },
+            "sell_unlisted": {
+                "type": "boolean",
+                "description": "是否清仓不在目标中的持仓",
+                "default": True
+            },
+            "min_trade_amount": {
+                "type": "number",
+                "description": "金额低于此值的调仓（清仓除外）不交易",
+                "default": 0
+            },
+            "dry_run": {
+                "type": "boolean",
+                "description": "只返回交易清单和估算成本，不下单",
+                "default": False
+            },
+            "cost_model": {
+                "type": ["string", "object"],
+                "description": f"估算成本的成本模型：预设名（{', '.join(COST_PRESETS)}）或参数字典",
+                "default": "a_share"
+            },
+            "price_type": {
+                "type": "string",
+                "description": "价格类型，'LATEST'表示市价，'FIX'表示以最新价限价",
+                "default": "LATEST"
+            },
+            "strategy_name": {
+                "type": "string",
+                "description": "策略名称",
+                "default": "rebalance"
+            },
+            "market_type": {
+                "type": "string",
+                "description": "市场类型，如'stock'表示股票市场",
+                "default": "stock"
+            },
+            "wait": {
+                "type": "boolean",
+                "description": "是否等待异步下单回报以返回委托编号",
+                "default": True
+            }
+        }
+    },
+    execution="trading"
+)
+async def rebalance_portfolio(account: str, targets: List[Dict], total_amount: float = 0,
+                              sell_unlisted: bool = True, min_trade_amount: float = 0, dry_run: bool = False,
+                              cost_model: Any = "a_share", price_type: str = "LATEST",
+                              strategy_name: str = "rebalance", market_type: str = "stock",
+                              wait: bool = True) -> Dict:
+    """
+    按目标权重调仓
+
+    Args:
+        account: 账户ID
+        targets: 目标持仓，每项包括 stock_code 和 weight
+        total_amount: 计算目标市值的总资产，为 0 时使用可用资金加持仓市值
+        sell_unlisted: 是否清仓不在目标中的持仓
+        min_trade_amount: 金额低于此值的调仓（清仓除外）不交易
+        dry_run: 只返回交易清单和估算成本
+        cost_model: 估算成本的成本模型
+        price_type: 价格类型，'LATEST'表示市价，'FIX'表示以最新价限价
+        strategy_name: 策略名称
+        market_type: 市场类型
+        wait: 是否等待异步下单回报
+
+    Returns:
+        结果字典，包括:
+        - trades: 交易清单，每笔包括 stock_code / direction / volume / price / amount / current_volume / target_volume /
+          target_weight / cost（估算成本），下单时还有 status / seq / order_id / error_msg
+        - equity: 计算目标市值用的总资产
+        - sell_amount / buy_amount: 卖出、买入金额
+        - costs / total_cost: 估算成本明细（佣金、印花税、过户费、滑点）及合计
+        - cash_after: 调仓后的估算可用资金
+        - buy_scale: 资金不足时买入的缩减比例
+        - 下单时还有 submitted / failed / skipped / pending 以及 sell_wait_ok（卖出是否在等待时间内回款或结束）
+    """
+    try:
+        model = CostModel.from_spec(cost_model) or CostModel.from_spec("none")
+        price_type_code(price_type)
+        weights_by_code: Dict[str, float] = {}
+        for item in targets:
+            weight = float(item["weight"])
+            if weight < 0:
+                return {"success": False, "message": f"权重不能为负: {item['stock_code']}"}
+            weights_by_code[item["stock_code"]] = weights_by_code.get(item["stock_code"], 0.0) + weight
+        if sum(weights_by_code.values()) > 1 + 1e-9:
+            return {"success": False, "message": f"目标权重之和 {sum(weights_by_code.values()):.4f} 超过 1"}
+
+        try:
+            book = get_account_book(account, market_type)
+        except TraderConnectionError as e:
+            return {"success": False, "message": f"获取账户信息失败: {e}"}
+
+        # 目标股票在前，其后是需要清仓的其他持仓
+        codes = list(weights_by_code)
+        if sell_unlisted:
+            codes += [code for code in book.positions if code not in weights_by_code]
+        weights = np.array([weights_by_code.get(code, 0.0) for code in codes], dtype=np.float64)
+        positions = [book.position(code) for code in codes]
+        volumes = np.array([getattr(p, "volume", 0) for p in positions], dtype=np.int64)
+        can_use = np.array([getattr(p, "can_use_volume", 0) for p in positions], dtype=np.int64)
+
+        # 目标股票和全部持仓（用于计算总资产）一次获取行情
+        held = list(book.positions.values())
+        ticks = xtdata.get_full_tick(sorted(set(codes) | {p.stock_code for p in held}))
+        prices = tick_prices(ticks, codes)
+        if total_amount and total_amount > 0:
+            equity = float(total_amount)
+        else:
+            # 没有行情的持仓按账户簿中的市值计
+            held_prices = tick_prices(ticks, [p.stock_code for p in held])
+            equity = book.available + float(sum(p.market_value if np.isnan(price) else p.volume * price
+                                                 for p, price in zip(held, held_prices)))
+
+        target, sell, buy = rebalance_volumes(weights, prices, volumes, can_use, equity, LOT_SIZE)
+        if min_trade_amount and min_trade_amount > 0:
+            small = np.nan_to_num((sell + buy) * prices) < min_trade_amount
+            sell = np.where(small & (target > 0), 0, sell)
+            buy = np.where(small, 0, buy)
+
+        # 买入金额加估算成本不超过卖出回款后的可用资金
+        zero = np.zeros(len(codes), dtype=bool)
+        sell_value = np.nan_to_num(sell * prices)
+        sell_cost = sum(order_costs(model, sell, prices, ~zero).values())
+        cash = book.available + float(sell_value.sum() - sell_cost.sum())
+        buy_value = np.nan_to_num(buy * prices)
+        buy_cost = sum(order_costs(model, buy, prices, zero).values())
+        scale = 1.0
+        if buy_value.sum() + buy_cost.sum() > cash:
+            _, scale = scale_to_cash(buy_value + buy_cost, cash)
+            buy = np.minimum(buy, lot_volumes(buy_value * scale, prices))
+
+        is_sell = sell > 0
+        trade_volumes = np.where(is_sell, sell, buy)
+        costs = order_costs(model, trade_volumes, prices, is_sell)
+        trade_cost = sum(costs.values())
+        trades = []
+        for i in np.flatnonzero(trade_volumes > 0):
+            trades.append({
+                "stock_code": codes[i],
+                "direction": "SELL" if is_sell[i] else "BUY",
+                "volume": int(trade_volumes[i]),
+                "price": float(prices[i]),
+                "amount": float(trade_volumes[i] * prices[i]),
+                "current_volume": int(volumes[i]),
+                "target_volume": int(target[i]),
+                "target_weight": float(weights[i]),
+                "cost": float(trade_cost[i]),
+            })
+        sell_amount = float(sum(t["amount"] for t in trades if t["direction"] == "SELL"))
+        buy_amount = float(sum(t["amount"] for t in trades if t["direction"] == "BUY"))
+        result = {
+            "success": True,
+            "dry_run": dry_run,
+            "equity": equity,
+            "available_cash": book.available,
+            "sell_amount": sell_amount,
+            "buy_amount": buy_amount,
+            "costs": {item: float(costs[item].sum()) for item in COST_ITEMS},
+            "total_cost": float(trade_cost.sum()),
+            "cash_after": book.available + sell_amount - buy_amount - float(trade_cost.sum()),
+            "buy_scale": scale,
+            "cost_model": model.to_dict(),
+            "trades": trades,
+        }
+        sells = [dict(t) for t in trades if t["direction"] == "SELL"]
+        buys = [dict(t) for t in trades if t["direction"] == "BUY"]
+        if dry_run or not trades:
+            result["message"] = f"卖出 {len(sells)} 笔，买入 {len(buys)} 笔，" + ("未下单" if dry_run else "无需调仓")
+            return result
+
+        # 先卖后买：卖出提交后等待回款，资金仍不足时按当时的可用资金缩减买入
+        summaries = []
+        if sells:
+            summaries.append(submit_basket(account, market_type, sells, price_type, strategy_name, wait))
+        sell_wait_ok = True
+        if buys:
+            needed = sum(t["amount"] + t["cost"] for t in buys)
+            order_ids = [t["order_id"] for t in sells if t.get("order_id") is not None]
+            sell_wait_ok = _wait_for_sells(book, needed, order_ids, REBALANCE_SELL_WAIT if sells else 0)
+            if book.available < needed:
+                buy_prices = np.array([t["price"] for t in buys])
+                amounts, _ = scale_to_cash(np.array([t["amount"] + t["cost"] for t in buys]), book.available)
+                for t, volume in zip(buys, lot_volumes(amounts, buy_prices)):
+                    if volume < t["volume"]:
+                        t.update(volume=int(volume), amount=float(volume * t["price"]), reason="可用资金不足，已缩减")
+            summaries.append(submit_basket(account, market_type, buys, price_type, strategy_name, wait))
+        result["trades"] = sells + buys
+        for key in ("submitted", "failed", "skipped", "pending"):
+            result[key] = sum(summary[key] for summary in summaries)
+        result["sell_wait_ok"] = sell_wait_ok
+        result["success"] = result["submitted"] > 0
+        result["message"] = f"提交 {result['submitted']} 笔，失败 {result['failed']} 笔，跳过 {result['skipped']} 笔"
+        return result
+    except Exception as e:
+        return {"success": False, "message": f"调仓失败: {str(e)}"}
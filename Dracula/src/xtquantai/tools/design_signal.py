@@ -1,5 +1,20 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+from collections import OrderedDict
+import os
+import threading
+import numpy as np
 from ..registry import tool_registry
+from ..columnar import encode_columns, ENCODING_JSON, ENCODINGS
+from ..formula import FormulaError, FormulaSyntaxError, StreamingSignal, compile_signal
+from ..kline_cache import format_time, kline_cache
+from .market_data import load_kline
+
+# 保留增量状态的实盘信号个数上限，超过时淘汰最久未更新的
+LIVE_SIGNAL_LIMIT = int(os.environ.get("XTQUANTAI_LIVE_SIGNAL_LIMIT", "64"))
+
+# (代码, 周期, 除权方式, 信号哈希, 参数) -> (StreamingSignal, 锁)
+_live_signals: "OrderedDict[tuple, Tuple[StreamingSignal, threading.Lock]]" = OrderedDict()
+_live_lock = threading.Lock()
 
 def format_vba_code(code: str) -> str:
     """格式化VBA代码，确保语句以分号结尾"""
@@ -171,7 +186,8 @@ bp:= {{sell_condition}};////平仓条件
                 "default": 34
             }
         }
-    }
+    },
+    execution="inline"
 )
 async def create_ma_cross_signal(
     fast_period: int = 5,
@@ -231,7 +247,8 @@ ma2:=ma(c,N2);
                 "description": "卖出条件"
             }
         }
-    }
+    },
+    execution="inline"
 )
 async def create_custom_signal(
     inputs: str,
@@ -280,4 +297,313 @@ async def create_custom_signal(
 {bk_condition}//////////开仓条件
 
 {bp_condition}////平仓条件
-"""
\ No newline at end of file
+"""
+
+
+@tool_registry.register(
+    name="evaluate_signal",
+    description="在本地缓存的K线上直接计算信号公式，返回bk/bp及各变量的序列，不经过get_vba_func_result",
+    input_schema={
+        "type": "object",
+        "required": ["stock_code", "signal"],
+        "properties": {
+            "stock_code": {
+                "type": "string",
+                "description": "股票代码，如'600000.SH'"
+            },
+            "signal": {
+                "type": "string",
+                "description": "信号公式，如create_ma_cross_signal/create_custom_signal的返回值"
+            },
+            "period": {
+                "type": "string",
+                "description": "K线周期，默认为'1d'",
+                "default": "1d"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "起始时间，如'20240101'",
+                "default": ""
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间，如'20241231'",
+                "default": ""
+            },
+            "count": {
+                "type": "integer",
+                "description": "数据个数，默认为-1",
+                "default": -1
+            },
+            "dividend_type": {
+                "type": "string",
+                "description": "除权方式，默认为'none'",
+                "default": "none"
+            },
+            "params": {
+                "type": "object",
+                "description": "覆盖input参数的默认值，如{'N1': 10}",
+                "default": {}
+            },
+            "outputs": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "需要返回的变量，为空时返回':'声明的输出变量和bk/bp（都没有时返回全部变量）",
+                "default": []
+            },
+            "encoding": {
+                "type": "string",
+                "enum": list(ENCODINGS),
+                "description": "结果编码：json / npy / arrow",
+                "default": "json"
+            },
+            "output_dir": {
+                "type": "string",
+                "description": "二进制编码的输出目录，为空时以base64 EmbeddedResource返回",
+                "default": ""
+            }
+        }
+    }
+)
+async def evaluate_signal(
+    stock_code: str,
+    signal: str,
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    count: int = -1,
+    dividend_type: str = "none",
+    params: Dict[str, float] = None,
+    outputs: List[str] = None,
+    encoding: str = "json",
+    output_dir: str = ""
+) -> Dict:
+    """
+    在本地缓存的K线上计算信号公式
+    
+    Args:
+        stock_code: 股票代码
+        signal: 信号公式文本
+        period: K线周期
+        start_time: 起始时间
+        end_time: 结束时间
+        count: 数据个数
+        dividend_type: 除权方式
+        params: 覆盖input参数的默认值
+        outputs: 需要返回的变量
+        encoding: 结果编码
+        output_dir: 二进制编码的输出目录
+    
+    Returns:
+        {stock_code, params, time, values: {变量: [值]}, signals: {BK/BP: 信号次数}}
+        无效值为 None；encoding 非 json 时返回列式二进制结果
+    """
+    compiled = compile_signal(signal)
+    if not outputs:
+        outputs = compiled.outputs + [name for name in ("BK", "BP") if name in compiled.variables]
+    names = outputs or list(compiled.variables)
+    bars = load_kline(stock_code, sorted(compiled.fields | {"time"}), period, start_time, end_time, count,
+                      dividend_type)
+    values = compiled.evaluate(bars, params, names)
+    used_params = {**compiled.defaults(), **{k.upper(): float(v) for k, v in (params or {}).items()}}
+    
+    if encoding != ENCODING_JSON:
+        return encode_columns(
+            {"time": bars["time"], **values},
+            encoding,
+            name=f"{stock_code}_{period}_signal",
+            output_dir=output_dir,
+            meta={"stock_code": stock_code, "period": period, "params": used_params}
+        )
+    return {
+        "stock_code": stock_code,
+        "params": used_params,
+        "time": np.asarray(bars["time"]).tolist(),
+        "values": {name: [None if np.isnan(v) else v for v in arr.tolist()] for name, arr in values.items()},
+        "signals": {name: int(np.count_nonzero(values[name] > 0)) for name in ("BK", "BP") if name in values}
+    }
+
+
+
+@tool_registry.register(
+    name="validate_signal",
+    description="检查信号公式：结构错误（括号不配对、缺少操作数等）时返回错误位置；能在本地编译时返回参数、输出、用到的行情字段和化简后的运算节点数",
+    input_schema={
+        "type": "object",
+        "required": ["signal"],
+        "properties": {
+            "signal": {
+                "type": "string",
+                "description": "信号公式，如create_ma_cross_signal/create_custom_signal的返回值"
+            }
+        }
+    },
+    execution="inline"
+)
+async def validate_signal(signal: str) -> Dict:
+    """
+    检查信号公式
+
+    结构错误的信号在任何引擎下都无法执行，run_single_stock_backtest 会直接返回错误；
+    本地不支持的函数或语法不算错误，回测时改用 get_vba_func_result 计算
+
+    Args:
+        signal: 信号公式文本
+
+    Returns:
+        {valid: 结构是否正确, local: 能否在本地计算, error: 错误信息（没有时为空）,
+         inputs: {参数: 默认值}, outputs: ':' 声明的输出变量, variables: 全部变量, fields: 用到的行情字段,
+         signature: 规范化后的信号哈希（等价的信号相同）,
+         stats: {expressions: 运算数, operations: 去重、折叠后的运算节点数, nodes: 节点数, shared: 复用节点次数,
+                folded: 折叠的运算数}}
+    """
+    try:
+        compiled = compile_signal(signal)
+    except FormulaSyntaxError as e:
+        return {"valid": False, "local": False, "error": str(e)}
+    except FormulaError as e:
+        return {"valid": True, "local": False, "error": str(e)}
+    return {
+        "valid": True,
+        "local": True,
+        "error": "",
+        "inputs": compiled.defaults(),
+        "outputs": compiled.outputs,
+        "variables": list(compiled.variables),
+        "fields": sorted(compiled.fields),
+        "signature": compiled.canonical_hash,
+        "stats": dict(compiled.stats)
+    }
+
+
+
+def _live_names(compiled) -> List[str]:
+    names = compiled.outputs + [name for name in ("BK", "BP") if name in compiled.variables]
+    return names or list(compiled.variables)
+
+
+@tool_registry.register(
+    name="update_live_signal",
+    description="实盘增量计算信号：第一次调用用最近的历史K线预热，之后每次只计算上次以来新增的K线（或分笔），每根的耗时与历史长度无关，返回新增周期的信号值和最新值",
+    input_schema={
+        "type": "object",
+        "required": ["stock_code", "signal"],
+        "properties": {
+            "stock_code": {
+                "type": "string",
+                "description": "股票代码，如'600000.SH'"
+            },
+            "signal": {
+                "type": "string",
+                "description": "信号公式，只能使用支持增量计算的函数（MA/EMA/SMA/DMA/SUM/HHV/LLV/REF/CROSS/BARSLAST 和逐元素函数），窗口参数须为常数或input参数"
+            },
+            "period": {
+                "type": "string",
+                "description": "K线周期，默认为'1m'，'tick'表示逐笔",
+                "default": "1m"
+            },
+            "dividend_type": {
+                "type": "string",
+                "description": "除权方式，默认为'none'（前复权会改写历史价格，增量状态随之失效）",
+                "default": "none"
+            },
+            "params": {
+                "type": "object",
+                "description": "覆盖input参数的默认值，如{'N1': 10}",
+                "default": {}
+            },
+            "warmup": {
+                "type": "integer",
+                "description": "第一次调用时预热的历史K线根数，-1表示全部",
+                "default": 1000
+            },
+            "include_last": {
+                "type": "boolean",
+                "description": "是否计入最新一根K线；K线周期下最新一根可能尚未走完，默认不计入，下次调用时再计算",
+                "default": False
+            },
+            "reset": {
+                "type": "boolean",
+                "description": "丢弃已有的增量状态，重新预热",
+                "default": False
+            }
+        }
+    }
+)
+async def update_live_signal(
+    stock_code: str,
+    signal: str,
+    period: str = "1m",
+    dividend_type: str = "none",
+    params: Dict[str, float] = None,
+    warmup: int = 1000,
+    include_last: bool = False,
+    reset: bool = False
+) -> Dict:
+    """
+    实盘增量计算信号
+    
+    每个 (代码, 周期, 除权方式, 信号, 参数) 保留一个 StreamingSignal（见 formula.streaming），
+    最多 LIVE_SIGNAL_LIMIT 个。预热之后每次调用只从本地K线缓存读取上次以来的新K线并逐根更新。
+    
+    Args:
+        stock_code: 股票代码
+        signal: 信号公式文本
+        period: K线周期
+        dividend_type: 除权方式
+        params: 覆盖input参数的默认值
+        warmup: 第一次调用时预热的历史K线根数
+        include_last: 是否计入最新一根K线
+        reset: 丢弃已有的增量状态
+    
+    Returns:
+        {stock_code, params, warmed_up: 本次是否预热, processed: 已计算的周期数,
+         time: [新增周期的时间], values: {变量: [新增周期的值]}, latest: {变量: 最新值},
+         latest_time: 最新值所在周期的时间, signals: 最新周期成立的 BK/BP}
+        预热时 time/values 只返回最后一个周期；没有新K线时 time/values 为空，latest/signals 仍是上一次计算的
+        最新周期的值；无效值为 None
+    """
+    compiled = compile_signal(signal)
+    params = {k.upper(): float(v) for k, v in (params or {}).items()}
+    key = (stock_code, period, dividend_type, compiled.canonical_hash, tuple(sorted(params.items())))
+    with _live_lock:
+        entry = None if reset else _live_signals.get(key)
+        if entry is None:
+            entry = (StreamingSignal(compiled, params, _live_names(compiled)), threading.Lock())
+            _live_signals[key] = entry
+        _live_signals.move_to_end(key)
+        while len(_live_signals) > LIVE_SIGNAL_LIMIT:
+            _live_signals.popitem(last=False)
+    stream, lock = entry
+    
+    fields = sorted(compiled.fields | {"time"})
+    with lock:
+        warmed_up = stream.last_time is None
+        if warmed_up:
+            bars = load_kline(stock_code, fields, period, "", "", warmup, dividend_type)
+        else:
+            # 不受K线缓存末尾刷新间隔的限制，每次都检查最新数据
+            kline_cache.mark_stale(stock_code, period)
+            bars = load_kline(stock_code, fields, period, format_time(int(stream.last_time)), "", -1, dividend_type)
+        times = np.asarray(bars.get("time", ()), dtype=np.int64)
+        start = 0 if warmed_up else int(np.searchsorted(times, int(stream.last_time), side="right"))
+        stop = len(times) if include_last or period == "tick" else max(len(times) - 1, start)
+        values = stream.run({field: np.asarray(bars[field])[start:stop] for field in fields})
+        # 两根K线之间的轮询没有新K线，返回上一次计算的最新值
+        latest = {name: (None if np.isnan(value) else float(value)) for name, value in stream.latest.items()}
+        latest_time = stream.last_time
+    
+    shown = slice(-1, None) if warmed_up else slice(None)
+    new_times = times[start:stop][shown]
+    values = {name: arr[shown] for name, arr in values.items()}
+    return {
+        "stock_code": stock_code,
+        "params": {**compiled.defaults(), **params},
+        "warmed_up": warmed_up,
+        "processed": stream.count,
+        "time": new_times.tolist(),
+        "values": {name: [None if np.isnan(v) else v for v in arr.tolist()] for name, arr in values.items()},
+        "latest": latest,
+        "latest_time": None if latest_time is None else int(latest_time),
+        "signals": [name for name in ("BK", "BP") if latest.get(name)]
+    }
@@ -1,5 +1,16 @@
 from typing import List, Dict, Optional, Literal
+import hashlib
+import threading
+import time
+import numpy as np
 from ..registry import tool_registry
+from ..progress import ProgressReporter
+from ..downloader import (DOWNLOAD_WORKERS, DOWNLOAD_RETRIES, BulkDownloadJob,
+                          download_jobs, make_job_id)
+from ..columnar import encode_columns, ENCODING_JSON, ENCODING_ARROW, ENCODINGS
+from ..kline_cache import kline_cache, format_time
+from ..instrument_store import instrument_store
+from ..panel import KLINE_BATCH_CHUNK, fetch_chunks, align_panel, downsample_panel, wide_columns, panel_to_lists
 import xtquant.xtdata as xtdata
 
 
@@ -191,7 +202,85 @@ async def get_instrument_detail(instrument_code: str) -> Dict:
      'UpStopPrice': 420.75, 'DownStopPrice': 344.25, 'FloatVolume': 1162413941.0,
      'TotalVolume': 3039065855.0, 'PriceTick': 0.01}
     """
-    return xtdata.get_instrument_detail(instrument_code)
+    return instrument_store.get(instrument_code)
+
+
+@tool_registry.register(
+    name="get_instrument_details",
+    description="批量获取多个合约（或整个市场）的基本信息，可只返回部分字段",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "instrument_codes": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "合约代码列表，如['002594.SZ', '600000.SH']",
+                "default": []
+            },
+            "market": {
+                "type": "string",
+                "description": "市场代码，如'SH'，提供时获取该市场全部合约",
+                "default": ""
+            },
+            "fields": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "只返回这些字段，如['InstrumentName', 'UpStopPrice']，为空时返回全部字段",
+                "default": []
+            }
+        }
+    }
+)
+async def get_instrument_details(instrument_codes: List[str] = [], market: str = "", fields: List[str] = []) -> Dict:
+    """
+    批量获取合约的基本信息
+    
+    Args:
+        instrument_codes: 合约代码列表
+        market: 市场代码，提供时追加该市场全部合约
+        fields: 只返回这些字段，字段含义同 get_instrument_detail，为空时返回全部字段
+    
+    Returns:
+        {合约代码: 合约信息字典}，不存在的合约为 None
+        
+    样例数据：
+    >>> get_instrument_details(['002594.SZ', '600000.SH'], fields=['InstrumentName', 'PreClose'])
+    {'002594.SZ': {'InstrumentName': '比亚迪', 'PreClose': 382.5},
+     '600000.SH': {'InstrumentName': '浦发银行', 'PreClose': 10.44}}
+    """
+    codes = list(instrument_codes or [])
+    if market:
+        instrument_store.prefetch_market(market)
+        codes += xtdata.get_stock_list_in_sector(market)
+    if not codes:
+        raise ValueError("请提供 instrument_codes 或 market")
+    return instrument_store.get_many(codes, fields or None)
+
+
+@tool_registry.register(
+    name="get_instrument_store_stats",
+    description="获取合约信息仓库的统计信息（缓存合约数、命中率、实际xtdata调用数和节省的调用次数）",
+    input_schema={
+        "type": "object",
+        "properties": {}
+    },
+    execution="inline"
+)
+async def get_instrument_store_stats() -> Dict:
+    """
+    获取合约信息仓库的统计信息
+    
+    Returns:
+        统计信息字典，包括:
+        - records / missing_records: 缓存的合约数 / 其中不存在的合约数
+        - trading_day: 当前交易日，记录只在获取时的交易日内有效
+        - requests / hits / hit_ratio: 请求的合约数 / 命中数 / 命中率
+        - expired: 因交易日切换重新获取的次数
+        - fetched / xtdata_calls: 从xtdata获取的合约数 / 实际xtdata调用次数（批量获取一次算一次）
+        - saved_calls: 相比每个请求调用一次 get_instrument_detail 节省的调用次数
+        - prefetched_markets: 已预取的市场及其交易日
+    """
+    return instrument_store.stats()
 
 
 @tool_registry.register(
@@ -297,7 +386,318 @@ async def download_history_data(stock_code: str, period: str, start_time: str =
                    'end_time': datetime.datetime(2025, 3, 31, 0, 0), 
                    'count': 3328}}
     """
-    return xtdata.download_history_data(stock_code, period, start_time, end_time, incrementally)
+    result = xtdata.download_history_data(stock_code, period, start_time, end_time, incrementally)
+    # 本地数据已更新，K线缓存下次读取时刷新末尾
+    kline_cache.mark_stale(stock_code, period)
+    return result
+
+
+def _extract_times(data) -> List[int]:
+    """get_local_data 返回的单个代码数据中的时间戳列表（DataFrame 或 字典）"""
+    if data is None:
+        return []
+    if hasattr(data, "columns"):
+        if "time" in data.columns:
+            return data["time"].tolist()
+        return []
+    return list(data.get("time", []))
+
+
+def _local_coverage(codes: List[str], period: str, start_time: str) -> Dict[str, tuple]:
+    """本地已有数据的起止日期 {code: (首个日期, 最后日期)}，日期为 'YYYYMMDD'"""
+    def fetch(chunk):
+        data = xtdata.get_local_data(
+            field_list=["time"],
+            stock_list=chunk,
+            period=period,
+            start_time=start_time,
+            end_time="",
+            count=-1 if start_time else 1
+        )
+        result = {}
+        for code, series in (data or {}).items():
+            times = _extract_times(series)
+            if times:
+                result[code] = (format_time(int(times[0]))[:8], format_time(int(times[-1]))[:8])
+        return result
+    
+    return fetch_chunks(fetch, codes)
+
+
+def _target_date(codes: List[str], end_time: str) -> str:
+    """下载的目标日期：指定了结束时间时为结束日期，否则为各市场最近的交易日"""
+    if end_time:
+        return end_time[:8]
+    latest = []
+    for market in sorted({code.rsplit(".", 1)[-1] for code in codes}):
+        try:
+            dates = xtdata.get_trading_dates(market, "", "", 1)
+        except Exception:
+            continue
+        if dates:
+            latest.append(int(dates[-1]))
+    if not latest:
+        return format_time(int(time.time() * 1000))[:8]
+    return format_time(max(latest))[:8]
+
+
+@tool_registry.register(
+    name="bulk_download_history",
+    description="批量补充整个板块/市场的历史行情数据，并行下载、失败重试、断点续传，跳过本地已有数据的代码",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "sector": {
+                "type": "string",
+                "description": "板块名称，如'沪深A股'",
+                "default": ""
+            },
+            "market": {
+                "type": "string",
+                "description": "市场代码，如'SH'，下载该市场全部合约",
+                "default": ""
+            },
+            "stock_codes": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "合约代码列表，与板块/市场的合约合并",
+                "default": []
+            },
+            "period": {
+                "type": "string",
+                "description": "周期",
+                "default": "1d"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "起始时间",
+                "default": ""
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间",
+                "default": ""
+            },
+            "workers": {
+                "type": "integer",
+                "description": "并行下载数",
+                "default": DOWNLOAD_WORKERS
+            },
+            "retries": {
+                "type": "integer",
+                "description": "单个代码失败后的最大重试次数",
+                "default": DOWNLOAD_RETRIES
+            },
+            "force": {
+                "type": "boolean",
+                "description": "是否忽略检查点和本地数据，全部重新下载",
+                "default": False
+            },
+            "background": {
+                "type": "boolean",
+                "description": "是否在后台运行，为true时立即返回任务ID，通过 get_bulk_download_status 查询进度",
+                "default": False
+            }
+        }
+    },
+    progress=True
+)
+async def bulk_download_history(
+    sector: str = "",
+    market: str = "",
+    stock_codes: List[str] = [],
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    workers: int = DOWNLOAD_WORKERS,
+    retries: int = DOWNLOAD_RETRIES,
+    force: bool = False,
+    background: bool = False,
+    progress: Optional[ProgressReporter] = None
+) -> Dict:
+    """
+    批量补充历史行情数据
+    
+    Args:
+        sector: 板块名称，如'沪深A股'
+        market: 市场代码，如'SH'
+        stock_codes: 合约代码列表，与板块/市场的合约合并去重
+        period: 周期，默认为'1d'
+        start_time: 起始时间，默认为空字符串（增量下载）
+        end_time: 结束时间，默认为空字符串
+        workers: 并行下载数，默认 XTQUANTAI_DOWNLOAD_WORKERS
+        retries: 单个代码失败后的最大重试次数，默认 XTQUANTAI_DOWNLOAD_RETRIES，按指数退避等待
+        force: 是否忽略检查点和本地数据，全部重新下载
+        background: 是否在后台运行
+        progress: 进度回调，由服务器注入，客户端提供 progressToken 时发送进度通知
+    
+    Returns:
+        任务状态字典，包括:
+        - job_id: 任务ID，相同的数据源/周期/区间对应同一任务，中断后重新调用即可续传
+        - status: running / finished / failed
+        - target: 目标日期，本地数据最后日期不早于它的代码视为已有数据
+        - requested: 请求的代码数（去重后）
+        - skipped_local: 本地已有数据而跳过的代码数
+        - skipped_checkpoint: 检查点中已完成而跳过的代码数
+        - total / completed / downloaded / retried: 本次需要下载 / 已处理 / 下载成功 / 重试次数
+        - failed: 重试后仍失败的代码和错误信息
+        - manifest: 检查点清单文件路径
+        
+    Note:
+        - 检查点清单保存在 XTQUANTAI_CACHE_DIR/downloads 下，每个代码完成后追加一行
+        - 本地数据判断基于 get_local_data 的首尾时间，盘中执行时当日数据可能不完整，可用 force 强制下载
+    """
+    codes = list(stock_codes or [])
+    source = []
+    if sector:
+        codes += xtdata.get_stock_list_in_sector(sector)
+        source.append(f"sector:{sector}")
+    if market:
+        codes += xtdata.get_stock_list_in_sector(market)
+        source.append(f"market:{market}")
+    if stock_codes:
+        source.append("codes:" + hashlib.sha1(",".join(sorted(stock_codes)).encode("utf-8")).hexdigest()[:8])
+    codes = list(dict.fromkeys(codes))
+    if not codes:
+        raise ValueError("请提供 sector、market 或 stock_codes")
+    
+    job_id = make_job_id(",".join(source), period, start_time, end_time)
+    manifest = download_jobs.manifest(job_id)
+    target = _target_date(codes, end_time)
+    
+    pending = codes
+    skipped_checkpoint = skipped_local = 0
+    if not force:
+        pending = [code for code in codes if not manifest.is_done(code, target)]
+        skipped_checkpoint = len(codes) - len(pending)
+        start_date = start_time[:8]
+        coverage = _local_coverage(pending, period, start_time)
+        pending = [code for code in pending
+                   if not (code in coverage and coverage[code][1] >= target
+                           and (not start_date or coverage[code][0] <= start_date))]
+        skipped_local = len(codes) - skipped_checkpoint - len(pending)
+    
+    job = BulkDownloadJob(
+        job_id, pending, target,
+        download=lambda code: xtdata.download_history_data(code, period, start_time, end_time, None),
+        manifest=manifest,
+        workers=workers,
+        retries=retries,
+        # 本地数据已更新，K线缓存下次读取时刷新末尾
+        on_success=lambda code: kline_cache.mark_stale(code, period),
+        progress=progress
+    )
+    download_jobs.start(job)
+    manifest.write_header({"job_id": job_id, "source": source, "period": period,
+                           "start_time": start_time, "end_time": end_time,
+                           "target": target, "requested": len(codes), "started_at": time.time()})
+    print(f"批量下载 {job_id}: 共 {len(codes)} 个代码，本地已有 {skipped_local}，"
+          f"检查点已完成 {skipped_checkpoint}，需要下载 {len(pending)}")
+    
+    extra = {"requested": len(codes), "skipped_local": skipped_local, "skipped_checkpoint": skipped_checkpoint}
+    if background:
+        threading.Thread(target=job.run, name=f"xtquantai-download-{job_id}", daemon=True).start()
+        return {**job.state(), "status": "running", **extra}
+    
+    if progress:
+        progress(0, len(pending), "开始下载")
+    state = job.run()
+    print(f"批量下载 {job_id} 完成: 成功 {state['downloaded']}，失败 {len(state['failed'])}，耗时 {state['elapsed']}s")
+    return {**state, **extra}
+
+
+@tool_registry.register(
+    name="get_bulk_download_status",
+    description="查询批量下载任务的进度",
+    input_schema={
+        "type": "object",
+        "required": ["job_id"],
+        "properties": {
+            "job_id": {
+                "type": "string",
+                "description": "bulk_download_history 返回的任务ID"
+            }
+        }
+    },
+    execution="inline"
+)
+async def get_bulk_download_status(job_id: str) -> Dict:
+    """
+    查询批量下载任务的进度
+    
+    Args:
+        job_id: bulk_download_history 返回的任务ID
+    
+    Returns:
+        本进程中运行过的任务返回任务状态（同 bulk_download_history）；
+        否则返回检查点清单的汇总：任务信息、已完成代码数、失败代码
+    """
+    job = download_jobs.get(job_id)
+    if job is not None:
+        return job.state()
+    manifest = download_jobs.manifest(job_id)
+    if not manifest.header and not manifest.entries:
+        raise ValueError(f"下载任务不存在: {job_id}")
+    return {"job_id": job_id, "status": "checkpoint", "manifest": manifest.path, **manifest.summary()}
+
+
+def load_kline(
+    stock_code: str,
+    field_list: List[str],
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    count: int = -1,
+    dividend_type: str = "none"
+) -> Dict[str, np.ndarray]:
+    """
+    通过本地K线缓存读取单个股票的K线（向后填充），供需要在本地计算的工具使用
+    
+    Returns:
+        { field: numpy数组 }，字段和参数含义同 get_kline
+    """
+    fetch, download = _kline_sources(stock_code, period, dividend_type)
+    return kline_cache.get(
+        stock_code, period, dividend_type, field_list, start_time, end_time, count,
+        fetch=fetch,
+        download=download
+    )
+
+
+def kline_version(
+    stock_code: str,
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    count: int = -1,
+    dividend_type: str = "none"
+) -> Optional[str]:
+    """
+    单个股票K线在本地缓存中的数据版本（见 KlineCache.version），与 load_kline 一样刷新缓存但不读取K线
+    
+    Returns:
+        版本字符串，没有K线时为 None
+    """
+    fetch, download = _kline_sources(stock_code, period, dividend_type)
+    return kline_cache.version(stock_code, period, dividend_type, start_time, end_time, count,
+                               fetch=fetch, download=download)
+
+
+def _kline_sources(stock_code: str, period: str, dividend_type: str):
+    """K线缓存补取单个股票数据用的 (fetch, download)"""
+    def fetch(fields, fetch_start, fetch_end, fetch_count):
+        return xtdata.get_market_data_ex_ori(
+            field_list=fields,
+            stock_list=[stock_code],
+            period=period,
+            start_time=fetch_start,
+            end_time=fetch_end,
+            count=fetch_count,
+            dividend_type=dividend_type,
+            fill_data=True
+        ).get(stock_code, {})
+    
+    return fetch, lambda: xtdata.download_history_data(stock_code, period, "", "", True)
 
 
 @tool_registry.register(
@@ -345,6 +745,22 @@ async def download_history_data(stock_code: str, period: str, start_time: str =
                 "type": "boolean",
                 "description": "是否向后填充空缺数据",
                 "default": True
+            },
+            "encoding": {
+                "type": "string",
+                "enum": list(ENCODINGS),
+                "description": "结果编码：json(默认)；npy/arrow 为列式二进制编码，适合大窗口数据",
+                "default": "json"
+            },
+            "output_dir": {
+                "type": "string",
+                "description": "二进制编码的输出目录，提供时写入文件并返回路径（可内存映射加载），否则以base64资源返回",
+                "default": ""
+            },
+            "use_cache": {
+                "type": "boolean",
+                "description": "是否使用本地K线缓存，缓存已覆盖的区间直接从磁盘读取，只补取最新数据",
+                "default": True
             }
         }
     }
@@ -357,7 +773,10 @@ async def get_kline(
     end_time: str = "",
     count: int = -1,
     dividend_type: str = "none",
-    fill_data: bool = True
+    fill_data: bool = True,
+    encoding: str = "json",
+    output_dir: str = "",
+    use_cache: bool = True
 ) -> Dict:
     """
     获取单个股票的K线数据
@@ -393,9 +812,16 @@ async def get_kline(
             - count < 0: 若start_time、end_time、count都缺省，取本地全部数据
         dividend_type: 除权方式，默认为'none'
         fill_data: 是否向后填充空缺数据，默认为True
+        encoding: 结果编码，默认为'json'
+            - json: 返回下述字典
+            - npy: 每个字段一个 .npy 缓冲区
+            - arrow: 所有字段一个 Arrow IPC 流（需要安装 pyarrow）
+        output_dir: 二进制编码的输出目录，为空时以base64 EmbeddedResource返回
+        use_cache: 是否使用本地K线缓存，默认为True。fill_data为False时不使用缓存
     
     Returns:
         返回dict { stock_code: { field1: [values], field2: [values], ... } }
+        encoding 非 json 时返回列式二进制结果，见 columnar.encode_columns
         - field1, field2等为数据字段
         - values为对应字段的数据列表
         - time字段为Unix时间戳(毫秒)
@@ -416,16 +842,297 @@ async def get_kline(
         'volume': [115784]
     }}
     """
-    return xtdata.get_market_data_ex_ori(
-        field_list=field_list,
-        stock_list=[stock_code],
-        period=period,
-        start_time=start_time,
-        end_time=end_time,
-        count=count,
-        dividend_type=dividend_type,
-        fill_data=fill_data
+    if use_cache and fill_data:
+        data = load_kline(stock_code, field_list, period, start_time, end_time, count, dividend_type)
+        if encoding == ENCODING_JSON:
+            return {stock_code: {field: values.tolist() for field, values in data.items()}}
+    else:
+        kline_cache.record_bypass()
+        result = xtdata.get_market_data_ex_ori(
+            field_list=field_list,
+            stock_list=[stock_code],
+            period=period,
+            start_time=start_time,
+            end_time=end_time,
+            count=count,
+            dividend_type=dividend_type,
+            fill_data=fill_data
+        )
+        if encoding == ENCODING_JSON:
+            return result
+        data = result.get(stock_code, {})
+    
+    return encode_columns(
+        data,
+        encoding,
+        name=f"{stock_code}_{period}_{dividend_type}",
+        output_dir=output_dir,
+        meta={"stock_code": stock_code, "period": period, "dividend_type": dividend_type}
+    )
+
+
+def load_panel(
+    stock_codes: List[str],
+    field_list: List[str],
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    count: int = -1,
+    dividend_type: str = "none",
+    fill_data: bool = True,
+    chunk_size: int = KLINE_BATCH_CHUNK
+):
+    """
+    分块并行获取多只股票的K线并对齐到共享时间轴，供需要在本地计算的工具使用
+    
+    Returns:
+        (时间轴, { field: (股票数, 时间数) 数组 }, 没有数据的股票)，见 panel.align_panel
+    """
+    def fetch(chunk):
+        return xtdata.get_market_data_ex_ori(
+            field_list=field_list,
+            stock_list=chunk,
+            period=period,
+            start_time=start_time,
+            end_time=end_time,
+            count=count,
+            dividend_type=dividend_type,
+            fill_data=fill_data
+        )
+    
+    data = fetch_chunks(fetch, stock_codes, chunk_size)
+    return align_panel(data, stock_codes, field_list)
+
+
+@tool_registry.register(
+    name="get_kline_batch",
+    description="批量获取多个股票（或整个板块）的K线数据，按共享时间轴对齐为面板",
+    input_schema={
+        "type": "object",
+        "required": ["field_list"],
+        "properties": {
+            "field_list": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "数据字段列表，如['close', 'volume']"
+            },
+            "stock_codes": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "合约代码列表，如['600000.SH', '002594.SZ']",
+                "default": []
+            },
+            "sector": {
+                "type": "string",
+                "description": "板块名称，如'沪深300'，提供时获取板块全部成分股",
+                "default": ""
+            },
+            "period": {
+                "type": "string",
+                "description": "K线周期，支持1m,3m,5m,10m,15m,30m,60m,120m,180m,240m,1h,2h,3h,4h,1d,2d,3d,5d,1w,1mon,1q,1hy,1y",
+                "default": "1d"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "起始时间",
+                "default": ""
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间",
+                "default": ""
+            },
+            "count": {
+                "type": "integer",
+                "description": "每个股票的数据个数，-1表示全部数据",
+                "default": -1
+            },
+            "dividend_type": {
+                "type": "string",
+                "description": "除权方式",
+                "default": "none"
+            },
+            "fill_data": {
+                "type": "boolean",
+                "description": "是否向后填充空缺数据",
+                "default": True
+            },
+            "max_points": {
+                "type": "integer",
+                "description": "降采样后的最大时间点数，0表示不降采样",
+                "default": 0
+            },
+            "chunk_size": {
+                "type": "integer",
+                "description": "单次获取的股票个数，股票更多时分块并行获取",
+                "default": KLINE_BATCH_CHUNK
+            },
+            "encoding": {
+                "type": "string",
+                "enum": list(ENCODINGS),
+                "description": "结果编码：json(默认)；npy/arrow 为列式二进制编码，股票较多时建议使用",
+                "default": "json"
+            },
+            "output_dir": {
+                "type": "string",
+                "description": "二进制编码的输出目录，提供时写入文件并返回路径（可内存映射加载），否则以base64资源返回",
+                "default": ""
+            }
+        }
+    }
+)
+async def get_kline_batch(
+    field_list: List[str],
+    stock_codes: List[str] = [],
+    sector: str = "",
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    count: int = -1,
+    dividend_type: str = "none",
+    fill_data: bool = True,
+    max_points: int = 0,
+    chunk_size: int = KLINE_BATCH_CHUNK,
+    encoding: str = "json",
+    output_dir: str = ""
+) -> Dict:
+    """
+    批量获取多个股票的K线数据，按共享时间轴对齐为面板
+    
+    Args:
+        field_list: 数据字段列表，传空则为全部数值字段，可用字段同 get_kline
+        stock_codes: 合约代码列表
+        sector: 板块名称，提供时追加板块全部成分股
+        period: K线周期，默认为'1d'
+        start_time: 起始时间，默认为空字符串
+        end_time: 结束时间，默认为空字符串
+        count: 每个股票的数据个数，默认为-1，含义同 get_kline
+        dividend_type: 除权方式，默认为'none'
+        fill_data: 是否向后填充空缺数据，默认为True
+        max_points: 降采样后的最大时间点数，默认为0（不降采样）。
+            降采样按时间分桶，open取桶内第一个，high/low取最大/最小，volume/amount求和，其余取最后一个
+        chunk_size: 单次 get_market_data_ex_ori 调用的股票个数，超过时分块并行获取
+        encoding: 结果编码，默认为'json'
+            - json: 返回下述字典
+            - npy: 每个字段一个 (股票数, 时间数) 的 .npy 缓冲区
+            - arrow: 宽表，列为 time 和 'field:code'（需要安装 pyarrow）
+        output_dir: 二进制编码的输出目录，为空时以base64 EmbeddedResource返回
+    
+    Returns:
+        返回dict:
+        - stock_codes: 股票列表，即面板的行顺序
+        - time: 共享时间轴，Unix时间戳(毫秒)
+        - fields: { field: [[股票1的values], [股票2的values], ...] }，没有数据的位置为 null
+        - missing: 没有任何数据的股票
+        encoding 非 json 时返回列式二进制结果，见 columnar.encode_columns
+        
+    样例数据:
+    >>> get_kline_batch(['close'], ['600000.SH', '002594.SZ'], count=2)
+    {'stock_codes': ['600000.SH', '002594.SZ'],
+     'time': [1743264000000, 1743350400000],
+     'fields': {'close': [[10.41, 10.44], [371.2, 374.9]]},
+     'missing': []}
+    """
+    codes = list(stock_codes or [])
+    if sector:
+        codes += xtdata.get_stock_list_in_sector(sector)
+    # 去重并保持顺序
+    codes = list(dict.fromkeys(codes))
+    if not codes:
+        raise ValueError("请提供 stock_codes 或 sector")
+    
+    time_axis, panel, missing = load_panel(
+        codes, field_list, period, start_time, end_time, count, dividend_type, fill_data, chunk_size
     )
+    time_axis, panel = downsample_panel(time_axis, panel, max_points)
+    
+    if encoding == ENCODING_JSON:
+        return {
+            "stock_codes": codes,
+            "time": time_axis.tolist(),
+            "fields": {field: panel_to_lists(values) for field, values in panel.items()},
+            "missing": missing
+        }
+    
+    meta = {"stock_codes": codes, "missing": missing, "period": period, "dividend_type": dividend_type}
+    if encoding == ENCODING_ARROW:
+        columns = wide_columns(time_axis, panel, codes)
+    else:
+        columns = {"time": time_axis, **panel}
+    return encode_columns(
+        columns,
+        encoding,
+        name=f"{sector or 'batch'}_{period}_{dividend_type}",
+        output_dir=output_dir,
+        meta=meta
+    )
+
+
+@tool_registry.register(
+    name="get_kline_cache_stats",
+    description="获取本地K线缓存的统计信息（命中率、大小、淘汰和除权失效次数等）",
+    input_schema={
+        "type": "object",
+        "properties": {}
+    },
+    execution="inline"
+)
+async def get_kline_cache_stats() -> Dict:
+    """
+    获取本地K线缓存的统计信息
+    
+    Returns:
+        统计信息字典，包括:
+        - requests: 请求次数
+        - hits / partial_hits / misses: 完全命中 / 部分命中（只补取了首尾数据）/ 未命中次数
+        - bypassed: 未使用缓存的请求次数
+        - hit_ratio / partial_hit_ratio: 完全命中率 / 部分命中率
+        - rows_served / rows_fetched: 返回的K线条数 / 从xtdata获取的K线条数
+        - evictions: 因超过大小上限被淘汰的序列数
+        - dividend_invalidations: 因除权因子变化整段重取的次数
+        - series / bytes / max_bytes: 缓存序列数 / 占用字节数 / 大小上限
+    """
+    return kline_cache.stats()
+
+
+@tool_registry.register(
+    name="clear_kline_cache",
+    description="清除本地K线缓存，可按代码、周期、除权方式过滤",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "stock_code": {
+                "type": "string",
+                "description": "合约代码，为空表示全部",
+                "default": ""
+            },
+            "period": {
+                "type": "string",
+                "description": "K线周期，为空表示全部",
+                "default": ""
+            },
+            "dividend_type": {
+                "type": "string",
+                "description": "除权方式，为空表示全部",
+                "default": ""
+            }
+        }
+    }
+)
+async def clear_kline_cache(stock_code: str = "", period: str = "", dividend_type: str = "") -> Dict:
+    """
+    清除本地K线缓存
+    
+    Args:
+        stock_code: 合约代码，为空表示全部
+        period: K线周期，为空表示全部
+        dividend_type: 除权方式，为空表示全部
+    
+    Returns:
+        包含删除序列数的字典
+    """
+    removed = kline_cache.invalidate(stock_code or None, period or None, dividend_type or None)
+    return {"removed_series": removed}
 
 
 @tool_registry.register(
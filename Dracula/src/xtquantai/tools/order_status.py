@@ -0,0 +1,124 @@
+from typing import Any, Dict, List
+import asyncio
+import time
+
+from ..registry import tool_registry
+from ..order_tracker import order_tracker, unknown_status
+
+
+def _status(kind: str, value: int) -> Dict[str, Any]:
+    """委托的当前状态，没有记录（未经本进程下单或已超出保留条数）时为 unknown"""
+    return order_tracker.status(**{kind: value}) or unknown_status(**{kind: value})
+
+
+@tool_registry.register(
+    name="wait_orders",
+    description="按 seq（buy_stock / sell_stock / place_basket_order 返回）或委托编号一次等待或查询多个委托的状态"
+                "（已报、部分成交、全部成交、已撤、废单、失败），由交易回调推送，不轮询交易服务器；timeout 为 0 时只返回当前状态",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "seqs": {
+                "type": "array",
+                "items": {"type": "integer"},
+                "description": "异步下单返回的 seq 列表"
+            },
+            "order_ids": {
+                "type": "array",
+                "items": {"type": "integer"},
+                "description": "委托编号列表"
+            },
+            "timeout": {
+                "type": "number",
+                "description": "最长等待时间（秒），0 表示不等待，只返回当前状态",
+                "default": 10
+            },
+            "until": {
+                "type": "string",
+                "enum": ["final", "update"],
+                "description": "'final' 等到委托结束（全部成交、已撤、废单、失败），'update' 等到下一次状态变化（如部分成交）",
+                "default": "final"
+            },
+            "return_when": {
+                "type": "string",
+                "enum": ["all", "any"],
+                "description": "'all' 等待全部委托，'any' 任一委托满足条件即返回",
+                "default": "all"
+            }
+        }
+    },
+    execution="inline"
+)
+async def wait_orders(seqs: List[int] = None, order_ids: List[int] = None, timeout: float = 10,
+                      until: str = "final", return_when: str = "all") -> Dict:
+    """
+    等待或查询一批委托的状态
+
+    等待在事件循环中进行（future 由交易回调线程完成），不占用交易执行池，等待期间其他工具照常执行
+
+    Args:
+        seqs: 异步下单返回的 seq 列表
+        order_ids: 委托编号列表
+        timeout: 最长等待时间（秒），0 表示只返回当前状态
+        until: 'final' 等到委托结束，'update' 等到下一次状态变化
+        return_when: 'all' 等待全部委托，'any' 任一委托满足条件即返回
+
+    Returns:
+        结果字典，包括:
+        - orders: 每个委托的状态（seq / order_id / stock_code / status / final / order_volume / traded_volume /
+          traded_price / error_msg），done 表示已满足等待条件；没有任何记录的委托 status 为 unknown
+        - counts: 各状态的委托数
+        - done / pending: 已满足、未满足等待条件的委托数
+        - elapsed: 等待时间（秒）
+    """
+    try:
+        keys = [("seq", seq) for seq in seqs or []] + [("order_id", order_id) for order_id in order_ids or []]
+        if not keys:
+            return {"success": False, "message": "请提供 seqs 或 order_ids"}
+        if until not in ("final", "update"):
+            return {"success": False, "message": f"不支持的等待条件: {until}"}
+        if return_when not in ("all", "any"):
+            return {"success": False, "message": f"不支持的返回条件: {return_when}"}
+
+        start = time.perf_counter()
+        orders: List[Dict[str, Any]] = []
+        if not timeout or timeout <= 0:
+            for kind, value in keys:
+                status = _status(kind, value)
+                status["done"] = status["final"]
+                orders.append(status)
+        else:
+            futures = [order_tracker.watch(final=until == "final", **{kind: value}) for kind, value in keys]
+            # 没有记录的委托不会再有回报，不参与等待，按未满足条件返回
+            waiting = [future for future in futures
+                       if not (future.done() and future.result()["status"] == "unknown")]
+            done, pending = set(), set()
+            if waiting:
+                done, pending = await asyncio.wait(
+                    waiting, timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED if return_when == "any" else asyncio.ALL_COMPLETED)
+            for future in pending:
+                future.cancel()
+            for (kind, value), future in zip(keys, futures):
+                if future in done:
+                    status = dict(future.result(), done=True)
+                else:
+                    status = dict(_status(kind, value), done=False)
+                orders.append(status)
+
+        counts: Dict[str, int] = {}
+        for status in orders:
+            counts[status["status"]] = counts.get(status["status"], 0) + 1
+        finished = sum(status["done"] for status in orders)
+        word = "结束" if until == "final" else "更新"
+        return {
+            "success": True,
+            "message": f"{finished} 个委托已{word}，{len(orders) - finished} 个未{word}",
+            "orders": orders,
+            "counts": counts,
+            "done": finished,
+            "pending": len(orders) - finished,
+            "elapsed": time.perf_counter() - start,
+        }
+    except Exception as e:
+        return {"success": False, "message": f"查询委托状态失败: {str(e)}"}
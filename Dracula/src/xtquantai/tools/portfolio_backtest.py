@@ -0,0 +1,219 @@
+from typing import Dict, Any, List
+from ..registry import tool_registry
+from ..columnar import encode_columns, ENCODING_JSON, ENCODINGS
+from ..formula import compile_signal
+from ..panel import KLINE_BATCH_CHUNK, downsample_panel
+from ..portfolio import ALLOCATIONS, PORTFOLIO_CAPITAL, PORTFOLIO_FEE, PORTFOLIO_MAX_POSITIONS, run_portfolio_backtest
+from ..sector_index import sector_index
+from .market_data import load_panel
+import numpy as np
+
+# 权益曲线的输出列
+CURVE_COLUMNS = ("equity", "cash", "market_value", "positions")
+
+
+@tool_registry.register(
+    name="run_sector_backtest",
+    description="在板块全部成分股（或指定股票列表）上运行同一个信号，按资金分配和仓位上限组合回测，返回组合权益曲线和汇总指标",
+    input_schema={
+        "type": "object",
+        "required": ["signal"],
+        "properties": {
+            "signal": {
+                "type": "string",
+                "description": "包含bk/bp的信号公式，可定义SCORE变量作为开仓优先级（越大越优先）"
+            },
+            "sector": {
+                "type": "string",
+                "description": "板块名称，如'沪深300'，回测板块全部成分股",
+                "default": ""
+            },
+            "stock_codes": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "股票代码列表，与sector同时提供时合并",
+                "default": []
+            },
+            "period": {
+                "type": "string",
+                "description": "K线周期",
+                "default": "1d"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "开始时间，如'20150101'",
+                "default": ""
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间，如'20241231'",
+                "default": ""
+            },
+            "count": {
+                "type": "integer",
+                "description": "每个股票的数据个数，-1表示全部数据",
+                "default": -1
+            },
+            "dividend_type": {
+                "type": "string",
+                "description": "除权方式",
+                "default": "front_ratio"
+            },
+            "params": {
+                "type": "object",
+                "description": "覆盖input参数的默认值，如{'N1': 10}",
+                "default": {}
+            },
+            "initial_capital": {
+                "type": "number",
+                "description": "初始资金",
+                "default": PORTFOLIO_CAPITAL
+            },
+            "max_positions": {
+                "type": "integer",
+                "description": "最大同时持仓股票数",
+                "default": PORTFOLIO_MAX_POSITIONS
+            },
+            "max_weight": {
+                "type": "number",
+                "description": "单只股票开仓金额占总权益的上限，如0.05，0表示不额外限制",
+                "default": 0.0
+            },
+            "allocation": {
+                "type": "string",
+                "enum": list(ALLOCATIONS),
+                "description": "资金分配：equal 每只股票开仓 总权益/max_positions；cash 把可用资金平分给同一根K线的开仓股票",
+                "default": "equal"
+            },
+            "fee": {
+                "type": "number",
+                "description": "单边手续费率，开平仓各收一次",
+                "default": PORTFOLIO_FEE
+            },
+            "max_points": {
+                "type": "integer",
+                "description": "权益曲线降采样后的最大点数，0表示不降采样",
+                "default": 0
+            },
+            "encoding": {
+                "type": "string",
+                "enum": list(ENCODINGS),
+                "description": "权益曲线编码：json / npy / arrow",
+                "default": "json"
+            },
+            "output_dir": {
+                "type": "string",
+                "description": "二进制编码的输出目录，为空时以base64 EmbeddedResource返回",
+                "default": ""
+            }
+        }
+    }
+)
+async def run_sector_backtest(
+    signal: str,
+    sector: str = "",
+    stock_codes: List[str] = None,
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    count: int = -1,
+    dividend_type: str = "front_ratio",
+    params: Dict[str, float] = None,
+    initial_capital: float = PORTFOLIO_CAPITAL,
+    max_positions: int = PORTFOLIO_MAX_POSITIONS,
+    max_weight: float = 0.0,
+    allocation: str = "equal",
+    fee: float = PORTFOLIO_FEE,
+    max_points: int = 0,
+    encoding: str = "json",
+    output_dir: str = ""
+) -> Dict[str, Any]:
+    """
+    板块组合回测
+
+    Args:
+        signal: 信号公式
+        sector: 板块名称
+        stock_codes: 股票代码列表
+        period: K线周期
+        start_time: 开始时间
+        end_time: 结束时间
+        count: 每个股票的数据个数
+        dividend_type: 除权方式
+        params: 覆盖input参数的默认值
+        initial_capital: 初始资金
+        max_positions: 最大同时持仓股票数
+        max_weight: 单只股票开仓金额占总权益的上限
+        allocation: 资金分配方式
+        fee: 单边手续费率
+        max_points: 权益曲线降采样后的最大点数
+        encoding: 权益曲线编码
+        output_dir: 二进制编码的输出目录
+
+    Returns:
+        {
+            "summary": 汇总指标（初始资金、期末权益、总收益率、最大回撤、收益回撤比、交易次数、胜率、
+                       平均持仓数、最大持仓数、未执行开仓信号），收益和回撤为百分比,
+            "per_stock": 有过交易的股票的交易次数、胜率、盈亏和是否持仓中，按盈亏从高到低排列,
+            "curve": {time, equity, cash, market_value, positions} 组合权益曲线,
+            "stock_codes": 参与回测的股票, "missing": 没有行情数据的股票, "parameters": 回测参数
+        }
+        encoding 非 json 时返回权益曲线的列式二进制结果，其余内容放在元数据中
+    """
+    codes = list(stock_codes or [])
+    if sector:
+        # 成分股取自板块倒排索引（磁盘缓存），不再每次调用 xtdata
+        codes += sector_index.members(sector)
+    codes = list(dict.fromkeys(codes))
+    if not codes:
+        raise ValueError("请提供 stock_codes 或 sector")
+
+    fields = sorted(compile_signal(signal).fields | {"time", "close"})
+    # 不填充停牌的K线：停牌期间收盘价为 NaN，组合回测中不能开平仓
+    time_axis, panel, missing = load_panel(
+        codes, fields, period, start_time, end_time, count, dividend_type, False, KLINE_BATCH_CHUNK
+    )
+    # 没有行情的股票不参与回测；面板转置为 (时间, 股票)
+    rows = [i for i, code in enumerate(codes) if code not in missing]
+    codes = [codes[i] for i in rows]
+    bars = {"time": time_axis}
+    for field, values in panel.items():
+        bars[field] = np.ascontiguousarray(values[rows].T)
+
+    result = run_portfolio_backtest(signal, bars, codes, params, initial_capital, max_positions,
+                                    max_weight, allocation, fee)
+    time_axis, curve = downsample_panel(
+        result["time"], {name: np.asarray(result[name], dtype=np.float64)[None, :] for name in CURVE_COLUMNS},
+        max_points
+    )
+    curve = {"time": time_axis, **{name: values[0] for name, values in curve.items()}}
+
+    parameters = {
+        "sector": sector,
+        "period": period,
+        "start_time": start_time,
+        "end_time": end_time,
+        "dividend_type": dividend_type,
+        "params": params or {},
+        "initial_capital": initial_capital,
+        "max_positions": max_positions,
+        "max_weight": max_weight,
+        "allocation": allocation,
+        "fee": fee
+    }
+    info = {
+        "summary": result["summary"],
+        "per_stock": result["per_stock"],
+        "stock_codes": codes,
+        "missing": missing,
+        "parameters": parameters
+    }
+    if encoding != ENCODING_JSON:
+        return encode_columns(
+            curve,
+            encoding,
+            name=f"{sector or 'portfolio'}_{period}_equity",
+            output_dir=output_dir,
+            meta=info
+        )
+    return {**info, "curve": {name: values.tolist() for name, values in curve.items()}}
@@ -0,0 +1,48 @@
+from typing import Dict, Optional
+from ..registry import tool_registry
+from ..encoding import result_store, PAGE_SIZE
+
+
+@tool_registry.register(
+    name="get_result_page",
+    description="按游标获取大结果的下一页数据（工具返回 paged=true 的清单时使用）",
+    input_schema={
+        "type": "object",
+        "required": ["result_id"],
+        "properties": {
+            "result_id": {
+                "type": "string",
+                "description": "结果ID，来自分页清单中的result_id"
+            },
+            "cursor": {
+                "type": "integer",
+                "description": "起始游标，来自上一页的next_cursor",
+                "default": 0
+            },
+            "page_size": {
+                "type": "integer",
+                "description": f"每页数据条数，最大{PAGE_SIZE}",
+                "default": PAGE_SIZE
+            }
+        }
+    },
+    execution="inline"
+)
+async def get_result_page(result_id: str, cursor: int = 0, page_size: Optional[int] = None) -> Dict:
+    """
+    按游标获取大结果的一页数据
+
+    Args:
+        result_id: 结果ID，来自分页清单中的result_id
+        cursor: 起始游标，来自上一页的next_cursor
+        page_size: 每页数据条数
+
+    Returns:
+        包含以下字段的字典:
+        - result_id: 结果ID
+        - cursor: 本页起始游标
+        - next_cursor: 下一页游标，没有下一页时为None
+        - total: 数据总条数
+        - data: 本页数据，结构与原结果相同，长数组被截取为本页范围
+    """
+    return result_store.page(result_id, cursor, page_size or PAGE_SIZE)
@@ -1,5 +1,8 @@
-﻿from typing import List
+﻿from typing import List, Dict
 from ..registry import tool_registry
+from ..sector_index import sector_index
+from ..name_index import name_index
+from ..instrument_store import instrument_store
 import xtquant.xtdata as xtdata
 
 
@@ -81,10 +84,12 @@ async def get_sector_constituents(sector: str) -> List[tuple[str, str]]:
     [('000001.SZ', '平安银行'), ('000002.SZ', '万 科Ａ'), ('000063.SZ', '中兴通讯'), ('000100.SZ', 'TCL科技')]
     """
     sl = xtdata.get_stock_list_in_sector(sector)
+    # 从合约信息仓库批量获取，仓库中缺失的合约一次性获取
+    instruments = instrument_store.get_many(sl, fields=['InstrumentName'])
     result = []
     unknown_instruments = []
     for s in sl:
-        instrument = xtdata.get_instrument_detail(s)
+        instrument = instruments.get(s)
         if instrument is not None:
             result.append((s, instrument['InstrumentName']))
         else:
@@ -118,6 +123,8 @@ async def download_sector_data() -> None:
     print("下载板块数据（在每个交易日早上9点更新一次即可，耗时几十秒较长，可推荐用户在界面手工下载更新）")
     xtdata.download_sector_data()
     print("下载板块数据完成")
+    # 板块数据已更新，后台重建板块索引
+    sector_index.mark_sector_data_updated()
 
 
 @tool_registry.register(
@@ -141,28 +148,11 @@ async def download_history_contracts() -> None:
     print("开始下载过期合约数据（耗时较长约几十秒）...")
     xtdata.download_history_contracts()
     print("下载过期合约数据完成")
+    # 合约列表已更新，清空合约信息仓库并后台重建合约名称索引
+    instrument_store.invalidate()
+    name_index.refresh(background=True)
 
 
-# 全局缓存字典,存储股票到板块的映射关系
-_stock_sector_cache = {}
-_stock_sector_cache_initialized = False
-
-def _build_stock_sector_cache():
-    """构建股票到板块的缓存映射"""
-    global _stock_sector_cache, _stock_sector_cache_initialized
-    if not _stock_sector_cache_initialized:
-        print("正在建立股票板块缓存，请稍等...")
-        # 获取所有板块
-        all_sectors = xtdata.get_sector_list()
-        # 遍历每个板块,获取成分股并建立反向索引
-        for sector in all_sectors:
-            stocks = xtdata.get_stock_list_in_sector(sector)
-            for stock in stocks:
-                if stock not in _stock_sector_cache:
-                    _stock_sector_cache[stock] = []
-                _stock_sector_cache[stock].append(sector)
-        _stock_sector_cache_initialized = True
-
 @tool_registry.register(
     name="get_stock_sectors", 
     description="获取股票所属的所有板块",
@@ -191,35 +181,92 @@ async def get_stock_sectors(stock_code: str) -> List[str]:
     >>> xtdata.get_stock_sectors('002594.SZ')
     ['801880.SH', '801880.SI', '850111.SI', '850111.SH', '801010.SI', '801010.SH']
     """
-    # 确保缓存已建立
-    _build_stock_sector_cache()
-    # 从缓存中获取结果
-    return _stock_sector_cache.get(stock_code, [])
+    # 从持久化的板块索引中查询，首次使用且磁盘上没有索引时才会构建
+    return sector_index.sectors_of(stock_code)
 
 
-# 合约名称到代码的缓存映射
-_stock_name_cache = {}
+@tool_registry.register(
+    name="query_sectors",
+    description="板块集合运算：查询同时属于若干板块、属于任一板块、不属于某些板块的股票",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "all_of": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "必须同时属于的板块列表（交集），如['沪深300', 'GN新能源']",
+                "default": []
+            },
+            "any_of": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "属于其中任一板块即可的板块列表（并集）",
+                "default": []
+            },
+            "none_of": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "需要排除的板块列表（差集）",
+                "default": []
+            }
+        }
+    }
+)
+async def query_sectors(all_of: List[str] = [], any_of: List[str] = [], none_of: List[str] = []) -> Dict:
+    """
+    板块集合运算，在本地板块索引上计算，不调用 xtdata
+    
+    Args:
+        all_of: 必须同时属于的板块列表（交集）
+        any_of: 属于其中任一板块即可的板块列表（并集）
+        none_of: 需要排除的板块列表（差集）
+        all_of 和 any_of 都为空时，从全部股票中排除 none_of
+        
+    Returns:
+        包含股票代码列表和个数的字典
+        
+    样例数据:
+    >>> query_sectors(all_of=['沪深300'], any_of=['GN新能源', 'GN锂电池'], none_of=['ST股'])
+    {'stock_codes': ['002594.SZ', '300750.SZ', ...], 'count': 42}
+    """
+    codes = sector_index.query(all_of, any_of, none_of)
+    return {"stock_codes": codes, "count": len(codes)}
 
-def _build_stock_name_cache_for_market(market: str):
-    """为指定市场构建合约名称到代码的缓存映射"""
-    global _stock_name_cache
-    # 检查是否已经缓存了该市场的数据
-    market_cached = any(k.startswith(f"{market}:") for k in _stock_name_cache)
-    if market_cached:
-        return
 
-    print(f"正在建立{market}市场的合约名称缓存，请稍等...")
-    stocks = xtdata.get_stock_list_in_sector(market)
-    for stock in stocks:
-        # 获取合约详情信息
-        detail = xtdata.get_instrument_detail(stock)
-        if detail and 'InstrumentName' in detail:
-            name = detail['InstrumentName']
-            _stock_name_cache[f"{market}:{name}"] = stock
+@tool_registry.register(
+    name="get_sector_index_info",
+    description="获取本地板块索引的信息（板块数、代码数、构建时间、是否过期），可强制重建",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "rebuild": {
+                "type": "boolean",
+                "description": "是否立即重建板块索引",
+                "default": False
+            }
+        }
+    }
+)
+async def get_sector_index_info(rebuild: bool = False) -> Dict:
+    """
+    获取本地板块索引的信息
+    
+    Args:
+        rebuild: 是否立即重建板块索引，默认为False。索引在板块数据更新或超过有效期后会自动在后台重建
+        
+    Returns:
+        索引信息字典，包括板块数(sectors)、代码数(codes)、成员关系数(memberships)、
+        板块数据版本(data_version)、构建时间(built_at)、构建耗时(build_seconds)、
+        是否过期(stale)、是否正在后台重建(refreshing)
+    """
+    if rebuild:
+        sector_index.refresh(background=False)
+    return sector_index.stats()
+
 
 @tool_registry.register(
     name="get_stock_code_by_name",
-    description="根据合约名称获取合约代码，可传入推定存在于的市场的列表",
+    description="根据合约名称获取合约代码，支持名称前缀、拼音首字母和近似名称，返回按得分排序的候选，可传入推定存在于的市场的列表",
     input_schema={
         "type": "object", 
         "required": ["stock_name"],
@@ -233,44 +280,45 @@ def _build_stock_name_cache_for_market(market: str):
                 "items": {"type": "string"},
                 "description": "要搜索的市场列表，按优先级排序。如果为None，则按默认顺序搜索所有市场。例如['SZ', 'SH']表示只在深交所和上交所中搜索。",
                 "default": ["SZ", "SH", "BJ"]
+            },
+            "limit": {
+                "type": "integer",
+                "description": "最多返回的候选个数",
+                "default": 10
             }
         }
     }
 )
-async def get_stock_code_by_name(stock_name: str, markets: List[str] = None) -> str:
+async def get_stock_code_by_name(stock_name: str, markets: List[str] = None, limit: int = 10) -> Dict:
     """
     根据合约名称获取合约代码
     
     Args:
-        stock_name: 合约名称，如'比亚迪'
-        markets: 要搜索的市场列表，按优先级排序。如果为None，则按默认顺序搜索。
+        stock_name: 合约名称，如'比亚迪'。也可以是名称前缀、拼音首字母（如'BYD'）或近似名称
+        markets: 要搜索的市场列表，按优先级排序。如果为None，则搜索所有市场，同分时按默认市场顺序排列。
+        limit: 最多返回的候选个数，默认为10
         
     Returns:
-        合约代码，如'002594.SZ'。如果未找到则返回空字符串
+        包含以下字段的字典:
+        - code: 得分最高的候选合约代码，没有候选时为空字符串
+        - exact: 最高分候选是否为名称精确匹配
+        - candidates: 按得分降序排列的候选列表，每项包括 code / name / market / score / match，
+          match 为 exact / pinyin / prefix / pinyin_prefix / contains / fuzzy
         
     样例数据:
     >>> get_stock_code_by_name('比亚迪')
-    '002594.SZ'
+    {'code': '002594.SZ', 'exact': True,
+     'candidates': [{'code': '002594.SZ', 'name': '比亚迪', 'market': 'SZ', 'score': 1.0, 'match': 'exact'}]}
+    >>> get_stock_code_by_name('比亚')
+    {'code': '002594.SZ', 'exact': False,
+     'candidates': [{'code': '002594.SZ', 'name': '比亚迪', 'market': 'SZ', 'score': 0.8667, 'match': 'prefix'}]}
     """
-    if markets is None:
-        all_markets = [
-            'SH', 'SZ', 'BJ'
-            , 'BKZS'
-            , 'IF', 'SF', 'DF', 'ZF', 'GF', 'INE'
-            , 'SHO', 'SZO'
-            , 'HK', 'HGT', 'SGT'
-        ]
-        available_markets = set(xtdata.get_markets().keys())
-        markets = [m for m in all_markets if m in available_markets]
-        remaining = [m for m in available_markets if m not in all_markets]
-        markets.extend(remaining)
-        
-    # 按优先级尝试各个市场
-    for market in markets:
-        _build_stock_name_cache_for_market(market)
-        cache_key = f"{market}:{stock_name}"
-        if cache_key in _stock_name_cache:
-            return _stock_name_cache[cache_key]
-            
-    raise ValueError(f"未找到名称为'{stock_name}'的合约")
-
+    # 全市场名称索引首次使用时从磁盘加载，磁盘上没有时批量获取合约详情构建
+    candidates = name_index.search(stock_name, markets, limit)
+    if not candidates:
+        print(f"未找到名称为'{stock_name}'的合约，如为新上市或过期合约，可尝试调用 download_history_contracts() 后重试")
+    return {
+        "code": candidates[0]["code"] if candidates else "",
+        "exact": bool(candidates) and candidates[0]["match"] == "exact",
+        "candidates": candidates
+    }
@@ -1,5 +1,16 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from ..registry import tool_registry
+from ..progress import ProgressReporter
+from ..columnar import encode_columns, ENCODING_JSON, ENCODINGS
+from ..backtest import BENCHMARK_CODE, run_template_backtest
+from ..backtest_cache import backtest_cache, cache_key, data_version
+from ..costs import COST_COLUMNS, COST_PRESETS, CostModel, cost_summary
+from ..formula import FormulaError, FormulaSyntaxError, compile_signal
+from ..kline_cache import format_time
+from ..optimize import METHODS, METRICS, optimize_signal
+from ..panel import downsample_panel
+from ..walk_forward import run_walk_forward
+from .market_data import kline_version, load_kline
 import xtquant.xtdata as xtdata
 import pandas as pd
 import numpy as np
@@ -7,8 +18,8 @@ import numpy as np
 # 设置pandas显示所有列
 pd.set_option('display.max_columns', None)
 
-def process_backtest_result(df: pd.DataFrame) -> Dict[str, Any]:
-    """处理回测结果DataFrame，转换为可序列化的字典格式"""
+def summarize_backtest_result(df: pd.DataFrame) -> Dict[str, Any]:
+    """从回测结果DataFrame的最后一行提取最终结果和汇总指标"""
     
     # 获取最后一行数据（最终结果）
     final_result = df.iloc[-1].to_dict()
@@ -30,97 +41,118 @@ def process_backtest_result(df: pd.DataFrame) -> Dict[str, Any]:
         "交易次数": int(final_result.get("交易次数", 0)),
         "收益回撤比": float(final_result.get("收益回撤比", 0.0))
     }
-    
-    # 生成每日数据，添加默认值处理
-    daily_data = []
-    for idx, row in df.iterrows():
-        daily_record = {
-            "date": idx,
-            "timestamp": int(row.get("time", 0)),
-            "strategy_value": float(row.get("策略收益", 0.0)) if not pd.isna(row.get("策略收益")) else 0.0,
-            "holding_period": int(row.get("持仓周期", 0)) if not pd.isna(row.get("持仓周期")) else 0,
-            "holding_return": float(row.get("持仓收益", 0.0)) if not pd.isna(row.get("持仓收益")) else 0.0,
-            "drawdown": float(row.get("最近回撤", 0.0)) if not pd.isna(row.get("最近回撤")) else 0.0
-        }
-        daily_data.append(daily_record)
+    # 使用成本模型时，增加毛收益、净收益和成本明细
+    if all(name in df.columns for name in COST_COLUMNS):
+        summary.update(cost_summary(df))
     
     return {
         "summary": summary,
-        "final_result": final_result,
-        "daily_data": daily_data
+        "final_result": final_result
     }
 
-@tool_registry.register(
-    name="run_single_stock_backtest",
-    description="运行单个股票的策略回测",
-    input_schema={
-        "type": "object",
-        "required": ["stock_code", "signal"],
-        "properties": {
-            "stock_code": {
-                "type": "string",
-                "description": "股票代码，如'600050.SH'"
-            },
-            "signal": {
-                "type": "string",
-                "description": "策略信号代码，包含买卖条件的VBA代码"
-            },
-            "period": {
-                "type": "string",
-                "description": "K线周期",
-                "default": "1d"  # 默认周期为1天，也可以是 1m、5m
-            },
-            "start_time": {
-                "type": "string",
-                "description": "开始时间，格式如'20240101000000'",
-                "default": "20240101000000"
-            },
-            "end_time": {
-                "type": "string",
-                "description": "结束时间，格式如'20241231150000'",
-                "default": "20241231150000"
-            },
-            "count": {
-                "type": "integer",
-                "description": "数据条数，-1表示全部",
-                "default": -1
-            },
-            "dividend_type": {
-                "type": "string",
-                "description": "除权类型",
-                "default": "front_ratio"
-            }
-        }
-    }
-)
-async def run_single_stock_backtest(
-    stock_code: str,
-    signal: str,
-    period: str = "1d",  # 默认周期为1天，也可以是 1m、5m
-    start_time: str = "20240101000000",
-    end_time: str = "20241231150000",
-    count: int = -1,
-    dividend_type: str = "front_ratio"
-) -> Dict[str, Any]:
+# daily_data 中的字段 -> 回测结果列
+DAILY_FIELDS = {
+    "strategy_value": "策略收益",
+    "holding_period": "持仓周期",
+    "holding_return": "持仓收益",
+    "drawdown": "最近回撤"
+}
+
+# 使用成本模型时 daily_data 中增加的字段 -> 回测结果列
+COST_DAILY_FIELDS = {
+    "gross_value": "毛收益",
+    "net_value": "净收益"
+}
+
+# daily_data 的格式：columns 为 字段 -> 数组；rows 为每根K线一个字典
+DAILY_FORMATS = ("columns", "rows")
+
+def backtest_daily_columns(df: pd.DataFrame, max_points: int = 0) -> Dict[str, np.ndarray]:
+    """按列生成 daily_data，缺失值记为 0
+    
+    max_points 大于 0 且K线数超过它时，按K线顺序分桶降采样用于展示：
+    每个桶取最后一根K线，最近回撤取桶内最大值，使回撤的峰值不会被抹掉。
     """
-    运行单个股票的策略回测
+    n = len(df)
+
+    def column(name: str) -> np.ndarray:
+        if name not in df.columns:
+            return np.zeros(n)
+        return np.nan_to_num(df[name].to_numpy(dtype=np.float64, na_value=np.nan), nan=0.0)
+
+    columns = {
+        "date": df.index.astype(str).to_numpy(),
+        "timestamp": column("time").astype(np.int64)
+    }
+    for field, name in DAILY_FIELDS.items():
+        columns[field] = column(name)
+    for field, name in COST_DAILY_FIELDS.items():
+        if name in df.columns:
+            columns[field] = column(name)
+    columns["holding_period"] = columns["holding_period"].astype(np.int64)
+
+    if max_points > 0 and n > max_points:
+        starts = np.unique(np.linspace(0, n, max_points, endpoint=False).astype(np.int64))
+        ends = np.append(starts[1:], n) - 1
+        drawdown = np.maximum.reduceat(columns["drawdown"], starts)
+        columns = {field: values[ends] for field, values in columns.items()}
+        columns["drawdown"] = drawdown
+    return columns
+
+def backtest_daily_rows(columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """把列式 daily_data 转换为每根K线一个字典"""
+    fields = list(columns)
+    return [dict(zip(fields, values)) for values in zip(*(columns[field].tolist() for field in fields))]
+
+def process_backtest_result(df: pd.DataFrame, daily_format: str = "columns", max_points: int = 0) -> Dict[str, Any]:
+    """处理回测结果DataFrame，转换为可序列化的字典格式
     
     Args:
-        stock_code: 股票代码，如'600050.SH'
-        signal: 策略信号代码，包含买卖条件的VBA代码
-        period: K线周期，默认'1d'
-        start_time: 开始时间，默认'20240101000000'
-        end_time: 结束时间，默认'20241231150000'
-        count: 数据条数，默认-1表示全部
-        dividend_type: 除权类型，默认'front_ratio'
-    
-    Returns:
-        回测结果字典，包含:
-        - summary: 回测汇总指标
-        - final_result: 最后一天的完整结果
-        - daily_data: 每日回测数据
+        df: 回测结果
+        daily_format: daily_data 的格式，columns 为 字段 -> 数组，rows 为每根K线一个字典
+        max_points: daily_data 降采样后的最大点数，0 表示不降采样
     """
-    vba_template = f"""
+    if daily_format not in DAILY_FORMATS:
+        raise ValueError(f"不支持的 daily_format: {daily_format}，可选 {', '.join(DAILY_FORMATS)}")
+    summarized = summarize_backtest_result(df)
+    daily_data = backtest_daily_columns(df, max_points)
+    if daily_format == "rows":
+        daily_data = backtest_daily_rows(daily_data)
+    
+    return {
+        "summary": summarized["summary"],
+        "final_result": summarized["final_result"],
+        "daily_data": daily_data
+    }
+
+def daily_data_columns(result: Dict[str, Any]) -> Dict[str, List]:
+    """取回测结果中的 daily_data，两种格式统一为 字段 -> 列表"""
+    daily_data = result.get("daily_data") or {}
+    if isinstance(daily_data, dict):
+        return {field: list(values) for field, values in daily_data.items()}
+    fields = ["date", "timestamp", *DAILY_FIELDS]
+    return {field: [day.get(field, 0) for day in daily_data] for field in fields}
+
+def parse_daily_dates(dates: List[Any]) -> pd.DatetimeIndex:
+    """解析 daily_data 的日期：'YYYYMMDD'、'YYYYMMDDHHMMSS' 或 'YYYY-MM-DD'，无法解析的记为 NaT"""
+    text = pd.Series([str(date) for date in dates], dtype=object)
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    for size, fmt in ((8, "%Y%m%d"), (14, "%Y%m%d%H%M%S"), (10, "%Y-%m-%d")):
+        mask = text.str.len() == size
+        if mask.any():
+            parsed[mask] = pd.to_datetime(text[mask], format=fmt, errors="coerce")
+    return pd.DatetimeIndex(parsed)
+
+def backtest_result_columns(df: pd.DataFrame) -> Dict[str, Any]:
+    """把回测结果DataFrame转换为列式数据，date列为索引"""
+    columns = {"date": df.index.astype(str).to_numpy()}
+    for name in df.columns:
+        columns[str(name)] = df[name].to_numpy()
+    return columns
+
+def build_vba_template(signal: str) -> str:
+    """把信号代码嵌入回测模板，得到交给 get_vba_func_result 执行的完整公式"""
+    return f"""
 VARIABLE:cj1=0,hszhishu:=0,BBD=0,zhishu=0,tmp=0,tmpshort=0,buypoint=0,sellpoint=0,profit=0,TestHolding=0,maxzhishu=0,huiche=0,maxhuiche=0,DCS=0,maxprofit=0,maxDhuiche=0,Dhuiche=0,maxshortprofit=0, hs300bp=0,hstmp=0,TMPzhishu=0,hs300bp=0;
 
 回测板块 : '沪深300';
@@ -196,21 +228,303 @@ ttttt:=TestHolding,LINETHICK0;
 胜率:count(指数>ref(指数,1),0)/DCS,LINETHICK0;
 """
 
+def load_backtest_bars(
+    stock_code: str,
+    signal: str,
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    count: int = -1,
+    dividend_type: str = "front_ratio",
+    with_costs: bool = False
+) -> Tuple[Dict[str, np.ndarray], Optional[Dict[str, np.ndarray]]]:
+    """通过本地K线缓存读取本地回测所需的股票K线和同期的沪深300K线（获取失败时为 None）
+    
+    with_costs 为 True 时同时读取成本模型判断涨跌停和停牌所需的 preClose、suspendFlag、volume
+    
+    Raises:
+        FormulaError: 信号无法在本地编译
+    """
+    fields = compile_signal(signal).fields | {"time", "close"}
+    if with_costs:
+        fields |= {"preClose", "suspendFlag", "volume"}
+    fields = sorted(fields)
+    bars = load_kline(stock_code, fields, period, start_time, end_time, count, dividend_type)
+    benchmark = None
+    if len(bars["time"]):
+        # 基准取与股票相同的时间范围，对应模板中的 callstock('sh000300',vtclose,-1,0)
+        try:
+            benchmark = load_kline(BENCHMARK_CODE, ["time", "close"], period,
+                                   format_time(int(bars["time"][0])), format_time(int(bars["time"][-1])),
+                                   -1, dividend_type)
+        except Exception as e:
+            print(f"获取基准 {BENCHMARK_CODE} 失败，不计算对应指数: {e}")
+    return bars, benchmark
+
+def local_backtest(
+    stock_code: str,
+    signal: str,
+    period: str = "1d",
+    start_time: str = "",
+    end_time: str = "",
+    count: int = -1,
+    dividend_type: str = "front_ratio"
+) -> pd.DataFrame:
+    """在本地缓存的K线上运行回测模板，结果格式与 get_vba_func_result 相同
+    
+    Raises:
+        FormulaError: 信号无法在本地计算
+        ValueError: 区间内没有K线
+    """
+    bars, benchmark = load_backtest_bars(stock_code, signal, period, start_time, end_time, count, dividend_type)
+    if not len(bars["time"]):
+        raise ValueError(f"{stock_code} 在 {start_time} - {end_time} 区间内没有K线")
+    return run_template_backtest(signal, bars, period, benchmark=benchmark)
+
+def vba_data_version(stock_code: str, period: str, start_time: str, end_time: str, count: int,
+                     dividend_type: str) -> Optional[str]:
+    """get_vba_func_result 回测的数据版本：股票和基准在本地K线缓存中的序列版本（见 KlineCache.version），
+    刷新缓存但不读取K线，K线追加或除权后版本随之变化。股票没有K线或读取失败时返回 None（不使用缓存）"""
     try:
-        # 获取回测结果
-        result = xtdata.get_vba_func_result(
-            [vba_template],
-            stock_code,
-            period,
-            start_time,
-            end_time,
-            count,
-            dividend_type
-        )
+        version = kline_version(stock_code, period, start_time, end_time, count, dividend_type)
+    except Exception as e:
+        print(f"读取 {stock_code} K线失败，不使用回测缓存: {e}")
+        return None
+    if version is None:
+        return None
+    try:
+        benchmark = kline_version(BENCHMARK_CODE, period, start_time, end_time, count, dividend_type)
+    except Exception as e:
+        print(f"获取基准 {BENCHMARK_CODE} 失败，不计算对应指数: {e}")
+        benchmark = None
+    return f"{version}|{benchmark or '-'}"
+
+@tool_registry.register(
+    name="run_single_stock_backtest",
+    description="运行单个股票的策略回测",
+    input_schema={
+        "type": "object",
+        "required": ["stock_code", "signal"],
+        "properties": {
+            "stock_code": {
+                "type": "string",
+                "description": "股票代码，如'600050.SH'"
+            },
+            "signal": {
+                "type": "string",
+                "description": "策略信号代码，包含买卖条件的VBA代码"
+            },
+            "period": {
+                "type": "string",
+                "description": "K线周期",
+                "default": "1d"  # 默认周期为1天，也可以是 1m、5m
+            },
+            "start_time": {
+                "type": "string",
+                "description": "开始时间，格式如'20240101000000'",
+                "default": "20240101000000"
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间，格式如'20241231150000'",
+                "default": "20241231150000"
+            },
+            "count": {
+                "type": "integer",
+                "description": "数据条数，-1表示全部",
+                "default": -1
+            },
+            "dividend_type": {
+                "type": "string",
+                "description": "除权类型",
+                "default": "front_ratio"
+            },
+            "encoding": {
+                "type": "string",
+                "enum": list(ENCODINGS),
+                "description": "结果编码：json(默认)；npy/arrow 返回逐K线回测结果的列式二进制编码",
+                "default": "json"
+            },
+            "output_dir": {
+                "type": "string",
+                "description": "二进制编码的输出目录，提供时写入文件并返回路径（可内存映射加载），否则以base64资源返回",
+                "default": ""
+            },
+            "engine": {
+                "type": "string",
+                "enum": ["auto", "local", "vba"],
+                "description": "回测引擎：vba(默认) 交给 get_vba_func_result；local 在本地K线上计算；auto 优先本地，信号无法本地计算时使用 vba",
+                "default": "vba"
+            },
+            "daily_format": {
+                "type": "string",
+                "enum": list(DAILY_FORMATS),
+                "description": "daily_data的格式：columns(默认) 为 字段->数组；rows 为每根K线一个字典（旧格式）",
+                "default": "columns"
+            },
+            "max_points": {
+                "type": "integer",
+                "description": "daily_data降采样后的最大点数，用于展示，0表示不降采样",
+                "default": 0
+            },
+            "use_cache": {
+                "type": "boolean",
+                "description": "是否使用回测结果缓存：信号、代码、周期、区间、除权方式和K线数据都相同时直接返回上次的结果",
+                "default": True
+            },
+            "cost_model": {
+                "type": ["string", "object", "null"],
+                "description": f"交易成本模型（仅本地引擎）：预设名 {'/'.join(COST_PRESETS)}，或参数字典（preset 指定基础预设，"
+                               "可覆盖 commission_rate、min_commission、stamp_duty、transfer_fee、slippage、slippage_rate、"
+                               "lot_size、limit_ratio、t_plus_one）；提供时汇总指标增加毛收益率、净收益率和成本明细",
+                "default": None
+            }
+        }
+    }
+)
+async def run_single_stock_backtest(
+    stock_code: str,
+    signal: str,
+    period: str = "1d",  # 默认周期为1天，也可以是 1m、5m
+    start_time: str = "20240101000000",
+    end_time: str = "20241231150000",
+    count: int = -1,
+    dividend_type: str = "front_ratio",
+    encoding: str = "json",
+    output_dir: str = "",
+    engine: str = "vba",
+    daily_format: str = "columns",
+    max_points: int = 0,
+    use_cache: bool = True,
+    cost_model: Any = None
+) -> Dict[str, Any]:
+    """
+    运行单个股票的策略回测
+    
+    Args:
+        stock_code: 股票代码，如'600050.SH'
+        signal: 策略信号代码，包含买卖条件的VBA代码
+        period: K线周期，默认'1d'
+        start_time: 开始时间，默认'20240101000000'
+        end_time: 结束时间，默认'20241231150000'
+        count: 数据条数，默认-1表示全部
+        dividend_type: 除权类型，默认'front_ratio'
+        encoding: 结果编码，默认'json'；'npy'/'arrow' 返回逐K线回测结果的列式二进制编码，
+            汇总指标和回测参数放在元数据中
+        output_dir: 二进制编码的输出目录，为空时以base64 EmbeddedResource返回
+        engine: 回测引擎，默认'vba'
+            - vba: 把模板交给 get_vba_func_result 执行
+            - local: 在本地缓存的K线上用 NumPy 复现模板（见 backtest 模块），不调用 get_vba_func_result
+            - auto: 优先 local，信号中有本地不支持的函数或语法时使用 vba
+            录制的 get_vba_func_result 夹具（benchmarks/fixtures/backtest）校验通过前，默认仍使用 vba
+            任何引擎下，结构错误的信号（括号不配对、缺少操作数、参数声明错误等）都直接返回错误
+        daily_format: daily_data 的格式，默认'columns'
+            - columns: {date, timestamp, strategy_value, holding_period, holding_return, drawdown} 各为一列
+            - rows: 每根K线一个字典，字段同上
+        max_points: daily_data 降采样后的最大点数，默认0（不降采样）
+        use_cache: 是否使用回测结果缓存，默认True。缓存键包含规范化的信号文本、回测参数、引擎和
+            回测所用K线内容的哈希（见 backtest_cache 模块；get_vba_func_result 的结果取K线缓存中的序列版本，
+            不读取K线），K线更新或除权后不会命中旧结果
+        cost_model: 交易成本模型，默认None（只计算模板的固定手续费）。预设名或参数字典，见 costs 模块：
+            按整手成交，计入佣金（含最低佣金）、卖出印花税、过户费和滑点，涨跌停、停牌的K线不能成交，
+            委托顺延到下一根可成交的K线。仅本地引擎支持（engine 为 local 或 auto），使用 vba 计算时忽略
+    
+    Returns:
+        回测结果字典，包含:
+        - summary: 回测汇总指标
+        - final_result: 最后一天的完整结果
+        - daily_data: 每日回测数据；使用成本模型时增加 gross_value（毛收益）和 net_value（净收益）
+        - cached: 结果是否来自回测结果缓存
+    """
+    vba_template = build_vba_template(signal)
+
+    try:
+        # 结构错误（括号不配对、缺少操作数等）的信号 get_vba_func_result 同样无法执行，不读取数据直接报错；
+        # 编译结果有缓存，本地计算时不会重复编译
+        try:
+            compile_signal(signal)
+        except FormulaSyntaxError:
+            raise
+        except FormulaError:
+            pass
+
+        # 获取回测结果：优先在本地K线上计算，参数和K线都相同时取缓存的结果
+        result = None
+        cached = False
+        used_engine = "vba"
+        model = CostModel.from_spec(cost_model)
+        if engine != "vba":
+            try:
+                bars, benchmark = load_backtest_bars(
+                    stock_code, signal, period, start_time, end_time, count, dividend_type, model is not None
+                )
+                if not len(bars["time"]):
+                    raise ValueError(f"{stock_code} 在 {start_time} - {end_time} 区间内没有K线")
+                key = cache_key(signal, stock_code, period, start_time, end_time, count, dividend_type,
+                                "local", data_version(bars, benchmark), model.key() if model else "")
+                result = backtest_cache.get(key) if use_cache else None
+                cached = result is not None
+                if result is None:
+                    result = run_template_backtest(signal, bars, period, benchmark=benchmark, cost_model=model,
+                                                   stock_code=stock_code)
+                    if use_cache:
+                        backtest_cache.put(key, result)
+                used_engine = "local"
+            except FormulaError as e:
+                if engine == "local":
+                    raise
+                print(f"信号无法在本地计算，改用 get_vba_func_result: {e}")
+                if model is not None:
+                    print("get_vba_func_result 不支持成本模型，忽略 cost_model")
+        elif model is not None:
+            print("get_vba_func_result 不支持成本模型，忽略 cost_model（需要 engine 为 local 或 auto）")
+        if result is None:
+            key = None
+            if use_cache:
+                version = vba_data_version(stock_code, period, start_time, end_time, count, dividend_type)
+                if version is not None:
+                    key = cache_key(signal, stock_code, period, start_time, end_time, count, dividend_type,
+                                    "vba", version)
+                    result = backtest_cache.get(key)
+                    cached = result is not None
+            if result is None:
+                result = xtdata.get_vba_func_result(
+                    [vba_template],
+                    stock_code,
+                    period,
+                    start_time,
+                    end_time,
+                    count,
+                    dividend_type
+                )
+                if key is not None:
+                    backtest_cache.put(key, result)
+        
+        # 回测参数信息
+        parameters = {
+            "stock_code": stock_code,
+            "period": period,
+            "start_time": start_time,
+            "end_time": end_time,
+            "count": count,
+            "dividend_type": dividend_type,
+            "engine": used_engine,
+            "cost_model": model.to_dict() if model is not None and used_engine == "local" else None
+        }
+        
+        # 请求二进制编码时，直接输出列式结果
+        if isinstance(result, pd.DataFrame) and encoding != ENCODING_JSON:
+            return encode_columns(
+                backtest_result_columns(result),
+                encoding,
+                name=f"backtest_{stock_code}_{period}_{start_time[:8]}_{end_time[:8]}",
+                output_dir=output_dir,
+                meta={**summarize_backtest_result(result), "parameters": parameters, "cached": cached}
+            )
         
         # 如果结果是DataFrame，处理它
         if isinstance(result, pd.DataFrame):
-            processed_result = process_backtest_result(result)
+            processed_result = process_backtest_result(result, daily_format, max_points)
         else:
             # 如果不是DataFrame，可能是其他格式的结果
             processed_result = {
@@ -219,14 +533,8 @@ ttttt:=TestHolding,LINETHICK0;
             }
             
         # 添加回测参数信息
-        processed_result["parameters"] = {
-            "stock_code": stock_code,
-            "period": period,
-            "start_time": start_time,
-            "end_time": end_time,
-            "count": count,
-            "dividend_type": dividend_type
-        }
+        processed_result["parameters"] = parameters
+        processed_result["cached"] = cached
         
         return processed_result
         
@@ -241,6 +549,399 @@ ttttt:=TestHolding,LINETHICK0;
             }
         }
 
+@tool_registry.register(
+    name="get_backtest_cache_stats",
+    description="获取回测结果缓存的统计信息（命中次数、命中率、内存/磁盘占用和淘汰次数）",
+    input_schema={
+        "type": "object",
+        "properties": {}
+    },
+    execution="inline"
+)
+async def get_backtest_cache_stats() -> Dict:
+    """
+    获取回测结果缓存的统计信息
+    
+    Returns:
+        统计信息字典，包括:
+        - requests: 查询次数
+        - memory_hits / disk_hits / misses: 内存命中 / 磁盘命中 / 未命中次数
+        - hit_ratio: 命中率（内存和磁盘命中合计）
+        - stores: 保存的结果数
+        - evictions / disk_evictions: 内存层 / 磁盘层因超过大小上限淘汰的结果数
+        - memory_entries / memory_bytes / max_memory_bytes: 内存层结果数 / 占用字节数估计 / 上限
+        - disk_entries / disk_bytes / max_disk_bytes: 磁盘层结果数 / 占用字节数 / 上限（0 表示不使用磁盘层）
+    """
+    return backtest_cache.stats()
+
+@tool_registry.register(
+    name="clear_backtest_cache",
+    description="清空回测结果缓存（内存和磁盘）",
+    input_schema={
+        "type": "object",
+        "properties": {}
+    }
+)
+async def clear_backtest_cache() -> Dict:
+    """
+    清空回测结果缓存
+    
+    Returns:
+        包含删除的内存结果数和磁盘结果数的字典
+    """
+    return backtest_cache.clear()
+
+@tool_registry.register(
+    name="optimize_signal_params",
+    description="展开信号中input声明的参数范围，在本地K线上并行回测全部（或抽样的）参数组合，返回按指标排序的结果和热力图数据",
+    input_schema={
+        "type": "object",
+        "required": ["stock_code", "signal"],
+        "properties": {
+            "stock_code": {
+                "type": "string",
+                "description": "股票代码，如'600050.SH'"
+            },
+            "signal": {
+                "type": "string",
+                "description": "包含bk/bp和input参数的信号公式，如create_ma_cross_signal的返回值"
+            },
+            "period": {
+                "type": "string",
+                "description": "K线周期",
+                "default": "1d"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "开始时间，格式如'20240101000000'",
+                "default": "20240101000000"
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间，格式如'20241231150000'",
+                "default": "20241231150000"
+            },
+            "count": {
+                "type": "integer",
+                "description": "数据条数，-1表示全部",
+                "default": -1
+            },
+            "dividend_type": {
+                "type": "string",
+                "description": "除权类型",
+                "default": "front_ratio"
+            },
+            "ranges": {
+                "type": "object",
+                "description": "覆盖参数范围，如{'N1': [5, 30, 5], 'N2': 60}，列表为[最小值, 最大值, 步长]，数字为固定值；默认取input声明的范围",
+                "default": {}
+            },
+            "constraint": {
+                "type": "string",
+                "description": "参数约束条件，公式语法，如'N1<N2'，不满足的组合不评估",
+                "default": ""
+            },
+            "metric": {
+                "type": "string",
+                "enum": list(METRICS),
+                "description": "排序指标，最大回撤越小越好，其余越大越好",
+                "default": "收益回撤比"
+            },
+            "method": {
+                "type": "string",
+                "enum": list(METHODS),
+                "description": "grid 评估全部组合；random 随机抽取samples组；bayes 用TPE按已有结果序贯抽取samples组",
+                "default": "grid"
+            },
+            "samples": {
+                "type": "integer",
+                "description": "random/bayes 评估的组合数",
+                "default": 200
+            },
+            "prune_keep": {
+                "type": "number",
+                "description": "大于0时先在前一半K线上评估全部组合，只保留该比例（如0.2）做完整评估；用于grid/random",
+                "default": 0.0
+            },
+            "min_trades": {
+                "type": "integer",
+                "description": "交易次数少于此值的组合不参与排名",
+                "default": 0
+            },
+            "top": {
+                "type": "integer",
+                "description": "返回排名前几的组合",
+                "default": 20
+            },
+            "heatmap": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "热力图的两个参数，默认取前两个参数",
+                "default": []
+            },
+            "seed": {
+                "type": "integer",
+                "description": "抽样的随机种子",
+                "default": 0
+            }
+        }
+    },
+    progress=True
+)
+async def optimize_signal_params(
+    stock_code: str,
+    signal: str,
+    period: str = "1d",
+    start_time: str = "20240101000000",
+    end_time: str = "20241231150000",
+    count: int = -1,
+    dividend_type: str = "front_ratio",
+    ranges: Dict[str, Any] = None,
+    constraint: str = "",
+    metric: str = "收益回撤比",
+    method: str = "grid",
+    samples: int = 200,
+    prune_keep: float = 0.0,
+    min_trades: int = 0,
+    top: int = 20,
+    heatmap: List[str] = None,
+    seed: int = 0,
+    progress: Optional[ProgressReporter] = None
+) -> Dict[str, Any]:
+    """
+    信号参数寻优
+    
+    K线只读取一次（经过本地K线缓存），放进共享内存后由 cpu 进程池分批评估各组参数，
+    每组参数运行与 run_single_stock_backtest 本地引擎相同的回测模板，实现见 optimize 模块。
+    
+    Args:
+        stock_code: 股票代码
+        signal: 信号公式
+        period / start_time / end_time / count / dividend_type: 同 run_single_stock_backtest
+        ranges: 覆盖参数范围
+        constraint: 参数约束条件
+        metric: 排序指标
+        method: 寻优方式
+        samples: random/bayes 评估的组合数
+        prune_keep: 剪枝保留比例
+        min_trades: 参与排名的最少交易次数
+        top: 返回排名前几的组合
+        heatmap: 热力图的两个参数
+        seed: 随机种子
+        progress: 进度回调，由服务器注入，客户端提供 progressToken 时发送进度通知
+    
+    Returns:
+        寻优结果字典，包含:
+        - best / top: 最优组合和排名前列的组合，每行为 参数 + summary 指标（总收益率、最大回撤、胜率、交易次数、收益回撤比）
+        - heatmap: {x, y, x_values, y_values, z}，z[i][j] 为 y=y_values[i]、x=x_values[j] 时其余参数中最好的指标值
+        - combinations / candidates / evaluated / pruned / failed / ranked: 组合数统计
+        - errors: 评估失败的前几组参数和错误信息
+        - parameters: 回测参数
+    """
+    fields = sorted(compile_signal(signal).fields | {"time", "close"})
+    bars = load_kline(stock_code, fields, period, start_time, end_time, count, dividend_type)
+    result = optimize_signal(
+        signal, bars, ranges, constraint, metric, method, samples, prune_keep, min_trades, seed, top,
+        heatmap, progress
+    )
+    result["parameters"] = {
+        "stock_code": stock_code,
+        "period": period,
+        "start_time": start_time,
+        "end_time": end_time,
+        "count": count,
+        "dividend_type": dividend_type,
+        "bars": len(bars["time"])
+    }
+    return result
+
+@tool_registry.register(
+    name="run_walk_forward_backtest",
+    description="滚动窗口样本外回测：把时间范围切成连续的训练/测试窗口，每个窗口在训练段上寻优参数、在随后的测试段上回测，拼接样本外收益曲线并返回各窗口的汇总指标",
+    input_schema={
+        "type": "object",
+        "required": ["stock_code", "signal"],
+        "properties": {
+            "stock_code": {
+                "type": "string",
+                "description": "股票代码，如'600050.SH'"
+            },
+            "signal": {
+                "type": "string",
+                "description": "包含bk/bp和input参数的信号公式，如create_ma_cross_signal的返回值"
+            },
+            "period": {
+                "type": "string",
+                "description": "K线周期",
+                "default": "1d"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "开始时间，格式如'20200101000000'",
+                "default": "20200101000000"
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间，格式如'20241231150000'",
+                "default": "20241231150000"
+            },
+            "count": {
+                "type": "integer",
+                "description": "数据条数，-1表示全部",
+                "default": -1
+            },
+            "dividend_type": {
+                "type": "string",
+                "description": "除权类型",
+                "default": "front_ratio"
+            },
+            "train_bars": {
+                "type": "integer",
+                "description": "训练段K线数（anchored时为第一个训练段的长度）",
+                "default": 500
+            },
+            "test_bars": {
+                "type": "integer",
+                "description": "测试段K线数，测试段首尾相接",
+                "default": 120
+            },
+            "anchored": {
+                "type": "boolean",
+                "description": "为true时训练段总是从第一根K线开始（扩展窗口），否则训练段长度固定并随窗口平移",
+                "default": False
+            },
+            "ranges": {
+                "type": "object",
+                "description": "覆盖参数范围，同optimize_signal_params",
+                "default": {}
+            },
+            "constraint": {
+                "type": "string",
+                "description": "参数约束条件，如'N1<N2'",
+                "default": ""
+            },
+            "metric": {
+                "type": "string",
+                "enum": list(METRICS),
+                "description": "训练段上选择参数的指标",
+                "default": "收益回撤比"
+            },
+            "method": {
+                "type": "string",
+                "enum": list(METHODS),
+                "description": "训练段上的寻优方式",
+                "default": "grid"
+            },
+            "samples": {
+                "type": "integer",
+                "description": "random/bayes 评估的组合数",
+                "default": 200
+            },
+            "min_trades": {
+                "type": "integer",
+                "description": "训练段上交易次数少于此值的组合不参与选择；没有满足条件的组合时该窗口使用默认参数",
+                "default": 0
+            },
+            "seed": {
+                "type": "integer",
+                "description": "抽样的随机种子",
+                "default": 0
+            },
+            "max_points": {
+                "type": "integer",
+                "description": "样本外收益曲线降采样后的最大点数，0表示不降采样",
+                "default": 0
+            }
+        }
+    },
+    progress=True
+)
+async def run_walk_forward_backtest(
+    stock_code: str,
+    signal: str,
+    period: str = "1d",
+    start_time: str = "20200101000000",
+    end_time: str = "20241231150000",
+    count: int = -1,
+    dividend_type: str = "front_ratio",
+    train_bars: int = 500,
+    test_bars: int = 120,
+    anchored: bool = False,
+    ranges: Dict[str, Any] = None,
+    constraint: str = "",
+    metric: str = "收益回撤比",
+    method: str = "grid",
+    samples: int = 200,
+    min_trades: int = 0,
+    seed: int = 0,
+    max_points: int = 0,
+    progress: Optional[ProgressReporter] = None
+) -> Dict[str, Any]:
+    """
+    滚动窗口样本外回测
+    
+    run_backtest 只在一个固定区间上回测，得到的是样本内指标。这里K线只读取一次（经过本地K线缓存），
+    各窗口在训练段上用 optimize_signal 寻优，窗口之间并行；最优参数在测试段上运行与本地引擎相同的回测模板，
+    实现见 walk_forward 模块。
+    
+    Args:
+        stock_code: 股票代码
+        signal: 信号公式
+        period / start_time / end_time / count / dividend_type: 同 run_single_stock_backtest
+        train_bars: 训练段K线数
+        test_bars: 测试段K线数
+        anchored: 是否锚定训练段起点
+        ranges / constraint / metric / method / samples / min_trades / seed: 训练段寻优参数，同 optimize_signal_params
+        max_points: 样本外收益曲线降采样后的最大点数
+        progress: 进度回调，由服务器注入，客户端提供 progressToken 时发送进度通知
+    
+    Returns:
+        回测结果字典，包含:
+        - summary: 拼接后样本外的汇总指标，与 process_backtest_result 的 summary 相同
+        - windows: 每个窗口的训练/测试起止时间、选出的参数、train_summary 和 test_summary（同 summary 格式）
+        - efficiency: 样本外每根K线平均收益 / 训练段每根K线平均收益，训练段收益不为正时为 None
+        - curve: {time, 策略收益, window}，样本外累计收益和所属窗口
+        - parameters: 回测参数
+    """
+    fields = sorted(compile_signal(signal).fields | {"time", "close"})
+    bars = load_kline(stock_code, fields, period, start_time, end_time, count, dividend_type)
+    optimize = {
+        "ranges": ranges,
+        "constraint": constraint,
+        "metric": metric,
+        "method": method,
+        "samples": samples,
+        "min_trades": min_trades,
+        "seed": seed
+    }
+    result = run_walk_forward(signal, bars, train_bars, test_bars, anchored, period, optimize, progress)
+
+    curve = result["curve"]
+    time_axis, values = downsample_panel(
+        curve["time"], {name: np.asarray(curve[name], dtype=np.float64)[None, :] for name in ("策略收益", "window")},
+        max_points
+    )
+    result["curve"] = {
+        "time": time_axis.tolist(),
+        "策略收益": values["策略收益"][0].tolist(),
+        "window": values["window"][0].astype(int).tolist()
+    }
+    result["parameters"] = {
+        "stock_code": stock_code,
+        "period": period,
+        "start_time": start_time,
+        "end_time": end_time,
+        "count": count,
+        "dividend_type": dividend_type,
+        "train_bars": train_bars,
+        "test_bars": test_bars,
+        "anchored": anchored,
+        "metric": metric,
+        "method": method,
+        "bars": len(bars["time"])
+    }
+    return result
+
 def visualize_backtest_result(result: Dict[str, Any]) -> Dict[str, Any]:
     """
     将回测结果可视化，生成图表展示回测表现
@@ -258,7 +959,6 @@ def visualize_backtest_result(result: Dict[str, Any]) -> Dict[str, Any]:
         import base64
         import tempfile
         import os
-        from datetime import datetime
         
         # 配置中文字体
         plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans', 'Arial Unicode MS']  # 用来正常显示中文
@@ -269,34 +969,17 @@ def visualize_backtest_result(result: Dict[str, Any]) -> Dict[str, Any]:
             return result
         
         # 提取数据
-        daily_data = result.get("daily_data", [])
-        if not daily_data:
+        daily = daily_data_columns(result)
+        if not daily.get("date"):
             return {**result, "visual_data": {"error": "没有足够的数据生成图表"}}
         
-        # 转换数据格式
-        dates = []
-        strategy_values = []
-        drawdowns = []
-        holdings = []
-        
-        for day in daily_data:
-            date_str = day.get("date")
-            try:
-                # 尝试解析日期
-                if isinstance(date_str, str):
-                    if len(date_str) == 8:  # 格式如 "20240101"
-                        date = datetime.strptime(date_str, "%Y%m%d")
-                    else:
-                        date = datetime.strptime(date_str, "%Y-%m-%d")
-                else:
-                    date = date_str  # 如果已经是日期类型
-                
-                dates.append(date)
-                strategy_values.append(day.get("strategy_value", 0))
-                drawdowns.append(day.get("drawdown", 0))
-                holdings.append(day.get("holding_period", 0) > 0)  # 是否持仓
-            except Exception:
-                continue
+        # 转换数据格式：按日期字符串长度整列解析，无法解析的K线跳过
+        dates = parse_daily_dates(daily["date"])
+        valid = ~pd.isna(dates)
+        dates = list(dates[valid].to_pydatetime())
+        strategy_values = list(np.asarray(daily["strategy_value"])[valid])
+        drawdowns = list(np.asarray(daily["drawdown"])[valid])
+        holdings = list(np.asarray(daily["holding_period"])[valid] > 0)  # 是否持仓
         
         if not dates:
             return {**result, "visual_data": {"error": "日期格式转换错误"}}
@@ -848,6 +1531,22 @@ def _open_file(file_path: str, silent: bool = False) -> bool:
                 "type": "boolean",
                 "description": "是否自动打开生成的文件",
                 "default": True
+            },
+            "max_points": {
+                "type": "integer",
+                "description": "图表和返回数据中逐K线曲线降采样后的最大点数，0表示不降采样；分钟级长区间回测建议设置，如5000",
+                "default": 0
+            },
+            "cost_model": {
+                "type": ["string", "object", "null"],
+                "description": "交易成本模型，同 run_single_stock_backtest 的 cost_model",
+                "default": None
+            },
+            "engine": {
+                "type": "string",
+                "enum": ["auto", "local", "vba"],
+                "description": "回测引擎，同 run_single_stock_backtest 的 engine",
+                "default": "vba"
             }
         }
     }
@@ -862,7 +1561,10 @@ async def run_backtest(
     dividend_type: str = "front_ratio",
     output_type: str = "interactive",
     save_path: str = "",
-    auto_open: bool = True
+    auto_open: bool = True,
+    max_points: int = 0,
+    cost_model: Any = None,
+    engine: str = "vba"
 ) -> Dict[str, Any]:
     """
     运行股票回测，并根据指定方式展示结果
@@ -878,6 +1580,9 @@ async def run_backtest(
         output_type: 输出类型，'interactive'(交互式HTML),'static'(静态图片),'data'(仅数据)
         save_path: 保存文件的目录，不提供则使用临时目录
         auto_open: 是否自动打开生成的文件
+        max_points: 逐K线曲线降采样后的最大点数，默认0（不降采样）
+        cost_model: 交易成本模型，默认None，同 run_single_stock_backtest
+        engine: 回测引擎，默认'vba'，同 run_single_stock_backtest
         
     Returns:
         回测结果字典
@@ -900,7 +1605,10 @@ async def run_backtest(
             start_time=start_time,
             end_time=end_time,
             count=count,
-            dividend_type=dividend_type
+            dividend_type=dividend_type,
+            max_points=max_points,
+            cost_model=cost_model,
+            engine=engine
         )
         
         if "error" in result:
@@ -1036,33 +1744,20 @@ def create_interactive_html_chart(result: Dict[str, Any], include_plotly: bool =
         包含HTML的字典
     """
     try:
-        if "daily_data" not in result or not result["daily_data"]:
+        daily = daily_data_columns(result)
+        if not daily.get("date"):
             return {**result, "error": "缺少数据无法创建交互式图表"}
         
         import json
-        from datetime import datetime
-        
-        # 提取数据
-        daily_data = result["daily_data"]
         
         # 准备JSON数据
         chart_data = {
-            "dates": [],
-            "strategy_values": [],
-            "drawdowns": [],
-            "holdings": []
+            "dates": [str(date) for date in daily["date"]],
+            "strategy_values": np.asarray(daily["strategy_value"], dtype=np.float64).tolist(),
+            "drawdowns": np.asarray(daily["drawdown"], dtype=np.float64).tolist(),
+            "holdings": (np.asarray(daily["holding_period"]) > 0).tolist()
         }
         
-        for day in daily_data:
-            date_str = day.get("date")
-            if isinstance(date_str, datetime):
-                date_str = date_str.strftime("%Y-%m-%d")
-            
-            chart_data["dates"].append(date_str)
-            chart_data["strategy_values"].append(day.get("strategy_value", 0))
-            chart_data["drawdowns"].append(day.get("drawdown", 0))
-            chart_data["holdings"].append(day.get("holding_period", 0) > 0)
-        
         # 准备汇总数据
         summary = result.get("summary", {})
         params = result.get("parameters", {})
@@ -0,0 +1,162 @@
+from typing import Dict, Any, Optional
+from ..registry import tool_registry
+from ..progress import ProgressReporter
+from ..backtest import TEMPLATE_FEE, time_labels
+from ..panel import downsample_panel
+from ..tick_replay import TICK_FIELDS, run_tick_backtest
+from .market_data import load_kline
+import xtquant.xtdata as xtdata
+import numpy as np
+
+
+def load_ticks(stock_code: str, start_time: str, end_time: str, count: int = -1,
+               download: bool = True) -> Dict[str, np.ndarray]:
+    """通过本地K线缓存读取分笔数据；本地没有数据且 download 为 True 时先下载该区间的分笔再读取"""
+    ticks = load_kline(stock_code, TICK_FIELDS, "tick", start_time, end_time, count, "none")
+    if len(ticks.get("time", ())) == 0 and download:
+        print(f"本地没有 {stock_code} 的分笔数据，下载 {start_time} - {end_time}")
+        xtdata.download_history_data(stock_code, "tick", start_time, end_time)
+        ticks = load_kline(stock_code, TICK_FIELDS, "tick", start_time, end_time, count, "none")
+    return ticks
+
+
+@tool_registry.register(
+    name="run_tick_backtest",
+    description="在分笔数据上回放信号，按卖一价买入、买一价卖出撮合（涨跌停无对手盘时顺延），返回收益曲线、逐笔交易和按最新价成交的对照",
+    input_schema={
+        "type": "object",
+        "required": ["stock_code", "signal"],
+        "properties": {
+            "stock_code": {
+                "type": "string",
+                "description": "股票代码，如'600050.SH'"
+            },
+            "signal": {
+                "type": "string",
+                "description": "包含bk/bp的信号公式，C为最新价，V/AMO为两笔之间的成交量/成交额，MA(C,N)等按分笔计算"
+            },
+            "start_time": {
+                "type": "string",
+                "description": "开始时间，格式如'20240101093000'",
+                "default": "20240101093000"
+            },
+            "end_time": {
+                "type": "string",
+                "description": "结束时间，格式如'20241231150000'",
+                "default": "20241231150000"
+            },
+            "count": {
+                "type": "integer",
+                "description": "分笔条数，-1表示区间内全部",
+                "default": -1
+            },
+            "params": {
+                "type": "object",
+                "description": "覆盖信号中input参数的默认值",
+                "default": {}
+            },
+            "delay": {
+                "type": "integer",
+                "description": "信号发出后第几笔快照开始撮合，0表示按发出信号那一笔的盘口成交",
+                "default": 1
+            },
+            "fee": {
+                "type": "number",
+                "description": "每笔交易（买入+卖出）扣除的手续费率",
+                "default": TEMPLATE_FEE
+            },
+            "download": {
+                "type": "boolean",
+                "description": "本地没有分笔数据时是否先调用download_history_data下载",
+                "default": True
+            },
+            "max_points": {
+                "type": "integer",
+                "description": "收益曲线降采样后的最大点数，0表示不降采样",
+                "default": 5000
+            }
+        }
+    },
+    progress=True
+)
+async def run_tick_backtest_tool(
+    stock_code: str,
+    signal: str,
+    start_time: str = "20240101093000",
+    end_time: str = "20241231150000",
+    count: int = -1,
+    params: Dict[str, float] = None,
+    delay: int = 1,
+    fee: float = TEMPLATE_FEE,
+    download: bool = True,
+    max_points: int = 5000,
+    progress: Optional[ProgressReporter] = None
+) -> Dict[str, Any]:
+    """
+    分笔回放回测
+
+    分笔数据经过本地K线缓存（按日分区、内存映射读取），信号在全部分笔上向量化求值，
+    撮合规则见 tick_replay 模块。
+
+    Args:
+        stock_code: 股票代码
+        signal: 信号公式
+        start_time: 开始时间
+        end_time: 结束时间
+        count: 分笔条数
+        params: 覆盖input参数的默认值
+        delay: 信号发出后第几笔快照开始撮合
+        fee: 每笔交易扣除的手续费率
+        download: 本地没有分笔数据时是否先下载
+        max_points: 收益曲线降采样后的最大点数
+        progress: 进度回调，由服务器注入，客户端提供 progressToken 时发送进度通知
+
+    Returns:
+        {
+            "summary": 汇总指标（总收益率、最大回撤、胜率、交易次数、收益回撤比，与 run_single_stock_backtest 相同），
+                       以及 最新价成交收益率、价差成本（两者之差）、平均持仓笔数、分笔数，收益为百分比,
+            "trades": 逐笔交易列 {entry_time, entry_price, exit_time, exit_price, return, last_return,
+                      entry_delay, exit_delay}，未平仓交易的 exit_* 为空,
+            "curve": {time, 策略收益, 持仓} 收益曲线,
+            "parameters": 回测参数
+        }
+    """
+    if progress:
+        progress(0, 3, "读取分笔数据")
+    ticks = load_ticks(stock_code, start_time, end_time, count, download)
+    if len(ticks.get("time", ())) == 0:
+        raise ValueError(f"没有 {stock_code} 在 {start_time} - {end_time} 的分笔数据")
+    if progress:
+        progress(1, 3, f"回放 {len(ticks['time'])} 笔")
+    result = run_tick_backtest(signal, ticks, params, delay, fee)
+    if progress:
+        progress(2, 3, "整理结果")
+
+    curve = result["curve"]
+    time_axis, values = downsample_panel(
+        curve["time"], {name: curve[name][None, :] for name in ("策略收益", "持仓")}, max_points
+    )
+    trades = dict(result["trades"])
+    closed = ~np.isnan(trades["exit_price"])
+    trades["entry_time"] = time_labels(trades["entry_time"], "tick")
+    trades["exit_time"] = np.where(closed, time_labels(trades["exit_time"], "tick"), "")
+    if progress:
+        progress(3, 3, "完成")
+    return {
+        "summary": result["summary"],
+        "trades": {name: values_.tolist() for name, values_ in trades.items()},
+        "curve": {
+            "time": time_axis.tolist(),
+            "策略收益": values["策略收益"][0].tolist(),
+            "持仓": values["持仓"][0].tolist()
+        },
+        "parameters": {
+            "stock_code": stock_code,
+            "start_time": start_time,
+            "end_time": end_time,
+            "count": count,
+            "params": params or {},
+            "delay": delay,
+            "fee": fee
+        }
+    }
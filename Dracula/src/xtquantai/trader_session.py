@@ -0,0 +1,316 @@
+"""
+交易连接会话
+每个交易工具原先都各自 connect()、subscribe() 一遍，查询前还要先做一次测试查询，一笔委托要经过三次交易接口往返。
+这里为每个终端路径保留一个已连接的 XtQuantTrader：
+- 第一次使用时创建、启动并连接，之后直接复用；账户只订阅一次，记录已订阅的账户
+- 连接断开（on_disconnected）后在后台线程按指数退避重连：重新创建交易实例（新的会话ID）、连接并重新订阅已订阅的账户；
+  创建、连接和订阅在锁外进行，成功后才在锁内替换交易实例，重连期间查询会话状态、标记断开不会被阻塞；
+  重连期间会话被停止（stop）时丢弃新连接
+- 后台重连和退避期间的请求直接报错而不是阻塞交易线程池
+交易实例和账户对象由调用方提供的工厂创建，本模块不直接依赖 xtquant。
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 重连退避的初始间隔和上限（秒）
+TRADER_RECONNECT_BASE = float(os.environ.get("XTQUANTAI_TRADER_RECONNECT_BASE", "1"))
+TRADER_RECONNECT_MAX = float(os.environ.get("XTQUANTAI_TRADER_RECONNECT_MAX", "60"))
+
+# create_trader(路径, 会话ID, 会话) -> (已注册回调并启动的交易实例, 回调实例)
+TraderFactory = Callable[[str, int, "TraderSession"], Tuple[Any, Any]]
+
+# create_account(账户ID, 账户类型) -> 账户对象
+AccountFactory = Callable[[str, str], Any]
+
+
+class TraderConnectionError(RuntimeError):
+    """无法连接交易服务器或订阅账户"""
+
+
+class TraderSession:
+    """一个终端路径上的交易连接
+
+    Attributes:
+        path: 终端 userdata 路径
+        trader: 当前的交易实例，没有时为 None
+        callback: 当前交易实例的回调
+        session_id: 当前交易实例的会话ID
+        connected: 是否已连接
+    """
+
+    def __init__(self, path: str, create_trader: TraderFactory, create_account: AccountFactory,
+                 reconnect_base: float = TRADER_RECONNECT_BASE, reconnect_max: float = TRADER_RECONNECT_MAX):
+        self.path = path
+        self.create_trader = create_trader
+        self.create_account = create_account
+        self.reconnect_base = reconnect_base
+        self.reconnect_max = reconnect_max
+        self.trader = None
+        self.callback = None
+        self.session_id = 0
+        self.connected = False
+        # (账户ID, 账户类型) -> 账户对象，包括断开前订阅过、重连后需要重新订阅的账户
+        self.accounts: Dict[Tuple[str, str], Any] = {}
+        self._subscribed: set = set()
+        self._lock = threading.RLock()
+        self._failures = 0
+        self._retry_at = 0.0
+        self._reconnecting = False
+        # stop() 时加一，重连线程据此判断会话在重连期间是否已停止
+        self._generation = 0
+        self.connects = 0
+        self.subscribes = 0
+        self.disconnects = 0
+        self.reconnects = 0
+        self.last_error = ""
+
+    # ---------- 连接 ----------
+
+    def _new_session_id(self) -> int:
+        # 重新创建交易实例时会话ID不能与之前的相同
+        self.session_id = max(int(time.time()), self.session_id + 1)
+        return self.session_id
+
+    def _connect_locked(self) -> None:
+        if self.trader is None:
+            self.trader, self.callback = self.create_trader(self.path, self._new_session_id(), self)
+            print(f"交易线程已启动，路径: {self.path}，会话ID: {self.session_id}")
+        result = self.trader.connect()
+        self.connects += 1
+        if result != 0:
+            self._failures += 1
+            delay = min(self.reconnect_base * 2 ** (self._failures - 1), self.reconnect_max)
+            self._retry_at = time.monotonic() + delay
+            self.last_error = f"连接交易服务器失败，错误码: {result}"
+            # 连接失败的实例不再复用，下次重新创建
+            self._discard_trader_locked()
+            raise TraderConnectionError(f"{self.last_error}，{delay:.1f}秒后重试")
+        self.connected = True
+        self._failures = 0
+        self._retry_at = 0.0
+        self._subscribed.clear()
+        print(f"已连接交易服务器，路径: {self.path}")
+        # 重新订阅断开前订阅过的账户，个别账户失败不影响其他账户
+        for key, account in list(self.accounts.items()):
+            try:
+                self._subscribe_locked(key, account)
+            except TraderConnectionError as e:
+                print(e)
+
+    def _subscribe_locked(self, key: Tuple[str, str], account: Any) -> None:
+        result = self.trader.subscribe(account)
+        self.subscribes += 1
+        if result != 0:
+            self.last_error = f"订阅账户 {key[0]} 失败，错误码: {result}"
+            raise TraderConnectionError(self.last_error)
+        self._subscribed.add(key)
+        print(f"已订阅账户: {key[0]}")
+
+    def _discard_trader_locked(self) -> None:
+        trader, self.trader, self.callback = self.trader, None, None
+        self.connected = False
+        self._subscribed.clear()
+        if trader is not None:
+            try:
+                trader.stop()
+            except Exception as e:
+                print(f"停止交易实例出错: {e}")
+
+    def ensure(self, account_id: str, account_type: str = "STOCK") -> Tuple[Any, Any]:
+        """返回已连接的交易实例和已订阅的账户对象，需要时连接、订阅
+
+        Raises:
+            TraderConnectionError: 连接或订阅失败，或正在后台重连、处于重连退避期间
+        """
+        key = (account_id, account_type.upper())
+        with self._lock:
+            if not self.connected:
+                # 后台正在重连时不在交易线程池里再连一次
+                if self._reconnecting:
+                    raise TraderConnectionError(f"{self.last_error or '交易连接已断开'}，正在后台重连")
+                wait = self._retry_at - time.monotonic()
+                if wait > 0:
+                    raise TraderConnectionError(f"{self.last_error or '交易连接已断开'}，{wait:.1f}秒后重试")
+                self._connect_locked()
+            account = self.accounts.get(key)
+            if key not in self._subscribed:
+                if account is None:
+                    account = self.create_account(account_id, key[1])
+                self._subscribe_locked(key, account)
+                self.accounts[key] = account
+            return self.trader, account
+
+    def trader_instance(self) -> Any:
+        """返回交易实例（没有时创建并启动，不连接）"""
+        with self._lock:
+            if self.trader is None:
+                self.trader, self.callback = self.create_trader(self.path, self._new_session_id(), self)
+                print(f"交易线程已启动，路径: {self.path}，会话ID: {self.session_id}")
+            return self.trader
+
+    # ---------- 断线重连 ----------
+
+    def on_disconnected(self, callback: Any = None) -> None:
+        """交易回调的 on_disconnected 调用：标记断开并在后台重连，不阻塞回调线程
+
+        Args:
+            callback: 发出通知的回调实例；已丢弃的交易实例（如重连时停止的旧实例）的通知被忽略
+        """
+        with self._lock:
+            if callback is not None and callback is not self.callback:
+                return
+            self.disconnects += 1
+            self.connected = False
+            self._subscribed.clear()
+            self.last_error = "交易连接已断开"
+            if self._reconnecting:
+                return
+            self._reconnecting = True
+            generation = self._generation
+        threading.Thread(target=self._reconnect_loop, args=(generation,), name="xtquantai-trader-reconnect",
+                         daemon=True).start()
+
+    def _open_trader(self, session_id: int, accounts: List[Tuple[Tuple[str, str], Any]]) -> Tuple[Any, Any, set]:
+        """不持有锁创建、连接新的交易实例并订阅账户，返回 (交易实例, 回调, 已订阅的账户)
+
+        个别账户订阅失败不影响其他账户
+
+        Raises:
+            TraderConnectionError: 连接失败（新的交易实例已停止）
+        """
+        trader, callback = self.create_trader(self.path, session_id, self)
+        print(f"交易线程已启动，路径: {self.path}，会话ID: {session_id}")
+        result = trader.connect()
+        if result != 0:
+            try:
+                trader.stop()
+            except Exception as e:
+                print(f"停止交易实例出错: {e}")
+            raise TraderConnectionError(f"连接交易服务器失败，错误码: {result}")
+        print(f"已连接交易服务器，路径: {self.path}")
+        subscribed = set()
+        for key, account in accounts:
+            result = trader.subscribe(account)
+            if result != 0:
+                print(f"订阅账户 {key[0]} 失败，错误码: {result}")
+                continue
+            subscribed.add(key)
+            print(f"已订阅账户: {key[0]}")
+        return trader, callback, subscribed
+
+    def _reconnect_loop(self, generation: int) -> None:
+        """后台重连，generation 为断开时的 _generation；会话停止后不再重连，也不使用已建立的新连接"""
+        attempt = 0
+        try:
+            while True:
+                delay = min(self.reconnect_base * 2 ** attempt, self.reconnect_max)
+                time.sleep(delay)
+                with self._lock:
+                    if self.connected or self._generation != generation:
+                        return
+                    old = self.trader
+                    session_id = self._new_session_id()
+                    accounts = list(self.accounts.items())
+                # 连接和重新订阅可能阻塞较久，不持有锁；断开后的旧交易实例在新实例连接成功后才停止
+                try:
+                    trader, callback, subscribed = self._open_trader(session_id, accounts)
+                except Exception as e:
+                    with self._lock:
+                        self.connects += 1
+                        self.last_error = str(e) if isinstance(e, TraderConnectionError) else f"重连出错: {e}"
+                    print(f"重连失败: {self.last_error}")
+                    attempt += 1
+                    continue
+                with self._lock:
+                    # 重连期间会话已停止（stop）或交易实例已被替换时不使用新连接
+                    current = self._generation == generation and self.trader is old
+                    if current:
+                        self.trader, self.callback = trader, callback
+                        self.connected = True
+                        self._subscribed = subscribed
+                        self._failures = 0
+                        self._retry_at = 0.0
+                        self.connects += 1
+                        self.subscribes += len(subscribed)
+                        self.reconnects += 1
+                stale = old if current else trader
+                if stale is not None:
+                    try:
+                        stale.stop()
+                    except Exception as e:
+                        print(f"停止交易实例出错: {e}")
+                if current:
+                    print(f"交易连接已恢复，路径: {self.path}，第 {attempt + 1} 次尝试")
+                return
+        finally:
+            with self._lock:
+                # 会话已停止时 stop() 已清除标记，之后可能又有新的重连线程
+                if self._generation == generation:
+                    self._reconnecting = False
+
+    def stop(self) -> None:
+        """停止交易实例并忘记已订阅的账户"""
+        with self._lock:
+            self._generation += 1
+            self._reconnecting = False
+            self._discard_trader_locked()
+            self.accounts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "session_id": self.session_id,
+                "connected": self.connected,
+                "reconnecting": self._reconnecting,
+                "accounts": [account_id for account_id, _ in sorted(self._subscribed)],
+                "connects": self.connects,
+                "subscribes": self.subscribes,
+                "disconnects": self.disconnects,
+                "reconnects": self.reconnects,
+                "last_error": self.last_error,
+            }
+
+
+class TraderSessionManager:
+    """按终端路径管理交易会话"""
+
+    def __init__(self):
+        self.sessions: Dict[str, TraderSession] = {}
+        self._lock = threading.Lock()
+        self.create_trader: Optional[TraderFactory] = None
+        self.create_account: Optional[AccountFactory] = None
+
+    def configure(self, create_trader: TraderFactory, create_account: AccountFactory) -> None:
+        """设置创建交易实例和账户对象的工厂（由交易工具模块在导入时设置）"""
+        self.create_trader = create_trader
+        self.create_account = create_account
+
+    def session(self, path: str) -> TraderSession:
+        with self._lock:
+            session = self.sessions.get(path)
+            if session is None:
+                if self.create_trader is None:
+                    raise TraderConnectionError("没有配置交易实例工厂")
+                session = self.sessions[path] = TraderSession(path, self.create_trader, self.create_account)
+            return session
+
+    def close(self, path: str = None) -> int:
+        """停止指定路径（为空时全部）的会话，返回停止的会话数"""
+        with self._lock:
+            paths = [p for p in self.sessions if path is None or p == path]
+            sessions = [self.sessions.pop(p) for p in paths]
+        for session in sessions:
+            session.stop()
+        return len(sessions)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            sessions = list(self.sessions.values())
+        return [session.stats() for session in sessions]
+
+
+# 全局交易会话
+trader_sessions = TraderSessionManager()
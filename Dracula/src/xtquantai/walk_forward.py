@@ -0,0 +1,158 @@
+"""
+滚动窗口（walk-forward）样本外评估
+把K线按时间切成连续的 训练 + 测试 窗口：每个窗口在训练段上寻优参数，用最优参数在紧随其后的测试段上回测，
+各测试段首尾相接得到样本外收益曲线。
+- 滚动（rolling）时训练段长度固定并随窗口向后平移；锚定（anchored）时训练段总是从第一根K线开始
+- 测试段的信号在 训练段+测试段 上计算，训练段只用作指标预热；每个测试段从空仓开始，
+  段末未平仓的持仓按收盘价计入该段收益
+- 策略收益是逐根累加的百分比（见 backtest 模块），拼接时后一段整体加上前面各段的累计收益
+- 各窗口的寻优互不依赖，用线程同时发起，计算都提交到同一个 cpu 进程池
+"""
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .backtest import template_backtest, template_summary, time_labels
+from .executor import CPU_WORKERS
+from .formula import FormulaError, compile_signal
+from .formula.functions import divide, f_hhv
+from .optimize import optimize_signal
+
+# (训练起点, 训练终点, 测试起点, 测试终点)，K线下标，左闭右开
+Window = Tuple[int, int, int, int]
+
+
+def walk_forward_windows(n: int, train_bars: int, test_bars: int, anchored: bool = False) -> List[Window]:
+    """切分窗口，测试段首尾相接覆盖第一个训练段之后的全部K线，最后一个测试段可以不足 test_bars"""
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError("train_bars 和 test_bars 必须大于 0")
+    if n <= train_bars:
+        raise ValueError(f"K线数量 {n} 不足一个训练窗口（{train_bars} 根）加测试窗口")
+    windows = []
+    for test_start in range(train_bars, n, test_bars):
+        train_start = 0 if anchored else test_start - train_bars
+        windows.append((train_start, test_start, test_start, min(test_start + test_bars, n)))
+    return windows
+
+
+def _slice(bars: Mapping[str, np.ndarray], start: int, stop: int) -> Dict[str, np.ndarray]:
+    return {field: values[start:stop] for field, values in bars.items()}
+
+
+def run_walk_forward(signal: str, bars: Mapping[str, Any], train_bars: int, test_bars: int,
+                     anchored: bool = False, period: str = "1d", optimize: Optional[Dict[str, Any]] = None,
+                     progress: Optional[Callable] = None, executor: Optional[Executor] = None) -> Dict[str, Any]:
+    """滚动窗口寻优 + 样本外回测
+
+    Args:
+        signal: 包含 bk/bp 和 input 参数的信号公式
+        bars: K线，至少包含 time、close 和信号用到的字段
+        train_bars: 训练段K线数（锚定时为第一个训练段的长度）
+        test_bars: 测试段K线数
+        anchored: 训练段是否总是从第一根K线开始
+        period: K线周期，决定窗口起止时间的格式
+        optimize: 传给 optimize_signal 的寻优参数（ranges、constraint、metric、method、samples、min_trades、seed 等）
+        progress: 进度回调 (已完成窗口数, 窗口总数, 说明)
+        executor: 进程池，默认使用 cpu 执行池
+
+    Returns:
+        {summary: 样本外汇总指标, windows: 各窗口的参数和训练/测试汇总指标, curve: 拼接后的样本外收益曲线,
+         efficiency: 样本外每根K线平均收益 / 训练段每根K线平均收益}
+    """
+    compiled = compile_signal(signal)
+    missing = [name for name in ("BK", "BP") if name not in compiled.variables]
+    if missing:
+        raise FormulaError(f"信号中没有定义 {'/'.join(missing)}")
+    fields = sorted(compiled.fields | {"time", "close"})
+    bars = {field: np.asarray(bars[field]) for field in fields}
+    times = bars["time"]
+    windows = walk_forward_windows(len(times), train_bars, test_bars, anchored)
+    options = {"top": 1, **(optimize or {})}
+    labels = time_labels(times, period)
+
+    done = 0
+    lock = threading.Lock()
+
+    def train(window: Window) -> Dict[str, Any]:
+        nonlocal done
+        train_start, train_end, _, _ = window
+        result = optimize_signal(signal, _slice(bars, train_start, train_end), executor=executor, **options)
+        with lock:
+            done += 1
+            finished = done
+        if progress:
+            progress(finished, len(windows), f"窗口 {finished}/{len(windows)} 寻优完成")
+        return result
+
+    # 窗口寻优互不依赖，同时发起；线程只负责提交任务和等待结果
+    with ThreadPoolExecutor(max_workers=max(1, min(len(windows), CPU_WORKERS)),
+                            thread_name_prefix="xtquantai-walk-forward") as pool:
+        trained = list(pool.map(train, windows))
+
+    reports = []
+    pieces = []
+    carry = 0.0
+    trades = wins = 0
+    for i, (window, result) in enumerate(zip(windows, trained)):
+        train_start, train_end, test_start, test_end = window
+        best = result["best"]
+        if best is None:
+            # 没有满足条件的组合时使用默认参数
+            params, source, train_summary = compiled.defaults(), "default", None
+        else:
+            params = {name: best[name] for name in result["parameters"]}
+            source = "optimized"
+            train_summary = {key: best[key] for key in ("总收益率", "最大回撤", "胜率", "交易次数", "收益回撤比")}
+
+        # 训练段用作指标预热，只在测试段上交易
+        segment = _slice(bars, train_start, test_end)
+        values = compiled.evaluate(segment, params, ["BK", "BP"])
+        offset = test_start - train_start
+        columns = template_backtest(segment["close"][offset:], values["BK"][offset:], values["BP"][offset:])
+        test_summary = template_summary(columns)
+        trades += test_summary["交易次数"]
+        wins += int(round(test_summary["胜率"] * test_summary["交易次数"]))
+
+        strategy = np.nan_to_num(columns["策略收益"]) + carry
+        carry = float(strategy[-1])
+        pieces.append((times[test_start:test_end], strategy, np.full(test_end - test_start, i)))
+        reports.append({
+            "window": i,
+            "train": {"start": labels[train_start], "end": labels[train_end - 1], "bars": train_end - train_start},
+            "test": {"start": labels[test_start], "end": labels[test_end - 1], "bars": test_end - test_start},
+            "params": params,
+            "params_source": source,
+            "evaluated": result["evaluated"],
+            "train_summary": train_summary,
+            "test_summary": test_summary,
+        })
+
+    curve_time = np.concatenate([piece[0] for piece in pieces])
+    curve = np.concatenate([piece[1] for piece in pieces])
+    curve_window = np.concatenate([piece[2] for piece in pieces])
+    n = len(curve)
+    max_drawdown = float(np.max(f_hhv(n, curve, 0) - curve)) if n else 0.0
+    total = float(curve[-1]) if n else 0.0
+    summary = {
+        "总收益率": total,
+        "最大回撤": max_drawdown,
+        "胜率": wins / trades if trades else 0.0,
+        "交易次数": trades,
+        "收益回撤比": float(divide(total, max_drawdown)),
+    }
+
+    # 样本外与训练段每根K线平均收益之比，衡量寻优结果在样本外保留了多少
+    trained_reports = [r for r in reports if r["train_summary"] is not None]
+    train_rate = sum(r["train_summary"]["总收益率"] for r in trained_reports) / \
+        max(1, sum(r["train"]["bars"] for r in trained_reports))
+    test_rate = total / max(1, n)
+    efficiency = test_rate / train_rate if train_rate > 0 else None
+
+    return {
+        "summary": summary,
+        "windows": reports,
+        "curve": {"time": curve_time, "策略收益": curve, "window": curve_window},
+        "efficiency": efficiency,
+    }